@@ -0,0 +1,20 @@
+-- supabase/migrations/20231029000000_create_session_stickiness.sql
+
+-- Session Stickiness Table
+-- Which agent a chat session is pinned to, shared by all API workers
+-- (used when AGENT_STICKINESS_BACKEND=supabase). Written with the service role key only.
+-- A pin belongs to the agent that set it (owner_path), so a delegated agent serving the
+-- same session never follows its caller's pin.
+CREATE TABLE public.session_stickiness (
+    owner_path TEXT NOT NULL,
+    session_id TEXT NOT NULL,
+    agent_path TEXT NOT NULL,
+    expires_at TIMESTAMPTZ NOT NULL,
+    PRIMARY KEY (owner_path, session_id)
+);
+
+-- Expired pins are swept by expiry
+CREATE INDEX idx_session_stickiness_expires_at ON public.session_stickiness(expires_at);
+
+-- Enable RLS; no policies, so only the service role can read or write pins
+ALTER TABLE public.session_stickiness ENABLE ROW LEVEL SECURITY;
@@ -0,0 +1,109 @@
+"""
+Versioned registry of agent discovery cards.
+
+The agent loader in main.py registers a card for every agent module it loads, built
+from the agent's service class attributes (the same fields its
+`.well-known/agent.json` serves), so agent services discover each other with a
+dictionary lookup instead of an HTTP GET to this very process.
+
+Every change bumps `version`; the whole directory is served at
+`/.well-known/agents.json` with an ETag derived from its content, so clients (and
+other workers) can poll it cheaply with If-None-Match.
+"""
+import hashlib
+import json
+import logging
+from types import ModuleType
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def card_from_service_class(service_class: type, agent_path: str, delegable: bool = True) -> Dict[str, Any]:
+    """Discovery card of an agent service class, in the `.well-known/agent.json` format."""
+    name = getattr(service_class, "agent_name", None) or agent_path.split("/")[-1]
+    is_sticky = bool(getattr(service_class, "is_sticky", False))
+    capability = getattr(service_class, "primary_capability_name", None)
+    return {
+        "name": name,
+        "display_name": getattr(service_class, "display_name", None) or name.replace("_", " ").title(),
+        "description": getattr(service_class, "agent_description", None),
+        "capabilities": [capability] if capability else [],
+        "limitations": [],
+        "routing": {},
+        "api_version": getattr(service_class, "agent_version", None),
+        "schema_version": "a2a-v1",
+        "is_sticky": is_sticky,
+        "sticky_duration": getattr(service_class, "sticky_duration", 30) if is_sticky else None,
+        "is_idempotent": bool(getattr(service_class, "is_idempotent", False)),
+        "department": getattr(service_class, "department_name", None) or agent_path.split("/")[0],
+        "agent_id_stable": getattr(service_class, "agent_id", None),
+        "path": agent_path,
+        "delegable": delegable,
+    }
+
+
+def find_service_class(module: ModuleType, agent_name: str) -> Optional[type]:
+    """The agent service class of a loaded agent module: the class whose `agent_name` matches."""
+    for value in vars(module).values():
+        if isinstance(value, type) and getattr(value, "agent_name", None) == agent_name and hasattr(value, "get_agent_card"):
+            return value
+    return None
+
+
+class AgentCardRegistry:
+    """Agent path (e.g. "business/metrics") -> discovery card, with a version and ETag."""
+
+    def __init__(self):
+        self._cards: Dict[str, Dict[str, Any]] = {}
+        self.version = 0
+        self._agents: List[Dict[str, Any]] = []
+        self._etag = self._compute_etag()
+
+    def _compute_etag(self) -> str:
+        material = json.dumps(self._agents, sort_keys=True, default=str)
+        return f'"{hashlib.sha256(material.encode("utf-8")).hexdigest()[:32]}"'
+
+    def register(self, card: Dict[str, Any]) -> None:
+        key = card["path"].strip("/")
+        card = {**card, "path": key}
+        if self._cards.get(key) == card:
+            return
+        self._cards[key] = card
+        self.version += 1
+        self._agents = [self._cards[path] for path in sorted(self._cards)]
+        self._etag = self._compute_etag()
+        logger.debug(f"Registered agent card for {key} (registry version {self.version}).")
+
+    def register_module(self, agent_path: str, module: ModuleType, delegable: bool = True) -> Dict[str, Any]:
+        """Registers the card of a loaded agent module; modules without a service class get a minimal card."""
+        agent_path = agent_path.strip("/")
+        service_class = find_service_class(module, agent_path.split("/")[-1])
+        card = card_from_service_class(service_class or object, agent_path, delegable)
+        self.register(card)
+        return card
+
+    def get(self, agent_path: str) -> Optional[Dict[str, Any]]:
+        return self._cards.get(agent_path.strip("/"))
+
+    def agents(self, exclude: Optional[str] = None, delegable_only: bool = True) -> List[Dict[str, Any]]:
+        """Registered cards sorted by path. The list is rebuilt per version; do not mutate it."""
+        if exclude is None and not delegable_only:
+            return self._agents
+        exclude = exclude.strip("/") if exclude else None
+        return [card for card in self._agents
+                if card["path"] != exclude and (card.get("delegable", True) or not delegable_only)]
+
+    @property
+    def etag(self) -> str:
+        return self._etag
+
+    def document(self) -> Dict[str, Any]:
+        return {"version": self.version, "agents": self._agents}
+
+    def stats(self) -> Dict[str, Any]:
+        return {"version": self.version, "etag": self.etag, "agents": sorted(self._cards)}
+
+
+# Shared registry populated by the agent loader in main.py
+agent_card_registry = AgentCardRegistry()
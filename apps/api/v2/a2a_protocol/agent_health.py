@@ -0,0 +1,188 @@
+"""
+Per-agent health for agent-to-agent delegation.
+
+Every agent path gets its own CircuitBreaker (see llm/resilience.py) plus EWMA
+latency and error-rate tracking fed by delegation outcomes. Optional periodic health
+probes of the agent's `.well-known/agent.json` only move the breaker (up/down state);
+they never enter the delegation latency or error statistics. While an agent's
+breaker is open, delegate_to_agent fails fast with a fallback message instead of
+retrying with backoff, and the orchestrator leaves the agent out of routing.
+"""
+import asyncio
+import logging
+import math
+import os
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional
+
+import httpx
+
+from apps.api.llm.resilience import CircuitBreaker, CircuitOpenError
+
+logger = logging.getLogger(__name__)
+
+# Tunables (environment variables)
+AGENT_BREAKER_FAILURE_THRESHOLD = int(os.environ.get("AGENT_BREAKER_FAILURE_THRESHOLD", "3"))
+AGENT_BREAKER_RECOVERY_SECONDS = float(os.environ.get("AGENT_BREAKER_RECOVERY_SECONDS", "30"))
+AGENT_HEALTH_EWMA_ALPHA = float(os.environ.get("AGENT_HEALTH_EWMA_ALPHA", "0.2"))
+AGENT_HEALTH_LATENCY_WINDOW = int(os.environ.get("AGENT_HEALTH_LATENCY_WINDOW", "200"))  # samples kept for percentiles
+AGENT_HEALTH_PROBE_INTERVAL_SECONDS = float(os.environ.get("AGENT_HEALTH_PROBE_INTERVAL_SECONDS", "0"))  # 0 disables probes
+AGENT_HEALTH_PROBE_TIMEOUT_SECONDS = float(os.environ.get("AGENT_HEALTH_PROBE_TIMEOUT_SECONDS", "2"))
+
+
+class AgentHealth:
+    """Breaker, EWMA latency/error rate and recent latencies of one agent path."""
+
+    def __init__(self, agent_path: str, failure_threshold: int = AGENT_BREAKER_FAILURE_THRESHOLD,
+                 recovery_timeout_seconds: float = AGENT_BREAKER_RECOVERY_SECONDS,
+                 alpha: float = AGENT_HEALTH_EWMA_ALPHA, latency_window: int = AGENT_HEALTH_LATENCY_WINDOW):
+        self.agent_path = agent_path
+        self.breaker = CircuitBreaker(f"agent:{agent_path}", failure_threshold, recovery_timeout_seconds)
+        self.alpha = alpha
+        self.ewma_latency_seconds: Optional[float] = None
+        self.ewma_error_rate = 0.0
+        self.successes = 0
+        self.failures = 0
+        self.last_error: Optional[str] = None
+        self.last_probe_ok: Optional[bool] = None
+        self._latencies: Deque[float] = deque(maxlen=max(1, latency_window))
+
+    def _observe(self, seconds: Optional[float], failed: bool) -> None:
+        self.ewma_error_rate += self.alpha * (float(failed) - self.ewma_error_rate)
+        if seconds is not None and not failed:
+            self._latencies.append(seconds)
+            if self.ewma_latency_seconds is None:
+                self.ewma_latency_seconds = seconds
+            else:
+                self.ewma_latency_seconds += self.alpha * (seconds - self.ewma_latency_seconds)
+
+    def before_call(self) -> None:
+        """Raises CircuitOpenError while the agent's breaker is open."""
+        self.breaker.before_call()
+
+    def record_success(self, seconds: float) -> None:
+        self.successes += 1
+        self._observe(seconds, failed=False)
+        self.breaker.record_success()
+
+    def record_failure(self, error: str, seconds: Optional[float] = None) -> None:
+        self.failures += 1
+        self.last_error = error
+        self._observe(seconds, failed=True)
+        self.breaker.record_failure()
+
+    def record_probe(self, ok: bool, error: Optional[str] = None) -> None:
+        """Health probe outcome: moves the breaker only, leaving delegation statistics alone."""
+        self.last_probe_ok = ok
+        if not ok:
+            self.last_error = error
+            self.breaker.record_failure()
+            return
+        if self.breaker.state == CircuitBreaker.HALF_OPEN:
+            try:
+                self.before_call()
+                self.breaker.record_success()
+                logger.info(f"Health probe closed the breaker of agent {self.agent_path}.")
+            except CircuitOpenError:
+                pass  # A delegation is already probing
+
+    @property
+    def available(self) -> bool:
+        """False while the breaker rejects calls (open and not yet due for a probe)."""
+        return self.breaker.state != CircuitBreaker.OPEN
+
+    @property
+    def latency_samples(self) -> int:
+        return len(self._latencies)
+
+    def latency_percentile(self, quantile: float) -> Optional[float]:
+        """Nearest-rank percentile of recent successful delegation latencies."""
+        if not self._latencies:
+            return None
+        ordered = sorted(self._latencies)
+        return ordered[min(len(ordered) - 1, max(0, math.ceil(quantile * len(ordered)) - 1))]
+
+    def stats(self) -> Dict[str, Any]:
+        p95 = self.latency_percentile(0.95)
+        return {
+            **self.breaker.stats(),
+            "available": self.available,
+            "successes": self.successes,
+            "failures": self.failures,
+            "ewma_latency_seconds": round(self.ewma_latency_seconds, 4) if self.ewma_latency_seconds is not None else None,
+            "ewma_error_rate": round(self.ewma_error_rate, 4),
+            "p95_latency_seconds": round(p95, 4) if p95 is not None else None,
+            "last_error": self.last_error,
+            "last_probe_ok": self.last_probe_ok,
+        }
+
+
+class AgentHealthRegistry:
+    """AgentHealth per agent path, plus the optional background prober."""
+
+    def __init__(self):
+        self._agents: Dict[str, AgentHealth] = {}
+        self._probe_task: Optional[asyncio.Task] = None
+        self.probes = 0
+
+    def get(self, agent_path: str) -> AgentHealth:
+        key = agent_path.strip("/")
+        health = self._agents.get(key)
+        if health is None:
+            health = self._agents[key] = AgentHealth(key)
+        return health
+
+    def is_available(self, agent_path: Optional[str]) -> bool:
+        if not agent_path:
+            return True
+        health = self._agents.get(agent_path.strip("/"))
+        return health is None or health.available
+
+    def routable(self, agents: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """`agents` without those whose breaker is open (all of them if every agent is down)."""
+        healthy = [agent for agent in agents if self.is_available(agent.get("path"))]
+        return healthy or agents
+
+    # --- Health probes ---
+
+    async def probe(self, http_client: httpx.AsyncClient, base_url: str, agent_path: str) -> bool:
+        """GETs the agent's discovery document. Failures count against the breaker; a
+        success closes a breaker that is due for its half-open probe."""
+        health = self.get(agent_path)
+        url = f"{base_url.rstrip('/')}/agents/{agent_path.strip('/')}/.well-known/agent.json"
+        self.probes += 1
+        try:
+            response = await http_client.get(url, timeout=AGENT_HEALTH_PROBE_TIMEOUT_SECONDS)
+            response.raise_for_status()
+        except Exception as e:
+            health.record_probe(False, f"probe: {type(e).__name__}: {e}")
+            return False
+        health.record_probe(True)
+        return True
+
+    async def _probe_periodically(self, http_client: httpx.AsyncClient, base_url: str, agent_paths: List[str],
+                                  interval_seconds: float) -> None:
+        while True:
+            await asyncio.gather(*(self.probe(http_client, base_url, path) for path in agent_paths), return_exceptions=True)
+            await asyncio.sleep(interval_seconds)
+
+    def start_probes(self, http_client: httpx.AsyncClient, base_url: str, agent_paths: List[str],
+                     interval_seconds: float = AGENT_HEALTH_PROBE_INTERVAL_SECONDS) -> None:
+        if interval_seconds <= 0 or not agent_paths:
+            return
+        if self._probe_task is None or self._probe_task.done():
+            self._probe_task = asyncio.create_task(
+                self._probe_periodically(http_client, base_url, agent_paths, interval_seconds))
+
+    async def stop_probes(self) -> None:
+        if self._probe_task is not None:
+            self._probe_task.cancel()
+            await asyncio.gather(self._probe_task, return_exceptions=True)
+            self._probe_task = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {"probes": self.probes, "agents": {path: health.stats() for path, health in self._agents.items()}}
+
+
+# Shared registry used by delegate_to_agent and the orchestrator
+agent_health = AgentHealthRegistry()
@@ -0,0 +1,112 @@
+"""
+Process-local registry of agent services for in-process delegation.
+
+Agent-to-agent delegation normally POSTs a TaskSendParams to `/agents/{path}/tasks`,
+which is usually served by this very process: the request pays JSON encoding, an HTTP
+round trip, routing and JSON decoding for nothing. When an agent module is loaded,
+its `get_agent_service` dependency is registered here under the agent's path;
+delegate_to_agent then builds the service in-process (resolving the same FastAPI
+dependencies, including app.dependency_overrides) and calls handle_task_send directly.
+
+Agents that are not registered, or whose dependencies need an HTTP request (e.g. the
+caller's auth token), are delegated to over HTTP as before.
+"""
+import inspect
+import logging
+import os
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+
+from fastapi import params
+
+logger = logging.getLogger(__name__)
+
+AGENT_LOCAL_DELEGATION_ENABLED = os.environ.get("AGENT_LOCAL_DELEGATION_ENABLED", "true").lower() == "true"
+
+
+class LocalDependencyError(Exception):
+    """Raised when a dependency can only be resolved inside an HTTP request."""
+    pass
+
+
+async def resolve_dependency(dependency: Callable[..., Any], overrides: Optional[Dict[Any, Any]] = None) -> Any:
+    """
+    Calls a FastAPI dependency outside of a request: Depends() parameters are resolved
+    recursively (honoring `overrides`), parameters with plain defaults keep them.
+    """
+    overrides = overrides or {}
+    dependency = overrides.get(dependency, dependency)
+    if inspect.isgeneratorfunction(dependency) or inspect.isasyncgenfunction(dependency):
+        raise LocalDependencyError(f"Dependency '{getattr(dependency, '__name__', dependency)}' uses yield.")
+    kwargs: Dict[str, Any] = {}
+    for name, parameter in inspect.signature(dependency).parameters.items():
+        if isinstance(parameter.default, params.Depends):
+            kwargs[name] = await resolve_dependency(parameter.default.dependency, overrides)
+        elif parameter.default is inspect.Parameter.empty:
+            raise LocalDependencyError(
+                f"Dependency '{getattr(dependency, '__name__', type(dependency).__name__)}' needs request parameter '{name}'."
+            )
+    result = dependency(**kwargs)
+    if inspect.isawaitable(result):
+        result = await result
+    return result
+
+
+class LocalAgentRegistry:
+    """Agent path (e.g. "business/metrics") -> provider of an in-process agent service."""
+
+    def __init__(self):
+        self._providers: Dict[str, Callable[[], Awaitable[Any]]] = {}
+        self._request_bound: Set[str] = set()
+        self.local_delegations = 0
+        self.http_delegations = 0
+
+    @staticmethod
+    def _key(agent_path: str) -> str:
+        return agent_path.strip("/")
+
+    def register(self, agent_path: str, provider: Callable[[], Awaitable[Any]]) -> None:
+        """`provider` is an async callable returning a service with handle_task_send()."""
+        key = self._key(agent_path)
+        self._providers[key] = provider
+        self._request_bound.discard(key)
+        logger.debug(f"Registered in-process agent service for {key}.")
+
+    def register_dependency(self, agent_path: str, dependency: Callable[..., Any],
+                            overrides: Optional[Dict[Any, Any]] = None) -> None:
+        """Registers an agent module's FastAPI `get_agent_service` dependency."""
+        self.register(agent_path, lambda: resolve_dependency(dependency, overrides))
+
+    def unregister(self, agent_path: str) -> None:
+        self._providers.pop(self._key(agent_path), None)
+
+    def registered_paths(self) -> List[str]:
+        return sorted(self._providers)
+
+    def __contains__(self, agent_path: str) -> bool:
+        return self._key(agent_path) in self._providers
+
+    async def get_service(self, agent_path: str) -> Optional[Any]:
+        """The in-process service for `agent_path`, or None when it must be reached over HTTP."""
+        key = self._key(agent_path)
+        provider = self._providers.get(key)
+        if provider is None or key in self._request_bound:
+            return None
+        try:
+            return await provider()
+        except LocalDependencyError as e:
+            self._request_bound.add(key)
+            logger.info(f"Agent {key} cannot be called in-process ({e}); delegating over HTTP.")
+            return None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": AGENT_LOCAL_DELEGATION_ENABLED,
+            "registered": self.registered_paths(),
+            "request_bound": sorted(self._request_bound),
+            "local_delegations": self.local_delegations,
+            "http_delegations": self.http_delegations,
+        }
+
+
+# Shared registry populated by the agent loader in main.py
+local_agent_registry = LocalAgentRegistry()
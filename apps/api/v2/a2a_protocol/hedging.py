@@ -0,0 +1,117 @@
+"""
+Hedged delegation for idempotent, read-only agents.
+
+A delegation that has not answered after the agent's recent p95 delegation latency is
+sent a second time, to the replica at AGENT_HEDGE_BASE_URL; the first successful
+response wins and the other call is cancelled. Without a replica there is nothing
+independent to hedge to (a second in-process call would share the slow path), so
+hedging stays off until AGENT_HEDGE_BASE_URL is set. A token-bucket budget caps
+hedges to a fraction of hedgeable delegations so a slow agent is not hit with twice
+the load.
+
+Agents opt in by declaring `is_idempotent = True` (published in their agent card), or
+by being listed in AGENT_HEDGE_AGENTS.
+"""
+import asyncio
+import logging
+import os
+from typing import Any, Awaitable, Callable, Dict, Optional, TypeVar
+
+from .agent_health import AgentHealth
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Tunables (environment variables)
+AGENT_HEDGING_ENABLED = os.environ.get("AGENT_HEDGING_ENABLED", "false").lower() == "true"
+AGENT_HEDGE_AGENTS = os.environ.get("AGENT_HEDGE_AGENTS", "")  # Extra hedgeable agent paths, comma-separated
+AGENT_HEDGE_BASE_URL = os.environ.get("AGENT_HEDGE_BASE_URL")  # Replica for hedges; unset disables hedging
+AGENT_HEDGE_BUDGET_RATIO = float(os.environ.get("AGENT_HEDGE_BUDGET_RATIO", "0.1"))  # Hedges per hedgeable delegation
+AGENT_HEDGE_BUDGET_BURST = float(os.environ.get("AGENT_HEDGE_BUDGET_BURST", "5"))
+AGENT_HEDGE_MIN_SAMPLES = int(os.environ.get("AGENT_HEDGE_MIN_SAMPLES", "20"))  # Latencies needed before trusting p95
+AGENT_HEDGE_DEFAULT_DELAY_SECONDS = float(os.environ.get("AGENT_HEDGE_DEFAULT_DELAY_SECONDS", "5"))
+AGENT_HEDGE_MIN_DELAY_SECONDS = float(os.environ.get("AGENT_HEDGE_MIN_DELAY_SECONDS", "0.05"))
+
+
+class HedgeBudget:
+    """
+    Token bucket: each hedgeable delegation earns `ratio` tokens (up to `burst`),
+    each hedge spends one. Tracks how hedges fared.
+    """
+
+    def __init__(self, ratio: float = AGENT_HEDGE_BUDGET_RATIO, burst: float = AGENT_HEDGE_BUDGET_BURST):
+        self.ratio = ratio
+        self.burst = burst
+        self.tokens = 0.0
+        self.requests = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.denied = 0
+
+    def record_request(self) -> None:
+        self.requests += 1
+        self.tokens = min(self.burst, self.tokens + self.ratio)
+
+    def try_acquire(self) -> bool:
+        if self.tokens < 1.0:
+            self.denied += 1
+            return False
+        self.tokens -= 1.0
+        self.hedges += 1
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": AGENT_HEDGING_ENABLED and bool(AGENT_HEDGE_BASE_URL),
+            "budget_ratio": self.ratio,
+            "tokens": round(self.tokens, 3),
+            "hedgeable_requests": self.requests,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "denied_by_budget": self.denied,
+        }
+
+
+def hedge_delay_seconds(health: AgentHealth, min_samples: int = AGENT_HEDGE_MIN_SAMPLES) -> float:
+    """
+    The agent's recent p95 delegation latency, or the default delay until enough samples
+    exist. Only delegations feed these samples; health probes do not (see AgentHealth.record_probe).
+    """
+    p95 = health.latency_percentile(0.95) if health.latency_samples >= min_samples else None
+    return max(AGENT_HEDGE_MIN_DELAY_SECONDS, p95 if p95 is not None else AGENT_HEDGE_DEFAULT_DELAY_SECONDS)
+
+
+async def run_hedged(call: Callable[[bool], Awaitable[T]], delay_seconds: float, budget: HedgeBudget) -> T:
+    """
+    Awaits `call(False)`; if it is still running after `delay_seconds` and the budget
+    allows, starts `call(True)` as well. Returns the first successful result, cancelling
+    the other call; raises the first error only when both calls fail.
+    """
+    budget.record_request()
+    primary = asyncio.create_task(call(False))
+    pending = {primary}
+    try:
+        done, _ = await asyncio.wait(pending, timeout=delay_seconds)
+        if done or not budget.try_acquire():
+            return await primary
+        hedge = asyncio.create_task(call(True))
+        pending = {primary, hedge}
+        first_error: Optional[BaseException] = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    if task is hedge:
+                        budget.hedge_wins += 1
+                    return task.result()
+                first_error = first_error or task.exception()
+        raise first_error
+    finally:
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+
+
+# Shared budget used by delegate_to_agent
+hedge_budget = HedgeBudget()
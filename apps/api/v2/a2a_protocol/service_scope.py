@@ -0,0 +1,47 @@
+"""
+App-scoped agent service instances.
+
+Agent modules' `get_agent_service` dependencies used to build a new service (and its
+MCPClient) on every request, re-reading context files and resetting discovery state.
+They now hand out one shared instance per agent, created in the application lifespan
+and rebuilt only when one of its dependencies is a different object (e.g. a test's
+dependency override, or the HTTP client recreated by a new lifespan).
+"""
+import logging
+from typing import Any, Callable, Dict, Tuple, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class AppScopedServices:
+    """Name -> (dependencies, instance). Instances are reused while their dependencies are unchanged."""
+
+    def __init__(self):
+        self._instances: Dict[str, Tuple[Tuple[Any, ...], Any]] = {}
+        self.created = 0
+        self.reused = 0
+
+    def get_or_create(self, name: str, factory: Callable[[], T], *dependencies: Any) -> T:
+        entry = self._instances.get(name)
+        if entry is not None and len(entry[0]) == len(dependencies) and all(
+            held is given for held, given in zip(entry[0], dependencies)
+        ):
+            self.reused += 1
+            return entry[1]
+        instance = factory()
+        self._instances[name] = (dependencies, instance)
+        self.created += 1
+        logger.debug(f"Created app-scoped service '{name}'.")
+        return instance
+
+    def clear(self) -> None:
+        self._instances.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {"services": sorted(self._instances), "created": self.created, "reused": self.reused}
+
+
+# Shared scope used by the agent modules' dependency providers and the application lifespan
+agent_services = AppScopedServices()
@@ -0,0 +1,242 @@
+"""
+Session stickiness store: which agent a session is pinned to, and until when.
+
+Pins are owned by the agent that set them (the one that delegated) and are keyed by
+(owner path, session id). The delegated agent sees the same session id but looks up
+its own pins, so it never follows its caller's pin back into another delegation.
+
+Stickiness used to live in a dict on each agent service instance, so entries of
+abandoned sessions were never removed, and pins were lost across workers or when a
+service was re-created per request. Services now share one StickinessStore:
+
+- InMemoryStickinessStore (default): a dict plus a min-heap of expiries. A background
+  sweeper pops expired entries in O(log n) each; stale heap entries left behind by
+  re-pinned or cleared pins are skipped.
+- SupabaseStickinessStore (AGENT_STICKINESS_BACKEND=supabase): the
+  `session_stickiness` table, shared by every worker.
+"""
+import asyncio
+import heapq
+import logging
+import os
+import time
+from abc import ABC, abstractmethod
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Tunables (environment variables)
+AGENT_STICKINESS_BACKEND = os.environ.get("AGENT_STICKINESS_BACKEND", "memory").lower()  # "memory" or "supabase"
+AGENT_STICKINESS_SWEEP_INTERVAL_SECONDS = float(os.environ.get("AGENT_STICKINESS_SWEEP_INTERVAL_SECONDS", "60"))
+AGENT_STICKINESS_TABLE = os.environ.get("AGENT_STICKINESS_TABLE", "session_stickiness")
+
+PinKey = Tuple[str, str]  # (owner agent path, session id)
+
+
+class StickinessStore(ABC):
+    """(Owner agent path, session id) -> {"agent_path": str, "expiry": unix timestamp}."""
+
+    def __init__(self):
+        self.pins = 0
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self._sweeper_task: Optional[asyncio.Task] = None
+
+    @abstractmethod
+    async def get(self, owner_path: str, session_id: str) -> Optional[Dict[str, Any]]:
+        """The live pin `owner_path` holds for `session_id`, or None (expired pins are dropped)."""
+        pass
+
+    @abstractmethod
+    async def set(self, owner_path: str, session_id: str, agent_path: str, ttl_seconds: float) -> None:
+        pass
+
+    @abstractmethod
+    async def clear(self, owner_path: str, session_id: str) -> Optional[str]:
+        """Removes the pin; returns the agent path it pointed to, if any."""
+        pass
+
+    @abstractmethod
+    async def sweep(self) -> int:
+        """Removes expired pins; returns how many were removed."""
+        pass
+
+    @abstractmethod
+    async def live_sessions(self) -> Dict[str, int]:
+        """Number of live pins per agent path."""
+        pass
+
+    async def _sweep_periodically(self, interval_seconds: float) -> None:
+        while True:
+            await asyncio.sleep(interval_seconds)
+            try:
+                removed = await self.sweep()
+                if removed:
+                    logger.debug(f"Stickiness sweeper removed {removed} expired session(s).")
+            except Exception as e:
+                logger.warning(f"Stickiness sweep failed: {e}")
+
+    def start_sweeper(self, interval_seconds: float = AGENT_STICKINESS_SWEEP_INTERVAL_SECONDS) -> None:
+        if interval_seconds <= 0:
+            return
+        if self._sweeper_task is None or self._sweeper_task.done():
+            self._sweeper_task = asyncio.create_task(self._sweep_periodically(interval_seconds))
+
+    async def stop_sweeper(self) -> None:
+        if self._sweeper_task is not None:
+            self._sweeper_task.cancel()
+            await asyncio.gather(self._sweeper_task, return_exceptions=True)
+            self._sweeper_task = None
+
+    async def stats(self) -> Dict[str, Any]:
+        live = await self.live_sessions()
+        return {
+            "backend": type(self).__name__,
+            "live_sessions": sum(live.values()),
+            "live_by_agent": live,
+            "pins": self.pins,
+            "hits": self.hits,
+            "misses": self.misses,
+            "expired": self.expired,
+        }
+
+
+class InMemoryStickinessStore(StickinessStore):
+    """Process-local store with heap-ordered expiry."""
+
+    def __init__(self, clock: Callable[[], float] = time.time):
+        super().__init__()
+        self._clock = clock
+        self._entries: Dict[PinKey, Dict[str, Any]] = {}
+        self._expiries: List[Tuple[float, PinKey]] = []  # Min-heap of (expiry, key), may hold stale entries
+
+    def _drop_expired(self, key: PinKey, entry: Dict[str, Any]) -> None:
+        del self._entries[key]
+        self.expired += 1
+        logger.info(f"Session {key[1]} stickiness from {key[0]} to {entry.get('agent_path')} has expired.")
+
+    async def get(self, owner_path: str, session_id: str) -> Optional[Dict[str, Any]]:
+        key = (owner_path, session_id)
+        entry = self._entries.get(key)
+        if entry is not None and entry["expiry"] <= self._clock():
+            self._drop_expired(key, entry)
+            entry = None
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return dict(entry)
+
+    async def set(self, owner_path: str, session_id: str, agent_path: str, ttl_seconds: float) -> None:
+        key = (owner_path, session_id)
+        expiry = self._clock() + ttl_seconds
+        self._entries[key] = {"agent_path": agent_path, "expiry": expiry}
+        heapq.heappush(self._expiries, (expiry, key))
+        self.pins += 1
+        # Re-pinned sessions leave stale heap entries behind; rebuild before they dominate
+        if len(self._expiries) > 2 * len(self._entries) + 64:
+            self._expiries = [(entry["expiry"], key) for key, entry in self._entries.items()]
+            heapq.heapify(self._expiries)
+
+    async def clear(self, owner_path: str, session_id: str) -> Optional[str]:
+        entry = self._entries.pop((owner_path, session_id), None)
+        return entry["agent_path"] if entry else None
+
+    async def sweep(self) -> int:
+        now = self._clock()
+        removed = 0
+        while self._expiries and self._expiries[0][0] <= now:
+            expiry, key = heapq.heappop(self._expiries)
+            entry = self._entries.get(key)
+            if entry is not None and entry["expiry"] == expiry:  # Not re-pinned or cleared since
+                self._drop_expired(key, entry)
+                removed += 1
+        return removed
+
+    async def live_sessions(self) -> Dict[str, int]:
+        now = self._clock()
+        live: Dict[str, int] = {}
+        for entry in self._entries.values():
+            if entry["expiry"] > now:
+                live[entry["agent_path"]] = live.get(entry["agent_path"], 0) + 1
+        return live
+
+
+class SupabaseStickinessStore(StickinessStore):
+    """Store shared by all workers, backed by the `session_stickiness` table."""
+
+    def __init__(self, client: Any, table: str = AGENT_STICKINESS_TABLE):
+        super().__init__()
+        self.client = client
+        self.table = table
+
+    @staticmethod
+    def _iso(timestamp: float) -> str:
+        return datetime.fromtimestamp(timestamp, timezone.utc).isoformat()
+
+    async def _execute(self, query: Any) -> Any:
+        # supabase-py is synchronous; keep its network round trip off the event loop
+        return await asyncio.to_thread(query.execute)
+
+    async def get(self, owner_path: str, session_id: str) -> Optional[Dict[str, Any]]:
+        response = await self._execute(
+            self.client.table(self.table).select("agent_path, expires_at")
+            .eq("owner_path", owner_path).eq("session_id", session_id).gt("expires_at", self._iso(time.time())).limit(1)
+        )
+        if not response.data:
+            self.misses += 1
+            return None
+        self.hits += 1
+        row = response.data[0]
+        return {"agent_path": row["agent_path"], "expiry": datetime.fromisoformat(row["expires_at"]).timestamp()}
+
+    async def set(self, owner_path: str, session_id: str, agent_path: str, ttl_seconds: float) -> None:
+        await self._execute(self.client.table(self.table).upsert({
+            "owner_path": owner_path,
+            "session_id": session_id,
+            "agent_path": agent_path,
+            "expires_at": self._iso(time.time() + ttl_seconds),
+        }, on_conflict="owner_path,session_id"))
+        self.pins += 1
+
+    async def clear(self, owner_path: str, session_id: str) -> Optional[str]:
+        response = await self._execute(
+            self.client.table(self.table).delete().eq("owner_path", owner_path).eq("session_id", session_id)
+        )
+        return response.data[0]["agent_path"] if response.data else None
+
+    async def sweep(self) -> int:
+        response = await self._execute(
+            self.client.table(self.table).delete().lte("expires_at", self._iso(time.time()))
+        )
+        removed = len(response.data or [])
+        self.expired += removed
+        return removed
+
+    async def live_sessions(self) -> Dict[str, int]:
+        response = await self._execute(
+            self.client.table(self.table).select("agent_path").gt("expires_at", self._iso(time.time()))
+        )
+        live: Dict[str, int] = {}
+        for row in response.data or []:
+            live[row["agent_path"]] = live.get(row["agent_path"], 0) + 1
+        return live
+
+
+def create_stickiness_store(backend: str = AGENT_STICKINESS_BACKEND) -> StickinessStore:
+    if backend == "supabase":
+        from apps.api.core.db import get_supabase_service_client
+        client = get_supabase_service_client()
+        if client is not None:
+            return SupabaseStickinessStore(client)
+        logger.warning("AGENT_STICKINESS_BACKEND=supabase but no Supabase service client is configured; "
+                       "using the in-memory stickiness store.")
+    elif backend != "memory":
+        raise ValueError(f"Unknown AGENT_STICKINESS_BACKEND '{backend}' (expected 'memory' or 'supabase').")
+    return InMemoryStickinessStore()
+
+
+# Shared store used by every agent service
+stickiness_store = create_stickiness_store()
@@ -9,6 +9,7 @@ import uuid
 import os
 from pathlib import Path
 import asyncio
+import time
 
 from .types import (
     AgentCard,
@@ -25,6 +26,30 @@ from .types import (
     Artifact # Assuming Artifact might be used later from .types
 )
 from .task_store import TaskStoreService
+from apps.api.llm.token_accounting import usage_scope
+from apps.api.core.deadlines import (
+    DeadlineExceededError, deadline_scope, deadline_metadata, deadline_headers, deadline_stats,
+    timeout_from_metadata, check_deadline, fits, run_with_deadline, A2A_REQUEST_DEADLINE_SECONDS
+)
+from .agent_registry import local_agent_registry, AGENT_LOCAL_DELEGATION_ENABLED
+from .agent_health import agent_health
+from .agent_cards import agent_card_registry
+from .stickiness_store import StickinessStore, stickiness_store as shared_stickiness_store
+from .hedging import (
+    AGENT_HEDGE_AGENTS,
+    AGENT_HEDGE_BASE_URL,
+    AGENT_HEDGING_ENABLED,
+    hedge_budget,
+    hedge_delay_seconds,
+    run_hedged,
+)
+from apps.api.llm.resilience import CircuitOpenError
+
+class DelegationError(Exception):
+    """A delegation that produced no answer; the message is the one reported to the user."""
+    def __init__(self, agent_path: str, message: str):
+        super().__init__(message)
+        self.agent_path = agent_path
 
 class A2AUnifiedAgentService(ABC):
     """
@@ -51,6 +76,7 @@ class A2AUnifiedAgentService(ABC):
     # Optional class attributes
     is_sticky: bool = False  # Whether this agent should maintain session stickiness when called
     sticky_duration: int = 30  # Minutes for stickiness, if applicable
+    is_idempotent: bool = False  # Read-only agent whose tasks may be sent twice (hedged delegation)
 
     def __init__(self, 
                  task_store: TaskStoreService, 
@@ -93,12 +119,13 @@ class A2AUnifiedAgentService(ABC):
             logging.basicConfig(level=os.environ.get("LOG_LEVEL", "INFO").upper())
         self.logger.info(f"Logger {effective_log_name} initialized.")
         
-        # Session stickiness tracking (when this agent is used as an orchestrator)
-        self.session_stickiness: Dict[str, Dict[str, Any]] = {}
+        # Session stickiness tracking (when this agent is used as an orchestrator), shared by all services
+        self.stickiness_store: StickinessStore = shared_stickiness_store
         
         # Initialize agent discovery
         self.available_agents: List[Dict[str, Any]] = []
         self._discovery_done = False # Flag to track if discovery has run
+        self._discovered_registry_version = 0 # agent_card_registry version available_agents was read from
 
         # Store any additional services passed via kwargs (e.g., self.openai_service)
         for key, value in kwargs.items():
@@ -160,6 +187,7 @@ class A2AUnifiedAgentService(ABC):
             "schema_version": "a2a-v1", # A2A protocol schema version
             "is_sticky": getattr(self.__class__, 'is_sticky', False),
             "sticky_duration": getattr(self.__class__, 'sticky_duration', 30) if getattr(self.__class__, 'is_sticky', False) else None,
+            "is_idempotent": getattr(self.__class__, 'is_idempotent', False),
             "department": self.department_name, # Adding department for better categorization
             "agent_id_stable": getattr(self.__class__, 'agent_id', None) # The stable unique ID of the agent
         }
@@ -200,11 +228,18 @@ class A2AUnifiedAgentService(ABC):
                     f"Task {task_id_from_store} not found or could not be updated."
                 )
             
-            response_message = await self.process_message(
-                message=params.message,
-                task_id=task_id_from_store,
-                session_id=effective_session_id
-            )
+            # LLM usage made while processing is attributed to this user/session/agent, and all of
+            # it (delegations, MCP, LLM calls) is cancelled once the caller's deadline has passed
+            request_user_id = (params.message.metadata or {}).get("user_id")
+            request_timeout = timeout_from_metadata(params.metadata)
+            with usage_scope(user_id=request_user_id, session_id=effective_session_id,
+                             agent_id=self._own_path()), \
+                    deadline_scope(request_timeout if request_timeout is not None else A2A_REQUEST_DEADLINE_SECONDS):
+                response_message = await run_with_deadline(self.process_message(
+                    message=params.message,
+                    task_id=task_id_from_store,
+                    session_id=effective_session_id
+                ), f"{self.agent_name} answered task {task_id_from_store}", layer="task")
             
             final_session_id_for_task = effective_session_id
             responding_agent_name_for_task_metadata = self.display_name # Default to this agent's display name
@@ -341,11 +376,19 @@ class A2AUnifiedAgentService(ABC):
     #--------------------------------------------------
     
     async def ensure_agents_discovered(self):
+        # The card registry is filled by the agent loader; re-read it whenever its version moves
+        from_registry = not self._discovery_done or self._discovered_registry_version
+        if from_registry and agent_card_registry.version and agent_card_registry.version != self._discovered_registry_version:
+            self.available_agents = agent_card_registry.agents(exclude=self._own_path())
+            self._discovered_registry_version = agent_card_registry.version
+            self._discovery_done = True
+            self.logger.debug(f"({self.agent_name}) {len(self.available_agents)} agents from registry version {agent_card_registry.version}.")
         if not self._discovery_done:
             await self._discover_available_agents()
             self._discovery_done = True
 
     async def _discover_available_agents(self):
+        # HTTP self-discovery, used only when no agent cards were registered (e.g. outside the app)
         discovered_agents_list: List[Dict[str, Any]] = []
         
         # Temporarily only discover the metrics agent
@@ -414,30 +457,35 @@ class A2AUnifiedAgentService(ABC):
             self.logger.error(f"Unexpected error discovering agent {agent_path} at {full_discovery_url}: {e}", exc_info=True)
         return None
     
-    def _is_session_sticky(self, session_id: str) -> Optional[Dict[str, Any]]:
-        if not session_id or session_id not in self.session_stickiness:
-            return None
-        sticky_data = self.session_stickiness[session_id]
-        if "expiry" in sticky_data and sticky_data["expiry"] < datetime.now(timezone.utc).timestamp():
-            del self.session_stickiness[session_id]
-            self.logger.info(f"Session {session_id} stickiness to {sticky_data.get('agent_path')} has expired.")
+    def _own_path(self) -> str:
+        return f"{self.department_name}/{self.agent_name}"
+
+    async def _is_session_sticky(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """The pin this agent set for `session_id`; pins set by other agents are not consulted."""
+        if not session_id:
             return None
-        return sticky_data
+        return await self.stickiness_store.get(self._own_path(), session_id)
     
-    def _set_session_sticky(self, session_id: str, agent_path: str, duration_minutes: int = 30) -> None:
+    async def _set_session_sticky(self, session_id: str, agent_path: str, duration_minutes: int = 30) -> None:
         if not session_id:
             return
-        expiry = datetime.now(timezone.utc).timestamp() + (duration_minutes * 60)
-        self.session_stickiness[session_id] = {"agent_path": agent_path, "expiry": expiry}
+        await self.stickiness_store.set(self._own_path(), session_id, agent_path, duration_minutes * 60)
         self.logger.info(f"Session {session_id} is now sticky to {agent_path} for {duration_minutes} minutes")
     
-    def _clear_session_sticky(self, session_id: str) -> None:
-        if session_id and session_id in self.session_stickiness:
-            agent_path = self.session_stickiness[session_id].get("agent_path")
-            del self.session_stickiness[session_id]
+    async def _clear_session_sticky(self, session_id: str) -> None:
+        if not session_id:
+            return
+        agent_path = await self.stickiness_store.clear(self._own_path(), session_id)
+        if agent_path:
             self.logger.info(f"Cleared stickiness of session {session_id} from {agent_path}.")
     
-    async def delegate_to_agent(self, agent_path: str, task_description: str, task_id: str, session_id: Optional[str]) -> str:
+    async def delegate_to_agent(self, agent_path: str, task_description: str, task_id: str, session_id: Optional[str],
+                                raise_on_failure: bool = False) -> str:
+        """
+        Sends `task_description` to `agent_path` and returns its answer. Failures come back as a
+        user-facing message, or raise DelegationError carrying it when `raise_on_failure` is set
+        (callers that must tell answers from failures, like fan-outs and plans).
+        """
         self.logger.info(f"({self.agent_name}) Delegating task '{task_id}' to '{agent_path}' for session '{session_id}'. Description: '{task_description[:100]}...'")
         
         # Create a new unique sub_task_id for the delegated task
@@ -451,60 +499,170 @@ class A2AUnifiedAgentService(ABC):
                 message=agent_message,
                 session_id=session_id # Propagate session_id for context
             )
-            
-            # Construct the full URL for delegation
-            agent_url_path_relative = f"agents/{agent_path.strip('/')}/tasks"
-
-            # Prioritize a general API_BASE_URL, then a hardcoded default.
-            delegation_base_url = os.getenv("API_BASE_URL")
-            if not delegation_base_url:
-                # Fallback if no specific base URL is set in environment variables
-                delegation_base_url = "http://localhost:8000" 
-                self.logger.warning(
-                    f"API_BASE_URL env var not set. "
-                    f"Defaulting to '{delegation_base_url}' for delegating to '{agent_path}'."
-                )
-            
-            full_delegation_url = f"{delegation_base_url.strip('/')}/{agent_url_path_relative.lstrip('/')}"
-            self.logger.info(f"Constructed full delegation URL: {full_delegation_url}")
-
-            max_retries = int(os.environ.get("AGENT_DELEGATION_RETRIES", "3"))
-            base_retry_delay = float(os.environ.get("AGENT_DELEGATION_RETRY_DELAY_SECONDS", "1"))
-            
-            for attempt in range(max_retries + 1):
-                try:
-                    self.logger.info(f"Calling {agent_path} at {full_delegation_url} (Attempt {attempt + 1})")
-                    api_response = await self.http_client.post(
-                        full_delegation_url, 
-                        json=agent_task_params.model_dump(mode='json')
-                    )
-                    api_response.raise_for_status()
-                    agent_task_response_data = api_response.json()
-                    
-                    # Extract the response text
-                    response_text = self._extract_response_text(agent_task_response_data, agent_path)
-                    
-                    # Check if the delegated agent is sticky and set stickiness for the current session
-                    await self._check_and_set_stickiness_after_delegation(agent_path, session_id)
-                    
-                    return response_text
-                except (httpx.HTTPStatusError, httpx.RequestError, httpx.ConnectTimeout, httpx.ReadTimeout) as e:
-                    self.logger.warning(f"Error calling {agent_path} (Attempt {attempt + 1}/{max_retries + 1}): {type(e).__name__} - {str(e)}")
-                    if attempt == max_retries:
-                        self.logger.error(f"All {max_retries + 1} attempts to call {agent_path} failed. Last error: {str(e)}")
-                        raise # Re-raise the last exception to be caught by the outer try-except
-                    backoff_delay = base_retry_delay * (2 ** attempt)
-                    self.logger.info(f"Retrying in {backoff_delay}s...")
-                    await asyncio.sleep(backoff_delay)
-                except Exception as e: # Catch other unexpected errors during the attempt
-                    self.logger.error(f"Unexpected error during delegation attempt {attempt + 1} to {agent_path}: {type(e).__name__} - {str(e)}", exc_info=True)
-                    raise # Re-raise immediately as it's not a network/HTTP issue we should retry for
-
+            health = agent_health.get(agent_path)
+
+            if not self._is_hedgeable(agent_path):
+                return await self._send_delegation(agent_path, agent_task_params, session_id)
+
+            # Idempotent agents get a second, identical sub-task when the first one is slower than usual
+            async def send(is_hedge: bool) -> str:
+                if not is_hedge:
+                    return await self._send_delegation(agent_path, agent_task_params, session_id)
+                self.logger.info(f"({self.agent_name}) Hedging sub-task {sub_task_id} to {agent_path}.")
+                hedge_params = agent_task_params.model_copy(update={"id": str(uuid.uuid4())})
+                return await self._send_delegation(agent_path, hedge_params, session_id, base_url=AGENT_HEDGE_BASE_URL)
+
+            return await run_hedged(send, hedge_delay_seconds(health), hedge_budget)
+
+        except DelegationError as e:
+            self.logger.warning(f"({self.agent_name}) Task '{task_id}' delegated to {agent_path} failed: {e}")
+            if raise_on_failure:
+                raise
+            return str(e)
+        except CircuitOpenError as e:
+            # The agent's breaker is open: fail fast instead of waiting through retries and backoff
+            self.logger.warning(f"({self.agent_name}) Not delegating task '{task_id}' to {agent_path}: circuit open.")
+            failure_message = self._agent_unavailable_message(agent_path, e.retry_after_seconds)
+        except DeadlineExceededError as e:
+            self.logger.warning(f"({self.agent_name}) Delegation of task '{task_id}' to {agent_path} cut short: {e}")
+            failure_message = f"The {agent_path.split('/')[-1]} agent could not answer before the request's deadline."
         except Exception as e:
             self.logger.error(f"({self.agent_name}) Error delegating task '{task_id}' to {agent_path}: {str(e)}", exc_info=True)
             # Return a user-friendly error message, not the raw exception, to the calling agent/user
-            return f"Error communicating with the {agent_path.split('/')[-1]} agent. Details: {str(e)}"
-        return f"An unexpected error occurred while trying to delegate to {agent_path}." # Should not be reached
+            failure_message = f"Error communicating with the {agent_path.split('/')[-1]} agent. Details: {str(e)}"
+        if raise_on_failure:
+            raise DelegationError(agent_path, failure_message)
+        return failure_message
+
+    def _is_hedgeable(self, agent_path: str) -> bool:
+        if not AGENT_HEDGING_ENABLED or not AGENT_HEDGE_BASE_URL:
+            return False  # Without a replica the hedge would hit the same (possibly in-process) path
+        if agent_path.strip("/") in {path.strip().strip("/") for path in AGENT_HEDGE_AGENTS.split(",")}:
+            return True
+        agent_info = next((agent for agent in self.available_agents if agent.get("path") == agent_path), None)
+        return bool(agent_info and agent_info.get("is_idempotent", False))
+
+    async def _send_delegation(self, agent_path: str, agent_task_params: TaskSendParams, session_id: Optional[str],
+                               base_url: Optional[str] = None) -> str:
+        """
+        One delegation of `agent_task_params`: in-process when the agent is registered locally
+        (and no `base_url` is forced), else over HTTP with retries. Raises CircuitOpenError
+        while the agent's breaker is open, DelegationError when the agent reports the task as
+        failed, and the last error when every attempt failed.
+        """
+        sub_task_id = agent_task_params.id
+        check_deadline(f"delegating to {agent_path}", layer="delegation")
+        health = agent_health.get(agent_path)
+        health.before_call()
+        started = time.perf_counter()
+
+        # Agents served by this process are called directly, skipping HTTP and JSON round trips
+        try:
+            local_service = await local_agent_registry.get_service(agent_path) if AGENT_LOCAL_DELEGATION_ENABLED and not base_url else None
+        except Exception:
+            health.record_failure("in-process service unavailable")
+            raise
+        if local_service is not None:
+            self.logger.info(f"Calling {agent_path} in-process for sub-task {sub_task_id}")
+            local_agent_registry.local_delegations += 1
+            try:
+                # The context already carries the deadline in-process; the metadata keeps every hop alike
+                agent_task = await local_service.handle_task_send(
+                    agent_task_params.model_copy(update={"metadata": deadline_metadata(agent_task_params.metadata)}))
+            except Exception as e:
+                health.record_failure(f"{type(e).__name__}: {e}", time.perf_counter() - started)
+                raise
+            response_text = self._extract_task_text(agent_task, agent_path)
+            if agent_task.status.state == TaskState.FAILED:
+                health.record_failure(f"task failed: {agent_task.status.message}", time.perf_counter() - started)
+                raise DelegationError(agent_path, response_text)
+            health.record_success(time.perf_counter() - started)
+            await self._check_and_set_stickiness_after_delegation(agent_path, session_id)
+            return response_text
+        local_agent_registry.http_delegations += 1
+        
+        # Construct the full URL for delegation
+        agent_url_path_relative = f"agents/{agent_path.strip('/')}/tasks"
+
+        # Prioritize an explicit replica, then a general API_BASE_URL, then a hardcoded default.
+        delegation_base_url = base_url or os.getenv("API_BASE_URL")
+        if not delegation_base_url:
+            # Fallback if no specific base URL is set in environment variables
+            delegation_base_url = "http://localhost:8000" 
+            self.logger.warning(
+                f"API_BASE_URL env var not set. "
+                f"Defaulting to '{delegation_base_url}' for delegating to '{agent_path}'."
+            )
+        
+        full_delegation_url = f"{delegation_base_url.strip('/')}/{agent_url_path_relative.lstrip('/')}"
+        self.logger.info(f"Constructed full delegation URL: {full_delegation_url}")
+
+        max_retries = int(os.environ.get("AGENT_DELEGATION_RETRIES", "3"))
+        base_retry_delay = float(os.environ.get("AGENT_DELEGATION_RETRY_DELAY_SECONDS", "1"))
+        
+        for attempt in range(max_retries + 1):
+            attempt_started = time.perf_counter()
+            try:
+                self.logger.info(f"Calling {agent_path} at {full_delegation_url} (Attempt {attempt + 1})")
+                # Each attempt tells the agent how much of the request's budget is left
+                attempt_params = agent_task_params.model_copy(update={"metadata": deadline_metadata(agent_task_params.metadata)})
+                api_response = await run_with_deadline(self.http_client.post(
+                    full_delegation_url, 
+                    json=attempt_params.model_dump(mode='json'),
+                    headers=deadline_headers()
+                ), f"{agent_path} answered", layer="delegation")
+                api_response.raise_for_status()
+                agent_task_response_data = api_response.json()
+
+                # Extract the response text
+                response_text = self._extract_response_text(agent_task_response_data, agent_path)
+                task_state = (agent_task_response_data.get("status") or {}).get("state") if isinstance(agent_task_response_data, dict) else None
+                if task_state == TaskState.FAILED.value:
+                    status_message = agent_task_response_data["status"].get("message")
+                    health.record_failure(f"task failed: {status_message}", time.perf_counter() - attempt_started)
+                    raise DelegationError(agent_path, response_text)  # The agent answered; retrying would not help
+                health.record_success(time.perf_counter() - attempt_started)
+                
+                # Check if the delegated agent is sticky and set stickiness for the current session
+                await self._check_and_set_stickiness_after_delegation(agent_path, session_id)
+                
+                return response_text
+            except (httpx.HTTPStatusError, httpx.RequestError, httpx.ConnectTimeout, httpx.ReadTimeout) as e:
+                health.record_failure(f"{type(e).__name__}: {e}", time.perf_counter() - attempt_started)
+                self.logger.warning(f"Error calling {agent_path} (Attempt {attempt + 1}/{max_retries + 1}): {type(e).__name__} - {str(e)}")
+                if attempt == max_retries:
+                    self.logger.error(f"All {max_retries + 1} attempts to call {agent_path} failed. Last error: {str(e)}")
+                    raise # Re-raise the last exception to be caught by delegate_to_agent
+                health.before_call()  # Stop retrying once the agent's breaker has opened
+                backoff_delay = base_retry_delay * (2 ** attempt)
+                if not fits(backoff_delay + (health.ewma_latency_seconds or 0.0)):
+                    deadline_stats.retries_skipped += 1
+                    self.logger.warning(f"Not retrying {agent_path}: the backoff and a typical call would outlast the request's deadline.")
+                    raise
+                self.logger.info(f"Retrying in {backoff_delay}s...")
+                await asyncio.sleep(backoff_delay)
+            except (DeadlineExceededError, DelegationError):
+                raise  # Out of time, or the agent answered with a failed task: nothing to retry
+            except Exception as e: # Catch other unexpected errors during the attempt
+                health.record_failure(f"{type(e).__name__}: {e}", time.perf_counter() - attempt_started)
+                self.logger.error(f"Unexpected error during delegation attempt {attempt + 1} to {agent_path}: {type(e).__name__} - {str(e)}", exc_info=True)
+                raise # Re-raise immediately as it's not a network/HTTP issue we should retry for
+        raise RuntimeError(f"An unexpected error occurred while trying to delegate to {agent_path}.") # Should not be reached
+
+    def _agent_unavailable_message(self, agent_path: str, retry_after_seconds: float) -> str:
+        agent_name = agent_path.split('/')[-1]
+        return (f"The {agent_name} agent is temporarily unavailable after repeated failures. "
+                f"Please try again in about {max(1, round(retry_after_seconds))} seconds.")
+
+    def _extract_task_text(self, agent_task: Task, agent_path: str) -> str:
+        # In-process counterpart of _extract_response_text: reads the Task object directly
+        response_message = agent_task.response_message
+        if response_message and response_message.parts:
+            first_part = getattr(response_message.parts[0], "root", response_message.parts[0])
+            text = getattr(first_part, "text", None)
+            if text is not None:
+                return str(text)
+        return self._extract_response_text(agent_task.model_dump(mode="json"), agent_path)
 
     def _extract_response_text(self, agent_task_response: Dict[str, Any], agent_path: str) -> str:
         # Standardized way to extract response text from a Task object (which is what /tasks should return)
@@ -547,7 +705,7 @@ class A2AUnifiedAgentService(ABC):
                 agent_card_data = agent_info 
                 if agent_card_data.get("is_sticky", False):
                     sticky_duration = agent_card_data.get("sticky_duration", 30) # Default from A2A spec if not provided
-                    self._set_session_sticky(session_id, agent_path, sticky_duration)
+                    await self._set_session_sticky(session_id, agent_path, sticky_duration)
                     self.logger.info(f"Session {session_id} became sticky to {agent_path} for {sticky_duration} mins after delegation.")
                 else:
                     self.logger.debug(f"Agent {agent_path} is not sticky; not setting session stickiness.")
@@ -583,14 +741,14 @@ class A2AUnifiedAgentService(ABC):
         self.logger.info(f"({self.agent_name}) Processing message for task {task_id}, session {session_id}")
         
         # Stickiness check is done first
-        sticky_agent_data = self._is_session_sticky(session_id)
+        sticky_agent_data = await self._is_session_sticky(session_id)
         
         response_text: str
         responding_agent_name_for_metadata = self.display_name # Default to this agent
 
         if sticky_agent_data:
             sticky_agent_path = sticky_agent_data["agent_path"]
-            if sticky_agent_path == f"{self.department_name}/{self.agent_name}": # Sticky to self
+            if sticky_agent_path == self._own_path(): # Sticky to self
                 self.logger.info(f"Session {session_id} is sticky to self ({sticky_agent_path}). Executing task directly.")
                 response_text = await self.execute_agent_task(message, task_id, session_id)
             else: # Sticky to another agent
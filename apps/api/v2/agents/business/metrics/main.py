@@ -17,6 +17,7 @@ from apps.api.a2a_protocol.types import (
 from apps.api.shared.mcp.mcp_client import MCPClient # Ensure MCPClient is imported
 from apps.api.agents.base.mcp_context_agent_base import MCPContextAgentBaseService
 from apps.api.a2a_protocol.task_store import TaskStoreService
+from apps.api.a2a_protocol.service_scope import agent_services
 from apps.api.main import get_original_task_store_service as get_task_store_service, get_original_http_client
 from pydantic import BaseModel, Field
 
@@ -61,9 +62,11 @@ agent_router = APIRouter(
     tags=[METRICS_DISPLAY_NAME]
 )
 
-# New dependency provider for MCPClient
+# New dependency provider for MCPClient, shared for as long as the HTTP client is
 def get_mcp_client_dependency(http_client: httpx.AsyncClient = Depends(get_original_http_client)) -> MCPClient:
-    return MCPClient(http_client=http_client)
+    return agent_services.get_or_create(
+        f"{METRICS_DEPARTMENT}/{METRICS_AGENT_NAME}:mcp_client", lambda: MCPClient(http_client=http_client), http_client
+    )
 
 # Corrected dependency provider for the new MetricsAgentService
 def get_agent_service(
@@ -71,11 +74,15 @@ def get_agent_service(
     http_client: httpx.AsyncClient = Depends(get_original_http_client), # This http_client is for MetricsAgentService itself
     mcp_client: MCPClient = Depends(get_mcp_client_dependency) # Use the new provider
 ) -> MetricsAgentService:
-    """Dependency to get an instance of MetricsAgentService."""
-    return MetricsAgentService(
-        task_store=task_store,
-        http_client=http_client,
-        mcp_client=mcp_client # Pass it to the service constructor
+    """Dependency to get the app-scoped MetricsAgentService (created in lifespan, rebuilt only if its dependencies change)."""
+    return agent_services.get_or_create(
+        f"{METRICS_DEPARTMENT}/{METRICS_AGENT_NAME}",
+        lambda: MetricsAgentService(
+            task_store=task_store,
+            http_client=http_client,
+            mcp_client=mcp_client # Pass it to the service constructor
+        ),
+        task_store, http_client, mcp_client
     )
 
 # --- Standard A2A Endpoints using the new MetricsAgentService ---
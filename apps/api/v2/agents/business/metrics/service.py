@@ -31,6 +31,7 @@ class MetricsAgentService(A2AUnifiedAgentService):
     
     is_sticky: bool = False # Typically, a metrics query is transactional
     sticky_duration: int = 30
+    is_idempotent: bool = True # Metrics queries only read data, so they can be hedged
 
     # --- Metrics-Specific Attributes ---
     # These would be equivalent to what McpContextAgentBase used to manage
@@ -153,6 +154,7 @@ class MetricsAgentService(A2AUnifiedAgentService):
             "auth_requirements": None,
             "is_sticky": self.is_sticky,
             "sticky_duration": self.sticky_duration if self.is_sticky else None,
+            "is_idempotent": self.is_idempotent,
             "department": self.department_name,
             "agent_id_stable": self.agent_id
         }
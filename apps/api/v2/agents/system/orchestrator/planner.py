@@ -0,0 +1,191 @@
+"""
+Plan-and-execute orchestration.
+
+A "plan" decision is a small DAG of agent steps:
+
+    {"action": "plan", "steps": [
+        {"id": "s1", "agent_name": "metrics", "query_for_agent": "Q3 sales by region"},
+        {"id": "s2", "agent_name": "competitors", "query_for_agent": "Competitor Q3 sales"},
+        {"id": "s3", "agent_name": "blog_post", "query_for_agent": "Draft a post comparing {s1} with {s2}",
+         "depends_on": ["s1", "s2"]}]}
+
+Each step starts as soon as the steps it depends on have finished, so independent
+steps run concurrently and the plan takes as long as its longest dependency chain.
+A step's query may reference earlier answers as `{step_id}`; answers that are not
+referenced are appended as context. Results are reported through `on_result` as
+they arrive, and `cached` results (e.g. from a re-sent task) are reused instead of
+delegating again. Steps are delegated, reported, merged and synthesized with the
+scatter-gather helpers.
+"""
+import asyncio
+import logging
+import os
+import re
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from apps.api.agents.system.orchestrator.scatter_gather import BranchResult, report_result, run_delegation
+
+logger = logging.getLogger(__name__)
+
+ORCHESTRATOR_PLAN_MAX_STEPS = int(os.environ.get("ORCHESTRATOR_PLAN_MAX_STEPS", "6"))
+ORCHESTRATOR_STEP_TIMEOUT_SECONDS = float(os.environ.get("ORCHESTRATOR_STEP_TIMEOUT_SECONDS", "30"))
+
+_PLACEHOLDER = re.compile(r"\{([A-Za-z0-9_\-]+)\}")
+
+
+class PlanError(ValueError):
+    """Raised for plans that cannot be executed (no valid steps, unknown dependencies, cycles)."""
+    pass
+
+
+@dataclass
+class PlanStep:
+    id: str
+    agent_path: str
+    query: str
+    depends_on: List[str] = field(default_factory=list)
+
+
+@dataclass
+class StepResult(BranchResult):
+    """A BranchResult of a plan step; its status may also be "skipped"."""
+    step_id: str = ""
+    cached: bool = False
+
+    @property
+    def heading(self) -> str:
+        return f"{self.step_id} · {super().heading}"
+
+
+def parse_plan(raw_steps: Any, resolve_agent: Callable[[Optional[str]], Optional[str]], fallback_query: str,
+               max_steps: int = ORCHESTRATOR_PLAN_MAX_STEPS) -> List[PlanStep]:
+    """
+    Validates the steps of a plan decision and returns them in dependency order.
+    Steps naming unknown agents are dropped together with the steps that depend on them.
+    """
+    if not isinstance(raw_steps, list):
+        raise PlanError("A plan needs a list of steps.")
+    steps: Dict[str, PlanStep] = {}
+    dropped: set = set()
+    for index, raw in enumerate(raw_steps):
+        if not isinstance(raw, dict):
+            continue
+        step_id = str(raw.get("id") or f"s{index + 1}")
+        if step_id in steps or step_id in dropped:
+            raise PlanError(f"Duplicate step id '{step_id}'.")
+        target = raw.get("agent_path") or raw.get("agent_name") or raw.get("agent")
+        agent_path = resolve_agent(target)
+        if not agent_path:
+            logger.warning(f"Plan step '{step_id}' names unknown agent '{target}'; dropping it.")
+            dropped.add(step_id)
+            continue
+        depends_on = raw.get("depends_on") or []
+        if isinstance(depends_on, str):
+            depends_on = [depends_on]
+        steps[step_id] = PlanStep(step_id, agent_path, str(raw.get("query_for_agent") or raw.get("query") or fallback_query),
+                                  [str(dep) for dep in depends_on])
+
+    # Kahn's algorithm: dependency order, dropping steps whose dependencies were dropped
+    ordered: List[PlanStep] = []
+    ordered_ids: set = set()
+    remaining = dict(steps)
+    while remaining:
+        ready = [step for step in remaining.values() if all(dep in ordered_ids for dep in step.depends_on)]
+        doomed = [step for step in remaining.values() if any(dep in dropped for dep in step.depends_on)]
+        for step in doomed:
+            logger.warning(f"Plan step '{step.id}' depends on a dropped step; dropping it.")
+            dropped.add(step.id)
+            del remaining[step.id]
+        if doomed:
+            continue
+        unknown = [dep for step in remaining.values() for dep in step.depends_on if dep not in steps]
+        if unknown:
+            raise PlanError(f"Plan step depends on unknown step '{unknown[0]}'.")
+        if not ready:
+            raise PlanError(f"Plan has a dependency cycle among {sorted(remaining)}.")
+        for step in ready:
+            ordered.append(step)
+            ordered_ids.add(step.id)
+            del remaining[step.id]
+    if not ordered:
+        raise PlanError("The plan has no executable steps.")
+    if len(ordered) > max_steps:
+        raise PlanError(f"The plan has {len(ordered)} steps; at most {max_steps} are allowed.")
+    return ordered
+
+
+def render_step_query(step: PlanStep, results: Dict[str, StepResult]) -> str:
+    """Fills `{step_id}` references with upstream answers and appends unreferenced ones as context."""
+    referenced = set()
+
+    def substitute(match: "re.Match[str]") -> str:
+        step_id = match.group(1)
+        if step_id in step.depends_on and step_id in results:
+            referenced.add(step_id)
+            return results[step_id].text
+        return match.group(0)
+
+    query = _PLACEHOLDER.sub(substitute, step.query)
+    context = [f"[{dep} from {results[dep].agent_path.split('/')[-1]}]: {results[dep].text}"
+               for dep in step.depends_on if dep in results and dep not in referenced]
+    if context:
+        query = f"{query}\n\nContext from earlier steps:\n" + "\n".join(context)
+    return query
+
+
+async def execute_plan(
+    steps: List[PlanStep],
+    run_step: Callable[[PlanStep, str], Awaitable[str]],
+    timeout_seconds: float = ORCHESTRATOR_STEP_TIMEOUT_SECONDS,
+    on_result: Optional[Callable[[StepResult], Awaitable[None]]] = None,
+    cached: Optional[Dict[str, StepResult]] = None,
+) -> List[StepResult]:
+    """
+    Runs every step once its dependencies are done; independent steps run concurrently.
+    A step whose dependency did not succeed is skipped. `cached` results whose rendered
+    query is unchanged are reused. Results are returned in plan order.
+    """
+    results: Dict[str, StepResult] = {}
+    running: Dict[asyncio.Task, PlanStep] = {}
+    waiting = list(steps)
+
+    async def finish(result: StepResult) -> None:
+        results[result.step_id] = result
+        await report_result(on_result, result)
+
+    async def run(step: PlanStep, query: str) -> StepResult:
+        status, text, seconds = await run_delegation(
+            lambda: run_step(step, query), timeout_seconds, f"Plan step {step.id} ({step.agent_path})")
+        return StepResult(step.agent_path, query, status, text, seconds, step_id=step.id)
+
+    try:
+        while waiting or running:
+            for step in [step for step in waiting if all(dep in results for dep in step.depends_on)]:
+                waiting.remove(step)
+                failed = [dep for dep in step.depends_on if not results[dep].ok]
+                if failed:
+                    await finish(StepResult(step.agent_path, step.query, "skipped",
+                                            f"Skipped: step {failed[0]} did not succeed.", 0.0, step_id=step.id))
+                    continue
+                query = render_step_query(step, results)
+                hit = (cached or {}).get(step.id)
+                if hit is not None and hit.ok and hit.query == query and hit.agent_path == step.agent_path:
+                    await finish(StepResult(step.agent_path, query, "ok", hit.text, 0.0, step_id=step.id, cached=True))
+                    continue
+                running[asyncio.create_task(run(step, query))] = step
+            if not running:
+                if waiting and not any(all(dep in results for dep in step.depends_on) for step in waiting):
+                    raise PlanError(f"Plan steps {[step.id for step in waiting]} depend on steps that never run.")
+                continue  # Skipped or cached steps may have unblocked others
+            done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                running.pop(task)
+                await finish(task.result())
+    finally:
+        for task in running:
+            task.cancel()
+        await asyncio.gather(*running, return_exceptions=True)
+
+    return [results[step.id] for step in steps]
+
@@ -0,0 +1,105 @@
+"""
+Scatter-gather delegation for multi-agent questions.
+
+A "fan_out" decision names several agents. Each branch is delegated concurrently
+with its own timeout; results are reported through `on_result` as soon as each
+branch finishes (the orchestrator records them on the task as progress updates),
+and the partial results that did arrive are merged by a final synthesis step.
+"""
+import asyncio
+import logging
+import os
+import time
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+ORCHESTRATOR_FAN_OUT_MAX_BRANCHES = int(os.environ.get("ORCHESTRATOR_FAN_OUT_MAX_BRANCHES", "4"))
+ORCHESTRATOR_BRANCH_TIMEOUT_SECONDS = float(os.environ.get("ORCHESTRATOR_BRANCH_TIMEOUT_SECONDS", "30"))
+
+
+@dataclass
+class Branch:
+    agent_path: str
+    query: str
+
+
+@dataclass
+class BranchResult:
+    agent_path: str
+    query: str
+    status: str  # "ok", "timeout" or "error"
+    text: str
+    seconds: float
+
+    @property
+    def ok(self) -> bool:
+        return self.status == "ok"
+
+    @property
+    def heading(self) -> str:
+        return self.agent_path.split("/")[-1]
+
+
+async def run_delegation(call: Callable[[], Awaitable[str]], timeout_seconds: float,
+                         label: str) -> Tuple[str, str, float]:
+    """
+    Awaits one delegation with a timeout. Returns (status, text, seconds); a timeout or
+    an exception becomes a "timeout" or "error" status instead of propagating.
+    """
+    started = time.perf_counter()
+    try:
+        text = await asyncio.wait_for(call(), timeout=timeout_seconds)
+        status = "ok"
+    except asyncio.TimeoutError:
+        text, status = f"No answer within {timeout_seconds:g}s.", "timeout"
+    except Exception as e:
+        logger.warning(f"{label} failed: {e}", exc_info=True)
+        text, status = f"Failed: {e}", "error"
+    return status, text, time.perf_counter() - started
+
+
+async def report_result(on_result: Optional[Callable[[Any], Awaitable[None]]], result: BranchResult) -> None:
+    """Passes a finished result to `on_result`; a failing callback is logged, not raised."""
+    if on_result is None:
+        return
+    try:
+        await on_result(result)
+    except Exception as e:
+        logger.warning(f"Reporting result of {result.heading} failed: {e}")
+
+
+async def scatter_gather(
+    branches: List[Branch],
+    delegate: Callable[[Branch], Awaitable[str]],
+    timeout_seconds: float = ORCHESTRATOR_BRANCH_TIMEOUT_SECONDS,
+    on_result: Optional[Callable[[BranchResult], Awaitable[None]]] = None,
+) -> List[BranchResult]:
+    """
+    Runs `delegate` for every branch concurrently. A branch that times out or raises
+    yields a non-ok BranchResult instead of failing the others. Results are returned
+    in branch order; `on_result` sees them in completion order.
+    """
+    async def run(branch: Branch) -> BranchResult:
+        status, text, seconds = await run_delegation(
+            lambda: delegate(branch), timeout_seconds, f"Fan-out branch {branch.agent_path}")
+        result = BranchResult(branch.agent_path, branch.query, status, text, seconds)
+        await report_result(on_result, result)
+        return result
+
+    return list(await asyncio.gather(*(run(branch) for branch in branches)))
+
+
+def merge_branch_results(results: List[BranchResult]) -> str:
+    """Plain merge used when no synthesis model is available."""
+    sections = []
+    for result in results:
+        body = result.text if result.ok else f"(unavailable: {result.text})"
+        sections.append(f"**{result.heading}**\n{body}")
+    return "\n\n".join(sections)
+
+
+def branch_results_for_synthesis(results: List[BranchResult]) -> List[Dict[str, Any]]:
+    return [{"agent": result.agent_path, "query": result.query, "status": result.status, "answer": result.text}
+            for result in results]
@@ -1,12 +1,26 @@
 from apps.api.a2a_protocol.unified_agent_service import A2AUnifiedAgentService
-from apps.api.a2a_protocol.types import AgentCard, AgentCapability, Message, TextPart
+from apps.api.a2a_protocol.agent_health import agent_health
+from apps.api.a2a_protocol.types import AgentCard, AgentCapability, Message, TextPart, TaskState, Artifact, ArtifactPart
+from apps.api.agents.system.orchestrator.scatter_gather import (
+    Branch, BranchResult, scatter_gather, merge_branch_results, branch_results_for_synthesis,
+    ORCHESTRATOR_FAN_OUT_MAX_BRANCHES, ORCHESTRATOR_BRANCH_TIMEOUT_SECONDS
+)
+from apps.api.agents.system.orchestrator.planner import (
+    PlanError, PlanStep, StepResult, parse_plan, execute_plan, ORCHESTRATOR_STEP_TIMEOUT_SECONDS
+)
+from apps.api.agents.system.orchestrator.speculation import (
+    last_agent_tracker, speculation_stats, speculation_elapsed,
+    ORCHESTRATOR_SPECULATION_ENABLED, ORCHESTRATOR_SPECULATION_IDEMPOTENT_ONLY
+)
 from apps.api.llm.openai_service import OpenAIService
 from apps.api.a2a_protocol.task_store import TaskStoreService
 from apps.api.a2a_protocol.supabase_chat_history import SupabaseChatMessageHistory
 from langchain_core.messages import HumanMessage, AIMessage
 from supabase import Client as SupabaseClient
 from typing import Optional, List, Dict, Any
+import asyncio
 import logging
+import time
 import uuid
 import httpx
 
@@ -64,6 +78,9 @@ class OrchestratorAgentService(A2AUnifiedAgentService):
         
         self.openai_service = openai_service
         self.supabase_client = supabase_client
+        # Last delegated agent per session and speculation outcomes, shared by all orchestrator instances
+        self.last_agents = last_agent_tracker
+        self.speculation_stats = speculation_stats
 
         if self.openai_service:
             self.logger.info("OrchestratorAgentService initialized with OpenAIService.")
@@ -117,7 +134,10 @@ class OrchestratorAgentService(A2AUnifiedAgentService):
     ) -> str:
         """
         Core logic for the Orchestrator agent.
-        Uses the discovered metrics agent for delegation.
+        Asks OpenAIService for a routing decision over the discovered agents and acts on it:
+        delegate, fan out to several agents, respond directly, ask for clarification, or decline.
+        Delegation starts as soon as the streamed decision names its target agent, or, with
+        speculation enabled, to the session's last agent before the decision is made.
         """
         self.logger.info(f"Orchestrator ({self.agent_name}) executing task '{task_id}' for session '{session_id}'.")
         
@@ -136,27 +156,302 @@ class OrchestratorAgentService(A2AUnifiedAgentService):
 
         # Ensure agents are discovered
         await self.ensure_agents_discovered()
+        history = await self._load_conversation_history(message, session_id, user_query)
 
-        # Find the metrics agent in discovered agents by its path
-        metrics_agent = next((agent for agent in self.available_agents if agent.get("path") == "business/metrics"), None)
-        if not metrics_agent:
-            error_msg = "Could not find the metrics agent (path: business/metrics) in discovered agents."
-            self.logger.error(error_msg)
-            return error_msg
+        # Delegation started while the decision is still streaming. It carries the user's own
+        # query: the LLM's rewritten query_for_agent is generated after agent_name.
+        early_delegation: Dict[str, Any] = self._start_speculation(user_query, task_id, session_id)
 
+        def start_early_delegation(agent_name: str) -> None:
+            agent_path = self._resolve_agent_path(agent_name)
+            if agent_path and early_delegation.get("speculative") and early_delegation["path"] != agent_path:
+                self._abandon_speculation(early_delegation)  # The stream already names another agent
+            if agent_path and not early_delegation:
+                early_delegation["path"] = agent_path
+                early_delegation["task"] = asyncio.create_task(self.delegate_to_agent(
+                    agent_path=agent_path,
+                    task_description=user_query,
+                    task_id=task_id,
+                    session_id=session_id
+                ))
+
+        try:
+            decision = await self.openai_service.decide_orchestration_action(
+                user_query=user_query,
+                available_agents=agent_health.routable(self.available_agents),  # Agents with an open breaker sit out
+                history=history,
+                on_delegate_target=start_early_delegation
+            )
+        except Exception as e:
+            self.logger.error(f"Task {task_id}: Error getting orchestration decision: {e}", exc_info=True)
+            await self._cancel_early_delegation(early_delegation)
+            return f"I encountered an error trying to understand your request: {str(e)}"
+
+        if not decision or "action" not in decision:
+            self.logger.error(f"Task {task_id}: Invalid orchestration decision: {decision}")
+            await self._cancel_early_delegation(early_delegation)
+            return "I encountered an issue trying to process your request due to an invalid routing decision."
+
+        action = decision["action"]
+        self.logger.info(f"Task {task_id}: Orchestration decision '{action}' (routed_by={decision.get('routed_by', 'llm')}).")
+
+        if action == "delegate":
+            # The LLM names agents by 'agent_name'; older prompts used 'agent'/'agent_id'
+            target = decision.get("agent_path") or decision.get("agent_id") or decision.get("agent_name") or decision.get("agent")
+            agent_path = self._resolve_agent_path(target)
+            if agent_path and session_id:
+                self.last_agents.set(session_id, agent_path)
+            if early_delegation and early_delegation["path"] == agent_path:
+                if early_delegation.get("speculative"):
+                    self.speculation_stats.record_hit(speculation_elapsed(early_delegation))
+                    self.logger.info(f"Task {task_id}: Speculative delegation to {agent_path} matches the decision.")
+                else:
+                    self.logger.info(f"Task {task_id}: Using delegation to {agent_path} started during the decision stream.")
+                try:
+                    return await early_delegation["task"]
+                except Exception as e:
+                    self.logger.error(f"Error delegating to {agent_path}: {str(e)}", exc_info=True)
+                    return f"I encountered an error while processing your request: {str(e)}"
+            await self._cancel_early_delegation(early_delegation)
+            if not agent_path:
+                self.logger.warning(f"Task {task_id}: Decision delegated to unknown agent '{target}'.")
+                return f"I wanted to route your request to the '{target}' agent, but it is not available right now."
+            query_for_agent = decision.get("user_query_for_agent") or decision.get("query_for_agent") or user_query
+            try:
+                return await self.delegate_to_agent(
+                    agent_path=agent_path,
+                    task_description=query_for_agent,
+                    task_id=task_id,
+                    session_id=session_id
+                )
+            except Exception as e:
+                self.logger.error(f"Error delegating to {agent_path}: {str(e)}", exc_info=True)
+                return f"I encountered an error while processing your request: {str(e)}"
+        # Not a delegation after all (e.g. the streamed JSON turned out malformed)
+        await self._cancel_early_delegation(early_delegation)
+        if action == "fan_out":
+            return await self._fan_out(decision.get("delegations") or [], user_query, task_id, session_id)
+        if action == "plan":
+            return await self._plan_and_execute(decision.get("steps"), user_query, task_id, session_id)
+        if action == "respond_directly":
+            return decision.get("response_text") or "I don't have a response for that."
+        if action == "clarify":
+            question = decision.get("clarification_question") or decision.get("response_text") or "Could you provide more details?"
+            return f"Clarification needed: {question}"
+        if action == "cannot_handle":
+            return f"I cannot handle this request: {decision.get('reason', 'It is outside the scope of the available agents.')}"
+
+        self.logger.warning(f"Task {task_id}: Unknown orchestration action '{action}'.")
+        return f"I'm not sure how to proceed based on the information received. (Action: {action})"
+
+    async def _load_conversation_history(self, message: Message, session_id: Optional[str],
+                                         user_query: str) -> Optional[List[Dict[str, str]]]:
+        """
+        The session's earlier turns as chat messages for the routing decision, or None for a
+        fresh conversation (which keeps the fast-path router and decision cache in play).
+        """
+        if not session_id or not self.supabase_client:
+            return None
+        user_id = (message.metadata or {}).get("user_id")
+        try:
+            stored = await SupabaseChatMessageHistory(self.supabase_client, session_id, user_id).aget_messages()
+        except Exception as e:
+            self.logger.warning(f"Could not load chat history for session {session_id}: {e}")
+            return None
+        roles = {"human": "user", "ai": "assistant", "system": "system"}
+        history = [{"role": roles[stored_message.type], "content": str(stored_message.content)}
+                   for stored_message in stored if stored_message.type in roles]
+        # The chat client may have stored the current query already; it is sent separately
+        if history and history[-1]["role"] == "user" and history[-1]["content"] == user_query:
+            history.pop()
+        return history or None
+
+    async def _fan_out(self, delegations: List[Dict[str, Any]], user_query: str, task_id: str,
+                       session_id: Optional[str]) -> str:
+        """
+        Delegates to every agent of a fan_out decision concurrently, records each branch's
+        answer on the task as it arrives, and synthesizes the answers into one reply.
+        """
+        branches: List[Branch] = []
+        for delegation in delegations:
+            if not isinstance(delegation, dict):
+                continue
+            target = delegation.get("agent_path") or delegation.get("agent_name") or delegation.get("agent")
+            agent_path = self._resolve_agent_path(target)
+            if not agent_path:
+                self.logger.warning(f"Task {task_id}: Fan-out names unknown agent '{target}'; skipping it.")
+                continue
+            if any(branch.agent_path == agent_path for branch in branches):
+                continue
+            branches.append(Branch(agent_path, delegation.get("query_for_agent") or user_query))
+        if len(branches) > ORCHESTRATOR_FAN_OUT_MAX_BRANCHES:
+            self.logger.warning(f"Task {task_id}: Fan-out limited to {ORCHESTRATOR_FAN_OUT_MAX_BRANCHES} of {len(branches)} agents.")
+            branches = branches[:ORCHESTRATOR_FAN_OUT_MAX_BRANCHES]
+        if not branches:
+            return "I wanted to ask several agents about your request, but none of them are available right now."
+
+        self.logger.info(f"Task {task_id}: Fanning out to {[branch.agent_path for branch in branches]}.")
+
+        async def delegate(branch: Branch) -> str:
+            return await self.delegate_to_agent(
+                agent_path=branch.agent_path,
+                task_description=branch.query,
+                task_id=task_id,
+                session_id=session_id,
+                raise_on_failure=True  # A failed branch must not be synthesized as an answer
+            )
+
+        async def report(result: BranchResult) -> None:
+            # Partial results become visible on the task (GET /tasks/{id}) while other branches run
+            await self.task_store.update_task_status(
+                task_id=task_id,
+                new_state=TaskState.WORKING,
+                status_update_message=self._create_text_message(f"[{result.heading}] {result.text}")
+            )
+
+        results = await scatter_gather(branches, delegate, ORCHESTRATOR_BRANCH_TIMEOUT_SECONDS, on_result=report)
+        return await self._synthesize(results, user_query, task_id)
+
+    async def _synthesize(self, results: List[BranchResult], user_query: str, task_id: str) -> str:
+        """One reply from fan-out branch or plan step results (a plain merge when synthesis is unavailable)."""
+        if len(results) == 1 or not any(result.ok for result in results):
+            return merge_branch_results(results)
+        synthesis = None
+        if self.openai_service:
+            try:
+                synthesis = await self.openai_service.synthesize_responses(user_query, branch_results_for_synthesis(results))
+            except Exception as e:
+                self.logger.error(f"Task {task_id}: Synthesis failed: {e}", exc_info=True)
+        return synthesis or merge_branch_results(results)
+
+    async def _plan_and_execute(self, raw_steps: Any, user_query: str, task_id: str,
+                                session_id: Optional[str]) -> str:
+        """
+        Runs a plan decision as a DAG: independent steps are delegated concurrently, dependent
+        steps get the answers they need. Every step's answer is streamed to the task as a
+        status update and kept as a `plan_step:<id>` artifact, so re-sending the task reuses
+        the steps that already succeeded.
+        """
         try:
-            # Use the agent's path for delegation, which includes department/name
-            response_text = await self.delegate_to_agent(
-                agent_path=metrics_agent["path"],
-                task_description=user_query,
+            steps = parse_plan(raw_steps, self._resolve_agent_path, user_query)
+        except PlanError as e:
+            # Its steps are not run as a fan-out: dependent queries would go out with literal {step_id} placeholders
+            self.logger.warning(f"Task {task_id}: Unusable plan: {e}")
+            return f"I could not complete the plan for your request: {e}"
+
+        self.logger.info(f"Task {task_id}: Executing plan {[(step.id, step.agent_path, step.depends_on) for step in steps]}.")
+        cached = await self._cached_step_results(task_id)
+
+        async def delegate(step: PlanStep, query: str) -> str:
+            return await self.delegate_to_agent(
+                agent_path=step.agent_path,
+                task_description=query,
+                task_id=task_id,
+                session_id=session_id,
+                raise_on_failure=True  # Failed steps skip their dependents and are not cached
+            )
+
+        async def report(result: StepResult) -> None:
+            await self.task_store.update_task_status(
                 task_id=task_id,
-                session_id=session_id
+                new_state=TaskState.WORKING,
+                status_update_message=self._create_text_message(f"[{result.heading}] {result.text}")
             )
-            return response_text
+            if result.ok and not result.cached:
+                await self.task_store.add_task_artifact(task_id, Artifact(
+                    name=f"plan_step:{result.step_id}",
+                    parts=[ArtifactPart(content={
+                        "step": result.step_id, "agent": result.agent_path, "query": result.query,
+                        "status": result.status, "answer": result.text,
+                    })]
+                ))
+
+        try:
+            results = await execute_plan(steps, delegate, ORCHESTRATOR_STEP_TIMEOUT_SECONDS, on_result=report, cached=cached)
+        except PlanError as e:
+            self.logger.error(f"Task {task_id}: Plan execution failed: {e}")
+            return f"I could not complete the plan for your request: {e}"
+        return await self._synthesize(results, user_query, task_id)
+
+    async def _cached_step_results(self, task_id: str) -> Dict[str, StepResult]:
+        """Step answers recorded on the task by an earlier run of the same plan."""
+        try:
+            task_and_history = await self.task_store.get_task(task_id)
         except Exception as e:
-            error_msg = f"Error delegating to metrics agent: {str(e)}"
-            self.logger.error(error_msg, exc_info=True)
-            return f"I encountered an error while processing your request: {str(e)}"
+            self.logger.warning(f"Task {task_id}: Could not load cached plan steps: {e}")
+            return {}
+        artifacts = (task_and_history.task.artifacts if task_and_history else None) or []
+        cached: Dict[str, StepResult] = {}
+        for artifact in artifacts:
+            if not artifact.name.startswith("plan_step:"):
+                continue
+            for part in artifact.parts:
+                content = getattr(part.root, "content", None)
+                if isinstance(content, dict) and content.get("status") == "ok":
+                    cached[content["step"]] = StepResult(content["agent"], content["query"], "ok", content["answer"], 0.0,
+                                                         step_id=content["step"])
+        return cached
+
+    def _start_speculation(self, user_query: str, task_id: str, session_id: Optional[str]) -> Dict[str, Any]:
+        """
+        Starts delegating to the session's last agent while routing decides, when speculation
+        is enabled and the agent is available, idempotent (unless configured otherwise) and not sticky.
+        """
+        if not ORCHESTRATOR_SPECULATION_ENABLED or not session_id:
+            return {}
+        agent_path = self.last_agents.get(session_id)
+        agent_info = next((agent for agent in self.available_agents if agent.get("path") == agent_path), None)
+        if not agent_info or not agent_health.is_available(agent_path) or agent_info.get("is_sticky", False):
+            return {}
+        if ORCHESTRATOR_SPECULATION_IDEMPOTENT_ONLY and not agent_info.get("is_idempotent", False):
+            return {}
+
+        self.logger.info(f"Task {task_id}: Speculatively delegating to last agent {agent_path} while routing.")
+        self.speculation_stats.record_start()
+        speculation: Dict[str, Any] = {"path": agent_path, "speculative": True, "started_at": time.perf_counter()}
+        speculation["task"] = asyncio.create_task(self.delegate_to_agent(
+            agent_path=agent_path,
+            task_description=user_query,
+            task_id=task_id,
+            session_id=session_id
+        ))
+        speculation["task"].add_done_callback(lambda _: speculation.setdefault("finished_at", time.perf_counter()))
+        return speculation
+
+    def _abandon_speculation(self, early_delegation: Dict[str, Any]) -> None:
+        """Cancels a speculative delegation routing did not pick and accounts for its cost."""
+        task = early_delegation.get("task")
+        completed = task is not None and task.done() and not task.cancelled()
+        self.speculation_stats.record_miss(speculation_elapsed(early_delegation), completed)
+        self.logger.info(f"Abandoning speculative delegation to {early_delegation['path']}: routing chose differently.")
+        if task is not None and not task.done():
+            task.cancel()
+        early_delegation.clear()
+
+    async def _cancel_early_delegation(self, early_delegation: Dict[str, Any]) -> None:
+        if early_delegation.get("speculative"):
+            task = early_delegation["task"]
+            self._abandon_speculation(early_delegation)
+            await asyncio.gather(task, return_exceptions=True)
+            return
+        task = early_delegation.get("task")
+        if task is not None and not task.done():
+            self.logger.info(f"Cancelling early delegation to {early_delegation['path']}: the final decision differs.")
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+    def _resolve_agent_path(self, target: Optional[str]) -> Optional[str]:
+        """Maps an agent reference from a decision (path, name or display name) to a discovered agent's path."""
+        if not target:
+            return None
+        normalized = str(target).strip().strip("/").lower()
+        for agent in self.available_agents:
+            path = str(agent.get("path", "")).lower()
+            candidates = {path, path.split("/")[-1], str(agent.get("name", "")).lower(), str(agent.get("display_name", "")).lower()}
+            if normalized in candidates:
+                return agent.get("path")
+        # Not discovered (yet): a department/name path is still delegable
+        return target.strip("/") if "/" in str(target) else None
 
     # Additional orchestrator-specific methods can be added here
     # For example, methods related to managing how OpenAIService is accessed or configured for this agent. 
\ No newline at end of file
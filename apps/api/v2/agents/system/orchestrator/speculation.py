@@ -0,0 +1,108 @@
+"""
+Speculative delegation to the session's last agent.
+
+Follow-up turns are usually routed back to the agent that answered the previous one.
+With ORCHESTRATOR_SPECULATION_ENABLED the orchestrator starts that delegation (with the
+user's own query) while the routing decision is still being made: if routing picks the
+same agent the answer is already on its way, otherwise the speculative delegation is
+cancelled and counted as wasted work.
+
+Only idempotent, non-sticky agents are speculated on by default, since a cancelled
+delegation may still have run on the agent side.
+"""
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Tunables (environment variables)
+ORCHESTRATOR_SPECULATION_ENABLED = os.environ.get("ORCHESTRATOR_SPECULATION_ENABLED", "false").lower() == "true"
+ORCHESTRATOR_SPECULATION_IDEMPOTENT_ONLY = os.environ.get("ORCHESTRATOR_SPECULATION_IDEMPOTENT_ONLY", "true").lower() == "true"
+ORCHESTRATOR_LAST_AGENT_TTL_SECONDS = float(os.environ.get("ORCHESTRATOR_LAST_AGENT_TTL_SECONDS", "1800"))
+ORCHESTRATOR_LAST_AGENT_MAX_SESSIONS = int(os.environ.get("ORCHESTRATOR_LAST_AGENT_MAX_SESSIONS", "10000"))
+
+
+class LastAgentTracker:
+    """Session id -> path of the agent the orchestrator last delegated to; expiring, LRU-bounded."""
+
+    def __init__(self, ttl_seconds: float = ORCHESTRATOR_LAST_AGENT_TTL_SECONDS,
+                 max_sessions: int = ORCHESTRATOR_LAST_AGENT_MAX_SESSIONS,
+                 clock: Callable[[], float] = time.monotonic):
+        self.ttl_seconds = ttl_seconds
+        self.max_sessions = max_sessions
+        self._clock = clock
+        self._sessions: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+
+    def get(self, session_id: str) -> Optional[str]:
+        entry = self._sessions.get(session_id)
+        if entry is None:
+            return None
+        agent_path, expires_at = entry
+        if expires_at <= self._clock():
+            del self._sessions[session_id]
+            return None
+        return agent_path
+
+    def set(self, session_id: str, agent_path: str) -> None:
+        self._sessions[session_id] = (agent_path, self._clock() + self.ttl_seconds)
+        self._sessions.move_to_end(session_id)
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+
+class SpeculationStats:
+    """
+    How speculation fares. `seconds_saved` is delegation time overlapped with routing on
+    hits; `wasted_seconds` is agent time spent on misses, and `wasted_delegations` the
+    misses that ran to completion before routing disagreed.
+    """
+
+    def __init__(self):
+        self.started = 0
+        self.hits = 0
+        self.misses = 0
+        self.wasted_delegations = 0
+        self.seconds_saved = 0.0
+        self.wasted_seconds = 0.0
+
+    def record_start(self) -> None:
+        self.started += 1
+
+    def record_hit(self, seconds_saved: float) -> None:
+        self.hits += 1
+        self.seconds_saved += seconds_saved
+
+    def record_miss(self, wasted_seconds: float, completed: bool) -> None:
+        self.misses += 1
+        self.wasted_seconds += wasted_seconds
+        if completed:
+            self.wasted_delegations += 1
+
+    def stats(self) -> Dict[str, Any]:
+        decided = self.hits + self.misses
+        return {
+            "enabled": ORCHESTRATOR_SPECULATION_ENABLED,
+            "started": self.started,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / decided, 3) if decided else None,
+            "seconds_saved": round(self.seconds_saved, 3),
+            "wasted_seconds": round(self.wasted_seconds, 3),
+            "wasted_delegations": self.wasted_delegations,
+        }
+
+
+def speculation_elapsed(speculation: Dict[str, Any]) -> float:
+    """Seconds a speculative delegation has run: until it finished, or until now."""
+    return (speculation.get("finished_at") or time.perf_counter()) - speculation["started_at"]
+
+
+# Shared across orchestrator instances (the orchestrator service is built per request)
+last_agent_tracker = LastAgentTracker()
+speculation_stats = SpeculationStats()
@@ -0,0 +1,175 @@
+"""
+Request deadlines propagated across delegation hops.
+
+Every A2A task runs under a deadline: the one its caller sent, or
+A2A_REQUEST_DEADLINE_SECONDS for requests that arrive without one. The deadline lives
+in a context variable (inherited by tasks the request spawns) and travels to the next
+hop as the *remaining* budget in milliseconds, in `TaskSendParams.metadata["deadline_ms"]`
+and the X-Request-Deadline-Ms header. Each hop re-anchors it on its own monotonic clock,
+so hosts do not need synchronized clocks, and a nested scope can only tighten it.
+
+Layers use `remaining_seconds()`/`fits()` to skip retries that cannot finish in time and
+`run_with_deadline()` to cancel downstream work once the deadline passes. HTTP requests
+pick up the header through RequestDeadlineMiddleware.
+"""
+import asyncio
+import contextvars
+import logging
+import os
+import time
+from contextlib import contextmanager
+from typing import Any, Awaitable, Dict, Iterator, Optional, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Tunables (environment variables). 0 means no deadline unless the caller sends one.
+A2A_REQUEST_DEADLINE_SECONDS = float(os.environ.get("A2A_REQUEST_DEADLINE_SECONDS", "120"))
+
+DEADLINE_METADATA_KEY = "deadline_ms"
+DEADLINE_HEADER = "X-Request-Deadline-Ms"
+
+# Absolute deadline of the current request on this process's monotonic clock
+_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("request_deadline", default=None)
+
+
+class DeadlineExceededError(asyncio.TimeoutError):
+    """Raised when the request's deadline passes before `what` could finish."""
+    def __init__(self, what: str = "the request"):
+        super().__init__(f"Deadline exceeded before {what} could finish.")
+        self.what = what
+
+
+class DeadlineStats:
+    """Counts deadline expiries (by what was cut short) and retries skipped for lack of time."""
+
+    def __init__(self):
+        self.exceeded = 0
+        self.retries_skipped = 0
+        self.by_layer: Dict[str, int] = {}
+
+    def record_exceeded(self, layer: str) -> None:
+        self.exceeded += 1
+        self.by_layer[layer] = self.by_layer.get(layer, 0) + 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "default_deadline_seconds": A2A_REQUEST_DEADLINE_SECONDS,
+            "exceeded": self.exceeded,
+            "retries_skipped": self.retries_skipped,
+            "by_layer": dict(self.by_layer),
+        }
+
+
+def remaining_seconds() -> Optional[float]:
+    """Seconds left before the current request's deadline (may be negative), or None without one."""
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+def fits(seconds: float) -> bool:
+    """Whether work expected to take `seconds` can finish before the deadline."""
+    remaining = remaining_seconds()
+    return remaining is None or remaining > seconds
+
+
+def bounded_timeout(timeout_seconds: float) -> float:
+    """`timeout_seconds`, shortened to what is left of the deadline."""
+    remaining = remaining_seconds()
+    return timeout_seconds if remaining is None else max(0.001, min(timeout_seconds, remaining))
+
+
+def check_deadline(what: str, layer: str = "a2a") -> None:
+    """Raises DeadlineExceededError if the deadline has already passed."""
+    remaining = remaining_seconds()
+    if remaining is not None and remaining <= 0:
+        deadline_stats.record_exceeded(layer)
+        raise DeadlineExceededError(what)
+
+
+@contextmanager
+def deadline_scope(timeout_seconds: Optional[float]) -> Iterator[Optional[float]]:
+    """Runs the block under a deadline `timeout_seconds` from now, or the enclosing one if sooner."""
+    deadline = _deadline.get()
+    if timeout_seconds is not None and timeout_seconds > 0:
+        candidate = time.monotonic() + timeout_seconds
+        deadline = candidate if deadline is None else min(deadline, candidate)
+    token = _deadline.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _deadline.reset(token)
+
+
+def parse_timeout_ms(value: Any) -> Optional[float]:
+    """A propagated budget in milliseconds (metadata value or header) as seconds; None when absent or invalid."""
+    if value is None or value == "":
+        return None
+    try:
+        return max(0.001, float(value) / 1000.0)  # An exhausted budget still sets an (expired) deadline
+    except (TypeError, ValueError):
+        logger.warning(f"Ignoring invalid request deadline '{value}'.")
+        return None
+
+
+def timeout_from_metadata(metadata: Optional[Dict[str, Any]]) -> Optional[float]:
+    return parse_timeout_ms((metadata or {}).get(DEADLINE_METADATA_KEY))
+
+
+def deadline_metadata(metadata: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """`metadata` with the remaining budget for the next hop (unchanged without a deadline)."""
+    remaining = remaining_seconds()
+    if remaining is None:
+        return metadata
+    return {**(metadata or {}), DEADLINE_METADATA_KEY: max(0, int(remaining * 1000))}
+
+
+def deadline_headers() -> Dict[str, str]:
+    remaining = remaining_seconds()
+    return {} if remaining is None else {DEADLINE_HEADER: str(max(0, int(remaining * 1000)))}
+
+
+async def run_with_deadline(awaitable: Awaitable[T], what: str, layer: str = "a2a") -> T:
+    """Awaits `awaitable`, cancelling it and raising DeadlineExceededError when the deadline passes."""
+    remaining = remaining_seconds()
+    if remaining is None:
+        return await awaitable
+    if remaining <= 0:
+        if asyncio.iscoroutine(awaitable):
+            awaitable.close()  # Never started: avoid the "never awaited" warning
+        deadline_stats.record_exceeded(layer)
+        raise DeadlineExceededError(what)
+    try:
+        return await asyncio.wait_for(awaitable, timeout=remaining)
+    except asyncio.TimeoutError as e:
+        if isinstance(e, DeadlineExceededError) or remaining_seconds() > 0:
+            raise  # Cut short further down, or an inner timeout of its own
+        deadline_stats.record_exceeded(layer)
+        raise DeadlineExceededError(what) from e
+
+
+class RequestDeadlineMiddleware:
+    """
+    Pure ASGI middleware that runs each HTTP request under the deadline its caller sent in
+    the X-Request-Deadline-Ms header. It only sets the context variable: the request and
+    response stream through untouched (no BaseHTTPMiddleware buffering or extra task).
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        header = DEADLINE_HEADER.lower().encode("latin-1")
+        value = next((raw.decode("latin-1") for name, raw in scope.get("headers", []) if name == header), None)
+        timeout_seconds = parse_timeout_ms(value)
+        if timeout_seconds is None:
+            return await self.app(scope, receive, send)
+        with deadline_scope(timeout_seconds):
+            await self.app(scope, receive, send)
+
+
+# Shared, process-wide counters exposed at /a2a/metrics
+deadline_stats = DeadlineStats()
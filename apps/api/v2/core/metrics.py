@@ -0,0 +1,41 @@
+"""
+Lightweight in-process metrics helpers.
+
+The API does not ship a metrics backend; components keep their own counters and
+histograms and expose them as plain dictionaries (e.g. via GET /mcp/metrics).
+"""
+import bisect
+from typing import Any, Dict, Optional, Sequence
+
+# Default latency buckets, in seconds
+DEFAULT_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class Histogram:
+    """Cumulative histogram (Prometheus-style buckets) with count, sum and max."""
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_LATENCY_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self._bucket_counts = [0] * (len(self.buckets) + 1)  # Last slot is +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.max: Optional[float] = None
+
+    def observe(self, value: float) -> None:
+        self._bucket_counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = value if self.max is None else max(self.max, value)
+
+    def snapshot(self) -> Dict[str, Any]:
+        cumulative, running = {}, 0
+        for bound, bucket_count in zip(list(self.buckets) + ["+Inf"], self._bucket_counts):
+            running += bucket_count
+            cumulative[str(bound)] = running
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 6),
+            "avg": round(self.sum / self.count, 6) if self.count else 0.0,
+            "max": self.max,
+            "buckets": cumulative,
+        }
@@ -0,0 +1,173 @@
+"""
+Shared, pre-warmed OpenAI client.
+
+Every component that talks to the LLM provider (OpenAIService, llm_mcp) gets its
+AsyncOpenAI client from one factory, so they share a single httpx connection pool
+with explicit limits and keep-alive instead of each owning a cold default pool.
+HTTP/2 is used when enabled and the `h2` package is installed.
+
+warmup() opens pool connections (TCP + TLS) to the provider ahead of the first
+request; the application lifespan calls it on startup and aclose() on shutdown.
+
+The factory is one implementation of LLMProvider; LLM_PROVIDER=fake swaps in the
+local stand-in from llm.fake_provider for offline load and latency testing.
+"""
+import asyncio
+import logging
+import os
+import time
+from abc import ABC, abstractmethod
+from typing import Any, Dict, Optional, Tuple
+
+import httpx
+import openai
+
+logger = logging.getLogger(__name__)
+
+# Tunables (environment variables)
+LLM_PROVIDER = os.environ.get("LLM_PROVIDER", "openai").lower()  # "openai" or "fake"
+LLM_HTTP_MAX_CONNECTIONS = int(os.environ.get("LLM_HTTP_MAX_CONNECTIONS", "100"))
+LLM_HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.environ.get("LLM_HTTP_MAX_KEEPALIVE_CONNECTIONS", "20"))
+LLM_HTTP_KEEPALIVE_EXPIRY_SECONDS = float(os.environ.get("LLM_HTTP_KEEPALIVE_EXPIRY_SECONDS", "120"))
+LLM_HTTP_CONNECT_TIMEOUT_SECONDS = float(os.environ.get("LLM_HTTP_CONNECT_TIMEOUT_SECONDS", "5"))
+LLM_HTTP_TIMEOUT_SECONDS = float(os.environ.get("LLM_HTTP_TIMEOUT_SECONDS", "60"))
+LLM_HTTP2_ENABLED = os.environ.get("LLM_HTTP2_ENABLED", "false").lower() == "true"
+LLM_CLIENT_WARMUP_CONNECTIONS = int(os.environ.get("LLM_CLIENT_WARMUP_CONNECTIONS", "2"))  # 0 disables warmup
+LLM_CLIENT_WARMUP_TIMEOUT_SECONDS = float(os.environ.get("LLM_CLIENT_WARMUP_TIMEOUT_SECONDS", "3"))
+
+try:
+    import h2  # noqa: F401  (httpx needs it for HTTP/2)
+    _HTTP2_AVAILABLE = True
+except ImportError:
+    _HTTP2_AVAILABLE = False
+
+
+class LLMProvider(ABC):
+    """Source of chat-completions clients (AsyncOpenAI or a compatible stand-in)."""
+
+    @abstractmethod
+    def get_client(self, api_key: str, max_retries: Optional[int] = None) -> Any:
+        """A client exposing `chat.completions.create(...)` like openai.AsyncOpenAI."""
+        pass
+
+    async def warmup(self, api_key: str, **kwargs: Any) -> int:
+        return 0
+
+    async def aclose(self) -> None:
+        pass
+
+    @abstractmethod
+    def stats(self) -> Dict[str, Any]:
+        pass
+
+
+class LLMClientFactory(LLMProvider):
+    """Hands out AsyncOpenAI clients that share one tuned httpx connection pool."""
+
+    def __init__(
+        self,
+        max_connections: int = LLM_HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections: int = LLM_HTTP_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry: float = LLM_HTTP_KEEPALIVE_EXPIRY_SECONDS,
+        http2: bool = LLM_HTTP2_ENABLED,
+        base_url: Optional[str] = None,
+    ):
+        self.limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_keepalive_connections,
+                                   keepalive_expiry=keepalive_expiry)
+        self.timeout = httpx.Timeout(LLM_HTTP_TIMEOUT_SECONDS, connect=LLM_HTTP_CONNECT_TIMEOUT_SECONDS)
+        if http2 and not _HTTP2_AVAILABLE:
+            logger.warning("LLM_HTTP2_ENABLED is set but the 'h2' package is not installed; using HTTP/1.1.")
+        self.http2 = http2 and _HTTP2_AVAILABLE
+        self.base_url = base_url or os.environ.get("OPENAI_BASE_URL")
+        self._http_client: Optional[httpx.AsyncClient] = None
+        self._clients: Dict[Tuple[str, Optional[int]], openai.AsyncOpenAI] = {}
+        self.clients_created = 0
+        self.warmed_connections = 0
+        self.warmup_seconds: Optional[float] = None
+
+    @property
+    def http_client(self) -> httpx.AsyncClient:
+        if self._http_client is None or self._http_client.is_closed:
+            self._http_client = httpx.AsyncClient(limits=self.limits, timeout=self.timeout, http2=self.http2)
+            self._clients.clear()  # Clients bound to a closed pool are unusable
+        return self._http_client
+
+    def get_client(self, api_key: str, max_retries: Optional[int] = None) -> openai.AsyncOpenAI:
+        """
+        The shared client for `api_key`. `max_retries` overrides the SDK's retry count
+        (OpenAIService passes 0 because it retries itself).
+        """
+        http_client = self.http_client
+        key = (api_key, max_retries)
+        client = self._clients.get(key)
+        if client is None:
+            options: Dict[str, Any] = {"api_key": api_key, "http_client": http_client}
+            if max_retries is not None:
+                options["max_retries"] = max_retries
+            if self.base_url:
+                options["base_url"] = self.base_url
+            client = openai.AsyncOpenAI(**options)
+            self._clients[key] = client
+            self.clients_created += 1
+        return client
+
+    async def warmup(self, api_key: str, connections: int = LLM_CLIENT_WARMUP_CONNECTIONS,
+                     timeout_seconds: float = LLM_CLIENT_WARMUP_TIMEOUT_SECONDS) -> int:
+        """
+        Opens up to `connections` keep-alive connections to the provider. Any HTTP response
+        counts (no tokens are spent); failures are logged and never block startup.
+        Returns the number of connections established.
+        """
+        if connections <= 0:
+            return 0
+        client = self.get_client(api_key)
+        url = str(client.base_url).rstrip("/") + "/models"
+        started = time.perf_counter()
+
+        async def open_connection() -> bool:
+            try:
+                await self.http_client.head(url, timeout=timeout_seconds)
+                return True
+            except Exception as e:
+                logger.warning(f"LLM client warmup request failed: {type(e).__name__}: {e}")
+                return False
+
+        results = await asyncio.gather(*(open_connection() for _ in range(connections)))
+        self.warmed_connections = sum(results)
+        self.warmup_seconds = time.perf_counter() - started
+        logger.info(f"LLM client warmed {self.warmed_connections}/{connections} connections in {self.warmup_seconds:.3f}s "
+                    f"(http2={self.http2}).")
+        return self.warmed_connections
+
+    async def aclose(self) -> None:
+        if self._http_client is not None and not self._http_client.is_closed:
+            await self._http_client.aclose()
+        self._http_client = None
+        self._clients.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "provider": "openai",
+            "http2": self.http2,
+            "max_connections": self.limits.max_connections,
+            "max_keepalive_connections": self.limits.max_keepalive_connections,
+            "keepalive_expiry_seconds": self.limits.keepalive_expiry,
+            "clients": len(self._clients),
+            "clients_created": self.clients_created,
+            "warmed_connections": self.warmed_connections,
+            "warmup_seconds": round(self.warmup_seconds, 4) if self.warmup_seconds is not None else None,
+        }
+
+
+def create_llm_provider(name: str = LLM_PROVIDER) -> LLMProvider:
+    if name == "fake":
+        from apps.api.llm.fake_provider import FakeLLMProvider
+        logger.warning("LLM_PROVIDER=fake: LLM calls are answered by the local fake provider.")
+        return FakeLLMProvider()
+    if name != "openai":
+        raise ValueError(f"Unknown LLM_PROVIDER '{name}' (expected 'openai' or 'fake').")
+    return LLMClientFactory()
+
+
+# Shared provider used by OpenAIService, llm_mcp and the application lifespan
+llm_client_factory = create_llm_provider()
@@ -0,0 +1,118 @@
+"""
+Cache of orchestration decisions for conversation openers.
+
+The first message of many conversations is the same handful of openers ("hi",
+"talk to support", "what can you do"), and decide_orchestration_action returns the
+same JSON for them every time. Decisions are cached keyed by:
+
+- the normalized query (case, whitespace and trailing punctuation insensitive),
+- a hash of the available-agents list, so a change in discovery yields new keys,
+- the conversation state: fresh (no history) or a hash of the summary messages.
+
+Only fresh or summarized conversations are cacheable; once real turns are in the
+history the decision depends on them and the LLM is always asked. Entries expire
+after a TTL and the cache is bounded with LRU eviction.
+"""
+import copy
+import hashlib
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from apps.api.llm.fast_router import agent_set_signature
+
+logger = logging.getLogger(__name__)
+
+# Tunables (environment variables)
+ORCHESTRATION_DECISION_CACHE_ENABLED = os.environ.get("ORCHESTRATION_DECISION_CACHE_ENABLED", "true").lower() == "true"
+ORCHESTRATION_DECISION_CACHE_MAX_ENTRIES = int(os.environ.get("ORCHESTRATION_DECISION_CACHE_MAX_ENTRIES", "512"))
+ORCHESTRATION_DECISION_CACHE_TTL_SECONDS = float(os.environ.get("ORCHESTRATION_DECISION_CACHE_TTL_SECONDS", "600"))
+
+_TRAILING_PUNCTUATION = ".!?,;: "
+
+
+def normalize_decision_query(user_query: str) -> str:
+    """'Hi!', 'hi' and '  HI ' are the same opener."""
+    return " ".join(user_query.split()).casefold().rstrip(_TRAILING_PUNCTUATION)
+
+
+def is_summarized_history(history: Optional[List[Dict[str, Any]]]) -> bool:
+    """A history made only of system messages is a summary of earlier turns, not the turns themselves."""
+    return bool(history) and all(message.get("role") == "system" for message in history)
+
+
+def is_cacheable_history(history: Optional[List[Dict[str, Any]]]) -> bool:
+    return not history or is_summarized_history(history)
+
+
+def build_decision_key(user_query: str, available_agents: List[Dict[str, Any]],
+                       history: Optional[List[Dict[str, Any]]] = None) -> str:
+    if history:
+        summary = json.dumps([message.get("content") for message in history], default=str)
+        conversation_state = "summary:" + hashlib.sha256(summary.encode("utf-8")).hexdigest()[:16]
+    else:
+        conversation_state = "fresh"
+    key_material = json.dumps(
+        [normalize_decision_query(user_query), agent_set_signature(available_agents), conversation_state]
+    )
+    return hashlib.sha256(key_material.encode("utf-8")).hexdigest()
+
+
+class OrchestrationDecisionCache:
+    """In-memory LRU + TTL cache of decide_orchestration_action results."""
+
+    def __init__(
+        self,
+        max_entries: int = ORCHESTRATION_DECISION_CACHE_MAX_ENTRIES,
+        ttl_seconds: float = ORCHESTRATION_DECISION_CACHE_TTL_SECONDS,
+    ):
+        self.max_entries = max(1, max_entries)
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        expires_at, decision = entry
+        if time.monotonic() >= expires_at:
+            del self._entries[key]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return copy.deepcopy(decision)  # Callers may annotate the decision
+
+    def set(self, key: str, decision: Dict[str, Any]) -> None:
+        if self.ttl_seconds <= 0:
+            return
+        self._entries[key] = (time.monotonic() + self.ttl_seconds, copy.deepcopy(decision))
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+# Shared cache used by OpenAIService.decide_orchestration_action
+decision_cache = OrchestrationDecisionCache()
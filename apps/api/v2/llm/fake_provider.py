@@ -0,0 +1,221 @@
+"""
+Deterministic local stand-in for the OpenAI chat-completions API, for load and
+latency testing without spending provider quota.
+
+FakeLLMProvider hands out clients exposing `chat.completions.create(...)` with the
+same request arguments and response shapes the code reads from the OpenAI SDK:
+plain and JSON-mode completions, streams (with a trailing usage chunk when
+`stream_options={"include_usage": True}`), and `usage` token counts. Latency is
+simulated as a time-to-first-token plus a tokens-per-second generation rate, and
+provider errors (429 / 500) are injected at configurable rates from a seeded RNG,
+so runs are reproducible.
+
+JSON-mode requests are answered with orchestration decisions: a canned route whose
+keyword appears in the user query (FAKE_LLM_ROUTES="sales:metrics,support:chat_support"),
+else an agent from the prompt's catalog whose name appears in the query, else a
+direct response.
+
+Enable it with LLM_PROVIDER=fake (an OPENAI_API_KEY is still required; any value works).
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import random
+import re
+from types import SimpleNamespace
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+import httpx
+import openai
+
+from apps.api.llm.client_factory import LLMProvider
+from apps.api.llm.resilience import count_text_tokens, estimate_request_tokens
+
+logger = logging.getLogger(__name__)
+
+# Tunables (environment variables)
+FAKE_LLM_TTFT_SECONDS = float(os.environ.get("FAKE_LLM_TTFT_SECONDS", "0.3"))
+FAKE_LLM_TOKENS_PER_SECOND = float(os.environ.get("FAKE_LLM_TOKENS_PER_SECOND", "50"))  # 0 = instant
+FAKE_LLM_ERROR_RATE = float(os.environ.get("FAKE_LLM_ERROR_RATE", "0"))  # 500 Internal Server Error
+FAKE_LLM_RATE_LIMIT_RATE = float(os.environ.get("FAKE_LLM_RATE_LIMIT_RATE", "0"))  # 429 Too Many Requests
+FAKE_LLM_COMPLETION_WORDS = int(os.environ.get("FAKE_LLM_COMPLETION_WORDS", "60"))
+FAKE_LLM_ROUTES = os.environ.get("FAKE_LLM_ROUTES", "")
+FAKE_LLM_SEED = int(os.environ.get("FAKE_LLM_SEED", "0"))
+
+_FAKE_BASE_URL = "http://fake-llm.local/v1/"
+_CATALOG_LINE = re.compile(r"^- Agent Name: ([^,]+),", re.MULTILINE)
+_FILLER_WORDS = (
+    "the", "results", "show", "a", "steady", "trend", "across", "recent", "periods", "with", "no",
+    "unusual", "changes", "in", "key", "figures", "and", "further", "detail", "is", "available", "on", "request",
+)
+
+
+def parse_routes(value: str) -> List[Tuple[str, str]]:
+    """"keyword:agent,keyword:agent" -> [(keyword, agent)], keywords lower-cased."""
+    routes = []
+    for item in value.split(","):
+        keyword, _, agent = item.partition(":")
+        if keyword.strip() and agent.strip():
+            routes.append((keyword.strip().lower(), agent.strip()))
+    return routes
+
+
+def _usage(prompt_tokens: int, completion_tokens: int) -> SimpleNamespace:
+    return SimpleNamespace(
+        prompt_tokens=prompt_tokens,
+        completion_tokens=completion_tokens,
+        total_tokens=prompt_tokens + completion_tokens,
+        prompt_tokens_details=SimpleNamespace(cached_tokens=0),
+    )
+
+
+class FakeChatStream:
+    """Async iterator over chat.completion.chunk-shaped objects, paced like a real stream."""
+
+    def __init__(self, pieces: List[str], ttft_seconds: float, tokens_per_second: float,
+                 usage: Optional[SimpleNamespace]):
+        self._pieces = pieces
+        self._ttft_seconds = ttft_seconds
+        self._tokens_per_second = tokens_per_second
+        self._usage = usage
+        self.closed = False
+
+    def __aiter__(self) -> AsyncIterator[Any]:
+        return self._iterate()
+
+    async def _iterate(self) -> AsyncIterator[Any]:
+        await asyncio.sleep(self._ttft_seconds)
+        for index, piece in enumerate(self._pieces):
+            if self.closed:
+                return
+            if index and self._tokens_per_second > 0:
+                await asyncio.sleep(1 / self._tokens_per_second)
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=piece), finish_reason=None)], usage=None)
+        if self._usage is not None:
+            yield SimpleNamespace(choices=[], usage=self._usage)
+
+    async def close(self) -> None:
+        self.closed = True
+
+
+class FakeChatCompletions:
+    def __init__(self, provider: "FakeLLMProvider"):
+        self._provider = provider
+
+    async def create(self, *, model: str, messages: List[Dict[str, Any]], stream: bool = False,
+                     response_format: Optional[Dict[str, Any]] = None, stream_options: Optional[Dict[str, Any]] = None,
+                     **_: Any) -> Any:
+        return await self._provider.complete(model, messages, stream, response_format, stream_options)
+
+
+class FakeLLMClient:
+    """The subset of AsyncOpenAI used by this codebase."""
+
+    def __init__(self, provider: "FakeLLMProvider", max_retries: Optional[int]):
+        self.base_url = httpx.URL(_FAKE_BASE_URL)
+        self.max_retries = 0 if max_retries is None else max_retries
+        self.chat = SimpleNamespace(completions=FakeChatCompletions(provider))
+
+
+class FakeLLMProvider(LLMProvider):
+    """Local provider with simulated latency, injected errors and canned routing."""
+
+    def __init__(
+        self,
+        ttft_seconds: float = FAKE_LLM_TTFT_SECONDS,
+        tokens_per_second: float = FAKE_LLM_TOKENS_PER_SECOND,
+        error_rate: float = FAKE_LLM_ERROR_RATE,
+        rate_limit_rate: float = FAKE_LLM_RATE_LIMIT_RATE,
+        completion_words: int = FAKE_LLM_COMPLETION_WORDS,
+        routes: Optional[List[Tuple[str, str]]] = None,
+        seed: int = FAKE_LLM_SEED,
+    ):
+        self.ttft_seconds = ttft_seconds
+        self.tokens_per_second = tokens_per_second
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.completion_words = completion_words
+        self.routes = parse_routes(FAKE_LLM_ROUTES) if routes is None else routes
+        self._rng = random.Random(seed)
+        self._clients: Dict[Optional[int], FakeLLMClient] = {}
+        self.requests = 0
+        self.streams = 0
+        self.injected_errors = 0
+        self.completion_tokens = 0
+
+    def get_client(self, api_key: str, max_retries: Optional[int] = None) -> FakeLLMClient:
+        client = self._clients.get(max_retries)
+        if client is None:
+            client = self._clients[max_retries] = FakeLLMClient(self, max_retries)
+        return client
+
+    # --- Responses ---
+
+    def _maybe_fail(self) -> None:
+        roll = self._rng.random()
+        if roll < self.rate_limit_rate:
+            status, error_cls = 429, openai.RateLimitError
+        elif roll < self.rate_limit_rate + self.error_rate:
+            status, error_cls = 500, openai.InternalServerError
+        else:
+            return
+        self.injected_errors += 1
+        request = httpx.Request("POST", _FAKE_BASE_URL + "chat/completions")
+        raise error_cls(f"Injected fake LLM error ({status})", response=httpx.Response(status, request=request), body=None)
+
+    def route_decision(self, messages: List[Dict[str, Any]]) -> Dict[str, Any]:
+        query = next((str(m.get("content", "")) for m in reversed(messages) if m.get("role") == "user"), "")
+        lowered = query.lower()
+        for keyword, agent in self.routes:
+            if keyword in lowered:
+                return {"action": "delegate", "agent_name": agent, "query_for_agent": query, "confidence": 0.9}
+        catalog = [name.strip() for m in messages if m.get("role") == "system"
+                   for name in _CATALOG_LINE.findall(str(m.get("content", "")))]
+        for agent in catalog:
+            if agent.lower() in lowered or agent.split("/")[-1].replace("_", " ").lower() in lowered:
+                return {"action": "delegate", "agent_name": agent, "query_for_agent": query, "confidence": 0.8}
+        return {"action": "respond_directly", "response_text": "Hello! How can I help you today?", "confidence": 0.9}
+
+    def answer_text(self, model: str, messages: List[Dict[str, Any]]) -> str:
+        """A deterministic answer: the same prompt always gets the same words."""
+        digest = hashlib.sha256(json.dumps(messages, sort_keys=True, default=str).encode("utf-8")).digest()
+        words = [_FILLER_WORDS[(digest[i % len(digest)] + i) % len(_FILLER_WORDS)] for i in range(self.completion_words)]
+        return f"[{model}] " + " ".join(words).capitalize() + "."
+
+    async def complete(self, model: str, messages: List[Dict[str, Any]], stream: bool,
+                       response_format: Optional[Dict[str, Any]], stream_options: Optional[Dict[str, Any]]) -> Any:
+        self.requests += 1
+        self._maybe_fail()
+        if (response_format or {}).get("type") == "json_object":
+            content = json.dumps(self.route_decision(messages))
+        else:
+            content = self.answer_text(model, messages)
+        # Word-sized pieces (keeping their separators) stand in for tokens
+        pieces = re.findall(r"\S+\s*|\s+", content)
+        usage = _usage(estimate_request_tokens(messages), count_text_tokens(content))
+        self.completion_tokens += usage.completion_tokens
+
+        if stream:
+            self.streams += 1
+            include_usage = bool((stream_options or {}).get("include_usage"))
+            return FakeChatStream(pieces, self.ttft_seconds, self.tokens_per_second, usage if include_usage else None)
+
+        generation_seconds = len(pieces) / self.tokens_per_second if self.tokens_per_second > 0 else 0.0
+        await asyncio.sleep(self.ttft_seconds + generation_seconds)
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(role="assistant", content=content), finish_reason="stop")],
+            usage=usage,
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "provider": "fake",
+            "requests": self.requests,
+            "streams": self.streams,
+            "injected_errors": self.injected_errors,
+            "completion_tokens": self.completion_tokens,
+            "ttft_seconds": self.ttft_seconds,
+            "tokens_per_second": self.tokens_per_second,
+        }
@@ -0,0 +1,263 @@
+"""
+Local fast-path router for orchestration decisions.
+
+Before paying for an LLM round trip in decide_orchestration_action, the query is
+scored against a TF-IDF index built from each available agent's name, description,
+capabilities and context markdown. When the best agent wins clearly (similarity of at
+least ORCHESTRATOR_FAST_ROUTER_MIN_SCORE and a lead over the runner-up of at least
+ORCHESTRATOR_FAST_ROUTER_MIN_MARGIN, as a fraction of the best score) a delegate decision
+is returned without the LLM; every low-margin or unknown-vocabulary query falls through
+to the LLM as before.
+
+The index is a dense NumPy matrix (agents x vocabulary, rows L2-normalized), so routing
+a query is one vectorized dot product. It is rebuilt only when the agent set changes.
+"""
+import hashlib
+import json
+import logging
+import math
+import os
+import re
+import time
+from collections import Counter
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+from apps.api.core.metrics import Histogram
+
+logger = logging.getLogger(__name__)
+
+# Tunables (environment variables)
+ORCHESTRATOR_FAST_ROUTER_ENABLED = os.environ.get("ORCHESTRATOR_FAST_ROUTER_ENABLED", "true").lower() == "true"
+ORCHESTRATOR_FAST_ROUTER_MIN_SCORE = float(os.environ.get("ORCHESTRATOR_FAST_ROUTER_MIN_SCORE", "0.08"))
+# Relative lead over the runner-up: (best - second) / best. Long context documents keep absolute
+# cosine scores low, so the lead is a steadier confidence signal than an absolute gap.
+ORCHESTRATOR_FAST_ROUTER_MIN_MARGIN = float(os.environ.get("ORCHESTRATOR_FAST_ROUTER_MIN_MARGIN", "0.4"))
+# Name/description/capabilities describe *what the agent is for*; they outweigh the long context markdown.
+ORCHESTRATOR_FAST_ROUTER_CARD_WEIGHT = int(os.environ.get("ORCHESTRATOR_FAST_ROUTER_CARD_WEIGHT", "3"))
+
+# Sub-millisecond buckets: routing is a single matrix-vector product
+ROUTE_LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05)
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+_STOPWORDS = frozenset("""
+a about above after again all am an and any are as at be because been before being below between both but by
+can could did do does doing down during each few for from further had has have having he her here hers him his
+how i if in into is it its itself just me more most my no nor not now of off on once only or other our ours out
+over own same she should so some such than that the their theirs them then there these they this those through
+to too under until up very was we were what when where which while who whom why will with would you your yours
+agent agents please tell show give get want need know like let us hi hello hey thanks thank
+""".split())
+
+
+def tokenize(text: str) -> List[str]:
+    """Lower-cased word tokens without stopwords, with a light plural/-ing suffix strip."""
+    tokens = []
+    for token in _TOKEN_RE.findall(text.lower()):
+        if len(token) < 2 or token in _STOPWORDS:
+            continue
+        if len(token) > 4 and token.endswith("ing"):
+            token = token[:-3]
+        elif len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+            token = token[:-1]
+        tokens.append(token)
+    return tokens
+
+
+def _default_context_dirs() -> List[Path]:
+    configured = os.environ.get("ORCHESTRATOR_FAST_ROUTER_CONTEXT_DIR")
+    if configured:
+        return [Path(configured)]
+    here = Path(__file__).resolve()
+    # markdown_context lives next to the API package (apps/api/markdown_context) or at the project root
+    return [here.parents[1] / "markdown_context", here.parents[3] / "markdown_context"]
+
+
+def load_context_markdown(agent: Dict[str, Any], context_dirs: Optional[List[Path]] = None) -> str:
+    """Context markdown for a discovered agent ('<name>_agent.md'), or '' when there is none."""
+    name = agent.get("name") or str(agent.get("path", "")).split("/")[-1]
+    if not name:
+        return ""
+    for directory in context_dirs or _default_context_dirs():
+        for file_name in (f"{name}_agent.md", f"{name}.md"):
+            path = directory / file_name
+            if path.exists():
+                try:
+                    return path.read_text(encoding="utf-8")
+                except OSError as e:
+                    logger.warning(f"Fast router could not read context {path}: {e}")
+                    return ""
+    return ""
+
+
+def agent_set_signature(agents: List[Dict[str, Any]]) -> str:
+    """Stable hash of the routable parts of an agent list (changes when discovery changes)."""
+    material = json.dumps(
+        [
+            {
+                "name": agent.get("name"),
+                "path": agent.get("path"),
+                "description": agent.get("description"),
+                "capabilities": agent.get("capabilities"),
+            }
+            for agent in agents
+        ],
+        sort_keys=True,
+        default=str,
+    )
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+def _capability_text(capabilities: Any) -> str:
+    parts = []
+    for capability in capabilities or []:
+        if isinstance(capability, dict):
+            parts.append(f"{capability.get('name', '')} {capability.get('description', '')}")
+        else:
+            parts.append(str(capability))
+    return " ".join(parts).replace("_", " ")
+
+
+@dataclass
+class FastRouteMatch:
+    agent: Dict[str, Any]
+    score: float
+    margin: float
+
+
+class FastPathRouter:
+    """TF-IDF cosine-similarity router over the available agents (see module docstring)."""
+
+    def __init__(
+        self,
+        min_score: float = ORCHESTRATOR_FAST_ROUTER_MIN_SCORE,
+        min_margin: float = ORCHESTRATOR_FAST_ROUTER_MIN_MARGIN,
+        card_weight: int = ORCHESTRATOR_FAST_ROUTER_CARD_WEIGHT,
+        context_loader: Callable[[Dict[str, Any]], str] = load_context_markdown,
+    ):
+        self.min_score = min_score
+        self.min_margin = min_margin
+        self.card_weight = max(1, card_weight)
+        self.context_loader = context_loader
+        self.signature: Optional[str] = None
+        self._agents: List[Dict[str, Any]] = []
+        self._vocabulary: Dict[str, int] = {}
+        self._idf = np.zeros(0, dtype=np.float32)
+        self._matrix = np.zeros((0, 0), dtype=np.float32)
+        # Metrics
+        self.hits = 0
+        self.misses = 0
+        self.builds = 0
+        self.route_latency = Histogram(ROUTE_LATENCY_BUCKETS)
+        self.build_latency = Histogram(ROUTE_LATENCY_BUCKETS)
+        self.llm_decision_latency = Histogram()  # Decisions that fell through to the LLM
+
+    def _agent_document(self, agent: Dict[str, Any]) -> List[str]:
+        card_text = " ".join([
+            str(agent.get("name", "")).replace("_", " "),
+            str(agent.get("display_name", "")),
+            str(agent.get("path", "")).replace("/", " ").replace("_", " "),
+            str(agent.get("description", "")),
+            _capability_text(agent.get("capabilities")),
+        ])
+        return tokenize(card_text) * self.card_weight + tokenize(self.context_loader(agent))
+
+    def build(self, agents: List[Dict[str, Any]]) -> None:
+        """(Re)builds the TF-IDF matrix for `agents`."""
+        started = time.perf_counter()
+        documents = [Counter(self._agent_document(agent)) for agent in agents]
+        vocabulary: Dict[str, int] = {}
+        for document in documents:
+            for term in document:
+                vocabulary.setdefault(term, len(vocabulary))
+
+        matrix = np.zeros((len(documents), len(vocabulary)), dtype=np.float32)
+        for row, document in enumerate(documents):
+            for term, count in document.items():
+                matrix[row, vocabulary[term]] = 1.0 + math.log(count)  # Sublinear tf
+        document_frequency = np.count_nonzero(matrix, axis=0)
+        idf = (np.log((1.0 + len(documents)) / (1.0 + document_frequency)) + 1.0).astype(np.float32)
+        matrix *= idf
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        matrix /= np.where(norms == 0, 1.0, norms)
+
+        self._agents = list(agents)
+        self._vocabulary = vocabulary
+        self._idf = idf
+        self._matrix = matrix
+        self.signature = agent_set_signature(agents)
+        self.builds += 1
+        self.build_latency.observe(time.perf_counter() - started)
+        logger.info(f"Fast router index built: {len(agents)} agents, {len(vocabulary)} terms.")
+
+    def ensure_index(self, agents: List[Dict[str, Any]]) -> None:
+        if agent_set_signature(agents) != self.signature:
+            self.build(agents)
+
+    def _query_vector(self, query: str) -> Optional[np.ndarray]:
+        counts = Counter(term for term in tokenize(query) if term in self._vocabulary)
+        if not counts:
+            return None
+        vector = np.zeros(len(self._vocabulary), dtype=np.float32)
+        for term, count in counts.items():
+            vector[self._vocabulary[term]] = 1.0 + math.log(count)
+        vector *= self._idf
+        return vector / np.linalg.norm(vector)
+
+    def score(self, query: str) -> np.ndarray:
+        """Cosine similarity of `query` to every indexed agent."""
+        vector = self._query_vector(query) if self._agents else None
+        if vector is None:
+            return np.zeros(len(self._agents), dtype=np.float32)
+        return self._matrix @ vector
+
+    def route(self, query: str, agents: Optional[List[Dict[str, Any]]] = None) -> Optional[FastRouteMatch]:
+        """
+        Returns the confidently matching agent, or None when the LLM should decide.
+        Passing `agents` (re)builds the index if the agent set changed.
+        """
+        if agents is not None:
+            self.ensure_index(agents)
+        started = time.perf_counter()
+        match = None
+        scores = self.score(query)
+        if len(scores):
+            best = int(np.argmax(scores))
+            best_score = float(scores[best])
+            runner_up = float(np.partition(scores, -2)[-2]) if len(scores) > 1 else 0.0
+            margin = (best_score - runner_up) / best_score if best_score > 0 else 0.0
+            if best_score >= self.min_score and margin >= self.min_margin:
+                match = FastRouteMatch(agent=self._agents[best], score=best_score, margin=margin)
+        self.route_latency.observe(time.perf_counter() - started)
+        if match:
+            self.hits += 1
+        else:
+            self.misses += 1
+        return match
+
+    def record_llm_decision(self, seconds: float) -> None:
+        self.llm_decision_latency.observe(seconds)
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        llm_avg = self.llm_decision_latency.sum / self.llm_decision_latency.count if self.llm_decision_latency.count else 0.0
+        return {
+            "enabled": ORCHESTRATOR_FAST_ROUTER_ENABLED,
+            "agents_indexed": len(self._agents),
+            "vocabulary_size": len(self._vocabulary),
+            "builds": self.builds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            "route_latency_seconds": self.route_latency.snapshot(),
+            "llm_decision_latency_seconds": self.llm_decision_latency.snapshot(),
+            # LLM round trips avoided, valued at the observed average LLM decision latency
+            "estimated_latency_saved_seconds": round(self.hits * llm_avg, 3),
+        }
+
+
+# Shared router used by OpenAIService.decide_orchestration_action
+fast_path_router = FastPathRouter()
@@ -0,0 +1,71 @@
+"""
+Incremental parser for the top-level string fields of a streamed JSON object.
+
+JSON-mode completions arrive as arbitrary text fragments. feed() consumes each fragment
+and reports the top-level string fields ("action", "agent_name", ...) whose values
+became complete in it, so a caller can act on early fields while the rest of the
+object is still being generated. Nested objects/arrays and non-string values are
+skipped; the full document should still be validated with json.loads() at the end.
+"""
+import json
+from typing import Dict, Optional
+
+
+class IncrementalJSONObjectParser:
+    """Character-level state machine over a single JSON object (see module docstring)."""
+
+    def __init__(self):
+        self.fields: Dict[str, str] = {}
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+        self._raw: list = []
+        self._expecting_key = False
+        self._current_key: Optional[str] = None
+
+    def feed(self, fragment: str) -> Dict[str, str]:
+        """Consumes `fragment` and returns the top-level string fields completed by it."""
+        completed: Dict[str, str] = {}
+        for char in fragment:
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                    self._raw.append(char)
+                elif char == "\\":
+                    self._escaped = True
+                    self._raw.append(char)
+                elif char == '"':
+                    self._in_string = False
+                    self._end_string(completed)
+                else:
+                    self._raw.append(char)
+                continue
+
+            if char == '"':
+                self._in_string = True
+                self._raw = []
+            elif char in "{[":
+                self._depth += 1
+                if self._depth == 1 and char == "{":
+                    self._expecting_key = True
+            elif char in "}]":
+                self._depth -= 1
+            elif self._depth == 1 and char == ",":
+                self._expecting_key = True
+                self._current_key = None
+        return completed
+
+    def _end_string(self, completed: Dict[str, str]) -> None:
+        if self._depth != 1:
+            return  # Strings inside nested values are not tracked
+        try:
+            value = json.loads('"' + "".join(self._raw) + '"')
+        except json.JSONDecodeError:
+            value = "".join(self._raw)
+        if self._expecting_key:
+            self._current_key = value
+            self._expecting_key = False
+        elif self._current_key is not None:
+            self.fields[self._current_key] = value
+            completed[self._current_key] = value
+            self._current_key = None
@@ -0,0 +1,166 @@
+"""
+Model cascade: answer with a small, fast model first and escalate to a larger one
+only when the cheap answer does not look good enough.
+
+A CascadePolicy is an ordered list of models. Every stage but the last is scored:
+
+- routing decisions: valid JSON, a known action, delegate/fan-out/plan targets that exist, and
+  the model's self-reported "confidence" at or above the policy's minimum;
+- free-text answers: a minimum length and no hedging ("I'm not sure", ...).
+
+The first accepted answer wins; the last model's answer is always used. The
+orchestrator's policy comes from ORCHESTRATOR_MODEL_CASCADE, MCP agents opt in via
+their context front-matter (`<!-- model_cascade: gpt-4o-mini,gpt-4o -->`).
+"""
+import json
+import logging
+import os
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+from apps.api.core.metrics import Histogram
+
+logger = logging.getLogger(__name__)
+
+# Tunables (environment variables). A single model disables the cascade.
+LLM_CASCADE_ENABLED = os.environ.get("LLM_CASCADE_ENABLED", "true").lower() == "true"
+ORCHESTRATOR_MODEL_CASCADE = os.environ.get("ORCHESTRATOR_MODEL_CASCADE", "gpt-3.5-turbo-0125,gpt-4o")
+LLM_CASCADE_MIN_CONFIDENCE = float(os.environ.get("LLM_CASCADE_MIN_CONFIDENCE", "0.6"))
+LLM_CASCADE_MIN_LENGTH = int(os.environ.get("LLM_CASCADE_MIN_LENGTH", "20"))  # characters, free-text answers
+
+ORCHESTRATION_ACTIONS = ("delegate", "respond_directly", "clarify", "cannot_handle", "fan_out", "plan")
+
+HEDGING_PHRASES = (
+    "i'm not sure", "i am not sure", "i don't know", "i do not know", "i'm unable to", "i am unable to",
+    "i cannot answer", "i can't answer", "not enough information",
+)
+
+CASCADE_LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+@dataclass
+class CascadeVerdict:
+    accepted: bool
+    reason: str  # "ok" or why the answer was escalated
+
+
+def parse_model_list(value: Optional[str]) -> List[str]:
+    return [model.strip() for model in (value or "").split(",") if model.strip()]
+
+
+def score_routing_decision(content: Optional[str], available_agents: List[Dict[str, Any]],
+                           min_confidence: float = LLM_CASCADE_MIN_CONFIDENCE) -> CascadeVerdict:
+    """Scores a JSON-mode orchestration decision."""
+    if not content:
+        return CascadeVerdict(False, "empty")
+    try:
+        decision = json.loads(content)
+    except json.JSONDecodeError:
+        return CascadeVerdict(False, "invalid_json")
+    if not isinstance(decision, dict) or decision.get("action") not in ORCHESTRATION_ACTIONS:
+        return CascadeVerdict(False, "invalid_action")
+    if decision["action"] == "cannot_handle":
+        return CascadeVerdict(False, "cannot_handle")  # A larger model may know better
+    known = {str(agent.get(field)) for agent in available_agents for field in ("name", "path") if agent.get(field)}
+
+    def is_known(target: Any) -> bool:
+        return bool(target) and (not known or str(target) in known or str(target).split("/")[-1] in known)
+
+    if decision["action"] == "delegate" and not is_known(decision.get("agent_name")):
+        return CascadeVerdict(False, "unknown_agent")
+    if decision["action"] == "fan_out":
+        delegations = decision.get("delegations")
+        if not isinstance(delegations, list) or not delegations:
+            return CascadeVerdict(False, "invalid_action")
+        if not all(isinstance(item, dict) and is_known(item.get("agent_name")) for item in delegations):
+            return CascadeVerdict(False, "unknown_agent")
+    if decision["action"] == "plan":
+        steps = decision.get("steps")
+        if not isinstance(steps, list) or not steps:
+            return CascadeVerdict(False, "invalid_action")
+        if not all(isinstance(step, dict) and is_known(step.get("agent_name")) for step in steps):
+            return CascadeVerdict(False, "unknown_agent")
+    confidence = decision.get("confidence")
+    if isinstance(confidence, (int, float)) and not isinstance(confidence, bool) and confidence < min_confidence:
+        return CascadeVerdict(False, "low_confidence")
+    return CascadeVerdict(True, "ok")
+
+
+def score_text_answer(content: Optional[str], min_length: int = LLM_CASCADE_MIN_LENGTH) -> CascadeVerdict:
+    """Scores a free-text agent answer."""
+    text = (content or "").strip()
+    if not text:
+        return CascadeVerdict(False, "empty")
+    if len(text) < min_length:
+        return CascadeVerdict(False, "too_short")
+    lowered = text.lower().replace("’", "'")
+    if any(phrase in lowered for phrase in HEDGING_PHRASES):
+        return CascadeVerdict(False, "hedged")
+    return CascadeVerdict(True, "ok")
+
+
+class CascadePolicy:
+    """Ordered models to try, cheapest first, and the thresholds used to accept an answer."""
+
+    def __init__(self, models: List[str], min_confidence: float = LLM_CASCADE_MIN_CONFIDENCE,
+                 min_length: int = LLM_CASCADE_MIN_LENGTH):
+        if not models:
+            raise ValueError("A cascade policy needs at least one model.")
+        self.models = list(models)
+        self.min_confidence = min_confidence
+        self.min_length = min_length
+
+    @property
+    def enabled(self) -> bool:
+        return LLM_CASCADE_ENABLED and len(self.models) > 1
+
+    @property
+    def stages(self) -> List[str]:
+        """Models actually tried: all of them, or only the final one when cascading is off."""
+        return self.models if self.enabled else self.models[-1:]
+
+    @classmethod
+    def from_context_metadata(cls, metadata: Dict[str, Any]) -> Optional["CascadePolicy"]:
+        """Policy for an MCP agent whose context declares `model_cascade`, else None."""
+        models = metadata.get("model_cascade")
+        if not models:
+            return None
+        return cls(models, min_length=metadata.get("cascade_min_length", LLM_CASCADE_MIN_LENGTH))
+
+
+class CascadeStats:
+    """Per-policy counters: which model answered, why answers were escalated, stage latency."""
+
+    def __init__(self):
+        self._policies: Dict[str, Dict[str, Any]] = {}
+
+    def _entry(self, name: str) -> Dict[str, Any]:
+        return self._policies.setdefault(name, {"requests": 0, "answered_by": {}, "escalations": {}, "stage_latency": {}})
+
+    def record_stage(self, name: str, model: str, verdict: CascadeVerdict, seconds: float) -> None:
+        entry = self._entry(name)
+        latency = entry["stage_latency"].setdefault(model, Histogram(CASCADE_LATENCY_BUCKETS))
+        latency.observe(seconds)
+        if not verdict.accepted:
+            entry["escalations"][verdict.reason] = entry["escalations"].get(verdict.reason, 0) + 1
+
+    def record_answer(self, name: str, model: str) -> None:
+        entry = self._entry(name)
+        entry["requests"] += 1
+        entry["answered_by"][model] = entry["answered_by"].get(model, 0) + 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            name: {
+                "requests": entry["requests"],
+                "answered_by": dict(entry["answered_by"]),
+                "escalations": dict(entry["escalations"]),
+                "stage_latency_seconds": {model: hist.snapshot() for model, hist in entry["stage_latency"].items()},
+            }
+            for name, entry in self._policies.items()
+        }
+
+
+# Shared instances used by OpenAIService and llm_mcp
+orchestrator_cascade_policy = CascadePolicy(parse_model_list(ORCHESTRATOR_MODEL_CASCADE) or ["gpt-3.5-turbo-0125"])
+cascade_stats = CascadeStats()
@@ -1,12 +1,89 @@
 import openai
-from typing import Optional, List, Dict, Any
+import asyncio
+import time
+import os
+from typing import Optional, List, Dict, Any, Callable
 import logging
 
+from apps.api.llm.resilience import (
+    RateLimiter, CircuitBreaker, CircuitOpenError, RetryCounter,
+    openai_rate_limiter, openai_circuit_breaker, openai_retry_counter,
+    estimate_request_tokens, retry_after_from_exception, backoff_delay, OPENAI_MAX_RETRIES
+)
+from apps.api.llm.single_flight import (
+    SingleFlight, chat_completion_single_flight, build_request_key, LLM_SINGLE_FLIGHT_ENABLED
+)
+from apps.api.llm.fast_router import FastPathRouter, fast_path_router, ORCHESTRATOR_FAST_ROUTER_ENABLED
+from apps.api.llm.incremental_json import IncrementalJSONObjectParser
+from apps.api.llm.token_accounting import TokenLedger, LLMBudgetExceededError, token_ledger as shared_token_ledger
+from apps.api.core.deadlines import DeadlineExceededError, check_deadline, fits, run_with_deadline, deadline_stats
+from apps.api.llm.orchestrator_prompt import (
+    OrchestratorPromptCompiler, orchestrator_prompt_compiler, provider_prefix_usage
+)
+from apps.api.llm.decision_cache import (
+    OrchestrationDecisionCache, decision_cache as shared_decision_cache, build_decision_key,
+    is_cacheable_history, ORCHESTRATION_DECISION_CACHE_ENABLED
+)
+from apps.api.llm.client_factory import LLMProvider, llm_client_factory
+from apps.api.llm.model_cascade import (
+    CascadePolicy, CascadeStats, orchestrator_cascade_policy, cascade_stats as shared_cascade_stats,
+    score_routing_decision, ORCHESTRATION_ACTIONS
+)
+
+# Transient provider errors worth retrying (and counted by the circuit breaker).
+# APITimeoutError is a subclass of APIConnectionError.
+RETRYABLE_OPENAI_ERRORS = (openai.APIConnectionError, openai.RateLimitError, openai.InternalServerError)
+
+# Stream orchestration decisions when the caller can act on an early delegate target
+ORCHESTRATOR_STREAM_DECISIONS = os.environ.get("ORCHESTRATOR_STREAM_DECISIONS", "true").lower() == "true"
+# Completion budget for orchestration decisions; fan_out and plan JSON need far more than a delegate
+ORCHESTRATOR_DECISION_MAX_TOKENS = int(os.environ.get("ORCHESTRATOR_DECISION_MAX_TOKENS", "500"))
+# Model that merges the answers of a fan-out into one reply
+ORCHESTRATOR_SYNTHESIS_MODEL = os.environ.get("ORCHESTRATOR_SYNTHESIS_MODEL", "gpt-3.5-turbo-0125")
+
 class OpenAIService:
-    def __init__(self, api_key: Optional[str]):
+    def __init__(
+        self,
+        api_key: Optional[str],
+        rate_limiter: Optional[RateLimiter] = None,
+        circuit_breaker: Optional[CircuitBreaker] = None,
+        retry_counter: Optional[RetryCounter] = None,
+        max_retries: int = OPENAI_MAX_RETRIES,
+        single_flight: Optional[SingleFlight] = None,
+        fast_router: Optional[FastPathRouter] = None,
+        decision_cache: Optional[OrchestrationDecisionCache] = None,
+        prompt_compiler: Optional[OrchestratorPromptCompiler] = None,
+        token_ledger: Optional[TokenLedger] = None,
+        cascade_policy: Optional[CascadePolicy] = None,
+        cascade_stats: Optional[CascadeStats] = None,
+        client_factory: Optional[LLMProvider] = None
+    ):
         if not api_key:
             raise ValueError("OpenAI API key is required to use OpenAIService.")
-        self.client = openai.AsyncOpenAI(api_key=api_key)
+        # Retries are handled by get_chat_completion (jittered, Retry-After aware, breaker-gated),
+        # so the SDK's own retry loop is disabled to avoid retrying twice. The client shares the
+        # process-wide warmed connection pool.
+        self.client = (client_factory or llm_client_factory).get_client(api_key, max_retries=0)
+        # Shared process-wide pacing/breaker state unless explicitly injected
+        self.rate_limiter = rate_limiter or openai_rate_limiter
+        self.circuit_breaker = circuit_breaker or openai_circuit_breaker
+        self.retry_counter = retry_counter or openai_retry_counter
+        self.max_retries = max_retries
+        # Opt-in coalescing of identical concurrent requests (LLM_SINGLE_FLIGHT_ENABLED or explicit injection)
+        self.single_flight = single_flight or (chat_completion_single_flight if LLM_SINGLE_FLIGHT_ENABLED else None)
+        # Local TF-IDF router that answers clear-cut delegations without an LLM call
+        self.fast_router = fast_router or (fast_path_router if ORCHESTRATOR_FAST_ROUTER_ENABLED else None)
+        # Repeat conversation openers reuse an earlier decision
+        if decision_cache is None and ORCHESTRATION_DECISION_CACHE_ENABLED:
+            decision_cache = shared_decision_cache
+        self.decision_cache = decision_cache
+        # Orchestration system prompt compiled once per agent-set version
+        self.prompt_compiler = prompt_compiler or orchestrator_prompt_compiler
+        # Per user/session/agent token accounting and budgets
+        self.token_ledger = token_ledger or shared_token_ledger
+        # Orchestration decisions try the cheap model first and escalate when it is unsure
+        self.cascade_policy = cascade_policy or orchestrator_cascade_policy
+        self.cascade_stats = cascade_stats or shared_cascade_stats
         self.logger = logging.getLogger(__name__)
         self.logger.info("OpenAIService initialized.")
 
@@ -19,42 +96,229 @@ class OpenAIService:
         response_format: Optional[Dict[str, str]] = None # Added response_format
         # Add other parameters like functions/tools if needed later
     ) -> Optional[str]:
-        """Gets a chat completion from OpenAI."""
+        """
+        Gets a chat completion from OpenAI.
+        Requests are paced by the RPM/TPM rate limiter, transient errors are retried with
+        jittered backoff (honoring Retry-After), and calls fail fast while the circuit breaker is open.
+        Returns None if no completion could be obtained.
+        Identical concurrent requests share one upstream call when single-flight is enabled.
+        """
+        if self.single_flight is not None:
+            key = build_request_key(model, messages, temperature, max_tokens, response_format)
+            return await self.single_flight.do(
+                key,
+                lambda: self._request_chat_completion(messages, model, temperature, max_tokens, response_format)
+            )
+        return await self._request_chat_completion(messages, model, temperature, max_tokens, response_format)
+
+    async def _request_chat_completion(
+        self,
+        messages: List[Dict[str, str]],
+        model: str,
+        temperature: float,
+        max_tokens: int,
+        response_format: Optional[Dict[str, str]]
+    ) -> Optional[str]:
+        """One paced, retried, breaker-gated chat completion call (see get_chat_completion)."""
         try:
-            self.logger.debug(f"Sending request to OpenAI: model={model}, messages={messages}, response_format={response_format}")
-            completion_params = {
-                "model": model,
-                "messages": messages, # type: ignore
-                "temperature": temperature,
-                "max_tokens": max_tokens,
-            }
-            if response_format:
-                completion_params["response_format"] = response_format
-            
-            response = await self.client.chat.completions.create(**completion_params)
-            self.logger.debug(f"Received response from OpenAI: {response}")
-            
-            if response.choices and response.choices[0].message and response.choices[0].message.content:
-                return response.choices[0].message.content.strip()
+            model = self.token_ledger.enforce_budget(model)
+        except LLMBudgetExceededError as e:
+            self.logger.warning(f"OpenAI call not attempted: {e}")
             return None
-        except openai.APIConnectionError as e:
-            self.logger.error(f"OpenAI APIConnectionError: {e}")
-            # Handle connection error, maybe retry or raise a specific exception
-        except openai.RateLimitError as e:
-            self.logger.error(f"OpenAI RateLimitError: {e}")
-            # Handle rate limit error
+        completion_params = {
+            "model": model,
+            "messages": messages, # type: ignore
+            "temperature": temperature,
+            "max_tokens": max_tokens,
+        }
+        if response_format:
+            completion_params["response_format"] = response_format
+        estimated_tokens = estimate_request_tokens(messages, max_tokens)
+
+        for attempt in range(self.max_retries + 1):
+            try:
+                self.circuit_breaker.before_call()
+            except CircuitOpenError as e:
+                self.logger.error(f"OpenAI call not attempted: {e}")
+                return None
+
+            await self.rate_limiter.acquire(estimated_tokens)
+            try:
+                self.logger.debug(f"Sending request to OpenAI: model={model}, messages={messages}, response_format={response_format}")
+                started = time.perf_counter()
+                response = await run_with_deadline(self.client.chat.completions.create(**completion_params),
+                                                   "the OpenAI call", layer="llm")
+                self.logger.debug(f"Received response from OpenAI: {response}")
+                self.circuit_breaker.record_success()
+                usage = getattr(response, "usage", None)
+                self.rate_limiter.reconcile(estimated_tokens, getattr(usage, "total_tokens", None))
+                provider_prefix_usage.record(usage)
+                
+                content = None
+                if response.choices and response.choices[0].message and response.choices[0].message.content:
+                    content = response.choices[0].message.content.strip()
+                self.token_ledger.record_usage(model, usage, messages, content, time.perf_counter() - started)
+                return content
+            except DeadlineExceededError as e:
+                # The request ran out of time: neither the provider's fault nor worth a retry
+                self.logger.warning(f"OpenAI call abandoned: {e}")
+                return None
+            except RETRYABLE_OPENAI_ERRORS as e:
+                self.circuit_breaker.record_failure()
+                error_name = type(e).__name__
+                if attempt >= self.max_retries:
+                    self.retry_counter.exhausted += 1
+                    self.logger.error(f"OpenAI {error_name} after {attempt + 1} attempt(s): {e}")
+                    return None
+                delay = backoff_delay(attempt, retry_after_from_exception(e))
+                if not fits(delay):
+                    deadline_stats.retries_skipped += 1
+                    self.logger.error(f"OpenAI {error_name}: {e}. Not retrying: the {delay:.2f}s backoff outlasts the request's deadline.")
+                    return None
+                self.retry_counter.record_retry(error_name)
+                self.logger.warning(f"OpenAI {error_name}: {e}. Retrying in {delay:.2f}s (attempt {attempt + 1}/{self.max_retries}).")
+                await asyncio.sleep(delay)
+            except openai.APIStatusError as e:
+                # Non-transient (4xx) error: the provider is healthy, the request is not retryable.
+                self.circuit_breaker.record_success()
+                self.logger.error(f"OpenAI APIStatusError: status_code={e.status_code}, response={e.response}")
+                return None
+            except Exception as e:
+                self.circuit_breaker.record_failure()
+                self.logger.error(f"An unexpected error occurred with OpenAI service: {e}", exc_info=True)
+                return None
+        return None
+
+    async def _stream_decision_completion(
+        self,
+        messages: List[Dict[str, str]],
+        model: str,
+        temperature: float,
+        max_tokens: int,
+        on_delegate_target: Callable[[str], None]
+    ) -> Optional[str]:
+        """
+        Streams a JSON-mode decision and calls `on_delegate_target(agent_name)` as soon as the
+        partial JSON has settled on action "delegate" and its agent_name. Returns the full text.
+        Paced and breaker-gated like get_chat_completion, but not retried: a retry after the
+        callback fired could contradict the delegation already started.
+        """
+        try:
+            model = self.token_ledger.enforce_budget(model)
+            check_deadline("the streamed OpenAI decision", layer="llm")
+            self.circuit_breaker.before_call()
+        except (LLMBudgetExceededError, DeadlineExceededError, CircuitOpenError) as e:
+            self.logger.error(f"OpenAI call not attempted: {e}")
+            return None
+        estimated_tokens = estimate_request_tokens(messages, max_tokens)
+        await self.rate_limiter.acquire(estimated_tokens)
+
+        parser = IncrementalJSONObjectParser()
+        content_parts: List[str] = []
+        delegate_announced = False
+        actual_tokens = None
+        stream_usage = None
+        stream = None
+        started = time.perf_counter()
+        try:
+            stream = await self.client.chat.completions.create(
+                model=model,
+                messages=messages, # type: ignore
+                temperature=temperature,
+                max_tokens=max_tokens,
+                response_format={"type": "json_object"},
+                stream=True,
+                stream_options={"include_usage": True}
+            )
+            async for chunk in stream:
+                usage = getattr(chunk, "usage", None)
+                if usage is not None:
+                    stream_usage = usage
+                    actual_tokens = getattr(usage, "total_tokens", None)
+                    provider_prefix_usage.record(usage)
+                if not chunk.choices:
+                    continue
+                fragment = chunk.choices[0].delta.content
+                if not fragment:
+                    continue
+                content_parts.append(fragment)
+                parser.feed(fragment)
+                if (not delegate_announced and parser.fields.get("action") == "delegate"
+                        and parser.fields.get("agent_name")):
+                    delegate_announced = True
+                    self.logger.info(f"Decision stream settled on delegate -> {parser.fields['agent_name']}; starting delegation early.")
+                    on_delegate_target(parser.fields["agent_name"])
+            self.circuit_breaker.record_success()
+            self.rate_limiter.reconcile(estimated_tokens, actual_tokens)
+            self.token_ledger.record_usage(model, stream_usage, messages, "".join(content_parts), time.perf_counter() - started)
         except openai.APIStatusError as e:
-            self.logger.error(f"OpenAI APIStatusError: status_code={e.status_code}, response={e.response}")
-            # Handle other API errors
+            if isinstance(e, RETRYABLE_OPENAI_ERRORS):
+                self.circuit_breaker.record_failure()
+            else:
+                self.circuit_breaker.record_success()
+            self.logger.error(f"OpenAI APIStatusError while streaming decision: status_code={e.status_code}")
+            return None
         except Exception as e:
-            self.logger.error(f"An unexpected error occurred with OpenAI service: {e}", exc_info=True)
-        return None
+            self.circuit_breaker.record_failure()
+            self.logger.error(f"Error streaming orchestration decision: {e}", exc_info=True)
+            return None
+        finally:
+            if stream is not None:
+                await stream.close()
+        return "".join(content_parts).strip() or None
+
+    async def _cascade_decision(
+        self,
+        messages: List[Dict[str, str]],
+        available_agents: List[Dict[str, str]],
+        on_delegate_target: Optional[Callable[[str], None]] = None
+    ) -> Optional[str]:
+        """
+        Runs the orchestration decision through the cascade policy's models, cheapest first,
+        and returns the first acceptable response (the last model's response otherwise).
+        Only the first stage is streamed to `on_delegate_target`: a later stage that picks
+        a different agent is reconciled by the caller, which cancels the early delegation.
+        """
+        stages = self.cascade_policy.stages
+        usable_response: Optional[str] = None
+        for index, model in enumerate(stages):
+            stage_started = time.perf_counter()
+            if index == 0 and on_delegate_target is not None and ORCHESTRATOR_STREAM_DECISIONS:
+                response = await self._stream_decision_completion(
+                    messages=messages,
+                    model=model,
+                    temperature=0.2,
+                    max_tokens=ORCHESTRATOR_DECISION_MAX_TOKENS,
+                    on_delegate_target=on_delegate_target
+                )
+            else:
+                response = await self.get_chat_completion(
+                    messages=messages,
+                    model=model, # Must support JSON mode
+                    temperature=0.2, # Low temperature for more deterministic decisions
+                    max_tokens=ORCHESTRATOR_DECISION_MAX_TOKENS,
+                    response_format={"type": "json_object"}
+                )
+            if index == len(stages) - 1:
+                self.cascade_stats.record_answer("orchestrator", model)
+                # A failed final stage falls back to an earlier well-formed (if unsure) decision
+                return response or usable_response
+            verdict = score_routing_decision(response, available_agents, self.cascade_policy.min_confidence)
+            self.cascade_stats.record_stage("orchestrator", model, verdict, time.perf_counter() - stage_started)
+            if verdict.accepted:
+                self.cascade_stats.record_answer("orchestrator", model)
+                return response
+            if verdict.reason not in ("empty", "invalid_json", "invalid_action"):
+                usable_response = usable_response or response
+            self.logger.info(f"Escalating orchestration decision from {model} ({verdict.reason}).")
+        return usable_response
 
     async def decide_orchestration_action(
         self, 
         user_query: str, 
         available_agents: List[Dict[str, str]], # e.g., [{"name": "metrics", "description": "Handles business metrics"}]
-        history: Optional[List[Dict[str, str]]] = None # Added history parameter
+        history: Optional[List[Dict[str, str]]] = None, # Added history parameter
+        on_delegate_target: Optional[Callable[[str], None]] = None
     ) -> Dict[str, Any]:
         """
         Uses OpenAI to decide the next action based on user query, chat history, and available agents.
@@ -63,73 +327,49 @@ class OpenAIService:
         {"action": "respond_directly", "response_text": "Some direct answer"}
         {"action": "clarify", "clarification_question": "Could you specify X?"}
         {"action": "cannot_handle"}
+        Fresh conversations whose query clearly matches one agent are routed by the local
+        fast-path router without an LLM call (the decision then carries "routed_by": "fast_path").
+        Decisions for fresh or summarized conversations are cached ("routed_by": "decision_cache" on a hit).
+        When `on_delegate_target` is given, the LLM decision is streamed and the callback receives the
+        agent_name as soon as a delegation is certain, before the rest of the JSON is generated.
+        LLM decisions go through the model cascade: the cheap model's decision is kept unless it
+        is malformed, names an unknown agent or reports low confidence.
         """
-        
-        prompt_lines = []
-        prompt_lines.append("You are an expert orchestrator AI. Your goal is to understand a user query "
-                            "and decide the best course of action. You have access to the following agents/capabilities:")
-        
-        # Check if we have a chat support or customer support agent in the available agents
-        has_chat_support = False
-        for agent_info in available_agents:
-            prompt_lines.append(f"- Agent Name: {agent_info['name']}, Description: {agent_info['description']}")
-            if "chat_support" in agent_info['name'] or "customer_support" in agent_info['name'] or "support" in agent_info['name']:
-                has_chat_support = True
-        
-        # Add special instructions for chat support requests
-        if has_chat_support:
-            prompt_lines.append("\nIMPORTANT: If the user is asking to talk to customer support, chat with support, or asking for help with a product/service issue, " 
-                              "ALWAYS delegate to the customer/chat_support agent. This includes any variation of 'speak to support', 'talk to a person', " 
-                              "'customer service', 'need help with my account', etc.")
-        
-        prompt_lines.append("\nBased on the user's query, you must decide on ONE of the following actions:")
-        prompt_lines.append("1. 'delegate': If the query clearly matches an agent's capability. If so, specify the 'agent_name' and formulate a concise 'query_for_agent' based on the user's original query.")
-        prompt_lines.append("2. 'respond_directly': If the query is a direct question, a simple statement, or a follow-up that you can answer using the provided chat history and your general knowledge, without needing to delegate to another agent. Provide the 'response_text'. Make sure to use information from the chat history if relevant to the user's query.")
-        prompt_lines.append("3. 'clarify': If the query is ambiguous or needs more information to decide on an action. Provide a 'clarification_question'.")
-        prompt_lines.append("4. 'cannot_handle': If the query is outside the scope of your capabilities and known agents.")
-        
-        prompt_lines.append("\nRespond ONLY with a JSON object with the fields 'action' (string, one of ['delegate', 'respond_directly', 'clarify', 'cannot_handle']), "
-                            "and then conditionally: 'agent_name' (string), 'query_for_agent' (string), 'response_text' (string), or 'clarification_question' (string).")
-        
-        # Correctly escaped JSON examples
-        prompt_lines.append('Example for delegation: {"action": "delegate", "agent_name": "metrics", "query_for_agent": "What are the current sales figures?"}')
-        prompt_lines.append('Example for direct response: {"action": "respond_directly", "response_text": "Hello! How can I assist you today?"}')
-        prompt_lines.append('Example for clarification: {"action": "clarify", "clarification_question": "Which specific metrics are you interested in?"}')
-        prompt_lines.append('Example for cannot handle: {"action": "cannot_handle"}')
-
-        system_prompt = "\n".join(prompt_lines)
-
-        messages = []
-        # Prepend history if available
-        if history:
-            messages.extend(history)
-        
-        # Add system prompt (should ideally be first if not in history, or OpenAI handles system role placement)
-        # For now, let's place it before the latest user query if history exists, or as the first message.
-        # Standard practice is often System -> History -> Latest User Query
-        
-        # Re-evaluate message construction order for clarity and OpenAI best practices
-        final_messages_for_llm = []
-        final_messages_for_llm.append({"role": "system", "content": system_prompt})
-        if history:
-            final_messages_for_llm.extend(history)
-        final_messages_for_llm.append({"role": "user", "content": user_query})
-
-
-        self.logger.info(f"Orchestration decision for query '{user_query}'. System prompt: {system_prompt}. History length: {len(history) if history else 0}")
+        if self.fast_router is not None and not history and available_agents:
+            match = self.fast_router.route(user_query, available_agents)
+            if match:
+                self.logger.info(
+                    f"Fast-path routed query '{user_query[:100]}' to {match.agent.get('path') or match.agent.get('name')} "
+                    f"(score={match.score:.3f}, margin={match.margin:.2f})."
+                )
+                return {
+                    "action": "delegate",
+                    "agent_name": match.agent.get("name"),
+                    "agent_path": match.agent.get("path"),
+                    "query_for_agent": user_query,
+                    "routed_by": "fast_path",
+                }
+
+        cache_key = None
+        if self.decision_cache is not None and is_cacheable_history(history):
+            cache_key = build_decision_key(user_query, available_agents, history)
+            cached_decision = self.decision_cache.get(cache_key)
+            if cached_decision is not None:
+                self.logger.info(f"Orchestration decision cache hit for query '{user_query[:100]}'.")
+                cached_decision["routed_by"] = "decision_cache"
+                return cached_decision
+
+        # Byte-stable layout for provider prefix caching: static instructions, agent catalog, history, query
+        final_messages_for_llm = self.prompt_compiler.build_messages(user_query, available_agents, history)
+
+        self.logger.info(f"Orchestration decision for query '{user_query}'. Agents: {len(available_agents)}. History length: {len(history) if history else 0}")
         self.logger.debug(f"Final messages for LLM: {final_messages_for_llm}")
 
+        decision_started = time.perf_counter()
         try:
-            # For critical decision making, a more capable model might be better, e.g., gpt-4
-            # Using gpt-3.5-turbo for now for speed/cost.
-            llm_response_str = await self.get_chat_completion(
-                messages=final_messages_for_llm, # Use the messages list with history
-                model="gpt-3.5-turbo-0125", # Ensure model supports JSON mode if directly asking for JSON
-                temperature=0.2, # Low temperature for more deterministic decisions
-                max_tokens=150,
-                response_format={"type": "json_object"} 
-                # We could also use OpenAI's function calling/tool use feature here for more robust JSON output.
-            )
+            llm_response_str = await self._cascade_decision(final_messages_for_llm, available_agents, on_delegate_target)
+            if self.fast_router is not None:
+                self.fast_router.record_llm_decision(time.perf_counter() - decision_started)
 
             if not llm_response_str:
                 self.logger.error("LLM did not return a response for orchestration decision.")
@@ -142,9 +382,11 @@ class OpenAIService:
             try:
                 decision = json.loads(llm_response_str)
                 # Basic validation of the decision structure
-                if "action" not in decision or decision["action"] not in ["delegate", "respond_directly", "clarify", "cannot_handle"]:
+                if "action" not in decision or decision["action"] not in ORCHESTRATION_ACTIONS:
                     self.logger.error(f"LLM decision JSON is malformed or action is invalid: {decision}")
                     return {"action": "cannot_handle", "reason": "LLM returned malformed decision."}
+                if cache_key is not None:
+                    self.decision_cache.set(cache_key, decision)
                 return decision
             except json.JSONDecodeError:
                 self.logger.error(f"Failed to decode LLM decision string as JSON: {llm_response_str}")
@@ -155,4 +397,26 @@ class OpenAIService:
 
         except Exception as e:
             self.logger.error(f"Error during LLM orchestration decision: {e}", exc_info=True)
-            return {"action": "cannot_handle", "reason": f"Internal error during LLM decision: {e}"} 
\ No newline at end of file
+            return {"action": "cannot_handle", "reason": f"Internal error during LLM decision: {e}"} 
+
+    async def synthesize_responses(self, user_query: str, branch_results: List[Dict[str, Any]]) -> Optional[str]:
+        """
+        Merges the answers several agents gave to parts of `user_query` into one reply.
+        `branch_results` items carry "agent", "query", "status" and "answer"; branches that
+        timed out or failed are mentioned as missing. Returns None if the LLM call fails.
+        """
+        import json
+        messages = [
+            {"role": "system", "content": (
+                "You combine answers from specialized agents into a single reply to the user's request. "
+                "Use only the information in the agent answers, keep each agent's key facts, remove repetition, "
+                "and briefly say which parts could not be answered when an agent's status is not 'ok'."
+            )},
+            {"role": "user", "content": f"User request: {user_query}\n\nAgent answers (JSON):\n{json.dumps(branch_results, indent=2)}"},
+        ]
+        return await self.get_chat_completion(
+            messages=messages,
+            model=ORCHESTRATOR_SYNTHESIS_MODEL,
+            temperature=0.3,
+            max_tokens=800
+        )
@@ -0,0 +1,165 @@
+"""
+Precompiled orchestration prompt.
+
+The orchestrator's system prompt only changes when the set of available agents
+changes, so it is compiled once per agent-set version and reused. Its layout is
+byte-stable and ordered from most to least shared, which lets the provider's
+prompt-prefix cache reuse as much of it as possible:
+
+1. static instructions (identical for every request),
+2. the agent catalog (identical for every request against the same agents),
+3. the conversation history and the user query (per request).
+
+Compilation time, compiled-prompt reuse and the provider-reported cached prompt
+tokens are exposed as metrics.
+"""
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+from apps.api.core.metrics import Histogram
+from apps.api.llm.fast_router import agent_set_signature, ROUTE_LATENCY_BUCKETS
+from apps.api.llm.resilience import count_text_tokens
+
+logger = logging.getLogger(__name__)
+
+ORCHESTRATOR_PROMPT_MAX_VERSIONS = int(os.environ.get("ORCHESTRATOR_PROMPT_MAX_VERSIONS", "8"))
+
+ORCHESTRATOR_STATIC_INSTRUCTIONS = "\n".join([
+    "You are an expert orchestrator AI. Your goal is to understand a user query "
+    "and decide the best course of action using the agents/capabilities listed under 'Available agents'.",
+    "",
+    "Based on the user's query, you must decide on ONE of the following actions:",
+    "1. 'delegate': If the query clearly matches an agent's capability. If so, specify the 'agent_name' and formulate a concise 'query_for_agent' based on the user's original query.",
+    "2. 'respond_directly': If the query is a direct question, a simple statement, or a follow-up that you can answer using the provided chat history and your general knowledge, without needing to delegate to another agent. Provide the 'response_text'. Make sure to use information from the chat history if relevant to the user's query.",
+    "3. 'clarify': If the query is ambiguous or needs more information to decide on an action. Provide a 'clarification_question'.",
+    "4. 'cannot_handle': If the query is outside the scope of your capabilities and known agents.",
+    "5. 'fan_out': If the query needs answers from several different agents (e.g. 'compare our metrics with competitors and draft a blog post'). "
+    "Provide 'delegations': a list of objects with 'agent_name' and 'query_for_agent', one per agent. Use 'delegate' when one agent is enough.",
+    "6. 'plan': If some parts of the query need the answers of other parts (e.g. 'pull our Q3 metrics and competitor numbers, then draft a blog post comparing them'). "
+    "Provide 'steps': a list of objects with 'id', 'agent_name', 'query_for_agent' and optionally 'depends_on' (ids of earlier steps). "
+    "A 'query_for_agent' may reference an earlier step's answer as {step_id}. Steps without dependencies run in parallel. Use 'fan_out' when no step needs another's answer.",
+    "",
+    "Respond ONLY with a JSON object with the fields 'action' (string, one of ['delegate', 'respond_directly', 'clarify', 'cannot_handle', 'fan_out', 'plan']), "
+    "and then conditionally: 'agent_name' (string), 'query_for_agent' (string), 'response_text' (string), 'clarification_question' (string), 'delegations' (list), or 'steps' (list). "
+    "Always include 'confidence' (number between 0 and 1): how sure you are that this is the right action.",
+    'Example for delegation: {"action": "delegate", "agent_name": "metrics", "query_for_agent": "What are the current sales figures?", "confidence": 0.9}',
+    'Example for direct response: {"action": "respond_directly", "response_text": "Hello! How can I assist you today?", "confidence": 0.95}',
+    'Example for clarification: {"action": "clarify", "clarification_question": "Which specific metrics are you interested in?", "confidence": 0.7}',
+    'Example for cannot handle: {"action": "cannot_handle", "confidence": 0.8}',
+    'Example for fan out: {"action": "fan_out", "delegations": [{"agent_name": "metrics", "query_for_agent": "Summarize this quarter\'s sales."}, '
+    '{"agent_name": "competitors", "query_for_agent": "Summarize competitor sales this quarter."}], "confidence": 0.85}',
+    'Example for plan: {"action": "plan", "steps": [{"id": "s1", "agent_name": "metrics", "query_for_agent": "Summarize Q3 sales."}, '
+    '{"id": "s2", "agent_name": "competitors", "query_for_agent": "Summarize competitor Q3 sales."}, '
+    '{"id": "s3", "agent_name": "blog_post", "query_for_agent": "Draft a blog post comparing {s1} with {s2}.", "depends_on": ["s1", "s2"]}], "confidence": 0.8}',
+])
+
+SUPPORT_AGENT_INSTRUCTION = (
+    "IMPORTANT: If the user is asking to talk to customer support, chat with support, or asking for help with a product/service issue, "
+    "ALWAYS delegate to the customer/chat_support agent. This includes any variation of 'speak to support', 'talk to a person', "
+    "'customer service', 'need help with my account', etc."
+)
+
+
+def render_agent_catalog(available_agents: List[Dict[str, Any]]) -> str:
+    """Agent listing in a deterministic order (discovery order is not stable across restarts)."""
+    ordered = sorted(available_agents, key=lambda agent: (str(agent.get("name", "")), str(agent.get("path", ""))))
+    lines = ["Available agents:"]
+    lines.extend(f"- Agent Name: {agent['name']}, Description: {agent['description']}" for agent in ordered)
+    if any("support" in agent["name"] for agent in ordered):
+        lines.append("")
+        lines.append(SUPPORT_AGENT_INSTRUCTION)
+    return "\n".join(lines)
+
+
+class PromptPrefixUsage:
+    """Provider-reported prompt-prefix cache usage (prompt_tokens_details.cached_tokens)."""
+
+    def __init__(self):
+        self.requests = 0
+        self.prompt_tokens = 0
+        self.cached_prompt_tokens = 0
+
+    def record(self, usage: Any) -> None:
+        if usage is None:
+            return
+        self.requests += 1
+        self.prompt_tokens += getattr(usage, "prompt_tokens", 0) or 0
+        details = getattr(usage, "prompt_tokens_details", None)
+        self.cached_prompt_tokens += getattr(details, "cached_tokens", 0) or 0
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "prompt_tokens": self.prompt_tokens,
+            "cached_prompt_tokens": self.cached_prompt_tokens,
+            "cached_ratio": round(self.cached_prompt_tokens / self.prompt_tokens, 4) if self.prompt_tokens else 0.0,
+        }
+
+
+class OrchestratorPromptCompiler:
+    """Compiles and caches the orchestration system prompt per agent-set version."""
+
+    def __init__(self, max_versions: int = ORCHESTRATOR_PROMPT_MAX_VERSIONS):
+        self.max_versions = max(1, max_versions)
+        self._compiled: "OrderedDict[str, str]" = OrderedDict()
+        self.builds = 0
+        self.reuses = 0
+        self.build_latency = Histogram(ROUTE_LATENCY_BUCKETS)
+        self.static_prefix_tokens = count_text_tokens(ORCHESTRATOR_STATIC_INSTRUCTIONS)
+        self.last_catalog_tokens = 0
+
+    def system_prompt(self, available_agents: List[Dict[str, Any]], version: Optional[str] = None) -> str:
+        """The system prompt for `available_agents`; `version` defaults to a hash of the agent set."""
+        version = version or agent_set_signature(available_agents)
+        prompt = self._compiled.get(version)
+        if prompt is not None:
+            self._compiled.move_to_end(version)
+            self.reuses += 1
+            return prompt
+
+        started = time.perf_counter()
+        catalog = render_agent_catalog(available_agents)
+        prompt = f"{ORCHESTRATOR_STATIC_INSTRUCTIONS}\n\n{catalog}"
+        self.build_latency.observe(time.perf_counter() - started)
+        self.builds += 1
+        self.last_catalog_tokens = count_text_tokens(catalog)
+        self._compiled[version] = prompt
+        while len(self._compiled) > self.max_versions:
+            self._compiled.popitem(last=False)
+        logger.info(f"Compiled orchestrator prompt for agent-set version {version[:12]} ({len(available_agents)} agents).")
+        return prompt
+
+    def build_messages(
+        self,
+        user_query: str,
+        available_agents: List[Dict[str, Any]],
+        history: Optional[List[Dict[str, str]]] = None,
+        version: Optional[str] = None,
+    ) -> List[Dict[str, str]]:
+        """System prompt, then history, then the user query: the stable part always comes first."""
+        messages = [{"role": "system", "content": self.system_prompt(available_agents, version)}]
+        if history:
+            messages.extend(history)
+        messages.append({"role": "user", "content": user_query})
+        return messages
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.builds + self.reuses
+        return {
+            "versions_cached": len(self._compiled),
+            "builds": self.builds,
+            "reuses": self.reuses,
+            "reuse_rate": round(self.reuses / total, 4) if total else 0.0,
+            "build_latency_seconds": self.build_latency.snapshot(),
+            "static_prefix_tokens": self.static_prefix_tokens,
+            "catalog_tokens": self.last_catalog_tokens,
+            "provider_prefix_cache": provider_prefix_usage.stats(),
+        }
+
+
+# Shared instances used by OpenAIService
+provider_prefix_usage = PromptPrefixUsage()
+orchestrator_prompt_compiler = OrchestratorPromptCompiler()
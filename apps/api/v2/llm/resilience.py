@@ -0,0 +1,284 @@
+"""
+Client-side resilience primitives for LLM provider calls.
+
+- RateLimiter: requests-per-minute and tokens-per-minute token buckets. Callers
+  reserve capacity with an estimate of the request's tokens *before* sending,
+  and are paced (they sleep) instead of hitting provider 429s.
+- CircuitBreaker: fails fast while the provider is degraded and lets a single
+  probe request through after a recovery timeout.
+- Retry helpers: jittered exponential backoff that honors Retry-After.
+
+Shared process-wide instances (openai_rate_limiter, openai_circuit_breaker) are
+used by OpenAIService so that every instance paces against the same budget.
+"""
+import asyncio
+import json
+import logging
+import os
+import random
+import time
+from typing import Any, Dict, List, Optional
+
+from apps.api.core.metrics import Histogram
+
+logger = logging.getLogger(__name__)
+
+# Tunables (environment variables). A limit of 0 disables that bucket.
+OPENAI_RPM_LIMIT = float(os.environ.get("OPENAI_RPM_LIMIT", "500"))
+OPENAI_TPM_LIMIT = float(os.environ.get("OPENAI_TPM_LIMIT", "200000"))
+OPENAI_MAX_RETRIES = int(os.environ.get("OPENAI_MAX_RETRIES", "3"))
+OPENAI_RETRY_BASE_DELAY_SECONDS = float(os.environ.get("OPENAI_RETRY_BASE_DELAY_SECONDS", "0.5"))
+OPENAI_RETRY_MAX_DELAY_SECONDS = float(os.environ.get("OPENAI_RETRY_MAX_DELAY_SECONDS", "20"))
+OPENAI_BREAKER_FAILURE_THRESHOLD = int(os.environ.get("OPENAI_BREAKER_FAILURE_THRESHOLD", "5"))
+OPENAI_BREAKER_RECOVERY_SECONDS = float(os.environ.get("OPENAI_BREAKER_RECOVERY_SECONDS", "30"))
+
+try:
+    import tiktoken
+    _encoding = tiktoken.get_encoding("cl100k_base")
+except Exception:  # tiktoken missing or its encoding files unavailable
+    _encoding = None
+
+
+def count_text_tokens(text: str) -> int:
+    """Token count of a string (tiktoken when available, ~4 chars/token otherwise)."""
+    if not text:
+        return 0
+    if _encoding is not None:
+        return len(_encoding.encode(text))
+    return max(1, len(text) // 4)
+
+
+def estimate_request_tokens(messages: List[Dict[str, Any]], max_tokens: Optional[int] = None) -> int:
+    """
+    Upper-bound estimate of the tokens a chat request consumes: prompt tokens
+    (plus per-message overhead) and the completion budget (max_tokens).
+    """
+    prompt_tokens = 0
+    for message in messages:
+        content = message.get("content") or ""
+        if not isinstance(content, str):
+            content = json.dumps(content, default=str)
+        prompt_tokens += count_text_tokens(content) + 4  # role/formatting overhead per message
+    return prompt_tokens + 2 + (max_tokens or 0)
+
+
+class TokenBucket:
+    """
+    Token bucket refilled continuously at `rate_per_minute`. reserve() always
+    succeeds and returns how long the caller must wait for its reservation,
+    letting the balance go negative so that waiters are served in arrival order.
+    """
+
+    def __init__(self, rate_per_minute: float):
+        self.capacity = float(rate_per_minute)
+        self.refill_per_second = self.capacity / 60.0
+        self.tokens = self.capacity
+        self._updated_at = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated_at) * self.refill_per_second)
+        self._updated_at = now
+
+    def reserve(self, amount: float) -> float:
+        self._refill()
+        self.tokens -= min(amount, self.capacity)  # An oversized request waits for a full bucket, not forever
+        if self.tokens >= 0:
+            return 0.0
+        return -self.tokens / self.refill_per_second
+
+    def adjust(self, delta: float) -> None:
+        """Corrects a previous reservation (positive delta refunds, negative charges more)."""
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens + delta)
+
+
+class RateLimiter:
+    """Requests-per-minute + tokens-per-minute limiter with throttle-wait metrics."""
+
+    def __init__(self, requests_per_minute: float = OPENAI_RPM_LIMIT, tokens_per_minute: float = OPENAI_TPM_LIMIT):
+        self.request_bucket = TokenBucket(requests_per_minute) if requests_per_minute > 0 else None
+        self.token_bucket = TokenBucket(tokens_per_minute) if tokens_per_minute > 0 else None
+        self.throttle_wait = Histogram()
+        self.throttled_requests = 0
+
+    async def acquire(self, estimated_tokens: int) -> float:
+        """Reserves capacity for one request and sleeps until it is available. Returns the wait in seconds."""
+        wait_seconds = 0.0
+        if self.request_bucket is not None:
+            wait_seconds = max(wait_seconds, self.request_bucket.reserve(1))
+        if self.token_bucket is not None:
+            wait_seconds = max(wait_seconds, self.token_bucket.reserve(estimated_tokens))
+        self.throttle_wait.observe(wait_seconds)
+        if wait_seconds > 0:
+            self.throttled_requests += 1
+            logger.info(f"LLM rate limiter: pacing request for {wait_seconds:.2f}s (~{estimated_tokens} tokens).")
+            await asyncio.sleep(wait_seconds)
+        return wait_seconds
+
+    def reconcile(self, estimated_tokens: int, actual_tokens: Optional[int]) -> None:
+        """Refunds (or charges) the difference once the provider reports actual usage."""
+        if self.token_bucket is not None and actual_tokens is not None:
+            self.token_bucket.adjust(estimated_tokens - actual_tokens)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "throttled_requests": self.throttled_requests,
+            "throttle_wait_seconds": self.throttle_wait.snapshot(),
+            "available_requests": round(self.request_bucket.tokens, 2) if self.request_bucket else None,
+            "available_tokens": round(self.token_bucket.tokens, 2) if self.token_bucket else None,
+        }
+
+
+class CircuitOpenError(Exception):
+    """Raised when a call is rejected because the circuit breaker is open."""
+    def __init__(self, name: str, retry_after_seconds: float):
+        super().__init__(f"Circuit '{name}' is open; retry in {retry_after_seconds:.1f}s.")
+        self.name = name
+        self.retry_after_seconds = retry_after_seconds
+
+
+class CircuitBreaker:
+    """
+    Classic closed -> open -> half-open breaker.
+    Opens after `failure_threshold` consecutive failures, rejects calls for
+    `recovery_timeout_seconds`, then allows one probe; a successful probe closes it.
+    """
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int = OPENAI_BREAKER_FAILURE_THRESHOLD,
+        recovery_timeout_seconds: float = OPENAI_BREAKER_RECOVERY_SECONDS,
+    ):
+        self.name = name
+        self.failure_threshold = max(1, failure_threshold)
+        self.recovery_timeout_seconds = recovery_timeout_seconds
+        self.consecutive_failures = 0
+        self.times_opened = 0
+        self.rejected_calls = 0
+        self._state = self.CLOSED
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._probe_started_at = 0.0
+
+    @property
+    def state(self) -> str:
+        if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.recovery_timeout_seconds:
+            self._state = self.HALF_OPEN
+            self._probe_in_flight = False
+        return self._state
+
+    def before_call(self) -> None:
+        """
+        Raises CircuitOpenError if the call must not be attempted. In half-open state
+        only one probe call is let through at a time.
+        """
+        state = self.state
+        if state == self.CLOSED:
+            return
+        now = time.monotonic()
+        # A probe that never reported back (e.g. its task was cancelled) must not wedge the breaker.
+        probe_stale = self._probe_in_flight and now - self._probe_started_at >= self.recovery_timeout_seconds
+        if state == self.HALF_OPEN and (not self._probe_in_flight or probe_stale):
+            self._probe_in_flight = True
+            self._probe_started_at = now
+            return
+        self.rejected_calls += 1
+        retry_after = max(0.0, self.recovery_timeout_seconds - (now - self._opened_at))
+        raise CircuitOpenError(self.name, retry_after)
+
+    def record_success(self) -> None:
+        if self._state != self.CLOSED:
+            logger.info(f"Circuit '{self.name}' closed after successful probe.")
+        self._state = self.CLOSED
+        self.consecutive_failures = 0
+        self._probe_in_flight = False
+
+    def record_failure(self) -> None:
+        self.consecutive_failures += 1
+        if self.state == self.HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+            if self._state != self.OPEN:
+                self.times_opened += 1
+                logger.warning(f"Circuit '{self.name}' opened after {self.consecutive_failures} consecutive failures.")
+            self._state = self.OPEN
+            self._opened_at = time.monotonic()
+            self._probe_in_flight = False
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "times_opened": self.times_opened,
+            "rejected_calls": self.rejected_calls,
+        }
+
+
+def retry_after_from_exception(exc: Exception) -> Optional[float]:
+    """Reads Retry-After (or OpenAI's retry-after-ms) from an SDK/httpx exception's response, if present."""
+    response = getattr(exc, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    retry_after_ms = headers.get("retry-after-ms")
+    if retry_after_ms:
+        try:
+            return float(retry_after_ms) / 1000.0
+        except ValueError:
+            pass
+    retry_after = headers.get("retry-after")
+    if retry_after:
+        try:
+            return float(retry_after)
+        except ValueError:
+            return None  # HTTP-date form is not used by the provider
+    return None
+
+
+def backoff_delay(
+    attempt: int,
+    retry_after: Optional[float] = None,
+    base_delay: float = OPENAI_RETRY_BASE_DELAY_SECONDS,
+    max_delay: float = OPENAI_RETRY_MAX_DELAY_SECONDS,
+) -> float:
+    """
+    Delay before retry number `attempt` (0-based): the server's Retry-After when given,
+    otherwise exponential backoff with full jitter.
+    """
+    if retry_after is not None:
+        return min(max_delay, retry_after) + random.uniform(0, base_delay)
+    return random.uniform(0, min(max_delay, base_delay * (2 ** attempt)))
+
+
+class RetryCounter:
+    """Counts retried attempts (by reason) and calls that ran out of retries."""
+
+    def __init__(self):
+        self.retries = 0
+        self.exhausted = 0
+        self.by_reason: Dict[str, int] = {}
+
+    def record_retry(self, reason: str) -> None:
+        self.retries += 1
+        self.by_reason[reason] = self.by_reason.get(reason, 0) + 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {"retries": self.retries, "exhausted": self.exhausted, "by_reason": dict(self.by_reason)}
+
+
+# Shared, process-wide instances used by OpenAIService
+openai_rate_limiter = RateLimiter()
+openai_circuit_breaker = CircuitBreaker("openai")
+openai_retry_counter = RetryCounter()
+
+
+def get_openai_resilience_stats() -> Dict[str, Any]:
+    """Snapshot of limiter, retry and breaker metrics for the shared OpenAI instances."""
+    return {
+        "rate_limiter": openai_rate_limiter.stats(),
+        "retries": openai_retry_counter.stats(),
+        "circuit_breaker": openai_circuit_breaker.stats(),
+    }
@@ -0,0 +1,171 @@
+"""
+Single-flight coalescing for identical concurrent LLM requests.
+
+When several callers issue exactly the same request at the same time (same model,
+messages, temperature, max_tokens and response_format), only the first one (the
+"leader") reaches the provider; the others wait for and share its result.
+For streaming requests the leader's stream is fanned out to every consumer, and
+late joiners first receive the chunks already produced.
+
+Nothing is cached once a flight finishes; that is the job of the response cache.
+Coalescing is opt-in via LLM_SINGLE_FLIGHT_ENABLED.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+from typing import Any, AsyncGenerator, Awaitable, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+LLM_SINGLE_FLIGHT_ENABLED = os.environ.get("LLM_SINGLE_FLIGHT_ENABLED", "false").lower() == "true"
+
+
+def build_request_key(
+    model: str,
+    messages: List[Dict[str, Any]],
+    temperature: Optional[float],
+    max_tokens: Optional[int],
+    response_format: Optional[Dict[str, Any]] = None,
+) -> str:
+    """Identity of an LLM request for coalescing purposes."""
+    material = json.dumps(
+        {
+            "model": model,
+            "messages": messages,
+            "temperature": temperature,
+            "max_tokens": max_tokens,
+            "response_format": response_format,
+        },
+        sort_keys=True,
+        default=str,
+    )
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+class _Flight:
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """Coalesces concurrent awaitable calls that share a key."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._flights: Dict[str, _Flight] = {}
+        self.leaders = 0     # Upstream calls actually made
+        self.coalesced = 0   # Calls that shared an in-flight upstream call
+
+    async def do(self, key: str, call: Callable[[], Awaitable[Any]]) -> Any:
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = _Flight(asyncio.create_task(call()))
+            self._flights[key] = flight
+            flight.task.add_done_callback(lambda _task, k=key, f=flight: self._forget(k, f))
+            self.leaders += 1
+        else:
+            self.coalesced += 1
+            logger.debug(f"SingleFlight[{self.name}]: joined in-flight call ({flight.waiters} waiting).")
+
+        flight.waiters += 1
+        try:
+            # shield(): one cancelled caller must not cancel the call shared by the others
+            return await asyncio.shield(flight.task)
+        finally:
+            flight.waiters -= 1
+            if flight.waiters == 0 and not flight.task.done():
+                flight.task.cancel()  # Every caller gave up
+
+    def _forget(self, key: str, flight: _Flight) -> None:
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+
+    def stats(self) -> Dict[str, Any]:
+        return {"in_flight": len(self._flights), "leaders": self.leaders, "coalesced": self.coalesced}
+
+
+class _StreamFlight:
+    def __init__(self):
+        self.items: List[Any] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.consumers = 0
+        self.condition = asyncio.Condition()
+        self.task: Optional[asyncio.Task] = None
+
+
+class StreamSingleFlight:
+    """Coalesces concurrent identical streams: one upstream stream fanned out to N consumers."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._flights: Dict[str, _StreamFlight] = {}
+        self.leaders = 0
+        self.coalesced = 0
+
+    async def _pump(self, key: str, flight: _StreamFlight, stream_factory: Callable[[], AsyncGenerator[Any, None]]) -> None:
+        upstream = stream_factory()
+        try:
+            async for item in upstream:
+                async with flight.condition:
+                    flight.items.append(item)
+                    flight.condition.notify_all()
+        except asyncio.CancelledError:
+            await upstream.aclose()  # Last consumer left: abort the upstream stream
+            flight.error = asyncio.CancelledError()
+            raise
+        except Exception as e:
+            flight.error = e
+        finally:
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+            async with flight.condition:
+                flight.done = True
+                flight.condition.notify_all()
+
+    async def stream(self, key: str, stream_factory: Callable[[], AsyncGenerator[Any, None]]) -> AsyncGenerator[Any, None]:
+        """
+        Yields the items of the upstream stream identified by `key`, starting one with
+        `stream_factory` if none is in flight. Upstream errors are re-raised in every consumer.
+        """
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = _StreamFlight()
+            self._flights[key] = flight
+            flight.task = asyncio.create_task(self._pump(key, flight, stream_factory))
+            self.leaders += 1
+        else:
+            self.coalesced += 1
+            logger.debug(f"StreamSingleFlight[{self.name}]: fanning out in-flight stream to another consumer.")
+
+        flight.consumers += 1
+        index = 0
+        try:
+            while True:
+                async with flight.condition:
+                    while index >= len(flight.items) and not flight.done:
+                        await flight.condition.wait()
+                    pending = flight.items[index:]
+                    index = len(flight.items)
+                    finished = flight.done
+                for item in pending:
+                    yield item
+                if finished and index >= len(flight.items):
+                    if flight.error is not None:
+                        raise flight.error
+                    return
+        finally:
+            flight.consumers -= 1
+            if flight.consumers == 0 and flight.task is not None and not flight.task.done():
+                flight.task.cancel()
+
+    def stats(self) -> Dict[str, Any]:
+        return {"in_flight": len(self._flights), "leaders": self.leaders, "coalesced": self.coalesced}
+
+
+# Shared coalescers
+chat_completion_single_flight = SingleFlight("chat_completion")
+stream_single_flight = StreamSingleFlight("chat_completion_stream")
@@ -0,0 +1,270 @@
+"""
+LLM token accounting and budgets.
+
+Every OpenAI call records its prompt and completion tokens, attributed to the current
+user, session and agent. Tokens come from the response's `usage` when the provider
+reports it and are estimated with tiktoken otherwise (e.g. for streams). Totals are
+aggregated in memory; the deltas since the last flush are handed to a flush sink
+periodically (the default sink logs them), so a persistent store can be plugged in
+without touching the request path.
+
+Attribution uses a context variable: request handlers wrap their work in
+`usage_scope(user_id=..., session_id=..., agent_id=...)` and every LLM call made
+inside it (including in tasks it creates) is attributed to that scope.
+
+Budgets are token limits per user, session and agent over a fixed window. Once a
+limit is reached, further requests are either downgraded to a cheaper model or
+rejected with LLMBudgetExceededError, depending on LLM_BUDGET_ACTION.
+"""
+import asyncio
+import contextvars
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from apps.api.llm.resilience import count_text_tokens, estimate_request_tokens
+
+logger = logging.getLogger(__name__)
+
+# Tunables (environment variables). A budget of 0 means unlimited.
+LLM_USAGE_FLUSH_INTERVAL_SECONDS = float(os.environ.get("LLM_USAGE_FLUSH_INTERVAL_SECONDS", "60"))
+LLM_USAGE_MAX_KEYS = int(os.environ.get("LLM_USAGE_MAX_KEYS", "10000"))  # per dimension, LRU-bounded
+LLM_BUDGET_WINDOW_SECONDS = float(os.environ.get("LLM_BUDGET_WINDOW_SECONDS", "86400"))
+LLM_BUDGET_USER_TOKENS = int(os.environ.get("LLM_BUDGET_USER_TOKENS", "0"))
+LLM_BUDGET_SESSION_TOKENS = int(os.environ.get("LLM_BUDGET_SESSION_TOKENS", "0"))
+LLM_BUDGET_AGENT_TOKENS = int(os.environ.get("LLM_BUDGET_AGENT_TOKENS", "0"))
+LLM_BUDGET_ACTION = os.environ.get("LLM_BUDGET_ACTION", "downgrade").lower()  # "downgrade" or "reject"
+LLM_BUDGET_DOWNGRADE_MODEL = os.environ.get("LLM_BUDGET_DOWNGRADE_MODEL", "gpt-3.5-turbo")
+
+# Scope dimensions, in the order budgets are checked
+USAGE_DIMENSIONS = ("user", "session", "agent")
+
+_usage_scope: contextvars.ContextVar[Dict[str, str]] = contextvars.ContextVar("llm_usage_scope", default={})
+
+
+@contextmanager
+def usage_scope(user_id: Optional[str] = None, session_id: Optional[str] = None,
+                agent_id: Optional[str] = None) -> Iterator[Dict[str, str]]:
+    """Attributes LLM usage inside the block; unset fields are inherited from the enclosing scope."""
+    scope = dict(_usage_scope.get())
+    for dimension, value in (("user", user_id), ("session", session_id), ("agent", agent_id)):
+        if value:
+            scope[dimension] = str(value)
+    token = _usage_scope.set(scope)
+    try:
+        yield scope
+    finally:
+        _usage_scope.reset(token)
+
+
+def current_usage_scope() -> Dict[str, str]:
+    return dict(_usage_scope.get())
+
+
+class LLMBudgetExceededError(Exception):
+    """Raised when a request is rejected because a token budget is exhausted."""
+    def __init__(self, dimension: str, key: str, used: int, limit: int):
+        super().__init__(f"LLM token budget exceeded for {dimension} '{key}': {used}/{limit} tokens in the current window.")
+        self.dimension = dimension
+        self.key = key
+        self.used = used
+        self.limit = limit
+
+
+class UsageTotals:
+    def __init__(self):
+        self.requests = 0
+        self.estimated_requests = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.latency_seconds = 0.0
+
+    @property
+    def total_tokens(self) -> int:
+        return self.prompt_tokens + self.completion_tokens
+
+    def add(self, prompt_tokens: int, completion_tokens: int, latency_seconds: float, estimated: bool) -> None:
+        self.requests += 1
+        self.estimated_requests += int(estimated)
+        self.prompt_tokens += prompt_tokens
+        self.completion_tokens += completion_tokens
+        self.latency_seconds += latency_seconds
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "estimated_requests": self.estimated_requests,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "total_tokens": self.total_tokens,
+            "avg_latency_seconds": round(self.latency_seconds / self.requests, 4) if self.requests else 0.0,
+        }
+
+
+def _log_flush_sink(deltas: Dict[str, Dict[str, Dict[str, Any]]]) -> None:
+    logger.info(f"LLM usage since last flush: {json.dumps(deltas, sort_keys=True)}")
+
+
+class TokenLedger:
+    """In-memory usage aggregation per model/user/session/agent, with windowed budgets."""
+
+    def __init__(
+        self,
+        budgets: Optional[Dict[str, int]] = None,
+        window_seconds: float = LLM_BUDGET_WINDOW_SECONDS,
+        action: str = LLM_BUDGET_ACTION,
+        downgrade_model: str = LLM_BUDGET_DOWNGRADE_MODEL,
+        flush_sink: Callable[[Dict[str, Dict[str, Dict[str, Any]]]], Any] = _log_flush_sink,
+        max_keys: int = LLM_USAGE_MAX_KEYS,
+    ):
+        if budgets is None:
+            budgets = {"user": LLM_BUDGET_USER_TOKENS, "session": LLM_BUDGET_SESSION_TOKENS, "agent": LLM_BUDGET_AGENT_TOKENS}
+        self.budgets = {dimension: limit for dimension, limit in budgets.items() if limit > 0}
+        self.window_seconds = window_seconds
+        self.action = action
+        self.downgrade_model = downgrade_model
+        self.flush_sink = flush_sink
+        self.max_keys = max(1, max_keys)
+        self._totals: Dict[str, "OrderedDict[str, UsageTotals]"] = {}
+        self._pending: Dict[str, Dict[str, UsageTotals]] = {}
+        self._windows: Dict[Tuple[str, str], List[float]] = {}  # (dimension, key) -> [window_start, tokens]
+        self.downgraded_requests = 0
+        self.rejected_requests = 0
+        self.flushes = 0
+        self._flush_task: Optional[asyncio.Task] = None
+
+    # --- Recording ---
+
+    def record(self, model: str, prompt_tokens: int, completion_tokens: int, latency_seconds: float = 0.0,
+               estimated: bool = False, scope: Optional[Dict[str, str]] = None) -> None:
+        scope = current_usage_scope() if scope is None else scope
+        keys = {"model": model, **{dimension: scope[dimension] for dimension in USAGE_DIMENSIONS if scope.get(dimension)}}
+        for dimension, key in keys.items():
+            totals = self._totals.setdefault(dimension, OrderedDict())
+            if key not in totals:
+                totals[key] = UsageTotals()
+                if len(totals) > self.max_keys:
+                    totals.popitem(last=False)
+            totals.move_to_end(key)
+            totals[key].add(prompt_tokens, completion_tokens, latency_seconds, estimated)
+            self._pending.setdefault(dimension, {}).setdefault(key, UsageTotals()).add(
+                prompt_tokens, completion_tokens, latency_seconds, estimated)
+            if dimension in self.budgets:
+                self._window(dimension, key)[1] += prompt_tokens + completion_tokens
+
+    def record_usage(self, model: str, usage: Any, messages: List[Dict[str, Any]], completion_text: Optional[str],
+                     latency_seconds: float = 0.0, scope: Optional[Dict[str, str]] = None) -> None:
+        """Records a provider `usage` object, falling back to tiktoken estimates when it is missing."""
+        prompt_tokens = getattr(usage, "prompt_tokens", None)
+        completion_tokens = getattr(usage, "completion_tokens", None)
+        if prompt_tokens is None or completion_tokens is None:
+            self.record_estimate(model, messages, completion_text or "", latency_seconds, scope)
+            return
+        self.record(model, prompt_tokens, completion_tokens, latency_seconds, estimated=False, scope=scope)
+
+    def record_estimate(self, model: str, messages: List[Dict[str, Any]], completion_text: str,
+                        latency_seconds: float = 0.0, scope: Optional[Dict[str, str]] = None) -> None:
+        self.record(model, estimate_request_tokens(messages), count_text_tokens(completion_text),
+                    latency_seconds, estimated=True, scope=scope)
+
+    # --- Budgets ---
+
+    def _window(self, dimension: str, key: str) -> List[float]:
+        now = time.monotonic()
+        window = self._windows.get((dimension, key))
+        if window is None or now - window[0] >= self.window_seconds:
+            window = [now, 0]
+            self._windows[(dimension, key)] = window
+        return window
+
+    def window_usage(self, dimension: str, key: str) -> int:
+        return int(self._window(dimension, key)[1])
+
+    def enforce_budget(self, model: str, scope: Optional[Dict[str, str]] = None) -> str:
+        """
+        Returns the model to use for a request in `scope`: `model` while within budget, the
+        downgrade model once a budget is exhausted (LLM_BUDGET_ACTION=downgrade).
+        Raises LLMBudgetExceededError instead when LLM_BUDGET_ACTION=reject.
+        """
+        scope = current_usage_scope() if scope is None else scope
+        for dimension in USAGE_DIMENSIONS:
+            limit = self.budgets.get(dimension)
+            key = scope.get(dimension)
+            if not limit or not key:
+                continue
+            used = self.window_usage(dimension, key)
+            if used < limit:
+                continue
+            if self.action == "reject":
+                self.rejected_requests += 1
+                raise LLMBudgetExceededError(dimension, key, used, limit)
+            if model != self.downgrade_model:
+                self.downgraded_requests += 1
+                logger.info(f"LLM budget exhausted for {dimension} '{key}' ({used}/{limit}); downgrading {model} -> {self.downgrade_model}.")
+            return self.downgrade_model
+        return model
+
+    # --- Flushing ---
+
+    def flush(self) -> Dict[str, Dict[str, Dict[str, Any]]]:
+        """Hands the usage accumulated since the last flush to the flush sink."""
+        pending, self._pending = self._pending, {}
+        deltas = {dimension: {key: totals.as_dict() for key, totals in entries.items()} for dimension, entries in pending.items()}
+        if deltas:
+            self.flushes += 1
+            try:
+                self.flush_sink(deltas)
+            except Exception as e:
+                logger.error(f"LLM usage flush failed: {e}", exc_info=True)
+        return deltas
+
+    async def _flush_periodically(self, interval_seconds: float) -> None:
+        while True:
+            await asyncio.sleep(interval_seconds)
+            self.flush()
+
+    def start_periodic_flush(self, interval_seconds: float = LLM_USAGE_FLUSH_INTERVAL_SECONDS) -> None:
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush_periodically(interval_seconds))
+
+    async def stop_periodic_flush(self) -> None:
+        """Stops the flush loop and flushes what is left."""
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            await asyncio.gather(self._flush_task, return_exceptions=True)
+            self._flush_task = None
+        self.flush()
+
+    # --- Reporting ---
+
+    def usage(self, dimension: str, key: str) -> Optional[Dict[str, Any]]:
+        totals = self._totals.get(dimension, {}).get(key)
+        return totals.as_dict() if totals else None
+
+    def stats(self, top: int = 20, dimensions: Optional[Tuple[str, ...]] = None) -> Dict[str, Any]:
+        """Top `top` keys per dimension (all, or only `dimensions`) by total tokens, plus budget counters."""
+        by_dimension = {}
+        for dimension, entries in self._totals.items():
+            if dimensions is not None and dimension not in dimensions:
+                continue
+            ranked = sorted(entries.items(), key=lambda item: item[1].total_tokens, reverse=True)[:top]
+            by_dimension[dimension] = {key: totals.as_dict() for key, totals in ranked}
+        return {
+            "usage": by_dimension,
+            "budgets": {
+                "limits": dict(self.budgets),
+                "window_seconds": self.window_seconds,
+                "action": self.action,
+                "downgraded_requests": self.downgraded_requests,
+                "rejected_requests": self.rejected_requests,
+            },
+            "flushes": self.flushes,
+        }
+
+
+# Shared ledger used by OpenAIService and llm_mcp
+token_ledger = TokenLedger()
@@ -1,7 +1,7 @@
 import sys
 import os
 import httpx
-from fastapi import FastAPI, HTTPException, APIRouter, Depends, status
+from fastapi import FastAPI, HTTPException, APIRouter, Depends, Request, Response, status
 from fastapi.responses import JSONResponse
 from dotenv import load_dotenv
 import importlib.util
@@ -81,6 +81,22 @@ from .a2a_protocol.types import (
     AgentCard, ErrorCode as A2AErrorCode, JSONRPCError as A2AJSONRPCError # Aliasing to avoid conflict if needed
 )
 from .llm.openai_service import OpenAIService
+from .llm.resilience import get_openai_resilience_stats
+from .llm.single_flight import chat_completion_single_flight, stream_single_flight
+from .llm.fast_router import fast_path_router
+from .llm.decision_cache import decision_cache
+from .llm.orchestrator_prompt import orchestrator_prompt_compiler
+from .llm.model_cascade import cascade_stats
+from .llm.client_factory import llm_client_factory
+from .a2a_protocol.agent_registry import local_agent_registry
+from .a2a_protocol.agent_health import agent_health
+from .a2a_protocol.agent_cards import agent_card_registry
+from .a2a_protocol.service_scope import agent_services
+from .a2a_protocol.hedging import hedge_budget
+from .a2a_protocol.stickiness_store import stickiness_store
+from .agents.system.orchestrator.speculation import speculation_stats
+from .core.deadlines import RequestDeadlineMiddleware, deadline_stats
+from .llm.token_accounting import token_ledger
 from .core.config import settings, Settings
 from .core.db import get_supabase_client, get_current_supabase_client, get_anon_supabase_client, get_current_supabase_service_client
 from supabase import Client as SupabaseClient # Import directly
@@ -103,6 +119,7 @@ from .sessions.schemas import SessionCreate, SessionResponse, SessionListRespons
 
 # Import the MCP router from its new location
 from .shared.mcp.mcp_routes import mcp_router
+from .shared.mcp.mcp_ws import mcp_ws_router
 from .auth.routes import router as auth_router # Import the new auth router
 from .sessions.routes import router as sessions_router # Import the new sessions router
 
@@ -138,8 +155,8 @@ def get_original_openai_service() -> Optional[OpenAIService]:
             print("[GET_ORIG_OPENAI_DEBUG] Key found, attempting to create a fallback instance. THIS IS UNEXPECTED if lifespan ran.")
             # Fallback, ideally lifespan should have created it.
             # Avoid creating multiple, this is more for a direct call scenario before lifespan has run.
-            # If this path is hit regularly, review call order.
-            return OpenAIService(api_key=settings.OPENAI_API_KEY) 
+            # If this path is hit regularly, review call order. The fallback is kept so later calls reuse it.
+            _original_openai_service_instance = OpenAIService(api_key=settings.OPENAI_API_KEY)
         else:
             print("[GET_ORIG_OPENAI_DEBUG] No API KEY, _original_openai_service_instance remains None.")
     return _original_openai_service_instance
@@ -241,6 +258,18 @@ def process_agent_module(
                 print(f"[METRICS_INCLUDE_PRINT_DEBUG] app.include_router for metrics FAILED: {e_include}")
             module_logger.error(f"Error including router for {module_name}: {e_include}", exc_info=True)
         
+        # Publish the agent's card; only agents serving /tasks can be delegated to
+        agent_card_registry.register_module(
+            base_prefix[len("/agents/"):], module,
+            delegable=any(getattr(route, "path", "").endswith("/tasks") for route in router_to_include.routes),
+        )
+
+        # Make the agent callable in-process for agent-to-agent delegation
+        if callable(getattr(module, "get_agent_service", None)):
+            local_agent_registry.register_dependency(
+                base_prefix[len("/agents/"):], module.get_agent_service, app_to_configure.dependency_overrides
+            )
+
         # The check for agent_service_class_name_candidate should be outside and after this if/else on router_to_include
         # if it's meant to be an alternative. But current structure has it nested.
         # For now, assume if router_to_include is found, we don't try service-based routing for the same routes.
@@ -372,13 +401,33 @@ async def lifespan(app: FastAPI):
     global _original_http_client_instance
     _original_http_client_instance = httpx.AsyncClient()
     logger.debug("Initialized global HTTP client in lifespan")
+    # Open LLM provider connections now so the first request doesn't pay for connection setup
+    if effective_openai_key:
+        await llm_client_factory.warmup(effective_openai_key)
+    token_ledger.start_periodic_flush()
+    # Create the app-scoped agent services now, bound to this lifespan's HTTP client
+    agent_services.clear()
+    for agent_path in local_agent_registry.registered_paths():
+        try:
+            await local_agent_registry.get_service(agent_path)
+        except Exception as e:
+            logger.warning(f"Could not create app-scoped service for agent {agent_path}: {e}")
+    # Background health probes of delegable agents (AGENT_HEALTH_PROBE_INTERVAL_SECONDS=0 disables them)
+    agent_health.start_probes(_original_http_client_instance, os.getenv("API_BASE_URL", "http://localhost:8000"),
+                              local_agent_registry.registered_paths())
+    stickiness_store.start_sweeper()
     yield
     # Cleanup logic
     logger.info("FastAPI application lifespan shutdown.")
+    await agent_health.stop_probes()
+    await stickiness_store.stop_sweeper()
+    await token_ledger.stop_periodic_flush()
+    agent_services.clear()
     if _original_http_client_instance:
         await _original_http_client_instance.aclose()
         logger.debug("Closed global HTTP client from lifespan")
-    # No specific cleanup for _original_openai_service_instance unless it has an aclose method
+    # The OpenAI service's client lives in the shared LLM connection pool
+    await llm_client_factory.aclose()
 
 def create_app() -> FastAPI:
     print("\n\n[CREATE_APP_DEBUG_MARKER] !!!!! EXECUTING create_app() from latest main.py !!!!!\n\n")
@@ -406,10 +455,14 @@ def create_app() -> FastAPI:
     )
     logger.debug("Configured CORS middleware")
 
+    # Requests run under the deadline their caller sent (X-Request-Deadline-Ms), if any
+    new_app.add_middleware(RequestDeadlineMiddleware)
+
     # Include routers
     new_app.include_router(auth_router, prefix="/auth", tags=["auth"])
     new_app.include_router(sessions_router, prefix="/sessions", tags=["sessions"])
     new_app.include_router(mcp_router, prefix="/mcp", tags=["mcp"])
+    new_app.include_router(mcp_ws_router, prefix="/mcp", tags=["mcp"])
     logger.debug("Included base routers")
 
     # Load agent services
@@ -445,6 +498,54 @@ def create_app() -> FastAPI:
     async def health_check():
         return {"status": "healthy"}
 
+    @new_app.get("/llm/metrics")
+    async def llm_metrics():
+        """Rate limiter, retry, circuit breaker, single-flight, fast-path routing, decision cache, prompt compilation, model cascade and connection pool metrics for OpenAI calls."""
+        return {
+            **get_openai_resilience_stats(),
+            "single_flight": {
+                "chat_completion": chat_completion_single_flight.stats(),
+                "chat_completion_stream": stream_single_flight.stats(),
+            },
+            "fast_router": fast_path_router.stats(),
+            "decision_cache": decision_cache.stats(),
+            "orchestrator_prompt": orchestrator_prompt_compiler.stats(),
+            "model_cascade": cascade_stats.stats(),
+            "client_pool": llm_client_factory.stats(),
+        }
+
+    @new_app.get("/llm/usage")
+    async def llm_usage(top: int = 20, current_user: SupabaseAuthUser = Depends(get_current_authenticated_user)):
+        """
+        LLM token usage per model and agent (top N by tokens), the caller's own totals, and
+        budget counters. Other users' and sessions' totals are not exposed.
+        """
+        report = token_ledger.stats(top=top, dimensions=("model", "agent"))
+        report["user_usage"] = token_ledger.usage("user", str(current_user.id))
+        return report
+
+    @new_app.get("/a2a/metrics")
+    async def a2a_metrics():
+        """Agent-to-agent delegation metrics."""
+        return {
+            "local_delegation": local_agent_registry.stats(),
+            "agent_health": agent_health.stats(),
+            "hedging": hedge_budget.stats(),
+            "stickiness": await stickiness_store.stats(),
+            "agent_cards": agent_card_registry.stats(),
+            "agent_services": agent_services.stats(),
+            "speculation": speculation_stats.stats(),
+            "deadlines": deadline_stats.stats(),
+        }
+
+    @new_app.get("/.well-known/agents.json", include_in_schema=False)
+    async def well_known_agents(request: Request):
+        """Cards of every loaded agent, versioned; honors If-None-Match."""
+        headers = {"ETag": agent_card_registry.etag, "Cache-Control": "no-cache"}
+        if request.headers.get("if-none-match") == agent_card_registry.etag:
+            return Response(status_code=304, headers=headers)
+        return JSONResponse(agent_card_registry.document(), headers=headers)
+
     logger.info("FastAPI application created successfully")
     return new_app
 
@@ -0,0 +1,193 @@
+"""
+Admission control and load shedding for the MCP streaming endpoint.
+
+Each stream holds one global slot and one slot for its agent while its LLM call runs.
+When no slot is free, requests wait in a bounded queue; once the queue is full
+(or a request has waited too long) they are rejected immediately with 429
+(agent busy) or 503 (server busy) and a Retry-After hint, instead of piling up
+on the LLM provider and slowing every request down together.
+"""
+import asyncio
+import logging
+import math
+import os
+import time
+from collections import OrderedDict, defaultdict
+from typing import Any, Dict, Optional
+
+from apps.api.core.metrics import Histogram
+
+logger = logging.getLogger(__name__)
+
+# Tunables (environment variables)
+MCP_ADMISSION_ENABLED = os.environ.get("MCP_ADMISSION_ENABLED", "true").lower() == "true"
+MCP_MAX_CONCURRENT_STREAMS = int(os.environ.get("MCP_MAX_CONCURRENT_STREAMS", "32"))  # global
+MCP_MAX_CONCURRENT_STREAMS_PER_AGENT = int(os.environ.get("MCP_MAX_CONCURRENT_STREAMS_PER_AGENT", "8"))
+MCP_ADMISSION_MAX_QUEUE = int(os.environ.get("MCP_ADMISSION_MAX_QUEUE", "64"))  # waiters, global
+MCP_ADMISSION_MAX_QUEUE_PER_AGENT = int(os.environ.get("MCP_ADMISSION_MAX_QUEUE_PER_AGENT", "16"))
+MCP_ADMISSION_QUEUE_TIMEOUT_SECONDS = float(os.environ.get("MCP_ADMISSION_QUEUE_TIMEOUT_SECONDS", "10"))
+MCP_ADMISSION_RETRY_AFTER_SECONDS = float(os.environ.get("MCP_ADMISSION_RETRY_AFTER_SECONDS", "2"))
+# Per-agent slots are kept for at most this many agents; idle ones are evicted least recently used first
+MCP_ADMISSION_MAX_AGENTS = int(os.environ.get("MCP_ADMISSION_MAX_AGENTS", "256"))
+
+
+class AdmissionRejectedError(Exception):
+    """Raised when a stream cannot be admitted. Carries the HTTP status and Retry-After hint."""
+    def __init__(self, message: str, status_code: int, retry_after_seconds: int):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after_seconds = retry_after_seconds
+
+
+class AdmissionTicket:
+    """Slot held by an admitted stream. release() is idempotent."""
+
+    def __init__(self, controller: Optional["AdmissionController"], agent_id: str, queue_seconds: float = 0.0):
+        self._controller = controller
+        self.agent_id = agent_id
+        self.queue_seconds = queue_seconds
+        self._released = False
+
+    def release(self) -> None:
+        if self._released:
+            return
+        self._released = True
+        if self._controller is not None:
+            self._controller._release(self.agent_id)
+
+
+class AdmissionController:
+    """Global + per-agent concurrency limits with a bounded wait queue."""
+
+    def __init__(
+        self,
+        max_concurrent: int = MCP_MAX_CONCURRENT_STREAMS,
+        max_concurrent_per_agent: int = MCP_MAX_CONCURRENT_STREAMS_PER_AGENT,
+        max_queue: int = MCP_ADMISSION_MAX_QUEUE,
+        max_queue_per_agent: int = MCP_ADMISSION_MAX_QUEUE_PER_AGENT,
+        queue_timeout_seconds: float = MCP_ADMISSION_QUEUE_TIMEOUT_SECONDS,
+        retry_after_seconds: float = MCP_ADMISSION_RETRY_AFTER_SECONDS,
+        enabled: bool = MCP_ADMISSION_ENABLED,
+        max_agents: int = MCP_ADMISSION_MAX_AGENTS,
+    ):
+        self.max_concurrent = max(1, max_concurrent)
+        self.max_concurrent_per_agent = max(1, max_concurrent_per_agent)
+        self.max_queue = max(0, max_queue)
+        self.max_queue_per_agent = max(0, max_queue_per_agent)
+        self.queue_timeout_seconds = queue_timeout_seconds
+        self.retry_after_seconds = retry_after_seconds
+        self.enabled = enabled
+        self.max_agents = max(1, max_agents)
+
+        self._global_semaphore = asyncio.Semaphore(self.max_concurrent)
+        # agent_id comes from the URL, so the per-agent state is LRU-bounded
+        self._agent_semaphores: "OrderedDict[str, asyncio.Semaphore]" = OrderedDict()
+        self._in_flight: Dict[str, int] = defaultdict(int)
+        self._waiting: Dict[str, int] = defaultdict(int)
+        self._waiting_total = 0
+
+        # Metrics
+        self.admitted = 0
+        self.rejected_agent_busy = 0    # 429
+        self.rejected_server_busy = 0   # 503
+        self.queue_time = Histogram()
+
+    def _agent_semaphore(self, agent_id: str) -> asyncio.Semaphore:
+        semaphore = self._agent_semaphores.get(agent_id)
+        if semaphore is None:
+            self._evict_idle_agents(room_for=1)
+            semaphore = asyncio.Semaphore(self.max_concurrent_per_agent)
+            self._agent_semaphores[agent_id] = semaphore
+        self._agent_semaphores.move_to_end(agent_id)
+        return semaphore
+
+    def _evict_idle_agents(self, room_for: int = 0) -> None:
+        """Drops least recently used agents without in-flight or queued streams to stay within max_agents."""
+        excess = len(self._agent_semaphores) + room_for - self.max_agents
+        for agent_id in list(self._agent_semaphores):
+            if excess <= 0:
+                break
+            if self._in_flight.get(agent_id) or self._waiting.get(agent_id):
+                continue  # Busy agents keep their slots; the bound is restored once they are idle
+            del self._agent_semaphores[agent_id]
+            self._in_flight.pop(agent_id, None)
+            self._waiting.pop(agent_id, None)
+            excess -= 1
+
+    def _retry_after(self) -> int:
+        # Scale the hint with the backlog so retries spread out under sustained load
+        backlog_factor = 1 + self._waiting_total / max(1, self.max_concurrent)
+        return max(1, math.ceil(self.retry_after_seconds * backlog_factor))
+
+    def _reject(self, agent_id: str, status_code: int, reason: str) -> AdmissionRejectedError:
+        if status_code == 429:
+            self.rejected_agent_busy += 1
+        else:
+            self.rejected_server_busy += 1
+        logger.warning(f"MCP admission rejected stream for agent {agent_id} ({status_code}): {reason}")
+        return AdmissionRejectedError(reason, status_code=status_code, retry_after_seconds=self._retry_after())
+
+    async def _acquire_slots(self, agent_semaphore: asyncio.Semaphore) -> None:
+        await agent_semaphore.acquire()
+        try:
+            await self._global_semaphore.acquire()
+        except BaseException:
+            agent_semaphore.release()
+            raise
+
+    async def acquire(self, agent_id: str) -> AdmissionTicket:
+        """
+        Waits (bounded) for a slot for `agent_id`.
+
+        Raises:
+            AdmissionRejectedError: 429 if the agent's queue is full, 503 if the global
+                queue is full or the wait exceeded the queue timeout.
+        """
+        if not self.enabled:
+            return AdmissionTicket(None, agent_id)
+
+        agent_semaphore = self._agent_semaphore(agent_id)
+        if agent_semaphore.locked() or self._global_semaphore.locked():
+            if self._waiting[agent_id] >= self.max_queue_per_agent:
+                raise self._reject(agent_id, 429, f"Too many queued requests for agent {agent_id}.")
+            if self._waiting_total >= self.max_queue:
+                raise self._reject(agent_id, 503, "Server is at capacity.")
+
+        started = time.monotonic()
+        self._waiting[agent_id] += 1
+        self._waiting_total += 1
+        try:
+            await asyncio.wait_for(self._acquire_slots(agent_semaphore), timeout=self.queue_timeout_seconds)
+        except asyncio.TimeoutError:
+            raise self._reject(agent_id, 503, f"Timed out after {self.queue_timeout_seconds}s waiting for a stream slot.")
+        finally:
+            self._waiting[agent_id] -= 1
+            self._waiting_total -= 1
+
+        queue_seconds = time.monotonic() - started
+        self.queue_time.observe(queue_seconds)
+        self.admitted += 1
+        self._in_flight[agent_id] += 1
+        return AdmissionTicket(self, agent_id, queue_seconds)
+
+    def _release(self, agent_id: str) -> None:
+        self._in_flight[agent_id] -= 1
+        self._global_semaphore.release()
+        self._agent_semaphores[agent_id].release()  # Not evicted while it has streams in flight
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "in_flight": sum(self._in_flight.values()),
+            "in_flight_per_agent": {agent: count for agent, count in self._in_flight.items() if count},
+            "waiting": self._waiting_total,
+            "tracked_agents": len(self._agent_semaphores),
+            "admitted": self.admitted,
+            "rejected_429": self.rejected_agent_busy,
+            "rejected_503": self.rejected_server_busy,
+            "queue_time_seconds": self.queue_time.snapshot(),
+        }
+
+
+# Shared controller used by the MCP routes
+admission_controller = AdmissionController()
@@ -1,60 +1,85 @@
 import os
+import re
+import time
 import logging
 from pathlib import Path
 from typing import AsyncGenerator, List, Optional, Dict, Any
 
 from openai import AsyncOpenAI, OpenAIError # Assuming usage of OpenAI SDK
 from .mcp_models import LLMSettings, ChatMessage, SSEContentChunk, SSEError, SSEInfoMessage, SSEEndOfStream
+from .response_cache import response_cache, build_cache_key
+from apps.api.llm.single_flight import stream_single_flight, build_request_key, LLM_SINGLE_FLIGHT_ENABLED
+from apps.api.llm.token_accounting import token_ledger, current_usage_scope, LLMBudgetExceededError
+from apps.api.llm.client_factory import llm_client_factory
+from apps.api.llm.model_cascade import CascadePolicy, cascade_stats, parse_model_list, score_text_answer
 from ...core.config import settings # Import settings
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Initialize OpenAI client lazily
-_aclient = None
-
 def get_openai_client() -> AsyncOpenAI:
-    """Get or create the OpenAI client, validating the API key."""
-    global _aclient
-    if _aclient is None:
-        if not settings.OPENAI_API_KEY:
-            raise ValueError("OPENAI_API_KEY is not set in the environment or .env file. Please configure it.")
-        _aclient = AsyncOpenAI(api_key=settings.OPENAI_API_KEY)
-    return _aclient
+    """Get the shared OpenAI client (see llm.client_factory), validating the API key."""
+    if not settings.OPENAI_API_KEY:
+        raise ValueError("OPENAI_API_KEY is not set in the environment or .env file. Please configure it.")
+    return llm_client_factory.get_client(settings.OPENAI_API_KEY)
 
 class ContextFileNotFoundError(Exception):
     """Custom exception for when an agent's context file is not found."""
     pass
 
-async def extract_agent_metadata(agent_id: str) -> Dict[str, Any]:
+def parse_context_metadata(context: str) -> Dict[str, Any]:
     """
-    Extract metadata from an agent's context file.
+    Parses the HTML-comment front-matter of an agent's context markdown.
     Currently supports:
     - is_sticky: Whether the agent should maintain conversation continuity
     - sticky_duration: How long (in minutes) the agent should remain sticky
+    - response_cache: Whether identical queries may be answered from the response cache
+    - response_cache_ttl: Lifetime (in seconds) of cached answers for this agent
+    - model_cascade: Models to try in order, cheapest first (e.g. "gpt-4o-mini,gpt-4o")
+    - cascade_min_length: Minimum answer length (characters) accepted from a cheaper model
+    """
+    metadata = {}
+    
+    # Check for stickiness declaration
+    if "<!-- sticky: true -->" in context:
+        metadata["is_sticky"] = True
+        
+        # Check for duration
+        duration_match = re.search(r"<!-- sticky_duration: (\d+) -->", context)
+        if duration_match:
+            try:
+                metadata["sticky_duration"] = int(duration_match.group(1))
+            except ValueError:
+                metadata["sticky_duration"] = 30  # Default 30 minutes
+        else:
+            metadata["sticky_duration"] = 30  # Default 30 minutes
+    
+    # Check for response cache opt-in (only for agents whose answers are deterministic enough to reuse)
+    if "<!-- response_cache: true -->" in context:
+        metadata["response_cache"] = True
+        ttl_match = re.search(r"<!-- response_cache_ttl: (\d+) -->", context)
+        if ttl_match:
+            metadata["response_cache_ttl"] = int(ttl_match.group(1))
+    
+    # Check for a model cascade (cheap model first, escalate when its answer looks weak)
+    cascade_match = re.search(r"<!-- model_cascade: ([^>]+?) -->", context)
+    if cascade_match:
+        metadata["model_cascade"] = parse_model_list(cascade_match.group(1))
+        min_length_match = re.search(r"<!-- cascade_min_length: (\d+) -->", context)
+        if min_length_match:
+            metadata["cascade_min_length"] = int(min_length_match.group(1))
+    
+    return metadata
+
+async def extract_agent_metadata(agent_id: str) -> Dict[str, Any]:
+    """
+    Extract metadata from an agent's context file (see parse_context_metadata).
     Returns a dictionary of metadata values.
     """
     try:
         context = await _load_agent_context(agent_id)
-        metadata = {}
-        
-        # Check for stickiness declaration
-        if "<!-- sticky: true -->" in context:
-            metadata["is_sticky"] = True
-            
-            # Check for duration
-            import re
-            duration_match = re.search(r"<!-- sticky_duration: (\d+) -->", context)
-            if duration_match:
-                try:
-                    metadata["sticky_duration"] = int(duration_match.group(1))
-                except ValueError:
-                    metadata["sticky_duration"] = 30  # Default 30 minutes
-            else:
-                metadata["sticky_duration"] = 30  # Default 30 minutes
-        
-        return metadata
+        return parse_context_metadata(context)
     except Exception as e:
         logger.error(f"Error extracting metadata for agent {agent_id}: {e}")
         return {}
@@ -156,6 +181,38 @@ def _construct_prompt_messages(agent_id: str, agent_context: str, user_query: st
     
     return messages
 
+async def _stream_llm_content(effective_settings: LLMSettings, prompt_messages: List[Dict[str, str]],
+                              usage_scope: Optional[Dict[str, str]] = None) -> AsyncGenerator[str, None]:
+    """
+    Streams the content deltas of one OpenAI chat completion. Its tokens (tiktoken estimates,
+    including partial streams) are recorded against `usage_scope`.
+    """
+    # Get the OpenAI client when needed
+    aclient = get_openai_client()
+    started = time.perf_counter()
+    streamed_parts: List[str] = []
+    stream = await aclient.chat.completions.create(
+        model=effective_settings.model_name,
+        messages=prompt_messages,
+        temperature=effective_settings.temperature,
+        max_tokens=effective_settings.max_tokens,
+        stream=True
+    )
+    try:
+        async for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta and chunk.choices[0].delta.content:
+                streamed_parts.append(chunk.choices[0].delta.content)
+                yield chunk.choices[0].delta.content
+    finally:
+        # Closes the HTTP response promptly; on cancellation/aclose this aborts the OpenAI request
+        await stream.close()
+        token_ledger.record_estimate(effective_settings.model_name, prompt_messages, "".join(streamed_parts),
+                                     time.perf_counter() - started, scope=usage_scope)
+
+async def _replay_chunks(chunks: List[str]) -> AsyncGenerator[str, None]:
+    for chunk in chunks:
+        yield chunk
+
 async def process_query_stream(
     agent_id: str,
     user_query: str,
@@ -174,29 +231,88 @@ async def process_query_stream(
         agent_context = await _load_agent_context(agent_id)
         yield SSEInfoMessage(message=f"Context loaded. Processing query...").model_dump()
         
+        # Exact-match response cache (opt-in per agent via context front-matter). The key is built
+        # from the requested settings, so answers from a model the budget or cascade swapped in are not stored.
+        context_metadata = parse_context_metadata(agent_context)
+        cache_key = None
+        if response_cache.enabled and context_metadata.get("response_cache"):
+            cache_key = build_cache_key(agent_id, agent_context, user_query, effective_settings, conversation_history)
+            cached_chunks = response_cache.get(cache_key)
+            if cached_chunks is not None:
+                logger.info(f"Response cache hit for agent {agent_id} ({len(cached_chunks)} chunks).")
+                for content_chunk in cached_chunks:
+                    yield SSEContentChunk(chunk=content_chunk).model_dump()
+                yield SSEEndOfStream(message=f"Stream finished for agent {agent_id}").model_dump()
+                return
+        
+        # Token budgets: past the limit the request is downgraded to a cheaper model or rejected
+        usage_scope = {**current_usage_scope(), "agent": agent_id}
+        budgeted_model = token_ledger.enforce_budget(effective_settings.model_name, scope=usage_scope)
+        cascade = CascadePolicy.from_context_metadata(context_metadata)
+        if budgeted_model != effective_settings.model_name:
+            effective_settings = effective_settings.model_copy(update={"model_name": budgeted_model})
+            cascade = None  # The budget already picked the model
+            cache_key = None  # A downgraded answer must not be replayed to requests within budget
+
         prompt_messages = _construct_prompt_messages(agent_id, agent_context, user_query, conversation_history)
         
         # Log the messages for debugging (optional)
         # logger.debug(f"Prompt messages for agent {agent_id}: {prompt_messages}")
         logger.info(f"Prompt messages for OpenAI (agent {agent_id}): {prompt_messages}")
 
-        # Get the OpenAI client when needed
-        aclient = get_openai_client()
-        stream = await aclient.chat.completions.create(
-            model=effective_settings.model_name,
-            messages=prompt_messages,
-            temperature=effective_settings.temperature,
-            max_tokens=effective_settings.max_tokens,
-            stream=True
-        )
-        async for chunk in stream:
-            if chunk.choices and chunk.choices[0].delta and chunk.choices[0].delta.content:
-                content_chunk = chunk.choices[0].delta.content
+        # Model cascade: cheaper models answer in full first (not streamed) and are only
+        # relayed when their answer passes the length/hedging checks
+        accepted_chunks: Optional[List[str]] = None
+        if cascade is not None:
+            stages = cascade.stages
+            for model in stages[:-1]:
+                stage_settings = effective_settings.model_copy(update={"model_name": model})
+                stage_started = time.perf_counter()
+                stage_chunks = [chunk async for chunk in _stream_llm_content(stage_settings, prompt_messages, usage_scope)]
+                verdict = score_text_answer("".join(stage_chunks), cascade.min_length)
+                cascade_stats.record_stage(agent_id, model, verdict, time.perf_counter() - stage_started)
+                if verdict.accepted:
+                    accepted_chunks = stage_chunks
+                    cascade_stats.record_answer(agent_id, model)
+                    break
+                logger.info(f"Escalating answer for agent {agent_id} from {model} ({verdict.reason}).")
+            else:
+                effective_settings = effective_settings.model_copy(update={"model_name": stages[-1]})
+                cascade_stats.record_answer(agent_id, stages[-1])
+                cache_key = None  # Escalated answers are not stored under the cheap-first key
+
+        if accepted_chunks is not None:
+            chunk_source = _replay_chunks(accepted_chunks)
+        # Identical concurrent requests share one upstream stream when single-flight is enabled
+        elif LLM_SINGLE_FLIGHT_ENABLED:
+            request_key = build_request_key(effective_settings.model_name, prompt_messages,
+                                            effective_settings.temperature, effective_settings.max_tokens)
+            chunk_source = stream_single_flight.stream(
+                request_key, lambda: _stream_llm_content(effective_settings, prompt_messages, usage_scope)
+            )
+        else:
+            chunk_source = _stream_llm_content(effective_settings, prompt_messages, usage_scope)
+
+        streamed_chunks: List[str] = []
+        try:
+            async for content_chunk in chunk_source:
                 logger.info(f"OpenAI content chunk for agent {agent_id}: '{content_chunk}'")
+                streamed_chunks.append(content_chunk)
                 yield SSEContentChunk(chunk=content_chunk).model_dump()
+        finally:
+            # Propagates cancellation/aclose down to the OpenAI stream (or single-flight consumer)
+            await chunk_source.aclose()
+        
+        # Only complete, error-free answers are cached
+        if cache_key is not None and streamed_chunks:
+            response_cache.set(cache_key, streamed_chunks, ttl_seconds=context_metadata.get("response_cache_ttl"))
         
         yield SSEEndOfStream(message=f"Stream finished for agent {agent_id}").model_dump()
 
+    except LLMBudgetExceededError as e:
+        logger.warning(f"LLM budget exceeded for agent {agent_id}: {e}")
+        yield SSEError(code="LLM_BUDGET_EXCEEDED", message=str(e)).model_dump()
+        yield SSEEndOfStream(message=f"Stream ended due to exhausted LLM budget for agent {agent_id}").model_dump()
     except ContextFileNotFoundError as e:
         logger.error(f"ContextFileNotFoundError for agent {agent_id}: {e}")
         yield SSEError(code="CONTEXT_NOT_FOUND", message=str(e)).model_dump()
@@ -11,8 +11,10 @@ from fastapi import Depends
 from pydantic import BaseModel, Field
 from httpx_sse import aconnect_sse, ServerSentEvent # Import aconnect_sse and ServerSentEvent
 
+from .stream_replay import parse_event_id
 from .mcp_models import LLMSettings, ChatMessage, SSEContentChunk, SSEError, SSEInfoMessage, SSEEndOfStream # Ensure these match server-side
 from apps.api.core.config import Settings, settings as global_settings # Import Settings and global instance
+from apps.api.core.deadlines import DeadlineExceededError, check_deadline, bounded_timeout, deadline_headers
 
 # Configure logging
 logger = logging.getLogger(__name__)
@@ -47,6 +49,8 @@ class MCPClient:
                 f"MCPClient: API_BASE_URL env var not set. Defaulting to {self.api_base_url}."
             )
         self.timeout = 30.0  # Default timeout for MCP requests
+        # How many times a dropped stream is resumed (via Last-Event-ID) before giving up
+        self.max_resume_attempts = int(os.environ.get("MCP_CLIENT_RESUME_ATTEMPTS", "2"))
         self.logger = logging.getLogger(__name__)
 
     async def _get_client(self) -> httpx.AsyncClient:
@@ -92,48 +96,87 @@ class MCPClient:
         if conversation_history:
             payload["conversation_history"] = [msg.model_dump() for msg in conversation_history]
 
-        try:
-            async with await self._get_client() as client:
-                async with aconnect_sse(client, "POST", mcp_agent_stream_url, json=payload, timeout=60.0) as event_source:
-                    async for sse_event in event_source.aiter_sse():
-                        logger.info(f"MCPClient received SSE - Event: '{sse_event.event}', Data: '{sse_event.data}', ID: '{sse_event.id}'")
-                        
-                        if sse_event.event == "content":
-                            try:
-                                content_data = SSEContentChunk.model_validate_json(sse_event.data)
-                                yield content_data.chunk
-                            except json.JSONDecodeError:
-                                logger.error(f"MCPClient: JSONDecodeError parsing content data: {sse_event.data}")
-                            except Exception as e:
-                                logger.error(f"MCPClient: Error processing content event: {e}, data: {sse_event.data}")
-                        elif sse_event.event == "error":
-                            try:
-                                error_data = SSEError.model_validate_json(sse_event.data)
-                                logger.error(f"MCP Server signaled an error: {error_data.code} - {error_data.message}")
-                            except json.JSONDecodeError:
-                                logger.error(f"MCPClient: JSONDecodeError parsing error data: {sse_event.data}")
-                        elif sse_event.event == "info":
-                            try:
-                                info_data = SSEInfoMessage.model_validate_json(sse_event.data)
-                                logger.info(f"MCP Server info: {info_data.message}")
-                            except json.JSONDecodeError:
-                                logger.error(f"MCPClient: JSONDecodeError parsing info data: {sse_event.data}")
-                        elif sse_event.event == "eos":
-                            try:
-                                eos_data = SSEEndOfStream.model_validate_json(sse_event.data)
-                                logger.info(f"MCP Server EOS: {eos_data.message}")
-                            except json.JSONDecodeError:
-                                logger.error(f"MCPClient: JSONDecodeError parsing EOS data: {sse_event.data}")
-                            break
-                        else:
-                            if sse_event.event not in ["content", "error", "info", "eos"]:
-                               logger.warning(f"MCPClient received SSE with unexpected event type: '{sse_event.event}', Data: '{sse_event.data}'")
-        except httpx.ConnectError as e_conn:
-            raise MCPConnectionError(f"Connection Error to MCP at {mcp_agent_stream_url}: {e_conn}") from e_conn
-        except httpx.ReadTimeout as e_timeout:
-            raise MCPTimeoutError(f"Read Timeout from MCP at {mcp_agent_stream_url}: {e_timeout}") from e_timeout
-        except Exception as e_generic:
-            raise MCPError(f"Unexpected error querying MCP stream at {mcp_agent_stream_url}: {str(e_generic)}") from e_generic
+        # Resumption state: the last SSE id seen lets us reconnect with Last-Event-ID
+        # and only receive the events we missed if the connection drops mid-stream.
+        last_event_id: Optional[str] = None
+        resume_attempts = 0
+        # A resumed connection must continue the same stream; anything else would repeat the answer
+        resuming_stream_id: Optional[str] = None
+
+        while True:
+            # Neither the first connection nor a resume is attempted once the request's deadline has passed
+            try:
+                check_deadline(f"streaming from MCP agent {agent_id}", layer="mcp")
+            except DeadlineExceededError as e_deadline:
+                raise MCPTimeoutError(str(e_deadline)) from e_deadline
+            headers = {"Last-Event-ID": last_event_id} if last_event_id else {}
+            headers.update(deadline_headers())
+            try:
+                async with await self._get_client() as client:
+                    async with aconnect_sse(client, "POST", mcp_agent_stream_url, json=payload, headers=headers,
+                                            timeout=bounded_timeout(60.0)) as event_source:
+                        async for sse_event in event_source.aiter_sse():
+                            logger.info(f"MCPClient received SSE - Event: '{sse_event.event}', Data: '{sse_event.data}', ID: '{sse_event.id}'")
+                            if resuming_stream_id is not None:
+                                parsed_id = parse_event_id(sse_event.id)
+                                if sse_event.event == "error" or (parsed_id and parsed_id[0] != resuming_stream_id):
+                                    raise MCPError(f"Could not resume stream {resuming_stream_id} from {mcp_agent_stream_url}: "
+                                                   f"the server did not continue it ({sse_event.data}).")
+                                if parsed_id:
+                                    resuming_stream_id = None  # Continuation confirmed
+                            if sse_event.id:
+                                last_event_id = sse_event.id
+                            
+                            if sse_event.event == "content":
+                                try:
+                                    content_data = SSEContentChunk.model_validate_json(sse_event.data)
+                                    yield content_data.chunk
+                                except json.JSONDecodeError:
+                                    logger.error(f"MCPClient: JSONDecodeError parsing content data: {sse_event.data}")
+                                except Exception as e:
+                                    logger.error(f"MCPClient: Error processing content event: {e}, data: {sse_event.data}")
+                            elif sse_event.event == "error":
+                                try:
+                                    error_data = SSEError.model_validate_json(sse_event.data)
+                                    logger.error(f"MCP Server signaled an error: {error_data.code} - {error_data.message}")
+                                except json.JSONDecodeError:
+                                    logger.error(f"MCPClient: JSONDecodeError parsing error data: {sse_event.data}")
+                            elif sse_event.event == "info":
+                                try:
+                                    info_data = SSEInfoMessage.model_validate_json(sse_event.data)
+                                    logger.info(f"MCP Server info: {info_data.message}")
+                                except json.JSONDecodeError:
+                                    logger.error(f"MCPClient: JSONDecodeError parsing info data: {sse_event.data}")
+                            elif sse_event.event == "eos":
+                                try:
+                                    eos_data = SSEEndOfStream.model_validate_json(sse_event.data)
+                                    logger.info(f"MCP Server EOS: {eos_data.message}")
+                                except json.JSONDecodeError:
+                                    logger.error(f"MCPClient: JSONDecodeError parsing EOS data: {sse_event.data}")
+                                break
+                            else:
+                                if sse_event.event not in ["content", "error", "info", "eos"]:
+                                   logger.warning(f"MCPClient received SSE with unexpected event type: '{sse_event.event}', Data: '{sse_event.data}'")
+                return
+            except (httpx.RemoteProtocolError, httpx.ReadError) as e_dropped:
+                # Connection dropped mid-stream: resume from the last event we saw, if any.
+                if last_event_id and resume_attempts < self.max_resume_attempts:
+                    resume_attempts += 1
+                    resuming_stream_id = (parse_event_id(last_event_id) or (None,))[0]
+                    logger.warning(
+                        f"MCPClient: stream from {mcp_agent_stream_url} dropped ({e_dropped}); "
+                        f"resuming after event {last_event_id} (attempt {resume_attempts}/{self.max_resume_attempts})."
+                    )
+                    continue
+                raise MCPError(f"Unexpected error querying MCP stream at {mcp_agent_stream_url}: {str(e_dropped)}") from e_dropped
+            except MCPError:
+                raise
+            except httpx.ConnectError as e_conn:
+                raise MCPConnectionError(f"Connection Error to MCP at {mcp_agent_stream_url}: {e_conn}") from e_conn
+            except httpx.ReadTimeout as e_timeout:
+                raise MCPTimeoutError(f"Read Timeout from MCP at {mcp_agent_stream_url}: {e_timeout}") from e_timeout
+            except Exception as e_generic:
+                raise MCPError(f"Unexpected error querying MCP stream at {mcp_agent_stream_url}: {str(e_generic)}") from e_generic
 
     async def query_agent_aggregate(
         self,
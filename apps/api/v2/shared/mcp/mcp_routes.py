@@ -1,10 +1,15 @@
+import asyncio
 import json
 import logging
-from fastapi import APIRouter, HTTPException, Depends
+from typing import Optional
+from fastapi import APIRouter, HTTPException, Depends, Header
 from fastapi.responses import StreamingResponse
 
-from .mcp_models import MCPRequest, AgentIDPath # LLMSettings, ChatMessage are part of MCPRequest
+from .mcp_models import MCPRequest, AgentIDPath, LLMSettings # ChatMessage is part of MCPRequest
 from .llm_mcp import process_query_stream, ContextFileNotFoundError
+from .stream_replay import replay_registry, parse_event_id, StreamReplayBuffer, StreamReplayGapError
+from .response_cache import response_cache
+from .admission import admission_controller, AdmissionRejectedError, AdmissionTicket
 
 logger = logging.getLogger(__name__)
 
@@ -13,14 +18,19 @@ mcp_router = APIRouter(
 )
 
 async def sse_event_formatter(event_generator):
-    """Formats dictionaries from process_query_stream into SSE events."""
-    async for event_data in event_generator:
+    """
+    Formats (event_id, event_data) pairs into SSE events.
+    event_data is a dictionary from process_query_stream; event_id (may be None) is emitted
+    as the SSE `id:` field so clients can resume with Last-Event-ID.
+    """
+    async for event_id, event_data in event_generator:
         event_type = event_data.get("type", "message") # Default event type
         # Special handling for different data structures if needed, or assume model_dump() was called
         # For now, assume event_data is a dict ready for JSON serialization.
         try:
             json_data = json.dumps(event_data)
-            yield f"event: {event_type}\ndata: {json_data}\n\n"
+            id_line = f"id: {event_id}\n" if event_id else ""
+            yield f"{id_line}event: {event_type}\ndata: {json_data}\n\n"
         except TypeError as e:
             logger.error(f"Error serializing event data to JSON: {e}. Data: {event_data}")
             # Fallback or skip event
@@ -28,26 +38,103 @@ async def sse_event_formatter(event_generator):
             json_error_data = json.dumps(error_event)
             yield f"event: error\ndata: {json_error_data}\n\n"
 
+async def _produce_into_buffer(buffer: StreamReplayBuffer, event_generator, ticket: Optional[AdmissionTicket] = None) -> None:
+    """
+    Drains process_query_stream into the replay buffer. Runs as its own task so the
+    generation survives a dropped client connection and can be resumed.
+    The admission ticket (if any) is held until the generation finishes.
+    """
+    try:
+        async for event_data in event_generator:
+            await buffer.append(event_data)
+    except asyncio.CancelledError:
+        # Every reader disconnected and nobody resumed: stop the upstream LLM stream.
+        await event_generator.aclose()
+        await buffer.append({"type": "eos", "message": f"Stream aborted for agent {buffer.agent_id}: client disconnected."})
+        raise
+    except Exception as e:
+        logger.error(f"Error while producing stream {buffer.stream_id} for agent {buffer.agent_id}: {e}", exc_info=True)
+        await buffer.append({"type": "error", "code": "STREAM_PRODUCER_ERROR", "message": str(e)})
+        await buffer.append({"type": "eos", "message": f"Stream ended due to error for agent {buffer.agent_id}"})
+    finally:
+        if ticket is not None:
+            ticket.release()
+        await buffer.complete()
+
+async def _follow_buffer(buffer: StreamReplayBuffer, last_seq: int = -1):
+    """
+    Yields buffered/live events after last_seq; turns a replay gap into error + eos events.
+    When the client disconnects, Starlette cancels/closes this generator and the finally
+    block unsubscribes it, letting the registry abort the stream if nobody resumes it.
+    """
+    replay_registry.subscribe(buffer)
+    try:
+        async for event_id, event_data in buffer.events_after(last_seq):
+            yield event_id, event_data
+    except StreamReplayGapError as e:
+        logger.warning(str(e))
+        yield None, {"type": "error", "code": "STREAM_RESUME_GAP", "message": "Missed events are no longer available; please retry the query."}
+        yield None, {"type": "eos", "message": "Stream resume failed."}
+    finally:
+        replay_registry.unsubscribe(buffer)
+
+async def _resume_failed(message: str):
+    """Error + eos for a Last-Event-ID that can no longer be resumed; the client must retry the query."""
+    yield None, {"type": "error", "code": "STREAM_RESUME_EXPIRED", "message": message}
+    yield None, {"type": "eos", "message": "Stream resume failed."}
+
 @mcp_router.post("/stream/{agent_id}")
 async def stream_agent_response(
     path_params: AgentIDPath = Depends(), # Validates agent_id in path
-    request_data: MCPRequest = None # Body can be optional if defaults in MCPRequest are suitable, or make it non-optional
+    request_data: MCPRequest = None, # Body can be optional if defaults in MCPRequest are suitable, or make it non-optional
+    last_event_id: Optional[str] = Header(None, alias="Last-Event-ID") # Set by reconnecting clients
 ):
     """
     Streams responses from the specified agent using Server-Sent Events (SSE).
 
     - **agent_id**: The unique identifier for the agent.
     - **request_data**: JSON body containing the user query, optional LLM settings, and conversation history.
+    - **Last-Event-ID** (header): Resumes a dropped stream after the given event id. Missed events
+      are replayed from the stream's buffer and the live stream continues; the body may be omitted.
+      An unknown or expired stream is reported with a STREAM_RESUME_EXPIRED error event, never
+      restarted: the client already holds part of the answer.
     """
+    agent_id = path_params.agent_id
+
+    if last_event_id:
+        parsed_id = parse_event_id(last_event_id)
+        buffer = replay_registry.get(parsed_id[0]) if parsed_id else None
+        if buffer is not None and buffer.agent_id == agent_id:
+            logger.info(f"Resuming stream {buffer.stream_id} for agent {agent_id} after event {last_event_id}.")
+            return StreamingResponse(
+                sse_event_formatter(_follow_buffer(buffer, parsed_id[1])),
+                media_type="text/event-stream",
+                headers={"X-MCP-Stream-Id": buffer.stream_id}
+            )
+        logger.info(f"Cannot resume stream for Last-Event-ID '{last_event_id}' (unknown or expired).")
+        return StreamingResponse(
+            sse_event_formatter(_resume_failed("The stream can no longer be resumed; please retry the query.")),
+            media_type="text/event-stream"
+        )
+
     if request_data is None:
         # Handle cases where client might send an empty body if it's truly optional
         # Or raise HTTPException if body is required but Pydantic model allows None (not typical for POST)
         # For this example, let's assume request_data (and thus user_query) is essential.
         raise HTTPException(status_code=400, detail="Request body is required.")
 
-    agent_id = path_params.agent_id
     logger.info(f"Streaming request received for agent_id: {agent_id}, query: '{request_data.user_query[:50]}...'")
 
+    # Admission control: wait (bounded) for a global + per-agent slot, or shed load fast.
+    try:
+        ticket = await admission_controller.acquire(agent_id)
+    except AdmissionRejectedError as e:
+        raise HTTPException(
+            status_code=e.status_code,
+            detail=str(e),
+            headers={"Retry-After": str(e.retry_after_seconds)}
+        )
+
     try:
         event_generator = process_query_stream(
             agent_id=agent_id,
@@ -55,8 +142,16 @@ async def stream_agent_response(
             llm_settings=request_data.llm_settings,
             conversation_history=request_data.conversation_history
         )
-        return StreamingResponse(sse_event_formatter(event_generator), media_type="text/event-stream")
+        buffer = replay_registry.create(agent_id)
+        buffer.max_tokens = (request_data.llm_settings or LLMSettings()).max_tokens
+        buffer.producer_task = asyncio.create_task(_produce_into_buffer(buffer, event_generator, ticket))
+        return StreamingResponse(
+            sse_event_formatter(_follow_buffer(buffer)),
+            media_type="text/event-stream",
+            headers={"X-MCP-Stream-Id": buffer.stream_id}
+        )
     except ContextFileNotFoundError as e:
+        ticket.release()
         logger.warning(f"Context file not found for agent {agent_id} during route handling: {e}")
         # This specific error is now handled within process_query_stream and yields an SSEError event.
         # However, if _load_agent_context was NOT async and called directly here before process_query_stream,
@@ -78,6 +173,7 @@ async def stream_agent_response(
         return StreamingResponse(error_stream(), media_type="text/event-stream", status_code=200) # Or 404
 
     except Exception as e:
+        ticket.release()
         logger.error(f"Unexpected error in /stream/{agent_id} endpoint: {e}", exc_info=True)
         # Generic fallback for other unexpected errors before streaming starts
         # Again, process_query_stream is designed to catch its own errors and yield SSEError.
@@ -90,4 +186,13 @@ async def stream_agent_response(
             yield f"event: eos\ndata: {json_eos_data}\n\n"
         # For truly unexpected errors here, a 500 might be more appropriate.
         # However, to maintain SSE protocol, we stream an error.
-        return StreamingResponse(critical_error_stream(), media_type="text/event-stream", status_code=500) 
\ No newline at end of file
+        return StreamingResponse(critical_error_stream(), media_type="text/event-stream", status_code=500)
+
+@mcp_router.get("/metrics")
+async def get_mcp_metrics():
+    """Returns in-process MCP metrics: admission control, response cache, streams and aborts."""
+    return {
+        "admission": admission_controller.stats(),
+        "response_cache": response_cache.stats(),
+        "streams": replay_registry.stats(),
+    }
@@ -0,0 +1,173 @@
+"""
+WebSocket transport for MCP agent queries.
+
+One connection to /mcp/ws carries any number of concurrent agent queries. Frames are
+JSON objects tagged with a client-chosen query id:
+
+Client -> server:
+    {"type": "query", "id": "q1", "agent_id": "metrics_agent", "user_query": "...",
+     "llm_settings": {...}, "conversation_history": [...]}      # llm_settings/history optional
+    {"type": "cancel", "id": "q1"}
+
+Server -> client (same event payloads as the SSE endpoint, plus the query id):
+    {"id": "q1", "type": "info" | "content" | "error" | "eos", ...}
+
+Every query ends with exactly one "eos" frame. At most MCP_WS_SEND_QUEUE_SIZE stream
+frames wait per connection, so a slow reader applies backpressure to the LLM streams
+instead of growing server memory. Error, eos and other control frames skip that limit:
+the receive loop never waits on the client, so cancel frames are always read.
+"""
+import asyncio
+import logging
+import os
+from typing import Any, Dict
+
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect
+from pydantic import ValidationError
+
+from .mcp_models import MCPRequest
+from . import llm_mcp
+from .admission import admission_controller, AdmissionRejectedError
+
+logger = logging.getLogger(__name__)
+
+# Tunables (environment variables)
+MCP_WS_MAX_QUERIES_PER_CONNECTION = int(os.environ.get("MCP_WS_MAX_QUERIES_PER_CONNECTION", "16"))
+MCP_WS_SEND_QUEUE_SIZE = int(os.environ.get("MCP_WS_SEND_QUEUE_SIZE", "256"))  # stream frames buffered per connection
+
+mcp_ws_router = APIRouter(
+    tags=["MCP - Message Control Program"],
+)
+
+
+class MCPWebSocketSession:
+    """State of one multiplexed WebSocket connection."""
+
+    def __init__(self, websocket: WebSocket):
+        self.websocket = websocket
+        # (frame, holds_send_slot) in send order; stream frames are bounded by _send_slots
+        self.outbound: asyncio.Queue = asyncio.Queue()
+        self._send_slots = asyncio.Semaphore(MCP_WS_SEND_QUEUE_SIZE)
+        self.queries: Dict[str, asyncio.Task] = {}
+
+    async def send(self, query_id: str, event_data: Dict[str, Any]) -> None:
+        """Queues a stream frame; blocks when the client is not keeping up (backpressure)."""
+        await self._send_slots.acquire()
+        self.outbound.put_nowait(({"id": query_id, **event_data}, True))
+
+    def send_control(self, query_id: str, event_data: Dict[str, Any]) -> None:
+        """Queues an error/eos frame without waiting, behind the frames already queued."""
+        self.outbound.put_nowait(({"id": query_id, **event_data}, False))
+
+    def send_error(self, query_id: str, code: str, message: str, **extra: Any) -> None:
+        self.send_control(query_id, {"type": "error", "code": code, "message": message, **extra})
+        self.send_control(query_id, {"type": "eos", "message": f"Query {query_id} ended due to error."})
+
+    async def sender_loop(self) -> None:
+        while True:
+            frame, holds_send_slot = await self.outbound.get()
+            try:
+                await self.websocket.send_json(frame)
+            finally:
+                if holds_send_slot:
+                    self._send_slots.release()
+
+    async def run_query(self, query_id: str, agent_id: str, request: MCPRequest) -> None:
+        """Streams one agent query into the outbound queue, under the MCP admission limits."""
+        ticket = None
+        event_generator = None
+        try:
+            try:
+                ticket = await admission_controller.acquire(agent_id)
+            except AdmissionRejectedError as e:
+                self.send_error(query_id, "ADMISSION_REJECTED", str(e),
+                                status_code=e.status_code, retry_after=e.retry_after_seconds)
+                return
+
+            event_generator = llm_mcp.process_query_stream(
+                agent_id=agent_id,
+                user_query=request.user_query,
+                llm_settings=request.llm_settings,
+                conversation_history=request.conversation_history
+            )
+            async for event_data in event_generator:
+                await self.send(query_id, event_data)
+        except asyncio.CancelledError:
+            # Cancelled by the client (or the connection closed), possibly while still queued
+            # for admission: abort the upstream stream if it was started.
+            if event_generator is not None:
+                await event_generator.aclose()
+            self.send_control(query_id, {"type": "eos", "message": f"Query {query_id} cancelled."})
+            raise
+        finally:
+            if ticket is not None:
+                ticket.release()
+            self.queries.pop(query_id, None)
+
+    def handle_frame(self, frame: Dict[str, Any]) -> None:
+        """Acts on one client frame without waiting on the client, so the receive loop keeps reading."""
+        frame_type = frame.get("type")
+        query_id = frame.get("id")
+        if not isinstance(query_id, str) or not query_id:
+            self.send_error("", "INVALID_FRAME", "Every frame needs a non-empty string 'id'.")
+            return
+
+        if frame_type == "cancel":
+            task = self.queries.get(query_id)
+            if task is not None:
+                task.cancel()
+            return
+
+        if frame_type != "query":
+            self.send_error(query_id, "INVALID_FRAME", f"Unknown frame type: {frame_type!r}.")
+            return
+        if query_id in self.queries:
+            self.send_error(query_id, "DUPLICATE_QUERY_ID", f"Query {query_id} is already running.")
+            return
+        if len(self.queries) >= MCP_WS_MAX_QUERIES_PER_CONNECTION:
+            self.send_error(query_id, "TOO_MANY_QUERIES",
+                            f"At most {MCP_WS_MAX_QUERIES_PER_CONNECTION} concurrent queries per connection.")
+            return
+
+        agent_id = frame.get("agent_id")
+        try:
+            request = MCPRequest.model_validate(frame)
+        except ValidationError as e:
+            self.send_error(query_id, "INVALID_QUERY", str(e))
+            return
+        if not isinstance(agent_id, str) or not agent_id:
+            self.send_error(query_id, "INVALID_QUERY", "'agent_id' is required.")
+            return
+
+        self.queries[query_id] = asyncio.create_task(self.run_query(query_id, agent_id, request))
+
+    async def close(self) -> None:
+        tasks = list(self.queries.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+@mcp_ws_router.websocket("/ws")
+async def mcp_websocket(websocket: WebSocket):
+    """Multiplexed MCP agent queries over a single WebSocket (see module docstring for framing)."""
+    await websocket.accept()
+    session = MCPWebSocketSession(websocket)
+    sender = asyncio.create_task(session.sender_loop())
+    try:
+        while True:
+            try:
+                frame = await websocket.receive_json()
+            except ValueError:
+                session.send_error("", "INVALID_FRAME", "Frames must be JSON objects.")
+                continue
+            if not isinstance(frame, dict):
+                session.send_error("", "INVALID_FRAME", "Frames must be JSON objects.")
+                continue
+            session.handle_frame(frame)
+    except WebSocketDisconnect:
+        logger.info(f"MCP WebSocket disconnected with {len(session.queries)} queries in flight.")
+    finally:
+        await session.close()
+        sender.cancel()
+        await asyncio.gather(sender, return_exceptions=True)
@@ -0,0 +1,124 @@
+"""
+Exact-match response cache for MCP agent queries.
+
+Agents whose context file opts in with `<!-- response_cache: true -->` have their
+completed answers cached, keyed by (agent_id, context version, normalized user_query,
+LLMSettings, conversation history hash). A cache hit is replayed by process_query_stream
+as an ordinary SSE stream (same chunking), so clients cannot tell the difference.
+Entries expire after a TTL and the cache is bounded with LRU eviction.
+"""
+import hashlib
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Tunables (environment variables)
+MCP_RESPONSE_CACHE_ENABLED = os.environ.get("MCP_RESPONSE_CACHE_ENABLED", "true").lower() == "true"  # global kill switch
+MCP_RESPONSE_CACHE_MAX_ENTRIES = int(os.environ.get("MCP_RESPONSE_CACHE_MAX_ENTRIES", "256"))
+MCP_RESPONSE_CACHE_TTL_SECONDS = float(os.environ.get("MCP_RESPONSE_CACHE_TTL_SECONDS", "300"))
+
+
+def _sha256(value: str) -> str:
+    return hashlib.sha256(value.encode("utf-8")).hexdigest()
+
+
+def context_version(agent_context: str) -> str:
+    """Version of an agent context: any edit to the markdown invalidates its cached answers."""
+    return _sha256(agent_context)[:16]
+
+
+def normalize_query(user_query: str) -> str:
+    """Case- and whitespace-insensitive form of a query used for exact matching."""
+    return " ".join(user_query.split()).casefold()
+
+
+def build_cache_key(
+    agent_id: str,
+    agent_context: str,
+    user_query: str,
+    llm_settings: Any,
+    conversation_history: Optional[List[Any]] = None,
+) -> str:
+    """
+    Builds the cache key for a query. llm_settings and history items are pydantic models
+    (LLMSettings / ChatMessage) and are hashed through model_dump().
+    """
+    settings_dump = llm_settings.model_dump() if hasattr(llm_settings, "model_dump") else llm_settings
+    history_dump = [
+        msg.model_dump() if hasattr(msg, "model_dump") else msg
+        for msg in (conversation_history or [])
+    ]
+    history_hash = _sha256(json.dumps(history_dump, sort_keys=True, default=str))
+    key_material = json.dumps(
+        [agent_id, context_version(agent_context), normalize_query(user_query), settings_dump, history_hash],
+        sort_keys=True,
+        default=str,
+    )
+    return _sha256(key_material)
+
+
+class MCPResponseCache:
+    """In-memory LRU cache of completed agent responses (stored as the list of streamed chunks)."""
+
+    def __init__(
+        self,
+        max_entries: int = MCP_RESPONSE_CACHE_MAX_ENTRIES,
+        default_ttl_seconds: float = MCP_RESPONSE_CACHE_TTL_SECONDS,
+        enabled: bool = MCP_RESPONSE_CACHE_ENABLED,
+    ):
+        self.max_entries = max(1, max_entries)
+        self.default_ttl_seconds = default_ttl_seconds
+        self.enabled = enabled
+        self._entries: "OrderedDict[str, Tuple[float, List[str]]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str) -> Optional[List[str]]:
+        """Returns the cached chunks for `key`, or None on a miss or expired entry."""
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        expires_at, chunks = entry
+        if time.monotonic() >= expires_at:
+            del self._entries[key]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return list(chunks)
+
+    def set(self, key: str, chunks: List[str], ttl_seconds: Optional[float] = None) -> None:
+        """Stores the chunks of a completed response, evicting least recently used entries."""
+        ttl = self.default_ttl_seconds if ttl_seconds is None else ttl_seconds
+        if ttl <= 0:
+            return
+        self._entries[key] = (time.monotonic() + ttl, list(chunks))
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+# Shared cache used by llm_mcp.process_query_stream
+response_cache = MCPResponseCache()
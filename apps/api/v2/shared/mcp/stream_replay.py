@@ -0,0 +1,232 @@
+"""
+Replay buffers for resumable MCP SSE streams.
+
+Every stream produced by the /mcp/stream/{agent_id} endpoint gets a stream id and
+each SSE event it emits is tagged with an id of the form "<stream_id>:<seq>".
+The events are kept in a bounded ring buffer per stream, for a short TTL after the
+stream completes, so that a client whose connection dropped can reconnect with a
+Last-Event-ID header and receive only the events it missed (and then keep following
+the live stream) instead of paying for a brand new LLM generation.
+"""
+import asyncio
+import logging
+import os
+import time
+import uuid
+from collections import OrderedDict, deque
+from typing import Any, AsyncGenerator, Deque, Dict, Optional, Set, Tuple
+
+from apps.api.llm.resilience import count_text_tokens
+
+logger = logging.getLogger(__name__)
+
+# Tunables (environment variables, same style as AGENT_DELEGATION_RETRIES)
+MCP_STREAM_REPLAY_BUFFER_SIZE = int(os.environ.get("MCP_STREAM_REPLAY_BUFFER_SIZE", "512"))  # events kept per stream
+MCP_STREAM_REPLAY_TTL_SECONDS = float(os.environ.get("MCP_STREAM_REPLAY_TTL_SECONDS", "60"))  # retention after completion
+MCP_STREAM_REPLAY_MAX_STREAMS = int(os.environ.get("MCP_STREAM_REPLAY_MAX_STREAMS", "1000"))  # buffers kept in memory
+# How long a stream with no connected reader keeps generating (waiting for a Last-Event-ID resume) before it is aborted
+MCP_STREAM_ABANDON_GRACE_SECONDS = float(os.environ.get("MCP_STREAM_ABANDON_GRACE_SECONDS", "2"))
+
+
+class StreamReplayGapError(Exception):
+    """Raised when the events requested for replay have already been evicted from the ring buffer."""
+    pass
+
+
+def format_event_id(stream_id: str, seq: int) -> str:
+    """Builds the SSE event id for the event at position `seq` of a stream."""
+    return f"{stream_id}:{seq}"
+
+
+def parse_event_id(event_id: Optional[str]) -> Optional[Tuple[str, int]]:
+    """
+    Parses a Last-Event-ID value of the form "<stream_id>:<seq>".
+    Returns (stream_id, seq) or None if the value is missing or malformed.
+    """
+    if not event_id:
+        return None
+    stream_id, sep, seq_str = event_id.strip().rpartition(":")
+    if not sep or not stream_id:
+        return None
+    try:
+        return stream_id, int(seq_str)
+    except ValueError:
+        return None
+
+
+class StreamReplayBuffer:
+    """
+    Bounded ring buffer holding the SSE events of a single MCP stream.
+    One producer appends events; any number of readers can follow the stream
+    from an arbitrary position (live or replayed).
+    """
+
+    def __init__(self, stream_id: str, agent_id: str, max_events: int = MCP_STREAM_REPLAY_BUFFER_SIZE):
+        self.stream_id = stream_id
+        self.agent_id = agent_id
+        self.created_at = time.monotonic()
+        self.completed_at: Optional[float] = None
+        self.producer_task: Optional[asyncio.Task] = None  # Keeps a reference to the generating task
+        self.max_tokens: Optional[int] = None  # LLM max_tokens of the generation, bounds the savings of an abort
+        self.subscribers = 0  # Connected readers
+        self.content_chunks = 0
+        self.content_tokens = 0  # Tokens streamed so far (tiktoken)
+        self.aborted = False
+        self._events: Deque[Tuple[int, Dict[str, Any]]] = deque(maxlen=max(1, max_events))
+        self._next_seq = 0
+        self._condition = asyncio.Condition()
+
+    @property
+    def is_complete(self) -> bool:
+        return self.completed_at is not None
+
+    async def append(self, event_data: Dict[str, Any]) -> str:
+        """Appends an event to the buffer and wakes up readers. Returns the event id."""
+        async with self._condition:
+            seq = self._next_seq
+            self._next_seq += 1
+            self._events.append((seq, event_data))
+            if event_data.get("type") == "content":
+                self.content_chunks += 1
+                self.content_tokens += count_text_tokens(event_data.get("chunk") or "")
+            self._condition.notify_all()
+        return format_event_id(self.stream_id, seq)
+
+    async def complete(self) -> None:
+        """Marks the stream as finished; readers drain what is buffered and stop."""
+        async with self._condition:
+            if self.completed_at is None:
+                self.completed_at = time.monotonic()
+            self._condition.notify_all()
+
+    async def events_after(self, last_seq: int = -1) -> AsyncGenerator[Tuple[str, Dict[str, Any]], None]:
+        """
+        Yields (event_id, event_data) for every event with a sequence number greater
+        than `last_seq`, first from the buffer and then live until the stream completes.
+
+        Raises:
+            StreamReplayGapError: If some of the requested events were already evicted.
+        """
+        cursor = last_seq
+        while True:
+            async with self._condition:
+                if self._events and self._events[0][0] > cursor + 1:
+                    raise StreamReplayGapError(
+                        f"Stream {self.stream_id}: events after seq {cursor} are no longer buffered "
+                        f"(oldest retained seq is {self._events[0][0]})."
+                    )
+                pending = [(seq, data) for seq, data in self._events if seq > cursor]
+                if not pending:
+                    if self.is_complete:
+                        return
+                    await self._condition.wait()
+                    continue
+            for seq, data in pending:
+                cursor = seq
+                yield format_event_id(self.stream_id, seq), data
+
+
+class StreamReplayRegistry:
+    """
+    Process-local registry of replay buffers, keyed by stream id.
+    Completed buffers expire after `ttl_seconds`; the number of buffers is capped
+    at `max_streams` (oldest buffers are evicted first, completed ones preferred).
+
+    The registry also tracks readers: when the last reader of a running stream goes
+    away (client disconnected) and nobody resumes it within `abandon_grace_seconds`,
+    the producer task is cancelled so the upstream LLM request is aborted.
+    """
+
+    def __init__(
+        self,
+        max_events: int = MCP_STREAM_REPLAY_BUFFER_SIZE,
+        ttl_seconds: float = MCP_STREAM_REPLAY_TTL_SECONDS,
+        max_streams: int = MCP_STREAM_REPLAY_MAX_STREAMS,
+        abandon_grace_seconds: float = MCP_STREAM_ABANDON_GRACE_SECONDS,
+    ):
+        self.max_events = max_events
+        self.ttl_seconds = ttl_seconds
+        self.max_streams = max(1, max_streams)
+        self.abandon_grace_seconds = abandon_grace_seconds
+        self._buffers: "OrderedDict[str, StreamReplayBuffer]" = OrderedDict()
+        self._abandon_checks: Set[asyncio.Task] = set()
+
+        # Metrics
+        self.aborted_streams = 0
+        self.saved_tokens_upper_bound = 0  # max_tokens minus what was streamed; generations often end sooner
+
+    def __len__(self) -> int:
+        return len(self._buffers)
+
+    def _is_expired(self, buffer: StreamReplayBuffer, now: float) -> bool:
+        return buffer.completed_at is not None and now - buffer.completed_at > self.ttl_seconds
+
+    def _sweep(self) -> None:
+        now = time.monotonic()
+        for stream_id in [sid for sid, buf in self._buffers.items() if self._is_expired(buf, now)]:
+            del self._buffers[stream_id]
+
+        while len(self._buffers) >= self.max_streams:
+            # Prefer evicting a completed stream; fall back to the oldest one.
+            victim = next((sid for sid, buf in self._buffers.items() if buf.is_complete), None)
+            if victim is None:
+                victim = next(iter(self._buffers))
+            logger.warning(f"Stream replay registry full ({self.max_streams}); evicting stream {victim}.")
+            del self._buffers[victim]
+
+    def create(self, agent_id: str) -> StreamReplayBuffer:
+        """Registers a new buffer for a stream about to start."""
+        self._sweep()
+        buffer = StreamReplayBuffer(stream_id=uuid.uuid4().hex, agent_id=agent_id, max_events=self.max_events)
+        self._buffers[buffer.stream_id] = buffer
+        return buffer
+
+    def get(self, stream_id: str) -> Optional[StreamReplayBuffer]:
+        """Returns the buffer for `stream_id`, or None if unknown or expired."""
+        buffer = self._buffers.get(stream_id)
+        if buffer is not None and self._is_expired(buffer, time.monotonic()):
+            del self._buffers[stream_id]
+            return None
+        return buffer
+
+    def subscribe(self, buffer: StreamReplayBuffer) -> None:
+        """Registers a connected reader of `buffer`."""
+        buffer.subscribers += 1
+
+    def unsubscribe(self, buffer: StreamReplayBuffer) -> None:
+        """
+        Unregisters a reader. If the stream is still running and has no readers left,
+        schedules an abort after the grace period (unless a client resumes it first).
+        """
+        buffer.subscribers = max(0, buffer.subscribers - 1)
+        if buffer.subscribers == 0 and not buffer.is_complete and buffer.producer_task is not None:
+            check = asyncio.create_task(self._abort_if_abandoned(buffer))
+            self._abandon_checks.add(check)
+            check.add_done_callback(self._abandon_checks.discard)
+
+    async def _abort_if_abandoned(self, buffer: StreamReplayBuffer) -> None:
+        if self.abandon_grace_seconds > 0:
+            await asyncio.sleep(self.abandon_grace_seconds)
+        producer = buffer.producer_task
+        if buffer.subscribers > 0 or buffer.is_complete or producer is None or producer.done():
+            return
+        buffer.aborted = True
+        producer.cancel()
+        self.aborted_streams += 1
+        saved_tokens = max(0, (buffer.max_tokens or 0) - buffer.content_tokens)
+        self.saved_tokens_upper_bound += saved_tokens
+        logger.info(
+            f"Aborted abandoned stream {buffer.stream_id} for agent {buffer.agent_id} after "
+            f"{buffer.content_tokens} tokens (up to {saved_tokens} tokens saved)."
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "streams": len(self._buffers),
+            "aborted_streams": self.aborted_streams,
+            "saved_tokens_upper_bound": self.saved_tokens_upper_bound,
+        }
+
+
+# Shared registry used by the MCP routes
+replay_registry = StreamReplayRegistry()
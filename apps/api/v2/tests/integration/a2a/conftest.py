@@ -0,0 +1,49 @@
+import pytest
+from datetime import datetime, timezone
+from typing import Optional
+from unittest.mock import AsyncMock, MagicMock
+
+import httpx
+
+from apps.api.a2a_protocol.types import AgentCard, Message, Task, TaskState, TaskStatus, TextPart
+from apps.api.a2a_protocol.unified_agent_service import A2AUnifiedAgentService
+
+class CallerService(A2AUnifiedAgentService):
+    """Minimal agent that delegates every task it receives to business/metrics."""
+    agent_name = "caller"
+    department_name = "system"
+
+    async def get_agent_card(self) -> AgentCard:
+        raise NotImplementedError
+
+    async def execute_agent_task(self, message, task_id, session_id=None) -> str:
+        return await self.delegate_to_agent("business/metrics", message.parts[0].root.text, task_id, session_id)
+
+def build_task(state: TaskState, text: str) -> Task:
+    now = datetime.now(timezone.utc).isoformat()
+    return Task(
+        id="sub-task",
+        status=TaskStatus(state=state, timestamp=now),
+        request_message=Message(role="user", parts=[TextPart(text="q")]),
+        response_message=Message(role="agent", parts=[TextPart(text=text)]),
+        created_at=now,
+        updated_at=now,
+    )
+
+@pytest.fixture
+def task_in_state():
+    """Builds the Task a delegated agent answers with: task_in_state(TaskState.COMPLETED, "text")."""
+    return build_task
+
+@pytest.fixture
+def completed_task():
+    return lambda text: build_task(TaskState.COMPLETED, text)
+
+@pytest.fixture
+def make_caller():
+    """Builds a CallerService whose HTTP client answers delegations with `post`."""
+    def make(post: Optional[AsyncMock] = None, task_store=None, **service_kwargs) -> CallerService:
+        http_client = MagicMock(spec=httpx.AsyncClient)
+        http_client.post = post or AsyncMock()
+        return CallerService(task_store=task_store or MagicMock(), http_client=http_client, **service_kwargs)
+    return make
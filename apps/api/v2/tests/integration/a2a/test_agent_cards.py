@@ -0,0 +1,71 @@
+import pytest
+from types import ModuleType
+from unittest.mock import AsyncMock, MagicMock
+
+from apps.api.a2a_protocol import unified_agent_service
+from apps.api.a2a_protocol.agent_cards import AgentCardRegistry, card_from_service_class
+from apps.api.a2a_protocol.types import AgentCard
+from apps.api.a2a_protocol.unified_agent_service import A2AUnifiedAgentService
+
+class ReportsService(A2AUnifiedAgentService):
+    agent_id = "reports-agent-v1"
+    agent_name = "reports"
+    display_name = "Reports Agent"
+    agent_description = "Builds reports."
+    department_name = "business"
+    primary_capability_name = "reporting"
+    is_idempotent = True
+
+    async def get_agent_card(self) -> AgentCard:
+        raise NotImplementedError
+
+    async def execute_agent_task(self, message, task_id, session_id=None) -> str:
+        return ""
+
+class RouterService(ReportsService):
+    agent_name = "router"
+    department_name = "system"
+
+def module_with(*classes) -> ModuleType:
+    module = ModuleType("agent_module")
+    for cls in classes:
+        setattr(module, cls.__name__, cls)
+    return module
+
+def test_cards_are_built_from_service_class_attributes():
+    card = card_from_service_class(ReportsService, "business/reports")
+    assert card["name"] == "reports" and card["display_name"] == "Reports Agent"
+    assert card["capabilities"] == ["reporting"] and card["is_idempotent"] and not card["is_sticky"]
+    assert card["path"] == "business/reports" and card["agent_id_stable"] == "reports-agent-v1"
+
+def test_version_and_etag_change_only_when_cards_change():
+    registry = AgentCardRegistry()
+    registry.register_module("/business/reports/", module_with(A2AUnifiedAgentService, ReportsService))
+    version, etag = registry.version, registry.etag
+
+    registry.register_module("business/reports", module_with(ReportsService))
+    assert (registry.version, registry.etag) == (version, etag)
+
+    registry.register_module("external/competitors", ModuleType("static_card_only"), delegable=False)
+    assert registry.version == version + 1 and registry.etag != etag
+    assert registry.get("external/competitors")["name"] == "competitors"
+    assert [card["path"] for card in registry.agents()] == ["business/reports"]
+    assert registry.document()["version"] == registry.version
+
+@pytest.mark.asyncio
+async def test_services_discover_agents_from_the_registry_without_http(monkeypatch):
+    registry = AgentCardRegistry()
+    monkeypatch.setattr(unified_agent_service, "agent_card_registry", registry)
+    registry.register_module("business/reports", module_with(ReportsService))
+    registry.register_module("system/router", module_with(RouterService))
+    http_client = MagicMock()
+    http_client.get = AsyncMock()
+    service = RouterService(task_store=MagicMock(), http_client=http_client)
+
+    await service.ensure_agents_discovered()
+    assert [agent["path"] for agent in service.available_agents] == ["business/reports"]  # Not itself
+    http_client.get.assert_not_awaited()
+
+    registry.register(card_from_service_class(ReportsService, "business/reports_v2"))
+    await service.ensure_agents_discovered()
+    assert [agent["path"] for agent in service.available_agents] == ["business/reports", "business/reports_v2"]
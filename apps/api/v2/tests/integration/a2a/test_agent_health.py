@@ -0,0 +1,98 @@
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+
+import httpx
+
+from apps.api.a2a_protocol import unified_agent_service
+from apps.api.a2a_protocol.agent_health import AgentHealth, AgentHealthRegistry
+from apps.api.a2a_protocol.agent_registry import LocalAgentRegistry
+from apps.api.a2a_protocol.types import TaskState
+from apps.api.llm.resilience import CircuitBreaker
+
+@pytest.fixture
+def health(monkeypatch):
+    health = AgentHealthRegistry()
+    monkeypatch.setattr(unified_agent_service, "agent_health", health)
+    monkeypatch.setattr(unified_agent_service, "local_agent_registry", LocalAgentRegistry())
+    monkeypatch.setenv("API_BASE_URL", "http://test")
+    monkeypatch.setenv("AGENT_DELEGATION_RETRY_DELAY_SECONDS", "0")
+    return health
+
+def test_agent_health_tracks_ewma_and_percentiles():
+    health = AgentHealth("business/metrics", failure_threshold=2, alpha=0.5)
+    for seconds in (1.0, 2.0, 3.0, 4.0):
+        health.record_success(seconds)
+    health.record_failure("boom")
+
+    assert health.ewma_latency_seconds == pytest.approx(3.125)
+    assert health.ewma_error_rate == pytest.approx(0.5)
+    assert health.latency_percentile(0.95) == 4.0 and health.latency_percentile(0.5) == 2.0
+    assert health.available
+    health.record_failure("boom")
+    assert not health.available and health.stats()["state"] == CircuitBreaker.OPEN
+
+@pytest.mark.asyncio
+async def test_open_breaker_stops_retries_and_fails_fast(health, monkeypatch, make_caller):
+    monkeypatch.setenv("AGENT_DELEGATION_RETRIES", "5")
+    post = AsyncMock(side_effect=httpx.ConnectError("refused"))
+    caller = make_caller(post)
+
+    first = await caller.delegate_to_agent("business/metrics", "q", "task-1", None)
+    assert "temporarily unavailable" in first
+    assert post.await_count == 3  # Stopped at the breaker's failure threshold, not after 6 attempts
+
+    second = await caller.delegate_to_agent("business/metrics", "q", "task-2", None)
+    assert "temporarily unavailable" in second and "try again in about" in second
+    assert post.await_count == 3  # No call at all while open
+    assert not health.is_available("business/metrics")
+    assert health.stats()["agents"]["business/metrics"]["failures"] == 3
+
+@pytest.mark.asyncio
+async def test_failed_in_process_tasks_count_against_the_agent(health, make_caller, task_in_state):
+    registry = unified_agent_service.local_agent_registry
+    target = MagicMock(handle_task_send=AsyncMock(return_value=task_in_state(TaskState.FAILED, "It broke.")))
+
+    async def provider():
+        return target
+
+    registry.register("business/metrics", provider)
+    caller = make_caller(AsyncMock())
+
+    assert await caller.delegate_to_agent("business/metrics", "q", "task-1", None) == "It broke."
+    stats = health.get("business/metrics").stats()
+    assert stats["failures"] == 1 and stats["successes"] == 0 and stats["last_error"].startswith("task failed")
+
+def test_routable_skips_agents_with_open_breakers():
+    health = AgentHealthRegistry()
+    agents = [{"name": "metrics", "path": "business/metrics"}, {"name": "jokes", "path": "specialists/jokes"}]
+    for _ in range(health.get("business/metrics").breaker.failure_threshold):
+        health.get("business/metrics").record_failure("down")
+
+    assert health.routable(agents) == [agents[1]]
+    health.get("specialists/jokes").breaker._state = CircuitBreaker.OPEN
+    health.get("specialists/jokes").breaker._opened_at = float("inf")
+    assert health.routable(agents) == agents  # With every agent down, routing still sees them all
+
+@pytest.mark.asyncio
+async def test_probes_move_the_breaker_without_touching_delegation_stats():
+    health = AgentHealthRegistry()
+    agent = health.get("business/metrics")
+    agent.breaker.recovery_timeout_seconds = 0
+    for _ in range(agent.breaker.failure_threshold):
+        agent.record_failure("down")
+    http_client = MagicMock(spec=httpx.AsyncClient)
+    http_client.get = AsyncMock(return_value=httpx.Response(200, json={}, request=httpx.Request("GET", "http://test")))
+
+    assert agent.breaker.state == CircuitBreaker.HALF_OPEN
+    assert await health.probe(http_client, "http://test/", "business/metrics")
+    assert agent.breaker.state == CircuitBreaker.CLOSED and agent.last_probe_ok
+    assert http_client.get.await_args.args[0] == "http://test/agents/business/metrics/.well-known/agent.json"
+    before = agent.stats()
+
+    http_client.get = AsyncMock(side_effect=httpx.ConnectError("refused"))
+    assert not await health.probe(http_client, "http://test/", "business/metrics")
+    after = agent.stats()
+    assert after["consecutive_failures"] == 1 and not agent.last_probe_ok
+    for key in ("successes", "failures", "ewma_latency_seconds", "ewma_error_rate", "p95_latency_seconds"):
+        assert after[key] == before[key], key
+    assert agent.latency_samples == 0
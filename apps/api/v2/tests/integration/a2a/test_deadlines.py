@@ -0,0 +1,113 @@
+import asyncio
+import pytest
+from unittest.mock import AsyncMock
+
+import httpx
+from fastapi import FastAPI
+
+from apps.api.a2a_protocol import unified_agent_service
+from apps.api.a2a_protocol.agent_health import AgentHealthRegistry
+from apps.api.a2a_protocol.agent_registry import LocalAgentRegistry
+from apps.api.a2a_protocol.task_store import TaskStoreService
+from apps.api.a2a_protocol.types import Message, TaskSendParams, TaskState, TextPart
+from apps.api.core.deadlines import (
+    DEADLINE_HEADER, DeadlineExceededError, RequestDeadlineMiddleware, deadline_headers, deadline_metadata,
+    deadline_scope, deadline_stats, remaining_seconds, run_with_deadline, timeout_from_metadata
+)
+
+@pytest.fixture(autouse=True)
+def isolated_delegation(monkeypatch):
+    monkeypatch.setattr(unified_agent_service, "agent_health", AgentHealthRegistry())
+    monkeypatch.setattr(unified_agent_service, "local_agent_registry", LocalAgentRegistry())
+    monkeypatch.setenv("API_BASE_URL", "http://agents")
+    monkeypatch.setenv("AGENT_DELEGATION_RETRY_DELAY_SECONDS", "1")
+
+def send_params(deadline_ms: int) -> TaskSendParams:
+    return TaskSendParams(id="task-1", message=Message(role="user", parts=[TextPart(text="How are sales?")]),
+                          metadata={"deadline_ms": deadline_ms})
+
+@pytest.mark.asyncio
+async def test_scopes_only_tighten_and_propagate_the_remaining_budget():
+    assert remaining_seconds() is None and deadline_metadata({"a": 1}) == {"a": 1} and deadline_headers() == {}
+    with deadline_scope(10):
+        with deadline_scope(60):
+            assert 9 < remaining_seconds() <= 10
+        with deadline_scope(1):
+            metadata = deadline_metadata(None)
+            assert 900 < metadata["deadline_ms"] <= 1000
+            assert 0.9 < timeout_from_metadata(metadata) <= 1.0
+            assert int(deadline_headers()[DEADLINE_HEADER]) <= 1000
+    assert timeout_from_metadata({"deadline_ms": "soon"}) is None
+
+@pytest.mark.asyncio
+async def test_downstream_work_is_cancelled_when_the_deadline_passes():
+    cancelled = asyncio.Event()
+
+    async def slow():
+        try:
+            await asyncio.Event().wait()
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    with deadline_scope(0.05):
+        with pytest.raises(DeadlineExceededError):
+            await run_with_deadline(slow(), "slow work")
+    assert cancelled.is_set()
+
+@pytest.mark.asyncio
+async def test_delegations_carry_the_callers_remaining_budget(make_caller, completed_task):
+    caller = make_caller(AsyncMock(return_value=httpx.Response(
+        200, json=completed_task("Sales are up.").model_dump(mode="json"), request=httpx.Request("POST", "http://agents"))),
+        task_store=TaskStoreService())
+    http_client = caller.http_client
+
+    task = await caller.handle_task_send(send_params(5000))
+
+    assert task.response_message.parts[0].root.text == "Sales are up."
+    call = http_client.post.await_args
+    assert 4000 < call.kwargs["json"]["metadata"]["deadline_ms"] <= 5000
+    assert 4000 < int(call.kwargs["headers"][DEADLINE_HEADER]) <= 5000
+
+@pytest.mark.asyncio
+async def test_retries_that_cannot_fit_are_skipped(make_caller):
+    caller = make_caller(AsyncMock(side_effect=httpx.ConnectError("refused")), task_store=TaskStoreService())
+    http_client = caller.http_client
+
+    skipped_before = deadline_stats.retries_skipped
+    task = await caller.handle_task_send(send_params(500))
+
+    assert deadline_stats.retries_skipped == skipped_before + 1  # The 1s backoff does not fit in 0.5s
+    assert http_client.post.await_count == 1
+    assert "Error communicating with the metrics agent" in task.response_message.parts[0].root.text
+
+@pytest.mark.asyncio
+async def test_slow_agents_are_cut_off_at_the_deadline(make_caller):
+    async def post(url, json, headers=None):
+        await asyncio.Event().wait()  # Never answers
+
+    caller = make_caller(AsyncMock(side_effect=post), task_store=TaskStoreService())
+
+    with deadline_scope(0.1):
+        reply = await caller.delegate_to_agent("business/metrics", "How are sales?", "task-0", None)
+    assert reply == "The metrics agent could not answer before the request's deadline."
+
+    task = await caller.handle_task_send(send_params(200))
+
+    assert task.status.state == TaskState.FAILED and "Deadline exceeded" in task.history[-1].parts[0].root.text
+
+@pytest.mark.asyncio
+async def test_middleware_scopes_http_requests_to_the_header_deadline():
+    app = FastAPI()
+    app.add_middleware(RequestDeadlineMiddleware)
+
+    @app.get("/remaining")
+    async def remaining():
+        return {"remaining": remaining_seconds()}
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://testserver") as client:
+        scoped = await client.get("/remaining", headers={DEADLINE_HEADER: "2000"})
+        unscoped = await client.get("/remaining")
+
+    assert 1 < scoped.json()["remaining"] <= 2
+    assert unscoped.json()["remaining"] is None
@@ -0,0 +1,127 @@
+import asyncio
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+
+import httpx
+
+from apps.api.a2a_protocol import unified_agent_service
+from apps.api.a2a_protocol.agent_health import AgentHealth, AgentHealthRegistry
+from apps.api.a2a_protocol.agent_registry import LocalAgentRegistry
+from apps.api.a2a_protocol.hedging import HedgeBudget, hedge_delay_seconds, run_hedged
+
+def funded_budget(tokens: float = 1.0) -> HedgeBudget:
+    budget = HedgeBudget(ratio=0.0, burst=5)
+    budget.tokens = tokens
+    return budget
+
+@pytest.mark.asyncio
+async def test_fast_primary_is_not_hedged():
+    calls = []
+
+    async def call(is_hedge):
+        calls.append(is_hedge)
+        return "primary"
+
+    budget = funded_budget()
+    assert await run_hedged(call, 0.5, budget) == "primary"
+    assert calls == [False] and budget.hedges == 0
+
+@pytest.mark.asyncio
+async def test_slow_primary_loses_to_hedge_and_is_cancelled():
+    primary_cancelled = asyncio.Event()
+
+    async def call(is_hedge):
+        if is_hedge:
+            return "hedge"
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            primary_cancelled.set()
+            raise
+
+    budget = funded_budget()
+    assert await run_hedged(call, 0.01, budget) == "hedge"
+    assert primary_cancelled.is_set()
+    assert budget.stats()["hedges"] == 1 and budget.stats()["hedge_wins"] == 1
+
+@pytest.mark.asyncio
+async def test_failed_hedge_does_not_beat_a_successful_primary():
+    async def call(is_hedge):
+        if is_hedge:
+            raise RuntimeError("replica down")
+        await asyncio.sleep(0.05)
+        return "primary"
+
+    assert await run_hedged(call, 0.01, funded_budget()) == "primary"
+
+@pytest.mark.asyncio
+async def test_budget_caps_hedges():
+    calls = []
+
+    async def call(is_hedge):
+        calls.append(is_hedge)
+        await asyncio.sleep(0.02)
+        return "primary"
+
+    budget = HedgeBudget(ratio=0.5, burst=1)
+    for _ in range(4):
+        await run_hedged(call, 0.001, budget)
+
+    assert calls.count(True) == 2  # Earned 0.5 tokens per delegation
+    assert budget.denied == 2
+
+def test_hedge_delay_uses_p95_once_enough_samples_exist():
+    health = AgentHealth("business/metrics")
+    health.record_success(0.2)
+    assert hedge_delay_seconds(health, min_samples=5) == 5.0  # Default until p95 is meaningful
+    for seconds in (0.1, 0.1, 0.1, 0.3):
+        health.record_success(seconds)
+    assert hedge_delay_seconds(health, min_samples=5) == pytest.approx(0.3)
+
+@pytest.mark.asyncio
+async def test_hedge_delay_ignores_health_probes():
+    registry = AgentHealthRegistry()
+    health = registry.get("business/metrics")
+    for _ in range(5):
+        health.record_success(0.4)
+    http_client = MagicMock(spec=httpx.AsyncClient)
+    http_client.get = AsyncMock(return_value=httpx.Response(200, json={}, request=httpx.Request("GET", "http://test")))
+    for _ in range(20):
+        await registry.probe(http_client, "http://test", "business/metrics")  # Fast, but not delegations
+
+    assert hedge_delay_seconds(health, min_samples=5) == pytest.approx(0.4)
+
+@pytest.mark.asyncio
+async def test_idempotent_agent_delegation_is_hedged_to_the_replica(monkeypatch, make_caller, completed_task):
+    monkeypatch.setattr(unified_agent_service, "agent_health", AgentHealthRegistry())
+    monkeypatch.setattr(unified_agent_service, "local_agent_registry", LocalAgentRegistry())
+    monkeypatch.setattr(unified_agent_service, "hedge_budget", funded_budget())
+    monkeypatch.setattr(unified_agent_service, "AGENT_HEDGING_ENABLED", True)
+    monkeypatch.setattr(unified_agent_service, "AGENT_HEDGE_BASE_URL", "http://replica")
+    monkeypatch.setattr(unified_agent_service, "hedge_delay_seconds", lambda health: 0.01)
+    monkeypatch.setenv("API_BASE_URL", "http://primary")
+
+    async def post(url, json, headers=None):
+        if url.startswith("http://primary"):
+            await asyncio.sleep(10)
+        return httpx.Response(200, json=completed_task("from replica").model_dump(mode="json"),
+                              request=httpx.Request("POST", url))
+
+    caller = make_caller(AsyncMock(side_effect=post))
+    http_client = caller.http_client
+    caller.available_agents = [{"name": "metrics", "path": "business/metrics", "is_idempotent": True}]
+
+    assert await caller.delegate_to_agent("business/metrics", "How are sales?", "task-1", None) == "from replica"
+    primary_call, hedge_call = http_client.post.await_args_list
+    assert hedge_call.args[0] == "http://replica/agents/business/metrics/tasks"
+    assert primary_call.kwargs["json"]["message"] == hedge_call.kwargs["json"]["message"]
+    assert primary_call.kwargs["json"]["id"] != hedge_call.kwargs["json"]["id"]
+
+    # Agents that are not idempotent are never hedged
+    caller.available_agents = [{"name": "metrics", "path": "business/metrics"}]
+    assert not caller._is_hedgeable("business/metrics")
+
+    # Nor is anything without a replica to hedge to
+    caller.available_agents = [{"name": "metrics", "path": "business/metrics", "is_idempotent": True}]
+    monkeypatch.setattr(unified_agent_service, "AGENT_HEDGE_BASE_URL", None)
+    assert not caller._is_hedgeable("business/metrics")
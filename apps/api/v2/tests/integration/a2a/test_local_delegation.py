@@ -0,0 +1,75 @@
+import pytest
+from types import SimpleNamespace
+from unittest.mock import AsyncMock
+
+import httpx
+from fastapi import Depends, Request
+
+from apps.api.a2a_protocol import unified_agent_service
+from apps.api.a2a_protocol.agent_registry import LocalAgentRegistry, LocalDependencyError, resolve_dependency
+
+@pytest.fixture
+def registry(monkeypatch):
+    registry = LocalAgentRegistry()
+    monkeypatch.setattr(unified_agent_service, "local_agent_registry", registry)
+    return registry
+
+@pytest.fixture
+def http_caller(make_caller, completed_task):
+    caller = make_caller(AsyncMock(return_value=httpx.Response(
+        200, json=completed_task("over http").model_dump(mode="json"), request=httpx.Request("POST", "http://test"))))
+    return caller, caller.http_client
+
+@pytest.mark.asyncio
+async def test_registered_agent_is_called_in_process(registry, http_caller, completed_task):
+    target = SimpleNamespace(handle_task_send=AsyncMock(return_value=completed_task("Sales are up 4%.")))
+
+    async def provider():
+        return target
+
+    registry.register("/business/metrics/", provider)
+    caller, http_client = http_caller
+
+    assert await caller.delegate_to_agent("business/metrics", "How are sales?", "task-1", "session-1") == "Sales are up 4%."
+    params = target.handle_task_send.await_args.args[0]
+    assert params.session_id == "session-1" and params.message.metadata == {"original_task_id": "task-1"}
+    http_client.post.assert_not_awaited()
+    assert registry.stats()["local_delegations"] == 1
+
+@pytest.mark.asyncio
+async def test_unregistered_or_request_bound_agents_use_http(registry, monkeypatch, http_caller):
+    monkeypatch.setenv("API_BASE_URL", "http://test")
+
+    def needs_request(request: Request):
+        return request
+
+    def get_agent_service(context=Depends(needs_request)):
+        return SimpleNamespace(handle_task_send=AsyncMock())
+
+    registry.register_dependency("customer/chat_support", get_agent_service)
+    caller, http_client = http_caller
+
+    assert await caller.delegate_to_agent("business/metrics", "q", "task-1", None) == "over http"
+    assert await caller.delegate_to_agent("customer/chat_support", "q", "task-2", None) == "over http"
+    assert http_client.post.await_count == 2
+    assert registry.stats()["request_bound"] == ["customer/chat_support"]
+
+@pytest.mark.asyncio
+async def test_dependencies_resolved_recursively_with_overrides():
+    def get_http_client():
+        return "real-client"
+
+    def get_mcp_client(http_client=Depends(get_http_client)):
+        return f"mcp({http_client})"
+
+    async def get_agent_service(mcp_client=Depends(get_mcp_client), retries: int = 3):
+        return (mcp_client, retries)
+
+    assert await resolve_dependency(get_agent_service) == ("mcp(real-client)", 3)
+    assert await resolve_dependency(get_agent_service, {get_http_client: lambda: "test-client"}) == ("mcp(test-client)", 3)
+
+    def get_user(token: str):
+        return token
+
+    with pytest.raises(LocalDependencyError):
+        await resolve_dependency(get_user)
@@ -0,0 +1,121 @@
+import pytest
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock
+
+from apps.api.a2a_protocol.stickiness_store import InMemoryStickinessStore, SupabaseStickinessStore
+from apps.api.a2a_protocol.types import Message, TextPart
+from apps.api.a2a_protocol.unified_agent_service import A2AUnifiedAgentService
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+@pytest.mark.asyncio
+async def test_pins_expire_and_are_swept_in_expiry_order():
+    clock = FakeClock()
+    store = InMemoryStickinessStore(clock=clock)
+    await store.set("system/orchestrator", "s1", "business/metrics", 60)
+    await store.set("system/orchestrator", "s2", "business/metrics", 120)
+    await store.set("system/orchestrator", "s3", "specialists/jokes", 300)
+
+    assert await store.live_sessions() == {"business/metrics": 2, "specialists/jokes": 1}
+    clock.now += 90
+    assert await store.sweep() == 1
+    assert await store.get("system/orchestrator", "s1") is None
+    assert (await store.get("system/orchestrator", "s2"))["agent_path"] == "business/metrics"
+
+    stats = await store.stats()
+    assert stats["live_sessions"] == 2 and stats["expired"] == 1
+    assert stats["hits"] == 1 and stats["misses"] == 1
+
+@pytest.mark.asyncio
+async def test_repinned_and_cleared_sessions_leave_no_stale_expiry():
+    clock = FakeClock()
+    store = InMemoryStickinessStore(clock=clock)
+    await store.set("system/orchestrator", "s1", "business/metrics", 60)
+    await store.set("system/orchestrator", "s1", "business/metrics", 600)  # Re-pinned: the first expiry is stale
+    await store.set("system/orchestrator", "s2", "specialists/jokes", 60)
+    assert await store.clear("system/orchestrator", "s2") == "specialists/jokes"
+
+    clock.now += 120
+    assert await store.sweep() == 0
+    assert (await store.get("system/orchestrator", "s1"))["expiry"] == 1600.0
+    assert store._expiries == [(1600.0, ("system/orchestrator", "s1"))]
+
+@pytest.mark.asyncio
+async def test_expired_pin_is_dropped_on_read_before_the_sweep():
+    clock = FakeClock()
+    store = InMemoryStickinessStore(clock=clock)
+    await store.set("system/orchestrator", "s1", "business/metrics", 60)
+    clock.now += 61
+
+    assert await store.get("system/orchestrator", "s1") is None
+    assert await store.live_sessions() == {} and store.expired == 1
+
+@pytest.mark.asyncio
+async def test_services_share_the_store(make_caller):
+    store = InMemoryStickinessStore()
+    first = make_caller(stickiness_store=store)
+    second = make_caller(stickiness_store=store)
+
+    await first._set_session_sticky("session-1", "business/metrics", duration_minutes=5)
+    assert (await second._is_session_sticky("session-1"))["agent_path"] == "business/metrics"
+    await second._clear_session_sticky("session-1")
+    assert await first._is_session_sticky("session-1") is None
+
+@pytest.mark.asyncio
+async def test_supabase_store_upserts_and_reads_live_pins():
+    query = MagicMock()
+    for method in ("select", "eq", "gt", "lte", "limit", "upsert", "delete"):
+        getattr(query, method).return_value = query
+    query.execute.return_value = SimpleNamespace(
+        data=[{"agent_path": "business/metrics", "expires_at": "2030-01-01T00:00:00+00:00"}])
+    client = MagicMock()
+    client.table.return_value = query
+    store = SupabaseStickinessStore(client)
+
+    await store.set("system/orchestrator", "s1", "business/metrics", 60)
+    upserted = query.upsert.call_args.args[0]
+    assert upserted["owner_path"] == "system/orchestrator" and upserted["session_id"] == "s1"
+    assert upserted["agent_path"] == "business/metrics"
+    assert query.upsert.call_args.kwargs["on_conflict"] == "owner_path,session_id"
+    pin = await store.get("system/orchestrator", "s1")
+    assert pin["agent_path"] == "business/metrics" and pin["expiry"] == 1893456000.0
+    client.table.assert_called_with("session_stickiness")
+
+@pytest.mark.asyncio
+async def test_pins_are_owned_by_the_agent_that_set_them():
+    store = InMemoryStickinessStore()
+    await store.set("system/orchestrator", "s1", "business/metrics", 60)
+
+    assert await store.get("business/metrics", "s1") is None
+    assert await store.clear("business/metrics", "s1") is None
+    assert (await store.get("system/orchestrator", "s1"))["agent_path"] == "business/metrics"
+
+@pytest.mark.asyncio
+async def test_delegated_agent_of_a_pinned_session_runs_locally(make_caller):
+    class ChatSupportService(A2AUnifiedAgentService):
+        """Another agent the caller delegates to within the pinned session (e.g. a plan step)."""
+        agent_name = "chat_support"
+        department_name = "customer"
+
+        async def get_agent_card(self):
+            raise NotImplementedError
+
+        async def execute_agent_task(self, message, task_id, session_id=None) -> str:
+            return "chat support answered"
+
+    store = InMemoryStickinessStore()
+    caller = make_caller(stickiness_store=store)
+    await caller._set_session_sticky("session-1", "business/metrics", duration_minutes=5)
+    chat_support = ChatSupportService(task_store=MagicMock(), http_client=MagicMock(), stickiness_store=store)
+    chat_support.delegate_to_agent = AsyncMock()
+
+    reply = await chat_support.process_message(Message(role="user", parts=[TextPart(text="refund?")]), "t1", "session-1")
+
+    assert reply.parts[0].root.text == "chat support answered"
+    chat_support.delegate_to_agent.assert_not_awaited()
+    assert (await caller._is_session_sticky("session-1"))["agent_path"] == "business/metrics"
@@ -0,0 +1,72 @@
+import time
+import pytest
+from unittest.mock import MagicMock
+
+from apps.api.a2a_protocol.agent_registry import resolve_dependency
+from apps.api.a2a_protocol.service_scope import AppScopedServices, agent_services
+from apps.api.agents.business.metrics import main as metrics_main
+from apps.api.agents.business.metrics.service import MetricsAgentService
+from apps.api.shared.mcp.mcp_client import MCPClient
+
+REQUESTS = 5
+BENCHMARK_REQUESTS = 200
+
+def test_instances_are_reused_until_a_dependency_changes():
+    scope = AppScopedServices()
+    first_client, second_client = object(), object()
+
+    service = scope.get_or_create("agent", lambda: object(), first_client)
+    assert scope.get_or_create("agent", lambda: object(), first_client) is service
+    assert scope.get_or_create("agent", lambda: object(), second_client) is not service
+    assert scope.stats() == {"services": ["agent"], "created": 2, "reused": 1}
+
+@pytest.mark.asyncio
+async def test_get_agent_service_returns_the_shared_instance():
+    agent_services.clear()
+    first = await resolve_dependency(metrics_main.get_agent_service)
+    second = await resolve_dependency(metrics_main.get_agent_service)
+
+    assert first is second
+    assert first.mcp_client is await resolve_dependency(metrics_main.get_mcp_client_dependency)
+
+@pytest.mark.asyncio
+async def test_repeated_requests_construct_the_service_once(mocker):
+    task_store, http_client = MagicMock(), MagicMock()
+    agent_services.clear()
+    created_before = agent_services.created
+    service_init = mocker.spy(MetricsAgentService, "__init__")
+    client_init = mocker.spy(MCPClient, "__init__")
+    overrides = {
+        metrics_main.get_task_store_service: lambda: task_store,
+        metrics_main.get_original_http_client: lambda: http_client,
+    }
+
+    services = [await resolve_dependency(metrics_main.get_agent_service, overrides) for _ in range(REQUESTS)]
+
+    assert all(service is services[0] for service in services)
+    assert service_init.call_count == 1 and client_init.call_count == 1
+    assert agent_services.created - created_before == 2  # One MCPClient and one service for all requests
+
+@pytest.mark.benchmark
+@pytest.mark.asyncio
+async def test_benchmark_per_request_service_overhead():
+    """Per-request cost of obtaining the metrics service: built every time (before) vs shared (after)."""
+    task_store, http_client = MagicMock(), MagicMock()
+
+    started = time.perf_counter()
+    for _ in range(BENCHMARK_REQUESTS):
+        MetricsAgentService(task_store=task_store, http_client=http_client, mcp_client=MCPClient(http_client=http_client))
+    per_request_before = (time.perf_counter() - started) / BENCHMARK_REQUESTS
+
+    agent_services.clear()
+    overrides = {
+        metrics_main.get_task_store_service: lambda: task_store,
+        metrics_main.get_original_http_client: lambda: http_client,
+    }
+    started = time.perf_counter()
+    for _ in range(BENCHMARK_REQUESTS):
+        await resolve_dependency(metrics_main.get_agent_service, overrides)
+    per_request_after = (time.perf_counter() - started) / BENCHMARK_REQUESTS
+
+    print(f"metrics service per request: before={1e6 * per_request_before:.1f}us "
+          f"after={1e6 * per_request_after:.1f}us ({per_request_before / per_request_after:.1f}x)")
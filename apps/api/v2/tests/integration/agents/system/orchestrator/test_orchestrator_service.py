@@ -124,6 +124,29 @@ async def test_orchestrator_delegate_to_metrics(
     # Reset at end of test to clear any unawaited coroutines
     mock_openai_service.reset_mock()
 
+@pytest.mark.asyncio
+async def test_orchestrator_reuses_delegation_started_during_decision_stream(
+    client_and_app: tuple[httpx.AsyncClient, FastAPI],
+    mock_openai_service: AsyncMock,
+    mocker: AsyncMock
+):
+    client, _ = client_and_app
+    mock_delegate = mocker.patch.object(OrchestratorAgentService, "delegate_to_agent", new_callable=AsyncMock, return_value="Sales are up 4%.")
+
+    async def streamed_decision(user_query, available_agents, history=None, on_delegate_target=None):
+        on_delegate_target("business/metrics")  # Target known before the rest of the JSON
+        return {"action": "delegate", "agent_name": "business/metrics", "query_for_agent": "Current sales figures"}
+    mock_openai_service.decide_orchestration_action.side_effect = streamed_decision
+
+    task_params = create_simple_task_send_params("What are the current sales figures?")
+    response = await client.post(f"/agents/{OrchestratorAgentService.department_name}/{OrchestratorAgentService.agent_name}/tasks", json=task_params.model_dump(mode='json'))
+
+    assert response.status_code == 200
+    assert response.json()["response_message"]["parts"][0]["text"] == "Sales are up 4%."
+    mock_delegate.assert_awaited_once()
+    assert mock_delegate.await_args.kwargs["task_description"] == "What are the current sales figures?"
+    mock_openai_service.decide_orchestration_action.side_effect = None
+
 @pytest.mark.asyncio
 async def test_orchestrator_clarify(client_and_app: tuple[httpx.AsyncClient, FastAPI], mock_openai_service: AsyncMock, mocker: AsyncMock):
     mock_openai_service.decide_orchestration_action.reset_mock() 
@@ -396,4 +419,28 @@ async def test_orchestrator_cancel_active_task(client_and_app: tuple[httpx.Async
     # Access root of the Part directly for TextPart
     assert update_message_arg.parts[0].root.text == cancelled_status_text
 
-# End of test_orchestrator_cancel_active_task 
\ No newline at end of file
+# End of test_orchestrator_cancel_active_task 
+
+@pytest.mark.asyncio
+async def test_orchestrator_routes_with_the_sessions_chat_history():
+    from unittest.mock import MagicMock
+    supabase_client = MagicMock()
+    supabase_client.table.return_value.select.return_value.eq.return_value.order.return_value.execute.return_value = MagicMock(data=[
+        {"role": "user", "content": "How are sales?", "metadata": {}},
+        {"role": "assistant", "content": "Sales are up 4%.", "metadata": {}},
+        {"role": "user", "content": "And last year?", "metadata": {}},  # Already stored by the chat client
+    ])
+    openai_service = MagicMock()
+    openai_service.decide_orchestration_action = AsyncMock(return_value={"action": "respond_directly", "response_text": "Up 2%."})
+    service = OrchestratorAgentService(task_store=TaskStoreService(), http_client=MagicMock(), openai_service=openai_service,
+                                       supabase_client=supabase_client)
+    service._discovery_done = True
+    message = Message(role="user", parts=[TextPart(text="And last year?")])
+
+    assert await service.execute_agent_task(message, "task-1", "session-1") == "Up 2%."
+    assert openai_service.decide_orchestration_action.await_args.kwargs["history"] == [
+        {"role": "user", "content": "How are sales?"}, {"role": "assistant", "content": "Sales are up 4%."}]
+
+    # Without a session there is nothing to load: a fresh conversation
+    await service.execute_agent_task(message, "task-2", None)
+    assert openai_service.decide_orchestration_action.await_args.kwargs["history"] is None
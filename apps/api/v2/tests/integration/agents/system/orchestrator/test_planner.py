@@ -0,0 +1,173 @@
+import asyncio
+import time
+import pytest
+from datetime import datetime, timezone
+from unittest.mock import AsyncMock, MagicMock
+
+import httpx
+
+from apps.api.a2a_protocol import unified_agent_service
+from apps.api.a2a_protocol.agent_health import AgentHealthRegistry
+from apps.api.a2a_protocol.agent_registry import LocalAgentRegistry
+from apps.api.a2a_protocol.task_store import TaskStoreService
+from apps.api.a2a_protocol.types import Message, Task, TaskState, TaskStatus, TextPart
+from apps.api.agents.system.orchestrator.planner import PlanError, PlanStep, execute_plan, parse_plan
+from apps.api.agents.system.orchestrator.service import OrchestratorAgentService
+
+AGENTS = [
+    {"name": "metrics", "path": "business/metrics", "description": "Business metrics."},
+    {"name": "competitors", "path": "external/competitors", "description": "Competitor research."},
+    {"name": "blog_post", "path": "marketing/blog_post", "description": "Drafts blog posts."},
+]
+
+PLAN = [
+    {"id": "s1", "agent_name": "metrics", "query_for_agent": "Our Q3 sales?"},
+    {"id": "s2", "agent_name": "competitors", "query_for_agent": "Competitor Q3 sales?"},
+    {"id": "s3", "agent_name": "blog_post", "query_for_agent": "Compare {s1} with {s2}.", "depends_on": ["s1", "s2"]},
+]
+
+def resolve(target):
+    return {agent["name"]: agent["path"] for agent in AGENTS}.get(target)
+
+def test_parse_plan_orders_steps_and_rejects_bad_graphs():
+    steps = parse_plan(list(reversed(PLAN)), resolve, "fallback")
+    assert [step.id for step in steps] == ["s2", "s1", "s3"]
+
+    # Unknown agents are dropped together with their dependents
+    steps = parse_plan(PLAN + [{"id": "s4", "agent_name": "weather"}, {"id": "s5", "agent_name": "metrics", "depends_on": "s4"}],
+                       resolve, "fallback")
+    assert [step.id for step in steps] == ["s1", "s2", "s3"]
+
+    with pytest.raises(PlanError, match="cycle"):
+        parse_plan([{"id": "a", "agent_name": "metrics", "depends_on": ["b"]},
+                    {"id": "b", "agent_name": "metrics", "depends_on": ["a"]}], resolve, "q")
+    with pytest.raises(PlanError, match="unknown step"):
+        parse_plan([{"id": "a", "agent_name": "metrics", "depends_on": ["missing"]}], resolve, "q")
+    with pytest.raises(PlanError, match="at most 2"):
+        parse_plan(PLAN, resolve, "q", max_steps=2)
+
+@pytest.mark.asyncio
+async def test_independent_steps_run_concurrently_and_dependents_get_their_answers():
+    queries = {}
+
+    async def run_step(step, query):
+        queries[step.id] = query
+        await asyncio.sleep(0.2)
+        return f"{step.id}-answer"
+
+    started = time.perf_counter()
+    results = await execute_plan(parse_plan(PLAN, resolve, "q"), run_step)
+    elapsed = time.perf_counter() - started
+
+    assert [result.step_id for result in results] == ["s1", "s2", "s3"]
+    assert queries["s3"] == "Compare s1-answer with s2-answer."
+    assert elapsed < 0.55  # Two levels of 0.2s, not three sequential steps
+
+@pytest.mark.asyncio
+async def test_failed_steps_skip_their_dependents_and_cached_steps_are_reused():
+    calls = []
+
+    async def run_step(step, query):
+        calls.append(step.id)
+        if step.id == "s2":
+            raise RuntimeError("boom")
+        return f"{step.id}-answer"
+
+    steps = [PlanStep("s1", "business/metrics", "a"), PlanStep("s2", "external/competitors", "b"),
+             PlanStep("s3", "marketing/blog_post", "{s1} {s2}", ["s1", "s2"])]
+    results = await execute_plan(steps, run_step)
+    assert [result.status for result in results] == ["ok", "error", "skipped"]
+
+    cached = {result.step_id: result for result in results}
+    calls.clear()
+    results = await execute_plan(steps, run_step, cached=cached)
+    assert calls == ["s2"] and results[0].cached
+
+def make_orchestrator(decision):
+    openai_service = MagicMock()
+    openai_service.decide_orchestration_action = AsyncMock(return_value=decision)
+    openai_service.synthesize_responses = AsyncMock(return_value="Combined answer.")
+    service = OrchestratorAgentService(task_store=TaskStoreService(), http_client=MagicMock(), openai_service=openai_service)
+    service.available_agents = AGENTS
+    service._discovery_done = True
+    return service, openai_service
+
+@pytest.mark.asyncio
+async def test_plan_decision_streams_steps_and_reuses_them_when_the_task_is_resent(mocker):
+    service, openai_service = make_orchestrator({"action": "plan", "steps": PLAN})
+    delegate = mocker.patch.object(OrchestratorAgentService, "delegate_to_agent", new_callable=AsyncMock,
+                                   side_effect=lambda agent_path, task_description, **_: f"{agent_path.split('/')[-1]}: {task_description}")
+    message = Message(role="user", parts=[TextPart(text="Compare our Q3 with competitors in a blog post")])
+    await service.task_store.create_or_get_task("task-1", message)
+
+    reply = await service.execute_agent_task(message, "task-1", "session-1")
+
+    assert reply == "Combined answer."
+    assert delegate.await_args_list[-1].kwargs["task_description"] == \
+        "Compare metrics: Our Q3 sales? with competitors: Competitor Q3 sales?."
+    task = (await service.task_store.get_task("task-1")).task
+    assert sorted(artifact.name for artifact in task.artifacts) == ["plan_step:s1", "plan_step:s2", "plan_step:s3"]
+    assert task.history[-1].parts[0].root.text.startswith("[s3 · blog_post] blog_post: Compare")
+
+    delegate.reset_mock()
+    await service.execute_agent_task(message, "task-1", "session-1")
+    delegate.assert_not_awaited()
+    assert [item["status"] for item in openai_service.synthesize_responses.await_args.args[1]] == ["ok", "ok", "ok"]
+
+@pytest.mark.asyncio
+async def test_unusable_plan_is_reported_instead_of_fanned_out(mocker):
+    cyclic = [dict(PLAN[0], depends_on=["s3"]), PLAN[1], PLAN[2]]
+    service, _ = make_orchestrator({"action": "plan", "steps": cyclic})
+    delegate = mocker.patch.object(OrchestratorAgentService, "delegate_to_agent", new_callable=AsyncMock)
+    message = Message(role="user", parts=[TextPart(text="Compare our Q3 with competitors in a blog post")])
+    await service.task_store.create_or_get_task("task-1", message)
+
+    reply = await service.execute_agent_task(message, "task-1", "session-1")
+
+    assert reply.startswith("I could not complete the plan for your request: Plan has a dependency cycle")
+    delegate.assert_not_awaited()
+
+def task_in_state(state: TaskState, text: str) -> Task:
+    now = datetime.now(timezone.utc).isoformat()
+    return Task(
+        id="sub-task",
+        status=TaskStatus(state=state, timestamp=now),
+        request_message=Message(role="user", parts=[TextPart(text="q")]),
+        response_message=Message(role="agent", parts=[TextPart(text=text)]),
+        created_at=now,
+        updated_at=now,
+    )
+
+@pytest.mark.asyncio
+async def test_failed_delegations_are_not_treated_as_answers(monkeypatch):
+    monkeypatch.setattr(unified_agent_service, "agent_health", AgentHealthRegistry())
+    monkeypatch.setattr(unified_agent_service, "local_agent_registry", LocalAgentRegistry())
+    monkeypatch.setenv("API_BASE_URL", "http://agents")
+    service, openai_service = make_orchestrator({"action": "plan", "steps": PLAN})
+
+    # metrics runs in-process and fails its task; competitors answers over HTTP
+    async def failing_metrics():
+        return MagicMock(handle_task_send=AsyncMock(return_value=task_in_state(TaskState.FAILED, "It broke.")))
+    unified_agent_service.local_agent_registry.register("business/metrics", failing_metrics)
+    service.http_client.post = AsyncMock(return_value=httpx.Response(
+        200, json=task_in_state(TaskState.COMPLETED, "They sold 3M.").model_dump(mode="json"),
+        request=httpx.Request("POST", "http://agents")))
+    message = Message(role="user", parts=[TextPart(text="Compare our Q3 with competitors in a blog post")])
+    await service.task_store.create_or_get_task("task-1", message)
+
+    await service.execute_agent_task(message, "task-1", "session-1")
+
+    steps = openai_service.synthesize_responses.await_args.args[1]
+    assert [item["status"] for item in steps] == ["error", "ok", "skipped"]
+    assert "It broke." in steps[0]["answer"]
+    assert service.http_client.post.await_count == 1  # blog_post never ran on the failed answer
+    task = (await service.task_store.get_task("task-1")).task
+    assert [artifact.name for artifact in task.artifacts] == ["plan_step:s2"]
+
+    # Unreachable over HTTP: the same failure path, with the default string reply unchanged
+    monkeypatch.setenv("AGENT_DELEGATION_RETRIES", "0")
+    service.http_client.post = AsyncMock(side_effect=httpx.ConnectError("refused"))
+    reply = await service.delegate_to_agent("external/competitors", "q", "task-2", None)
+    assert reply.startswith("Error communicating with the competitors agent")
+    with pytest.raises(unified_agent_service.DelegationError, match="Error communicating"):
+        await service.delegate_to_agent("external/competitors", "q", "task-2", None, raise_on_failure=True)
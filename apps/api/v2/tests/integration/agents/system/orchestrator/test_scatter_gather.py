@@ -0,0 +1,100 @@
+import asyncio
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+
+import httpx
+
+from apps.api.a2a_protocol import unified_agent_service
+from apps.api.a2a_protocol.agent_health import AgentHealthRegistry
+from apps.api.a2a_protocol.agent_registry import LocalAgentRegistry
+from apps.api.a2a_protocol.types import Message, TextPart
+from apps.api.agents.system.orchestrator.scatter_gather import Branch, merge_branch_results, scatter_gather
+from apps.api.agents.system.orchestrator.service import OrchestratorAgentService
+
+AGENTS = [
+    {"name": "metrics", "path": "business/metrics", "description": "Business metrics."},
+    {"name": "competitors", "path": "external/competitors", "description": "Competitor research."},
+    {"name": "blog_post", "path": "marketing/blog_post", "description": "Drafts blog posts."},
+]
+
+@pytest.mark.asyncio
+async def test_branches_run_concurrently_and_keep_partial_results():
+    finished = []
+
+    async def delegate(branch):
+        if branch.agent_path == "slow":
+            await asyncio.sleep(1)
+        if branch.agent_path == "broken":
+            raise RuntimeError("boom")
+        await asyncio.sleep(0.01)
+        return f"answer from {branch.agent_path}"
+
+    async def on_result(result):
+        finished.append(result.agent_path)
+
+    branches = [Branch("slow", "q"), Branch("fast", "q"), Branch("broken", "q")]
+    results = await scatter_gather(branches, delegate, timeout_seconds=0.2, on_result=on_result)
+
+    assert [result.status for result in results] == ["timeout", "ok", "error"]
+    assert finished == ["broken", "fast", "slow"]  # Completion order
+    assert max(result.seconds for result in results) < 0.5
+    assert "(unavailable: No answer within 0.2s.)" in merge_branch_results(results)
+
+def make_orchestrator(decision):
+    openai_service = MagicMock()
+    openai_service.decide_orchestration_action = AsyncMock(return_value=decision)
+    openai_service.synthesize_responses = AsyncMock(return_value="Combined answer.")
+    task_store = MagicMock()
+    task_store.update_task_status = AsyncMock()
+    service = OrchestratorAgentService(task_store=task_store, http_client=MagicMock(), openai_service=openai_service)
+    service.available_agents = AGENTS
+    service._discovery_done = True
+    return service, openai_service, task_store
+
+@pytest.mark.asyncio
+async def test_fan_out_decision_delegates_to_each_agent_and_synthesizes(mocker):
+    decision = {"action": "fan_out", "delegations": [
+        {"agent_name": "metrics", "query_for_agent": "Our sales this quarter?"},
+        {"agent_name": "competitors", "query_for_agent": "Competitor sales this quarter?"},
+        {"agent_name": "weather", "query_for_agent": "Ignored: unknown agent"},
+    ]}
+    service, openai_service, task_store = make_orchestrator(decision)
+    delegate = mocker.patch.object(OrchestratorAgentService, "delegate_to_agent", new_callable=AsyncMock,
+                                   side_effect=lambda agent_path, **_: f"{agent_path} says hi")
+    message = Message(role="user", parts=[TextPart(text="Compare our sales with competitors")])
+
+    reply = await service.execute_agent_task(message, "task-1", "session-1")
+
+    assert reply == "Combined answer."
+    assert sorted(call.kwargs["agent_path"] for call in delegate.await_args_list) == ["business/metrics", "external/competitors"]
+    branch_results = openai_service.synthesize_responses.await_args.args[1]
+    assert {item["agent"]: item["answer"] for item in branch_results} == {
+        "business/metrics": "business/metrics says hi", "external/competitors": "external/competitors says hi"}
+    progress = [call.kwargs["status_update_message"].parts[0].root.text for call in task_store.update_task_status.await_args_list]
+    assert sorted(progress) == ["[competitors] external/competitors says hi", "[metrics] business/metrics says hi"]
+
+@pytest.mark.asyncio
+async def test_fan_out_falls_back_to_plain_merge_without_synthesis(mocker):
+    service, openai_service, _ = make_orchestrator({"action": "fan_out", "delegations": [
+        {"agent_name": "metrics"}, {"agent_name": "blog_post"}]})
+    openai_service.synthesize_responses.return_value = None
+    mocker.patch.object(OrchestratorAgentService, "delegate_to_agent", new_callable=AsyncMock, return_value="done")
+
+    reply = await service.execute_agent_task(Message(role="user", parts=[TextPart(text="Do both")]), "task-2")
+
+    assert reply == "**metrics**\ndone\n\n**blog_post**\ndone"
+
+@pytest.mark.asyncio
+async def test_unreachable_agents_are_reported_as_failed_branches(monkeypatch):
+    monkeypatch.setattr(unified_agent_service, "agent_health", AgentHealthRegistry())
+    monkeypatch.setattr(unified_agent_service, "local_agent_registry", LocalAgentRegistry())
+    monkeypatch.setenv("API_BASE_URL", "http://agents")
+    monkeypatch.setenv("AGENT_DELEGATION_RETRIES", "0")
+    service, openai_service, _ = make_orchestrator({"action": "fan_out", "delegations": [
+        {"agent_name": "metrics"}, {"agent_name": "competitors"}]})
+    service.http_client.post = AsyncMock(side_effect=httpx.ConnectError("refused"))
+
+    reply = await service.execute_agent_task(Message(role="user", parts=[TextPart(text="Compare sales")]), "task-3")
+
+    openai_service.synthesize_responses.assert_not_awaited()  # Nothing to synthesize from error text
+    assert reply.count("(unavailable: Failed: Error communicating with the") == 2
@@ -0,0 +1,114 @@
+import asyncio
+import time
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+
+from apps.api.a2a_protocol.types import Message, TextPart
+from apps.api.agents.system.orchestrator import service as orchestrator_service
+from apps.api.agents.system.orchestrator.service import OrchestratorAgentService
+from apps.api.agents.system.orchestrator.speculation import LastAgentTracker, SpeculationStats
+
+AGENTS = [
+    {"name": "metrics", "path": "business/metrics", "is_idempotent": True},
+    {"name": "competitors", "path": "external/competitors", "is_idempotent": True},
+    {"name": "blog_post", "path": "marketing/blog_post", "is_idempotent": False},
+]
+
+ROUTING_SECONDS = 0.2
+DELEGATION_SECONDS = 0.2
+
+def make_orchestrator(monkeypatch, decision, last_agent, stream_target=None):
+    monkeypatch.setattr(orchestrator_service, "ORCHESTRATOR_SPECULATION_ENABLED", True)
+
+    async def decide(user_query, available_agents, history=None, on_delegate_target=None):
+        if stream_target and on_delegate_target:
+            on_delegate_target(stream_target)
+        await asyncio.sleep(ROUTING_SECONDS)
+        return decision
+
+    openai_service = MagicMock()
+    openai_service.decide_orchestration_action = AsyncMock(side_effect=decide)
+    task_store = MagicMock()
+    task_store.update_task_status = AsyncMock()
+    service = OrchestratorAgentService(task_store=task_store, http_client=MagicMock(), openai_service=openai_service)
+    service.available_agents = AGENTS
+    service._discovery_done = True
+    service.last_agents = LastAgentTracker()
+    service.speculation_stats = SpeculationStats()
+    if last_agent:
+        service.last_agents.set("session-1", last_agent)
+    return service
+
+def patch_delegation(mocker, seconds=DELEGATION_SECONDS):
+    async def delegate(agent_path, task_description, **_):
+        await asyncio.sleep(seconds)
+        return f"{agent_path} answered"
+    return mocker.patch.object(OrchestratorAgentService, "delegate_to_agent", new_callable=AsyncMock, side_effect=delegate)
+
+def message(text="And last month?"):
+    return Message(role="user", parts=[TextPart(text=text)])
+
+def test_last_agent_tracker_expires_and_evicts():
+    now = [0.0]
+    tracker = LastAgentTracker(ttl_seconds=10, max_sessions=2, clock=lambda: now[0])
+    tracker.set("a", "business/metrics")
+    tracker.set("b", "external/competitors")
+    tracker.set("c", "business/metrics")
+    assert tracker.get("a") is None and len(tracker) == 2
+    now[0] = 11
+    assert tracker.get("b") is None
+
+@pytest.mark.asyncio
+async def test_speculation_hit_overlaps_delegation_with_routing(monkeypatch, mocker):
+    service = make_orchestrator(monkeypatch, {"action": "delegate", "agent_name": "metrics"}, "business/metrics")
+    delegate = patch_delegation(mocker)
+
+    started = time.perf_counter()
+    reply = await service.execute_agent_task(message(), "task-1", "session-1")
+    elapsed = time.perf_counter() - started
+
+    assert reply == "business/metrics answered"
+    assert delegate.await_count == 1
+    assert elapsed < ROUTING_SECONDS + DELEGATION_SECONDS - 0.1
+    stats = service.speculation_stats.stats()
+    assert (stats["hits"], stats["misses"], stats["hit_rate"]) == (1, 0, 1.0)
+    assert stats["seconds_saved"] >= DELEGATION_SECONDS - 0.05
+
+@pytest.mark.asyncio
+async def test_speculation_miss_is_cancelled_and_counted_as_waste(monkeypatch, mocker):
+    service = make_orchestrator(monkeypatch, {"action": "delegate", "agent_name": "competitors"}, "business/metrics")
+    delegate = patch_delegation(mocker, seconds=ROUTING_SECONDS / 4)
+
+    reply = await service.execute_agent_task(message("How are competitors doing?"), "task-2", "session-1")
+
+    assert reply == "external/competitors answered"
+    assert [call.kwargs["agent_path"] for call in delegate.await_args_list] == ["business/metrics", "external/competitors"]
+    stats = service.speculation_stats.stats()
+    assert (stats["hits"], stats["misses"], stats["wasted_delegations"]) == (0, 1, 1)  # It finished during routing
+    assert service.last_agents.get("session-1") == "external/competitors"
+
+@pytest.mark.asyncio
+async def test_streamed_target_replaces_a_wrong_speculation(monkeypatch, mocker):
+    service = make_orchestrator(monkeypatch, {"action": "delegate", "agent_name": "competitors"}, "business/metrics",
+                                stream_target="competitors")
+    delegate = patch_delegation(mocker)
+
+    started = time.perf_counter()
+    reply = await service.execute_agent_task(message("How are competitors doing?"), "task-3", "session-1")
+
+    assert reply == "external/competitors answered"
+    assert time.perf_counter() - started < ROUTING_SECONDS + DELEGATION_SECONDS - 0.1
+    assert delegate.call_count == 2  # The speculation was cancelled before it started running
+    stats = service.speculation_stats.stats()
+    assert (stats["misses"], stats["wasted_delegations"]) == (1, 0)
+
+@pytest.mark.asyncio
+async def test_no_speculation_on_non_idempotent_agents_or_new_sessions(monkeypatch, mocker):
+    service = make_orchestrator(monkeypatch, {"action": "delegate", "agent_name": "blog_post"}, "marketing/blog_post")
+    delegate = patch_delegation(mocker)
+
+    await service.execute_agent_task(message("Another draft"), "task-4", "session-1")
+    await service.execute_agent_task(message("Another draft"), "task-5", "session-2")
+
+    assert delegate.await_count == 2
+    assert service.speculation_stats.started == 0
@@ -0,0 +1,46 @@
+import httpx
+import pytest
+
+from apps.api.llm.client_factory import LLMClientFactory
+from apps.api.llm.openai_service import OpenAIService
+from apps.api.llm.resilience import CircuitBreaker, RateLimiter, RetryCounter
+from apps.api.shared.mcp import llm_mcp
+
+def test_clients_share_one_tuned_pool(monkeypatch):
+    factory = LLMClientFactory(max_connections=50, max_keepalive_connections=10, http2=False)
+    service = OpenAIService(api_key="sk-test", rate_limiter=RateLimiter(0, 0), circuit_breaker=CircuitBreaker("t"),
+                            retry_counter=RetryCounter(), client_factory=factory)
+    another = OpenAIService(api_key="sk-test", rate_limiter=RateLimiter(0, 0), circuit_breaker=CircuitBreaker("t"),
+                            retry_counter=RetryCounter(), client_factory=factory)
+    monkeypatch.setattr(llm_mcp, "llm_client_factory", factory)
+    monkeypatch.setattr(llm_mcp.settings, "OPENAI_API_KEY", "sk-test")
+
+    mcp_client = llm_mcp.get_openai_client()
+
+    assert service.client is another.client and service.client.max_retries == 0
+    assert mcp_client is llm_mcp.get_openai_client() and mcp_client is not service.client
+    assert service.client._client is mcp_client._client is factory.http_client  # One connection pool
+    assert factory.stats()["max_connections"] == 50 and factory.clients_created == 2
+
+@pytest.mark.asyncio
+async def test_warmup_opens_connections_and_never_raises():
+    requests = []
+
+    def handler(request):
+        requests.append(request)
+        return httpx.Response(401)  # Unauthenticated HEAD still establishes the connection
+
+    factory = LLMClientFactory()
+    factory._http_client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    assert await factory.warmup("sk-test", connections=2) == 2
+    assert [request.url.path for request in requests] == ["/v1/models", "/v1/models"]
+
+    def failing(request):
+        raise httpx.ConnectError("no route to host")
+
+    factory._http_client = httpx.AsyncClient(transport=httpx.MockTransport(failing))
+    assert await factory.warmup("sk-test", connections=2) == 0
+
+    await factory.aclose()
+    assert factory.stats()["clients"] == 0
+    assert not factory.http_client.is_closed  # A fresh pool is created on next use
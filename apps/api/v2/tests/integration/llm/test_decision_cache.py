@@ -0,0 +1,69 @@
+import pytest
+from types import SimpleNamespace
+from unittest.mock import AsyncMock
+
+from apps.api.llm.decision_cache import OrchestrationDecisionCache, build_decision_key, is_cacheable_history
+from apps.api.llm.fast_router import FastPathRouter
+from apps.api.llm.openai_service import OpenAIService
+from apps.api.llm.resilience import CircuitBreaker, RateLimiter, RetryCounter
+
+AGENTS = [{"name": "chat_support", "path": "customer/chat_support", "description": "Customer support chat."}]
+GREETING = '{"action": "respond_directly", "response_text": "Hello! How can I help?"}'
+
+def make_service(cache, content=GREETING):
+    # A router that never matches keeps every decision on the LLM path
+    router = FastPathRouter(min_score=2.0, context_loader=lambda agent: "")
+    service = OpenAIService(api_key="sk-test", rate_limiter=RateLimiter(0, 0), circuit_breaker=CircuitBreaker("t"),
+                            retry_counter=RetryCounter(), fast_router=router, decision_cache=cache)
+    create = AsyncMock(return_value=SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))], usage=None))
+    service.client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+    return service, create
+
+def test_key_normalizes_query_and_tracks_agent_set_and_conversation_state():
+    key = build_decision_key("Hi!", AGENTS)
+    assert key == build_decision_key("  hi ", AGENTS)
+    assert key != build_decision_key("hi", AGENTS + [{"name": "metrics", "path": "business/metrics"}])
+    assert key != build_decision_key("hi", AGENTS, history=[{"role": "system", "content": "Summary: asked about billing."}])
+
+def test_only_fresh_or_summarized_histories_are_cacheable():
+    assert is_cacheable_history(None) and is_cacheable_history([])
+    assert is_cacheable_history([{"role": "system", "content": "Summary of earlier turns."}])
+    assert not is_cacheable_history([{"role": "user", "content": "hi"}, {"role": "assistant", "content": "hello"}])
+
+@pytest.mark.asyncio
+async def test_repeat_opener_skips_llm():
+    cache = OrchestrationDecisionCache()
+    service, create = make_service(cache)
+
+    first = await service.decide_orchestration_action("Hi", AGENTS)
+    second = await service.decide_orchestration_action("hi!", AGENTS)
+
+    assert create.await_count == 1
+    assert second == {**first, "routed_by": "decision_cache"}
+    assert cache.stats()["hits"] == 1
+
+@pytest.mark.asyncio
+async def test_active_conversation_and_failed_decisions_are_not_cached():
+    cache = OrchestrationDecisionCache()
+    service, create = make_service(cache)
+    history = [{"role": "user", "content": "hi"}, {"role": "assistant", "content": "Hello!"}]
+
+    await service.decide_orchestration_action("hi", AGENTS, history=history)
+    await service.decide_orchestration_action("hi", AGENTS, history=history)
+    assert create.await_count == 2 and len(cache) == 0
+
+    broken, broken_create = make_service(cache, content="not json")
+    await broken.decide_orchestration_action("what can you do", AGENTS)
+    await broken.decide_orchestration_action("what can you do", AGENTS)
+    assert broken_create.await_count == 4 and len(cache) == 0  # Malformed decisions escalate: two models per call
+
+def test_ttl_and_size_bound(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr("apps.api.llm.decision_cache.time.monotonic", lambda: now[0])
+    cache = OrchestrationDecisionCache(max_entries=2, ttl_seconds=10)
+
+    for key in ("a", "b", "c"):
+        cache.set(key, {"action": "respond_directly"})
+    assert cache.get("a") is None and cache.evictions == 1
+    now[0] += 11
+    assert cache.get("b") is None and cache.get("c") is None
@@ -0,0 +1,78 @@
+import time
+import pytest
+
+from apps.api.llm.decision_cache import OrchestrationDecisionCache
+from apps.api.llm.fake_provider import FakeLLMProvider
+from apps.api.llm.model_cascade import CascadePolicy, CascadeStats
+from apps.api.llm.openai_service import OpenAIService
+from apps.api.llm.resilience import CircuitBreaker, RateLimiter, RetryCounter
+from apps.api.llm.token_accounting import TokenLedger
+from apps.api.shared.mcp import llm_mcp
+
+AGENTS = [
+    {"name": "metrics", "path": "business/metrics", "description": "Business metrics."},
+    {"name": "chat_support", "path": "customer/chat_support", "description": "Customer support."},
+]
+
+def make_service(provider, **kwargs):
+    service = OpenAIService(api_key="sk-fake", rate_limiter=RateLimiter(0, 0), circuit_breaker=CircuitBreaker("t"),
+                            retry_counter=RetryCounter(), decision_cache=OrchestrationDecisionCache(),
+                            cascade_policy=CascadePolicy(["small", "large"]), cascade_stats=CascadeStats(),
+                            client_factory=provider, token_ledger=TokenLedger(budgets={}), **kwargs)
+    service.fast_router = None
+    return service
+
+@pytest.mark.asyncio
+async def test_canned_and_catalog_routing_decisions():
+    provider = FakeLLMProvider(ttft_seconds=0, tokens_per_second=0, routes=[("revenue", "metrics")])
+    service = make_service(provider)
+
+    assert (await service.decide_orchestration_action("what was revenue in May", AGENTS))["agent_name"] == "metrics"
+    assert (await service.decide_orchestration_action("connect me to chat support", AGENTS))["agent_name"] == "chat_support"
+    assert (await service.decide_orchestration_action("hello", AGENTS))["action"] == "respond_directly"
+    assert provider.requests == 3  # Confident fake decisions never escalate
+
+@pytest.mark.asyncio
+async def test_streamed_decision_announces_delegate_early():
+    provider = FakeLLMProvider(ttft_seconds=0, tokens_per_second=0, routes=[("sales", "metrics")])
+    service = make_service(provider)
+    announced = []
+
+    decision = await service.decide_orchestration_action("sales please", AGENTS, on_delegate_target=announced.append)
+
+    assert announced == ["metrics"] and decision["agent_name"] == "metrics"
+    assert provider.streams == 1
+    assert service.token_ledger.usage("model", "small")["estimated_requests"] == 0  # Usage chunk was reported
+
+@pytest.mark.asyncio
+async def test_stream_latency_matches_configuration(monkeypatch):
+    provider = FakeLLMProvider(ttft_seconds=0.05, tokens_per_second=200, completion_words=10)
+    monkeypatch.setattr(llm_mcp, "llm_client_factory", provider)
+    monkeypatch.setattr(llm_mcp.settings, "OPENAI_API_KEY", "sk-fake")
+
+    async def fake_load_agent_context(agent_id):
+        return "You report business metrics."
+
+    monkeypatch.setattr(llm_mcp, "_load_agent_context", fake_load_agent_context)
+    started = time.perf_counter()
+    first_chunk_at = None
+    chunks = []
+    async for event in llm_mcp.process_query_stream("metrics_agent", "sales?"):
+        if event["type"] == "content":
+            first_chunk_at = first_chunk_at or time.perf_counter()
+            chunks.append(event["chunk"])
+    elapsed = time.perf_counter() - started
+
+    assert first_chunk_at - started >= 0.05
+    assert elapsed >= 0.05 + (len(chunks) - 1) / 200
+    # Deterministic: the same prompt produces the same answer
+    assert "".join(chunks) == provider.answer_text("gpt-3.5-turbo", llm_mcp._construct_prompt_messages(
+        "metrics_agent", "You report business metrics.", "sales?", None))
+
+@pytest.mark.asyncio
+async def test_injected_errors_exercise_retries_and_breaker():
+    provider = FakeLLMProvider(ttft_seconds=0, tokens_per_second=0, error_rate=1.0)
+    service = make_service(provider, max_retries=1)
+
+    assert await service.get_chat_completion([{"role": "user", "content": "hi"}], model="small") is None
+    assert provider.injected_errors == 2 and service.retry_counter.retries == 1
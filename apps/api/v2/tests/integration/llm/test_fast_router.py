@@ -0,0 +1,116 @@
+import pytest
+from types import SimpleNamespace
+from unittest.mock import AsyncMock
+
+from apps.api.llm.decision_cache import OrchestrationDecisionCache
+from apps.api.llm.fast_router import FastPathRouter
+from apps.api.llm.openai_service import OpenAIService
+from apps.api.llm.resilience import CircuitBreaker, RateLimiter, RetryCounter
+
+AGENTS = [
+    {"name": "metrics", "path": "business/metrics", "description": "Business metrics and KPIs: revenue, sales figures, growth, retention.",
+     "capabilities": ["metrics_reporting"]},
+    {"name": "chat_support", "path": "customer/chat_support", "description": "Customer support chat for account, billing and product issues.",
+     "capabilities": ["customer_support"]},
+    {"name": "calendar", "path": "productivity/calendar", "description": "Schedules meetings and manages calendar events and availability.",
+     "capabilities": ["scheduling"]},
+    {"name": "onboarding", "path": "hr/onboarding", "description": "New hire onboarding checklists, first-week plans and orientation.",
+     "capabilities": ["employee_onboarding"]},
+    {"name": "invoice", "path": "finance/invoice", "description": "Creates, sends and tracks customer invoices and payments.",
+     "capabilities": ["invoicing"]},
+]
+CONTEXTS = {
+    "metrics": "Provide current and historical values for sales, revenue, quarter over quarter growth and churn.",
+    "chat_support": "Help customers who want to talk to support about login problems, refunds and their account.",
+    "calendar": "Book meetings, find free slots tomorrow or next week, reschedule calendar invites.",
+    "onboarding": "Guide a new employee through paperwork, laptop setup and the onboarding checklist.",
+    "invoice": "Generate an invoice for a client, record payments, chase overdue invoices.",
+}
+
+# (query, expected agent name or None when only the LLM should decide)
+LABELED_QUERIES = [
+    ("show me this month's sales figures", "metrics"),
+    ("what is our revenue growth quarter over quarter", "metrics"),
+    ("I need to talk to customer support about my account", "chat_support"),
+    ("schedule a meeting on my calendar tomorrow", "calendar"),
+    ("onboarding checklist for a new hire", "onboarding"),
+    ("create an invoice for the client", "invoice"),
+    ("hi", None),
+    ("what can you do", None),
+    ("tell me a joke", None),
+]
+
+def make_router(**kwargs):
+    router = FastPathRouter(context_loader=lambda agent: CONTEXTS.get(agent["name"], ""), **kwargs)
+    router.build(AGENTS)
+    return router
+
+def make_service(router, content='{"action": "respond_directly", "response_text": "Hello!"}'):
+    service = OpenAIService(api_key="sk-test", rate_limiter=RateLimiter(0, 0), circuit_breaker=CircuitBreaker("t"),
+                            retry_counter=RetryCounter(), fast_router=router,
+                            decision_cache=OrchestrationDecisionCache())
+    create = AsyncMock(return_value=SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))], usage=None))
+    service.client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+    return service, create
+
+def test_confident_query_routes_and_unknown_vocabulary_falls_through():
+    router = make_router()
+
+    match = router.route("show me this month's sales figures")
+    assert match.agent["path"] == "business/metrics"
+    assert match.score >= router.min_score and match.margin >= router.min_margin
+    assert router.route("hello there, how are you?") is None
+    assert (router.hits, router.misses) == (1, 1)
+
+def test_low_margin_query_falls_through():
+    router = make_router(min_margin=0.4)
+    # "meetings" (calendar) and "customers" (support/invoice) split the evidence
+    assert router.route("customer meeting invoice support") is None
+
+def test_index_rebuilt_only_when_agent_set_changes():
+    router = make_router()
+    router.route("sales figures", AGENTS)
+    router.route("sales figures", list(AGENTS))
+    assert router.builds == 1
+    router.route("sales figures", AGENTS[:2])
+    assert router.builds == 2
+
+@pytest.mark.asyncio
+async def test_decide_orchestration_action_skips_llm_on_fast_path_hit():
+    service, create = make_service(make_router())
+
+    decision = await service.decide_orchestration_action("show me this month's sales figures", AGENTS)
+
+    assert decision == {"action": "delegate", "agent_name": "metrics", "agent_path": "business/metrics",
+                        "query_for_agent": "show me this month's sales figures", "routed_by": "fast_path"}
+    create.assert_not_awaited()
+
+@pytest.mark.asyncio
+async def test_decide_orchestration_action_uses_llm_for_misses_and_active_conversations():
+    router = make_router()
+    service, create = make_service(router)
+
+    assert (await service.decide_orchestration_action("hi", AGENTS))["action"] == "respond_directly"
+    history = [{"role": "user", "content": "How are sales?"}, {"role": "assistant", "content": "Up 4%."}]
+    await service.decide_orchestration_action("show me this month's sales figures", AGENTS, history=history)
+
+    assert create.await_count == 2
+    assert router.llm_decision_latency.count == 2
+
+def test_labeled_queries_hit_rate_and_precision():
+    """Hit rate and hit precision on a small labeled set."""
+    router = make_router()
+    correct = wrong = 0
+    for query, expected in LABELED_QUERIES:
+        match = router.route(query)
+        if match is None:
+            continue
+        if match.agent["name"] == expected:
+            correct += 1
+        else:
+            wrong += 1
+
+    routable = sum(1 for _, expected in LABELED_QUERIES if expected)
+    assert wrong == 0
+    assert correct >= routable - 1
+    assert router.route_latency.count == len(LABELED_QUERIES)
@@ -0,0 +1,80 @@
+import asyncio
+import pytest
+from types import SimpleNamespace
+from unittest.mock import AsyncMock
+
+from apps.api.llm.decision_cache import OrchestrationDecisionCache
+from apps.api.llm.fast_router import FastPathRouter
+from apps.api.llm.incremental_json import IncrementalJSONObjectParser
+from apps.api.llm.openai_service import OpenAIService
+from apps.api.llm.resilience import CircuitBreaker, RateLimiter, RetryCounter
+
+AGENTS = [{"name": "metrics", "path": "business/metrics", "description": "Business metrics."}]
+DECISION = '{"action": "delegate", "agent_name": "metrics", "query_for_agent": "Sales for \\"May\\"?"}'
+
+def test_parser_reports_fields_as_they_complete():
+    parser = IncrementalJSONObjectParser()
+    completed = [parser.feed(DECISION[i:i + 7]) for i in range(0, len(DECISION), 7)]
+
+    flattened = [field for step in completed for field in step.items()]
+    assert flattened == [("action", "delegate"), ("agent_name", "metrics"), ("query_for_agent", 'Sales for "May"?')]
+    # agent_name completes well before the document does
+    assert next(i for i, step in enumerate(completed) if "agent_name" in step) < len(completed) - 3
+
+def test_parser_ignores_nested_and_non_string_values():
+    parser = IncrementalJSONObjectParser()
+    parser.feed('{"n": 3, "meta": {"action": "nested"}, "tags": ["a"], "action": "clarify"}')
+    assert parser.fields == {"action": "clarify"}
+
+class FakeDecisionStream:
+    """Streams DECISION in small fragments; records how far it got when the callback fired."""
+    def __init__(self, text, fragment_size=5):
+        self.fragments = [text[i:i + fragment_size] for i in range(0, len(text), fragment_size)]
+        self.sent = 0
+        self.closed = False
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self.sent >= len(self.fragments):
+            raise StopAsyncIteration
+        fragment = self.fragments[self.sent]
+        self.sent += 1
+        await asyncio.sleep(0)
+        return SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=fragment))], usage=None)
+
+    async def close(self):
+        self.closed = True
+
+def make_service(stream):
+    service = OpenAIService(api_key="sk-test", rate_limiter=RateLimiter(0, 0), circuit_breaker=CircuitBreaker("t"),
+                            retry_counter=RetryCounter(), fast_router=FastPathRouter(min_score=2.0),
+                            decision_cache=OrchestrationDecisionCache())
+    create = AsyncMock(return_value=stream)
+    service.client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+    return service, create
+
+@pytest.mark.asyncio
+async def test_streamed_decision_announces_delegate_target_early():
+    stream = FakeDecisionStream(DECISION)
+    service, create = make_service(stream)
+    announced = []
+
+    decision = await service.decide_orchestration_action(
+        "How were sales in May?", AGENTS, on_delegate_target=lambda name: announced.append((name, stream.sent)))
+
+    assert decision["agent_name"] == "metrics" and decision["query_for_agent"] == 'Sales for "May"?'
+    assert announced[0][0] == "metrics" and announced[0][1] < len(stream.fragments)
+    assert create.await_args.kwargs["stream"] is True
+    assert stream.closed
+
+@pytest.mark.asyncio
+async def test_non_delegate_decision_never_announces():
+    stream = FakeDecisionStream('{"action": "respond_directly", "response_text": "Hi there!"}')
+    service, _ = make_service(stream)
+    announced = []
+
+    decision = await service.decide_orchestration_action("hi", AGENTS, on_delegate_target=announced.append)
+
+    assert decision["action"] == "respond_directly" and announced == []
@@ -0,0 +1,184 @@
+import json
+import pytest
+from types import SimpleNamespace
+from unittest.mock import AsyncMock
+
+from apps.api.llm.decision_cache import OrchestrationDecisionCache
+from apps.api.llm.model_cascade import CascadePolicy, CascadeStats, score_routing_decision, score_text_answer
+from apps.api.llm.openai_service import OpenAIService
+from apps.api.llm.resilience import CircuitBreaker, RateLimiter, RetryCounter
+from apps.api.shared.mcp import llm_mcp
+
+AGENTS = [
+    {"name": "metrics", "path": "business/metrics", "description": "Business metrics."},
+    {"name": "chat_support", "path": "customer/chat_support", "description": "Customer support."},
+]
+
+def make_service(responses_by_model):
+    stats = CascadeStats()
+    service = OpenAIService(api_key="sk-test", rate_limiter=RateLimiter(0, 0), circuit_breaker=CircuitBreaker("t"),
+                            retry_counter=RetryCounter(), decision_cache=OrchestrationDecisionCache(),
+                            cascade_policy=CascadePolicy(["small", "large"], min_confidence=0.6), cascade_stats=stats)
+    service.fast_router = None
+
+    async def create(**kwargs):
+        # Like the provider, stop at max_tokens (~4 characters per token)
+        content = responses_by_model[kwargs["model"]][:kwargs["max_tokens"] * 4]
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))], usage=None)
+
+    service.client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=AsyncMock(side_effect=create))))
+    return service, service.client.chat.completions.create, stats
+
+def test_routing_decision_scoring():
+    assert score_routing_decision('{"action": "delegate", "agent_name": "metrics", "confidence": 0.9}', AGENTS).accepted
+    assert score_routing_decision('{"action": "delegate", "agent_name": "business/metrics"}', AGENTS).accepted
+    assert score_routing_decision('{"action": "respond_directly", "response_text": "Hi"}', AGENTS).accepted
+    assert score_routing_decision('{"action": "fan_out", "delegations": [{"agent_name": "metrics"}, {"agent_name": "chat_support"}]}', AGENTS).accepted
+    rejected = {
+        "not json": "invalid_json",
+        '{"action": "dance"}': "invalid_action",
+        '{"action": "delegate", "agent_name": "weather"}': "unknown_agent",
+        '{"action": "delegate", "agent_name": "metrics", "confidence": 0.3}': "low_confidence",
+        '{"action": "cannot_handle"}': "cannot_handle",
+        '{"action": "fan_out", "delegations": []}': "invalid_action",
+        '{"action": "fan_out", "delegations": [{"agent_name": "metrics"}, {"agent_name": "weather"}]}': "unknown_agent",
+    }
+    for content, reason in rejected.items():
+        assert score_routing_decision(content, AGENTS, min_confidence=0.6).reason == reason
+
+def test_text_answer_scoring():
+    assert score_text_answer("Revenue grew 4% quarter over quarter.").accepted
+    assert score_text_answer("Yes.", min_length=20).reason == "too_short"
+    assert score_text_answer("I'm not sure which quarter you mean, sorry.").reason == "hedged"
+
+@pytest.mark.asyncio
+async def test_confident_cheap_decision_is_kept():
+    service, create, stats = make_service({"small": '{"action": "delegate", "agent_name": "metrics", "confidence": 0.9}'})
+
+    decision = await service.decide_orchestration_action("how are sales", AGENTS)
+
+    assert decision["agent_name"] == "metrics"
+    assert [call.kwargs["model"] for call in create.await_args_list] == ["small"]
+    assert stats.stats()["orchestrator"]["answered_by"] == {"small": 1}
+
+@pytest.mark.asyncio
+async def test_unsure_or_malformed_cheap_decision_escalates():
+    service, create, stats = make_service({
+        "small": '{"action": "delegate", "agent_name": "chat_support", "confidence": 0.4}',
+        "large": '{"action": "delegate", "agent_name": "metrics", "confidence": 0.8}',
+    })
+    assert (await service.decide_orchestration_action("how are sales", AGENTS))["agent_name"] == "metrics"
+    assert [call.kwargs["model"] for call in create.await_args_list] == ["small", "large"]
+
+    service, _, stats = make_service({"small": "Sure, metrics!", "large": '{"action": "respond_directly", "response_text": "Hi"}'})
+    assert (await service.decide_orchestration_action("hi", AGENTS))["action"] == "respond_directly"
+    assert stats.stats()["orchestrator"]["escalations"] == {"invalid_json": 1}
+
+@pytest.mark.asyncio
+async def test_failed_escalation_falls_back_to_well_formed_cheap_decision():
+    service, _, _ = make_service({"small": '{"action": "delegate", "agent_name": "metrics", "confidence": 0.4}', "large": ""})
+    assert (await service.decide_orchestration_action("how are sales", AGENTS))["agent_name"] == "metrics"
+
+@pytest.mark.asyncio
+async def test_multi_step_plan_fits_the_decision_budget():
+    steps = [
+        {"id": "s1", "agent_name": "metrics",
+         "query_for_agent": "Summarize Q3 2024 sales by region and product line, with revenue, units and margin for each."},
+        {"id": "s2", "agent_name": "metrics",
+         "query_for_agent": "Summarize Q2 2024 sales by region and product line, with revenue, units and margin for each."},
+        {"id": "s3", "agent_name": "chat_support",
+         "query_for_agent": "List the most common customer complaints about Q3 2024 orders, grouped by product line."},
+        {"id": "s4", "agent_name": "metrics",
+         "query_for_agent": "Explain the quarter-over-quarter change between {s2} and {s1}, and which of these complaints "
+                            "may account for it: {s3}. Highlight the regions and product lines that need attention.",
+         "depends_on": ["s1", "s2", "s3"]},
+    ]
+    plan = json.dumps({"action": "plan", "steps": steps, "confidence": 0.8})
+    service, create, _ = make_service({"small": plan, "large": plan})
+
+    decision = await service.decide_orchestration_action("compare Q2 and Q3 sales and explain", AGENTS)
+
+    assert decision["action"] == "plan" and decision["steps"] == steps
+    assert [call.kwargs["model"] for call in create.await_args_list] == ["small"]
+
+@pytest.mark.asyncio
+async def test_multi_delegation_fan_out_fits_the_decision_budget():
+    delegations = [
+        {"agent_name": "metrics",
+         "query_for_agent": "Report Q3 2024 revenue, units sold and gross margin by region, compared with Q2 2024."},
+        {"agent_name": "metrics",
+         "query_for_agent": "Report the Q3 2024 customer acquisition cost and churn rate by marketing channel."},
+        {"agent_name": "chat_support",
+         "query_for_agent": "Summarize the open support tickets from enterprise customers in Q3 2024 and their status."},
+        {"agent_name": "chat_support",
+         "query_for_agent": "List the most frequent refund reasons in Q3 2024 and how many orders each one affected."},
+    ]
+    fan_out = json.dumps({"action": "fan_out", "delegations": delegations, "confidence": 0.85})
+    service, create, _ = make_service({"small": fan_out, "large": fan_out})
+
+    decision = await service.decide_orchestration_action("give me the full Q3 business review", AGENTS)
+
+    assert decision["action"] == "fan_out" and decision["delegations"] == delegations
+    assert [call.kwargs["model"] for call in create.await_args_list] == ["small"]
+
+class FakeStream:
+    def __init__(self, words):
+        self._chunks = [SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=word))]) for word in words]
+
+    def __aiter__(self):
+        return self._iter()
+
+    async def _iter(self):
+        for chunk in self._chunks:
+            yield chunk
+
+    async def close(self):
+        pass
+
+CASCADE_CONTEXT = "<!-- model_cascade: gpt-4o-mini, gpt-4o -->\n<!-- cascade_min_length: 10 -->\nYou report business metrics."
+
+@pytest.fixture
+def mcp_answers(monkeypatch):
+    answers = {}
+
+    async def fake_load_agent_context(agent_id):
+        return CASCADE_CONTEXT
+
+    async def create(**kwargs):
+        return FakeStream(answers[kwargs["model"]])
+
+    client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=AsyncMock(side_effect=create))))
+    monkeypatch.setattr(llm_mcp, "_load_agent_context", fake_load_agent_context)
+    monkeypatch.setattr(llm_mcp, "get_openai_client", lambda: client)
+    monkeypatch.setattr(llm_mcp, "cascade_stats", CascadeStats())
+    return answers, client.chat.completions.create
+
+async def collect(*args):
+    return [event async for event in llm_mcp.process_query_stream(*args)]
+
+def test_cascade_front_matter():
+    metadata = llm_mcp.parse_context_metadata(CASCADE_CONTEXT)
+    assert metadata["model_cascade"] == ["gpt-4o-mini", "gpt-4o"] and metadata["cascade_min_length"] == 10
+    assert CascadePolicy.from_context_metadata({}) is None
+
+@pytest.mark.asyncio
+async def test_mcp_agent_relays_good_cheap_answer(mcp_answers):
+    answers, create = mcp_answers
+    answers["gpt-4o-mini"] = ["Sales rose ", "4% in May."]
+
+    events = await collect("metrics_agent", "sales?")
+
+    assert [e["chunk"] for e in events if e["type"] == "content"] == ["Sales rose ", "4% in May."]
+    assert [call.kwargs["model"] for call in create.await_args_list] == ["gpt-4o-mini"]
+
+@pytest.mark.asyncio
+async def test_mcp_agent_escalates_weak_cheap_answer(mcp_answers):
+    answers, create = mcp_answers
+    answers["gpt-4o-mini"] = ["I don't know."]
+    answers["gpt-4o"] = ["Sales rose ", "4% in May."]
+
+    events = await collect("metrics_agent", "sales?")
+
+    assert "".join(e["chunk"] for e in events if e["type"] == "content") == "Sales rose 4% in May."
+    assert [call.kwargs["model"] for call in create.await_args_list] == ["gpt-4o-mini", "gpt-4o"]
+    assert llm_mcp.cascade_stats.stats()["metrics_agent"]["escalations"] == {"hedged": 1}
@@ -0,0 +1,106 @@
+import httpx
+import openai
+import pytest
+from types import SimpleNamespace
+from unittest.mock import AsyncMock
+
+from apps.api.llm import openai_service as openai_service_module
+from apps.api.llm.openai_service import OpenAIService
+from apps.api.llm.resilience import (
+    CircuitBreaker, CircuitOpenError, RateLimiter, RetryCounter, TokenBucket, backoff_delay,
+    estimate_request_tokens, retry_after_from_exception
+)
+
+MESSAGES = [{"role": "user", "content": "How many active users?"}]
+
+def make_rate_limit_error(retry_after: str = "0.25") -> openai.RateLimitError:
+    response = httpx.Response(429, headers={"retry-after": retry_after},
+                              request=httpx.Request("POST", "https://api.openai.com/v1/chat/completions"))
+    return openai.RateLimitError("Rate limit reached", response=response, body=None)
+
+def make_completion(text: str, total_tokens: int = 20):
+    return SimpleNamespace(
+        choices=[SimpleNamespace(message=SimpleNamespace(content=text))],
+        usage=SimpleNamespace(total_tokens=total_tokens)
+    )
+
+@pytest.fixture
+def service(monkeypatch):
+    sleeps = []
+
+    async def fake_sleep(seconds):
+        sleeps.append(seconds)
+
+    monkeypatch.setattr(openai_service_module.asyncio, "sleep", fake_sleep)
+    svc = OpenAIService(
+        api_key="sk-test",
+        rate_limiter=RateLimiter(requests_per_minute=0, tokens_per_minute=0),
+        circuit_breaker=CircuitBreaker("test", failure_threshold=2, recovery_timeout_seconds=60),
+        retry_counter=RetryCounter(),
+        max_retries=3
+    )
+    svc.client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=AsyncMock())))
+    svc.sleeps = sleeps
+    return svc
+
+@pytest.mark.asyncio
+async def test_retries_honor_retry_after_then_succeed(service):
+    service.client.chat.completions.create.side_effect = [make_rate_limit_error(), make_completion(" 1500 ")]
+
+    result = await service.get_chat_completion(MESSAGES)
+
+    assert result == "1500"
+    assert service.retry_counter.stats()["by_reason"] == {"RateLimitError": 1}
+    assert 0.25 <= service.sleeps[0] < 0.25 + 0.5  # Retry-After plus jitter
+    assert service.circuit_breaker.state == CircuitBreaker.CLOSED
+
+@pytest.mark.asyncio
+async def test_breaker_opens_and_fails_fast(service):
+    service.client.chat.completions.create.side_effect = make_rate_limit_error()
+
+    assert await service.get_chat_completion(MESSAGES) is None
+    assert service.circuit_breaker.state == CircuitBreaker.OPEN
+    calls_when_opened = service.client.chat.completions.create.await_count
+    assert calls_when_opened == 2  # Threshold reached on the second failure; no further attempts
+
+    assert await service.get_chat_completion(MESSAGES) is None
+    assert service.client.chat.completions.create.await_count == calls_when_opened
+    assert service.circuit_breaker.stats()["rejected_calls"] == 2
+
+def test_breaker_half_open_probe_closes_on_success(monkeypatch):
+    breaker = CircuitBreaker("probe", failure_threshold=1, recovery_timeout_seconds=10)
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+
+    opened_at = breaker._opened_at
+    monkeypatch.setattr("apps.api.llm.resilience.time.monotonic", lambda: opened_at + 11)
+    breaker.before_call()  # The single probe is allowed
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()  # Concurrent calls are still rejected
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+@pytest.mark.asyncio
+async def test_rate_limiter_paces_by_estimated_tokens(monkeypatch):
+    sleeps = []
+
+    async def fake_sleep(seconds):
+        sleeps.append(seconds)
+
+    monkeypatch.setattr("apps.api.llm.resilience.asyncio.sleep", fake_sleep)
+    limiter = RateLimiter(requests_per_minute=600, tokens_per_minute=600)  # 10 tokens/second
+
+    assert await limiter.acquire(estimated_tokens=600) == 0.0
+    waited = await limiter.acquire(estimated_tokens=30)
+    assert waited == pytest.approx(3.0, abs=0.05)
+    assert sleeps and limiter.stats()["throttled_requests"] == 1
+
+    limiter.reconcile(estimated_tokens=30, actual_tokens=10)  # Refund over-estimate
+    assert limiter.token_bucket.tokens == pytest.approx(-10, abs=1)
+
+def test_helpers():
+    bucket = TokenBucket(rate_per_minute=60)
+    assert bucket.reserve(120) == pytest.approx(0.0, abs=0.01)  # Oversized requests are capped at capacity
+    assert estimate_request_tokens(MESSAGES, max_tokens=100) > 100
+    assert retry_after_from_exception(make_rate_limit_error("2")) == 2.0
+    assert 0 <= backoff_delay(attempt=3, base_delay=0.5, max_delay=2) <= 2
@@ -0,0 +1,58 @@
+import pytest
+from types import SimpleNamespace
+from unittest.mock import AsyncMock
+
+from apps.api.llm.decision_cache import OrchestrationDecisionCache
+from apps.api.llm.fast_router import FastPathRouter
+from apps.api.llm.openai_service import OpenAIService
+from apps.api.llm.orchestrator_prompt import ORCHESTRATOR_STATIC_INSTRUCTIONS, OrchestratorPromptCompiler
+from apps.api.llm.resilience import CircuitBreaker, RateLimiter, RetryCounter
+
+AGENTS = [
+    {"name": "metrics", "path": "business/metrics", "description": "Business metrics."},
+    {"name": "chat_support", "path": "customer/chat_support", "description": "Customer support."},
+]
+
+def test_prompt_compiled_once_per_agent_set_and_independent_of_discovery_order():
+    compiler = OrchestratorPromptCompiler()
+
+    first = compiler.system_prompt(AGENTS)
+    assert compiler.system_prompt(list(AGENTS)) is first
+    assert compiler.system_prompt(list(reversed(AGENTS))) == first  # Different version, identical bytes
+    assert compiler.builds == 2 and compiler.reuses == 1
+
+    assert first.startswith(ORCHESTRATOR_STATIC_INSTRUCTIONS)
+    assert first.index("Agent Name: chat_support") < first.index("Agent Name: metrics")
+    assert "ALWAYS delegate to the customer/chat_support agent" in first
+    assert "ALWAYS delegate" not in compiler.system_prompt(AGENTS[:1])
+
+def test_messages_keep_stable_prefix_before_history():
+    compiler = OrchestratorPromptCompiler()
+    history = [{"role": "user", "content": "How are sales?"}, {"role": "assistant", "content": "Up 4%."}]
+
+    fresh = compiler.build_messages("hi", AGENTS)
+    follow_up = compiler.build_messages("and last month?", AGENTS, history)
+
+    assert fresh[0] == follow_up[0]
+    assert follow_up[1:] == history + [{"role": "user", "content": "and last month?"}]
+
+@pytest.mark.asyncio
+async def test_decide_orchestration_action_uses_compiled_prompt():
+    compiler = OrchestratorPromptCompiler()
+    service = OpenAIService(api_key="sk-test", rate_limiter=RateLimiter(0, 0), circuit_breaker=CircuitBreaker("t"),
+                            retry_counter=RetryCounter(), fast_router=FastPathRouter(min_score=2.0),
+                            decision_cache=OrchestrationDecisionCache(ttl_seconds=0), prompt_compiler=compiler)
+    usage = SimpleNamespace(total_tokens=900, prompt_tokens=850, prompt_tokens_details=SimpleNamespace(cached_tokens=768))
+    create = AsyncMock(return_value=SimpleNamespace(
+        choices=[SimpleNamespace(message=SimpleNamespace(content='{"action": "respond_directly", "response_text": "Hi"}'))],
+        usage=usage))
+    service.client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+
+    await service.decide_orchestration_action("hi", AGENTS)
+    await service.decide_orchestration_action("hello", AGENTS)
+
+    first_call, second_call = (call.kwargs["messages"] for call in create.await_args_list)
+    assert first_call[0] == second_call[0] == {"role": "system", "content": compiler.system_prompt(AGENTS)}
+    stats = compiler.stats()
+    assert stats["builds"] == 1 and stats["reuses"] >= 2
+    assert stats["provider_prefix_cache"]["cached_prompt_tokens"] >= 768 * 2
@@ -0,0 +1,133 @@
+import asyncio
+import pytest
+from types import SimpleNamespace
+from unittest.mock import AsyncMock
+
+from apps.api.llm.openai_service import OpenAIService
+from apps.api.llm.resilience import CircuitBreaker, RateLimiter, RetryCounter
+from apps.api.llm.single_flight import SingleFlight, StreamSingleFlight, build_request_key
+from apps.api.shared.mcp import llm_mcp
+from apps.api.shared.mcp.response_cache import MCPResponseCache
+
+MESSAGES = [{"role": "user", "content": "What is the onboarding checklist?"}]
+
+@pytest.mark.asyncio
+async def test_identical_concurrent_completions_share_one_call():
+    release = asyncio.Event()
+
+    async def slow_create(**kwargs):
+        await release.wait()
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content="Checklist"))], usage=None)
+
+    single_flight = SingleFlight("test")
+    service = OpenAIService(api_key="sk-test", rate_limiter=RateLimiter(0, 0), circuit_breaker=CircuitBreaker("t"),
+                            retry_counter=RetryCounter(), single_flight=single_flight)
+    service.client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=AsyncMock(side_effect=slow_create))))
+
+    callers = [asyncio.create_task(service.get_chat_completion(MESSAGES)) for _ in range(5)]
+    other = asyncio.create_task(service.get_chat_completion(MESSAGES, temperature=0.1))  # Different key
+    await asyncio.sleep(0)
+    release.set()
+
+    assert await asyncio.gather(*callers) == ["Checklist"] * 5
+    assert await other == "Checklist"
+    assert service.client.chat.completions.create.await_count == 2
+    assert single_flight.stats() == {"in_flight": 0, "leaders": 2, "coalesced": 4}
+
+@pytest.mark.asyncio
+async def test_cancelled_caller_does_not_cancel_shared_call():
+    release = asyncio.Event()
+
+    async def call():
+        await release.wait()
+        return "done"
+
+    single_flight = SingleFlight("test")
+    first = asyncio.create_task(single_flight.do("k", call))
+    second = asyncio.create_task(single_flight.do("k", call))
+    await asyncio.sleep(0)
+    first.cancel()
+    await asyncio.sleep(0)
+    release.set()
+    assert await second == "done"
+
+@pytest.mark.asyncio
+async def test_stream_fan_out_late_joiner_and_errors():
+    gate = asyncio.Event()
+    started = {"count": 0}
+
+    async def upstream():
+        started["count"] += 1
+        yield "a"
+        await gate.wait()
+        yield "b"
+        raise RuntimeError("provider dropped")
+
+    fan_out = StreamSingleFlight("test")
+
+    async def consume():
+        items = []
+        try:
+            async for item in fan_out.stream("k", upstream):
+                items.append(item)
+        except RuntimeError as e:
+            items.append(f"error: {e}")
+        return items
+
+    early = asyncio.create_task(consume())
+    await asyncio.sleep(0.01)
+    late = asyncio.create_task(consume())  # Joins after "a" was produced
+    await asyncio.sleep(0.01)
+    gate.set()
+
+    expected = ["a", "b", "error: provider dropped"]
+    assert await early == expected
+    assert await late == expected
+    assert started["count"] == 1
+
+@pytest.mark.asyncio
+async def test_process_query_stream_coalesces_identical_queries(monkeypatch):
+    release = asyncio.Event()
+    calls = {"count": 0}
+
+    class FakeStream:
+        def __aiter__(self):
+            return self._iter()
+
+        async def _iter(self):
+            await release.wait()
+            for word in ["Welcome ", "aboard"]:
+                yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=word))])
+
+        async def close(self):
+            pass
+
+    async def fake_create(**kwargs):
+        calls["count"] += 1
+        return FakeStream()
+
+    async def fake_load_agent_context(agent_id):
+        return "You are the onboarding agent."
+
+    fake_client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=fake_create)))
+    monkeypatch.setattr(llm_mcp, "_load_agent_context", fake_load_agent_context)
+    monkeypatch.setattr(llm_mcp, "get_openai_client", lambda: fake_client)
+    monkeypatch.setattr(llm_mcp, "response_cache", MCPResponseCache())
+    monkeypatch.setattr(llm_mcp, "LLM_SINGLE_FLIGHT_ENABLED", True)
+    monkeypatch.setattr(llm_mcp, "stream_single_flight", StreamSingleFlight("test"))
+
+    async def collect():
+        return [e["chunk"] async for e in llm_mcp.process_query_stream("onboarding", "First day?") if e["type"] == "content"]
+
+    consumers = [asyncio.create_task(collect()) for _ in range(3)]
+    await asyncio.sleep(0.01)
+    release.set()
+
+    assert await asyncio.gather(*consumers) == [["Welcome ", "aboard"]] * 3
+    assert calls["count"] == 1
+
+def test_request_key_covers_all_request_fields():
+    base = build_request_key("gpt-4o-mini", MESSAGES, 0.2, 150, {"type": "json_object"})
+    assert base == build_request_key("gpt-4o-mini", list(MESSAGES), 0.2, 150, {"type": "json_object"})
+    assert base != build_request_key("gpt-4o-mini", MESSAGES, 0.2, 150, None)
+    assert base != build_request_key("gpt-4o-mini", MESSAGES, 0.2, 151, {"type": "json_object"})
@@ -0,0 +1,138 @@
+import pytest
+from types import SimpleNamespace
+from unittest.mock import AsyncMock
+
+from apps.api.llm.openai_service import OpenAIService
+from apps.api.llm.resilience import CircuitBreaker, RateLimiter, RetryCounter
+from apps.api.llm.token_accounting import LLMBudgetExceededError, TokenLedger, current_usage_scope, usage_scope
+from apps.api.shared.mcp import llm_mcp
+
+MESSAGES = [{"role": "user", "content": "How were sales last month?"}]
+
+def make_service(ledger):
+    service = OpenAIService(api_key="sk-test", rate_limiter=RateLimiter(0, 0), circuit_breaker=CircuitBreaker("t"),
+                            retry_counter=RetryCounter(), token_ledger=ledger)
+    usage = SimpleNamespace(prompt_tokens=40, completion_tokens=10, total_tokens=50)
+    create = AsyncMock(return_value=SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content="Up 4%."))], usage=usage))
+    service.client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+    return service, create
+
+def test_usage_scopes_nest_and_restore():
+    with usage_scope(user_id="u1", session_id="s1"):
+        with usage_scope(agent_id="business/metrics"):
+            assert current_usage_scope() == {"user": "u1", "session": "s1", "agent": "business/metrics"}
+        assert current_usage_scope() == {"user": "u1", "session": "s1"}
+    assert current_usage_scope() == {}
+
+@pytest.mark.asyncio
+async def test_response_usage_attributed_to_scope():
+    ledger = TokenLedger(budgets={})
+    service, _ = make_service(ledger)
+
+    with usage_scope(user_id="u1", session_id="s1", agent_id="system/orchestrator"):
+        await service.get_chat_completion(MESSAGES, model="gpt-4o")
+
+    for dimension, key in (("user", "u1"), ("session", "s1"), ("agent", "system/orchestrator"), ("model", "gpt-4o")):
+        usage = ledger.usage(dimension, key)
+        assert usage["prompt_tokens"] == 40 and usage["completion_tokens"] == 10 and usage["estimated_requests"] == 0
+
+@pytest.mark.asyncio
+async def test_exhausted_budget_downgrades_or_rejects():
+    downgrading = TokenLedger(budgets={"user": 50}, downgrade_model="gpt-3.5-turbo")
+    service, create = make_service(downgrading)
+    with usage_scope(user_id="u1"):
+        await service.get_chat_completion(MESSAGES, model="gpt-4o")  # 50 tokens: budget now used up
+        await service.get_chat_completion(MESSAGES, model="gpt-4o")
+    assert [call.kwargs["model"] for call in create.await_args_list] == ["gpt-4o", "gpt-3.5-turbo"]
+    assert downgrading.downgraded_requests == 1
+
+    rejecting = TokenLedger(budgets={"session": 50}, action="reject")
+    service, create = make_service(rejecting)
+    with usage_scope(session_id="s1"):
+        assert await service.get_chat_completion(MESSAGES) == "Up 4%."
+        assert await service.get_chat_completion(MESSAGES) is None
+        with pytest.raises(LLMBudgetExceededError):
+            rejecting.enforce_budget("gpt-4o")
+    assert create.await_count == 1
+    with usage_scope(session_id="s2"):
+        assert rejecting.enforce_budget("gpt-4o") == "gpt-4o"  # Other sessions are unaffected
+
+def test_budget_window_resets(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("apps.api.llm.token_accounting.time.monotonic", lambda: now[0])
+    ledger = TokenLedger(budgets={"agent": 10}, window_seconds=60, action="reject")
+    ledger.record("gpt-4o", 8, 4, scope={"agent": "business/metrics"})
+    with pytest.raises(LLMBudgetExceededError):
+        ledger.enforce_budget("gpt-4o", scope={"agent": "business/metrics"})
+    now[0] += 61
+    assert ledger.enforce_budget("gpt-4o", scope={"agent": "business/metrics"}) == "gpt-4o"
+
+def test_flush_hands_deltas_to_sink_once():
+    flushed = []
+    ledger = TokenLedger(budgets={}, flush_sink=flushed.append)
+    ledger.record("gpt-4o", 10, 5, scope={"user": "u1"})
+
+    ledger.flush()
+    ledger.flush()  # Nothing new
+    ledger.record("gpt-4o", 1, 1, scope={"user": "u1"})
+    ledger.flush()
+
+    assert len(flushed) == 2
+    assert flushed[0]["user"]["u1"]["total_tokens"] == 15 and flushed[1]["user"]["u1"]["total_tokens"] == 2
+    assert ledger.usage("user", "u1")["total_tokens"] == 17
+
+class FakeStream:
+    def __init__(self, words):
+        self._chunks = [SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=word))]) for word in words]
+
+    def __aiter__(self):
+        return self._iter()
+
+    async def _iter(self):
+        for chunk in self._chunks:
+            yield chunk
+
+    async def close(self):
+        pass
+
+@pytest.mark.asyncio
+async def test_mcp_streams_are_estimated_and_budgeted(monkeypatch):
+    ledger = TokenLedger(budgets={"agent": 1}, action="reject")
+    create = AsyncMock(return_value=FakeStream(["Sales ", "rose."]))
+
+    async def fake_load_agent_context(agent_id):
+        return "You report business metrics."
+
+    monkeypatch.setattr(llm_mcp, "token_ledger", ledger)
+    monkeypatch.setattr(llm_mcp, "_load_agent_context", fake_load_agent_context)
+    monkeypatch.setattr(llm_mcp, "get_openai_client", lambda: SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create))))
+
+    with usage_scope(user_id="u1"):
+        first = [event async for event in llm_mcp.process_query_stream("metrics_agent", "sales?")]
+        second = [event async for event in llm_mcp.process_query_stream("metrics_agent", "sales?")]
+
+    usage = ledger.usage("agent", "metrics_agent")
+    assert usage["estimated_requests"] == 1 and usage["completion_tokens"] > 0
+    assert ledger.usage("user", "u1")["requests"] == 1
+    assert first[-1]["type"] == "eos" and create.await_count == 1
+    assert [event.get("code") for event in second if event["type"] == "error"] == ["LLM_BUDGET_EXCEEDED"]
+
+@pytest.mark.asyncio
+async def test_usage_endpoint_requires_auth_and_shows_only_the_callers_own_totals(client_and_app, monkeypatch):
+    from apps.api import main
+    ledger = TokenLedger(budgets={})
+    ledger.record("gpt-4o", 40, 10, scope={"user": "u1", "session": "s1", "agent": "business/metrics"})
+    ledger.record("gpt-4o", 400, 100, scope={"user": "someone-else", "session": "s2"})
+    monkeypatch.setattr(main, "token_ledger", ledger)
+    client, app = client_and_app
+    app.dependency_overrides[main.get_current_authenticated_user] = lambda: SimpleNamespace(id="u1")
+
+    report = (await client.get("/llm/usage")).json()
+
+    assert set(report["usage"]) == {"model", "agent"}
+    assert report["usage"]["model"]["gpt-4o"]["total_tokens"] == 550
+    assert report["user_usage"]["total_tokens"] == 50
+
+    del app.dependency_overrides[main.get_current_authenticated_user]
+    unauthenticated = await client.get("/llm/usage")
+    assert unauthenticated.status_code >= 400 and "usage" not in unauthenticated.json()  # Rejected by the auth dependency
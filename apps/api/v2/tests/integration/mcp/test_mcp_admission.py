@@ -0,0 +1,92 @@
+import asyncio
+import pytest
+import httpx
+from fastapi import FastAPI
+
+from apps.api.shared.mcp import mcp_routes
+from apps.api.shared.mcp.admission import AdmissionController, AdmissionRejectedError
+from apps.api.shared.mcp.stream_replay import StreamReplayRegistry
+
+AGENT_ID = "metrics_agent"
+
+@pytest.mark.asyncio
+async def test_queued_request_is_admitted_when_slot_frees():
+    controller = AdmissionController(max_concurrent=4, max_concurrent_per_agent=1, max_queue=4,
+                                     max_queue_per_agent=1, queue_timeout_seconds=1)
+    first = await controller.acquire(AGENT_ID)
+    waiter = asyncio.create_task(controller.acquire(AGENT_ID))
+    await asyncio.sleep(0)
+    assert controller.stats()["waiting"] == 1
+
+    # The per-agent queue is full: the next request is shed immediately with 429
+    with pytest.raises(AdmissionRejectedError) as exc_info:
+        await controller.acquire(AGENT_ID)
+    assert exc_info.value.status_code == 429
+    assert exc_info.value.retry_after_seconds >= 1
+
+    first.release()
+    second = await waiter
+    assert controller.stats()["in_flight"] == 1
+    second.release()
+    second.release()  # Idempotent
+    stats = controller.stats()
+    assert stats["in_flight"] == 0
+    assert stats["admitted"] == 2
+    assert stats["rejected_429"] == 1
+    assert stats["queue_time_seconds"]["count"] == 2
+
+@pytest.mark.asyncio
+async def test_idle_agents_are_evicted_beyond_the_agent_cap():
+    controller = AdmissionController(max_concurrent=4, max_agents=2)
+    busy = await controller.acquire("busy_agent")
+    for index in range(5):  # Arbitrary agent ids from the URL
+        (await controller.acquire(f"agent_{index}")).release()
+
+    assert list(controller._agent_semaphores) == ["busy_agent", "agent_4"]
+    assert set(controller._waiting) <= {"busy_agent", "agent_4"}
+    busy.release()
+    (await controller.acquire("agent_5")).release()
+    assert list(controller._agent_semaphores) == ["agent_4", "agent_5"]
+    assert controller.stats()["tracked_agents"] == 2 and controller.stats()["in_flight"] == 0
+
+@pytest.mark.asyncio
+async def test_global_limit_and_queue_timeout_return_503():
+    controller = AdmissionController(max_concurrent=1, max_concurrent_per_agent=4, max_queue=0,
+                                     max_queue_per_agent=4, queue_timeout_seconds=0.01)
+    ticket = await controller.acquire("agent_a")
+    with pytest.raises(AdmissionRejectedError) as exc_info:
+        await controller.acquire("agent_b")
+    assert exc_info.value.status_code == 503
+
+    controller.max_queue = 1
+    with pytest.raises(AdmissionRejectedError) as exc_info:
+        await controller.acquire("agent_b")  # Waits, then times out
+    assert exc_info.value.status_code == 503
+    assert controller.stats()["waiting"] == 0
+    ticket.release()
+    (await controller.acquire("agent_b")).release()
+
+@pytest.mark.asyncio
+async def test_stream_endpoint_sheds_load_with_retry_after(monkeypatch):
+    async def fake_process_query_stream(agent_id, user_query, llm_settings=None, conversation_history=None):
+        yield {"type": "content", "chunk": "ok"}
+        yield {"type": "eos", "message": "done"}
+
+    controller = AdmissionController(max_concurrent=4, max_concurrent_per_agent=1, max_queue=4, max_queue_per_agent=0)
+    monkeypatch.setattr(mcp_routes, "process_query_stream", fake_process_query_stream)
+    monkeypatch.setattr(mcp_routes, "replay_registry", StreamReplayRegistry())
+    monkeypatch.setattr(mcp_routes, "admission_controller", controller)
+    app = FastAPI()
+    app.include_router(mcp_routes.mcp_router, prefix="/mcp")
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://testserver") as client:
+        busy_ticket = await controller.acquire(AGENT_ID)
+        rejected = await client.post(f"/mcp/stream/{AGENT_ID}", json={"user_query": "hi"})
+        busy_ticket.release()
+        accepted = await client.post(f"/mcp/stream/{AGENT_ID}", json={"user_query": "hi"})
+        await asyncio.sleep(0)  # Let the producer task release its slot
+
+    assert rejected.status_code == 429
+    assert int(rejected.headers["Retry-After"]) >= 1
+    assert accepted.status_code == 200
+    assert controller.stats()["in_flight"] == 0
@@ -0,0 +1,114 @@
+import time
+import pytest
+from types import SimpleNamespace
+
+from apps.api.shared.mcp import llm_mcp
+from apps.api.shared.mcp.mcp_models import LLMSettings
+from apps.api.shared.mcp.response_cache import MCPResponseCache, build_cache_key
+
+CACHED_CONTEXT = "<!-- response_cache: true -->\n<!-- response_cache_ttl: 120 -->\nYou answer SOP questions."
+UNCACHED_CONTEXT = "You answer SOP questions."
+
+class FakeStream:
+    """Async iterator mimicking an OpenAI chat completion stream."""
+    def __init__(self, words):
+        self._chunks = [
+            SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=word))]) for word in words
+        ]
+
+    def __aiter__(self):
+        return self._iter()
+
+    async def _iter(self):
+        for chunk in self._chunks:
+            yield chunk
+
+    async def close(self):
+        pass
+
+@pytest.fixture
+def fake_llm(monkeypatch):
+    calls = {"count": 0, "context": CACHED_CONTEXT}
+
+    async def fake_load_agent_context(agent_id):
+        return calls["context"]
+
+    async def fake_create(**kwargs):
+        calls["count"] += 1
+        if kwargs["model"] == "gpt-4o-mini" and "model_cascade" in calls["context"]:
+            return FakeStream(["Not sure."])  # Too short: the cascade escalates
+        return FakeStream(["Step ", "one."])
+
+    fake_client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=fake_create)))
+    monkeypatch.setattr(llm_mcp, "_load_agent_context", fake_load_agent_context)
+    monkeypatch.setattr(llm_mcp, "get_openai_client", lambda: fake_client)
+    monkeypatch.setattr(llm_mcp, "response_cache", MCPResponseCache(max_entries=8, default_ttl_seconds=60))
+    return calls
+
+async def collect(agent_id, query, **kwargs):
+    return [event async for event in llm_mcp.process_query_stream(agent_id, query, **kwargs)]
+
+@pytest.mark.asyncio
+async def test_cache_hit_replays_identical_stream(fake_llm):
+    first = await collect("sop", "How do I  onboard a new hire?")
+    second = await collect("sop", "how do i onboard a new hire?")  # Normalized to the same key
+
+    assert fake_llm["count"] == 1
+    assert second == first
+    assert [e["chunk"] for e in second if e["type"] == "content"] == ["Step ", "one."]
+    assert llm_mcp.response_cache.stats()["hits"] == 1
+
+@pytest.mark.asyncio
+async def test_cache_key_varies_with_settings_and_context(fake_llm):
+    await collect("sop", "How do I onboard?")
+    await collect("sop", "How do I onboard?", llm_settings=LLMSettings(temperature=0.1))
+    assert fake_llm["count"] == 2
+
+    # Editing the context file changes its version and invalidates cached answers
+    fake_llm["context"] = CACHED_CONTEXT + "\nNew policy."
+    await collect("sop", "How do I onboard?")
+    assert fake_llm["count"] == 3
+
+@pytest.mark.asyncio
+async def test_agents_without_opt_in_are_not_cached(fake_llm):
+    fake_llm["context"] = UNCACHED_CONTEXT
+    await collect("sop", "How do I onboard?")
+    await collect("sop", "How do I onboard?")
+    assert fake_llm["count"] == 2
+    assert len(llm_mcp.response_cache) == 0
+
+@pytest.mark.asyncio
+async def test_downgraded_and_escalated_answers_are_not_cached(fake_llm, monkeypatch):
+    over_budget = {"value": True}
+    monkeypatch.setattr(llm_mcp.token_ledger, "enforce_budget",
+                        lambda model, scope=None: "gpt-4o-mini" if over_budget["value"] else model)
+    await collect("sop", "How do I onboard?")
+    over_budget["value"] = False
+    await collect("sop", "How do I onboard?")  # Within budget again: answered by the requested model
+    assert fake_llm["count"] == 2
+    assert len(llm_mcp.response_cache) == 1
+
+    fake_llm["context"] = "<!-- model_cascade: gpt-4o-mini, gpt-4o -->\n" + CACHED_CONTEXT
+    await collect("sop", "How do I onboard?")
+    assert fake_llm["count"] == 4 and len(llm_mcp.response_cache) == 1
+
+def test_lru_bound_and_ttl(monkeypatch):
+    cache = MCPResponseCache(max_entries=2, default_ttl_seconds=60)
+    cache.set("a", ["1"])
+    cache.set("b", ["2"])
+    assert cache.get("a") == ["1"]  # "a" becomes most recently used
+    cache.set("c", ["3"])
+    assert cache.get("b") is None
+    assert cache.get("a") == ["1"]
+
+    cache.set("short", ["x"], ttl_seconds=1)
+    now = time.monotonic()
+    monkeypatch.setattr("apps.api.shared.mcp.response_cache.time.monotonic", lambda: now + 5)
+    assert cache.get("short") is None
+
+def test_parse_context_metadata():
+    metadata = llm_mcp.parse_context_metadata(CACHED_CONTEXT)
+    assert metadata == {"response_cache": True, "response_cache_ttl": 120}
+    key_a = build_cache_key("sop", CACHED_CONTEXT, "Hi", LLMSettings())
+    key_b = build_cache_key("sop", CACHED_CONTEXT, "Hi", LLMSettings(), conversation_history=[{"role": "user", "content": "x"}])
+    assert key_a != key_b
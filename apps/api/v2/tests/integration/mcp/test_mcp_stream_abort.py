@@ -0,0 +1,94 @@
+import asyncio
+import pytest
+from types import SimpleNamespace
+
+from apps.api.llm.resilience import count_text_tokens
+from apps.api.shared.mcp import llm_mcp, mcp_routes
+from apps.api.shared.mcp.response_cache import MCPResponseCache
+from apps.api.shared.mcp.stream_replay import StreamReplayRegistry
+
+AGENT_ID = "metrics_agent"
+
+class HangingStream:
+    """OpenAI-like stream that yields one chunk and then blocks until cancelled."""
+    def __init__(self):
+        self.closed = False
+
+    def __aiter__(self):
+        return self._iter()
+
+    async def _iter(self):
+        yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content="partial"))])
+        await asyncio.Event().wait()
+
+    async def close(self):
+        self.closed = True
+
+@pytest.fixture
+def hanging_llm(monkeypatch):
+    stream = HangingStream()
+
+    async def fake_load_agent_context(agent_id):
+        return "You report metrics."
+
+    async def fake_create(**kwargs):
+        return stream
+
+    fake_client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=fake_create)))
+    monkeypatch.setattr(llm_mcp, "_load_agent_context", fake_load_agent_context)
+    monkeypatch.setattr(llm_mcp, "get_openai_client", lambda: fake_client)
+    monkeypatch.setattr(llm_mcp, "response_cache", MCPResponseCache())
+    return stream
+
+async def start_stream(registry):
+    buffer = registry.create(AGENT_ID)
+    buffer.max_tokens = 500
+    generator = llm_mcp.process_query_stream(AGENT_ID, "Revenue?")
+    buffer.producer_task = asyncio.create_task(mcp_routes._produce_into_buffer(buffer, generator))
+    return buffer
+
+@pytest.mark.asyncio
+async def test_disconnect_aborts_upstream_stream(monkeypatch, hanging_llm):
+    registry = StreamReplayRegistry(abandon_grace_seconds=0)
+    monkeypatch.setattr(mcp_routes, "replay_registry", registry)
+    buffer = await start_stream(registry)
+
+    # Client reads until the first content chunk, then disconnects
+    follower = mcp_routes._follow_buffer(buffer)
+    async for _, event_data in follower:
+        if event_data["type"] == "content":
+            break
+    await follower.aclose()
+
+    with pytest.raises(asyncio.CancelledError):
+        await buffer.producer_task
+    assert hanging_llm.closed
+    assert buffer.aborted and buffer.is_complete
+    assert registry.stats()["aborted_streams"] == 1
+    assert buffer.content_tokens == count_text_tokens("partial")
+    assert registry.stats()["saved_tokens_upper_bound"] == 500 - buffer.content_tokens
+
+@pytest.mark.asyncio
+async def test_resume_within_grace_period_keeps_stream_alive(monkeypatch, hanging_llm):
+    registry = StreamReplayRegistry(abandon_grace_seconds=0.05)
+    monkeypatch.setattr(mcp_routes, "replay_registry", registry)
+    buffer = await start_stream(registry)
+
+    follower = mcp_routes._follow_buffer(buffer)
+    async for _, event_data in follower:
+        if event_data["type"] == "content":
+            break
+    await follower.aclose()
+
+    # A reconnecting client (Last-Event-ID) subscribes before the grace period ends
+    resumed = mcp_routes._follow_buffer(buffer, last_seq=2)
+    resume_read = asyncio.create_task(resumed.__anext__())
+    await asyncio.sleep(0.1)
+
+    assert not buffer.producer_task.done()
+    assert registry.stats()["aborted_streams"] == 0
+
+    resume_read.cancel()
+    buffer.producer_task.cancel()
+    await asyncio.gather(resume_read, buffer.producer_task, return_exceptions=True)
+    await resumed.aclose()
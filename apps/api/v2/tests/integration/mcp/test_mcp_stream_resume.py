@@ -0,0 +1,172 @@
+import asyncio
+import json
+import pytest
+import httpx
+from fastapi import FastAPI
+
+from apps.api.shared.mcp import mcp_routes
+from apps.api.shared.mcp.stream_replay import (
+    StreamReplayBuffer, StreamReplayGapError, StreamReplayRegistry, parse_event_id
+)
+
+AGENT_ID = "metrics_agent"
+
+def parse_sse(body: str):
+    """Parses a raw SSE body into a list of (id, event, data) tuples."""
+    events = []
+    for block in body.strip().split("\n\n"):
+        fields = {}
+        for line in block.splitlines():
+            key, _, value = line.partition(": ")
+            fields[key] = value
+        events.append((fields.get("id"), fields.get("event"), json.loads(fields["data"])))
+    return events
+
+@pytest.fixture
+def mcp_app(monkeypatch):
+    """Minimal app with the MCP router, a fresh replay registry and a fake LLM stream."""
+    calls = {"count": 0}
+
+    async def fake_process_query_stream(agent_id, user_query, llm_settings=None, conversation_history=None):
+        calls["count"] += 1
+        yield {"type": "info", "message": "Context loaded."}
+        for word in ["Total ", "users: ", "1500"]:
+            yield {"type": "content", "chunk": word}
+        yield {"type": "eos", "message": f"Stream finished for agent {agent_id}"}
+
+    monkeypatch.setattr(mcp_routes, "process_query_stream", fake_process_query_stream)
+    monkeypatch.setattr(mcp_routes, "replay_registry", StreamReplayRegistry(max_events=16, ttl_seconds=60))
+    app = FastAPI()
+    app.include_router(mcp_routes.mcp_router, prefix="/mcp")
+    return app, calls
+
+@pytest.mark.asyncio
+async def test_stream_events_carry_ids(mcp_app):
+    app, _ = mcp_app
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://testserver") as client:
+        response = await client.post(f"/mcp/stream/{AGENT_ID}", json={"user_query": "How many users?"})
+
+    assert response.status_code == 200
+    events = parse_sse(response.text)
+    stream_id = response.headers["X-MCP-Stream-Id"]
+    assert [e[1] for e in events] == ["info", "content", "content", "content", "eos"]
+    assert [e[0] for e in events] == [f"{stream_id}:{i}" for i in range(5)]
+
+@pytest.mark.asyncio
+async def test_resume_with_last_event_id_replays_missed_events(mcp_app):
+    app, calls = mcp_app
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://testserver") as client:
+        first = await client.post(f"/mcp/stream/{AGENT_ID}", json={"user_query": "How many users?"})
+        first_events = parse_sse(first.text)
+
+        # Pretend the connection dropped after the first content chunk
+        last_seen_id = first_events[1][0]
+        resumed = await client.post(f"/mcp/stream/{AGENT_ID}", headers={"Last-Event-ID": last_seen_id})
+
+    assert resumed.status_code == 200
+    resumed_events = parse_sse(resumed.text)
+    assert resumed_events == first_events[2:]
+    assert calls["count"] == 1  # No second LLM generation
+
+@pytest.mark.asyncio
+async def test_resume_with_unknown_id_is_rejected_not_restarted(mcp_app):
+    app, calls = mcp_app
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://testserver") as client:
+        response = await client.post(
+            f"/mcp/stream/{AGENT_ID}",
+            headers={"Last-Event-ID": "expired-stream:3"},
+            json={"user_query": "How many users?"}
+        )
+
+    assert response.status_code == 200
+    events = parse_sse(response.text)
+    assert [(e[1], e[2].get("code")) for e in events] == [("error", "STREAM_RESUME_EXPIRED"), ("eos", None)]
+    assert calls["count"] == 0
+
+@pytest.mark.asyncio
+async def test_replay_buffer_follows_live_stream_and_reports_gaps():
+    buffer = StreamReplayBuffer(stream_id="s1", agent_id=AGENT_ID, max_events=2)
+
+    async def read_all(last_seq):
+        return [event_id async for event_id, _ in buffer.events_after(last_seq)]
+
+    reader = asyncio.create_task(read_all(-1))
+    await asyncio.sleep(0)
+    await buffer.append({"type": "content", "chunk": "a"})
+    await buffer.append({"type": "content", "chunk": "b"})
+    await buffer.complete()
+    assert await reader == ["s1:0", "s1:1"]
+
+    # Ring buffer holds only the last 2 events, so seq 0 is evicted
+    buffer = StreamReplayBuffer(stream_id="s2", agent_id=AGENT_ID, max_events=2)
+    for chunk in ["a", "b", "c"]:
+        await buffer.append({"type": "content", "chunk": chunk})
+    await buffer.complete()
+    with pytest.raises(StreamReplayGapError):
+        await read_all(-1)
+    assert await read_all(0) == ["s2:1", "s2:2"]
+
+def test_parse_event_id():
+    assert parse_event_id("abc:12") == ("abc", 12)
+    assert parse_event_id("abc") is None
+    assert parse_event_id("abc:x") is None
+    assert parse_event_id(None) is None
+
+class DroppingStream(httpx.AsyncByteStream):
+    """Sends the first two events, then the connection breaks."""
+    async def __aiter__(self):
+        yield b'id: s1:0\nevent: content\ndata: {"type": "content", "chunk": "Total "}\n\n'
+        yield b'id: s1:1\nevent: content\ndata: {"type": "content", "chunk": "users: "}\n\n'
+        raise httpx.ReadError("connection reset")
+
+@pytest.mark.asyncio
+async def test_mcp_client_resumes_dropped_stream(monkeypatch):
+    from apps.api.shared.mcp.mcp_client import MCPClient
+
+    seen_last_event_ids = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        last_event_id = request.headers.get("Last-Event-ID")
+        seen_last_event_ids.append(last_event_id)
+        if last_event_id is None:
+            return httpx.Response(200, headers={"content-type": "text/event-stream"}, stream=DroppingStream())
+        body = (
+            'id: s1:2\nevent: content\ndata: {"type": "content", "chunk": "1500"}\n\n'
+            'id: s1:3\nevent: eos\ndata: {"type": "eos", "message": "done"}\n\n'
+        )
+        return httpx.Response(200, headers={"content-type": "text/event-stream"}, text=body)
+
+    async def get_mock_client(self):
+        return httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+    monkeypatch.setattr(MCPClient, "_get_client", get_mock_client)
+    client = MCPClient(http_client=None)
+
+    chunks = [chunk async for chunk in client.query_agent_stream(AGENT_ID, "How many users?")]
+
+    assert "".join(chunks) == "Total users: 1500"
+    assert seen_last_event_ids == [None, "s1:1"]
+
+@pytest.mark.asyncio
+async def test_mcp_client_stops_when_the_server_does_not_continue_the_stream(monkeypatch):
+    from apps.api.shared.mcp.mcp_client import MCPClient, MCPError
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        if request.headers.get("Last-Event-ID") is None:
+            return httpx.Response(200, headers={"content-type": "text/event-stream"}, stream=DroppingStream())
+        # A server that lost the buffer and generated the whole answer again
+        body = (
+            'id: s2:0\nevent: content\ndata: {"type": "content", "chunk": "Total "}\n\n'
+            'id: s2:1\nevent: content\ndata: {"type": "content", "chunk": "users: 1500"}\n\n'
+        )
+        return httpx.Response(200, headers={"content-type": "text/event-stream"}, text=body)
+
+    async def get_mock_client(self):
+        return httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+    monkeypatch.setattr(MCPClient, "_get_client", get_mock_client)
+    chunks = []
+    with pytest.raises(MCPError, match="Could not resume stream s1"):
+        async for chunk in MCPClient(http_client=None).query_agent_stream(AGENT_ID, "How many users?"):
+            chunks.append(chunk)
+    assert "".join(chunks) == "Total users: "  # Nothing repeated
@@ -0,0 +1,142 @@
+import asyncio
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from apps.api.shared.mcp import llm_mcp, mcp_ws
+from apps.api.shared.mcp.admission import AdmissionController
+
+@pytest.fixture
+def ws_client(monkeypatch):
+    """App with only the MCP WebSocket router and a fake LLM stream."""
+    async def fake_process_query_stream(agent_id, user_query, llm_settings=None, conversation_history=None):
+        yield {"type": "info", "message": f"Context loaded for {agent_id}."}
+        if user_query == "hang":
+            await asyncio.Event().wait()
+        for word in user_query.split():
+            yield {"type": "content", "chunk": word}
+        yield {"type": "eos", "message": "done"}
+
+    monkeypatch.setattr(llm_mcp, "process_query_stream", fake_process_query_stream)
+    monkeypatch.setattr(mcp_ws, "admission_controller", AdmissionController())
+    app = FastAPI()
+    app.include_router(mcp_ws.mcp_ws_router, prefix="/mcp")
+    with TestClient(app) as client:
+        yield client
+
+def receive_until_eos(websocket, query_ids):
+    """Collects frames per query id until every query has sent its eos."""
+    frames = {query_id: [] for query_id in query_ids}
+    pending = set(query_ids)
+    while pending:
+        frame = websocket.receive_json()
+        frames[frame["id"]].append(frame)
+        if frame["type"] == "eos":
+            pending.discard(frame["id"])
+    return frames
+
+def test_multiplexed_queries_on_one_connection(ws_client):
+    with ws_client.websocket_connect("/mcp/ws") as websocket:
+        websocket.send_json({"type": "query", "id": "a", "agent_id": "metrics_agent", "user_query": "one two"})
+        websocket.send_json({"type": "query", "id": "b", "agent_id": "sop_agent", "user_query": "three"})
+        frames = receive_until_eos(websocket, ["a", "b"])
+
+    assert [f["chunk"] for f in frames["a"] if f["type"] == "content"] == ["one", "two"]
+    assert [f["chunk"] for f in frames["b"] if f["type"] == "content"] == ["three"]
+    assert frames["b"][0]["message"] == "Context loaded for sop_agent."
+
+def test_cancel_stops_only_that_query(ws_client):
+    with ws_client.websocket_connect("/mcp/ws") as websocket:
+        websocket.send_json({"type": "query", "id": "slow", "agent_id": "metrics_agent", "user_query": "hang"})
+        assert websocket.receive_json()["type"] == "info"
+        websocket.send_json({"type": "query", "id": "fast", "agent_id": "metrics_agent", "user_query": "hi"})
+        websocket.send_json({"type": "cancel", "id": "slow"})
+        frames = receive_until_eos(websocket, ["slow", "fast"])
+
+    assert frames["slow"][-1]["message"] == "Query slow cancelled."
+    assert [f["chunk"] for f in frames["fast"] if f["type"] == "content"] == ["hi"]
+
+def test_invalid_frames_get_error_and_eos(ws_client):
+    with ws_client.websocket_connect("/mcp/ws") as websocket:
+        websocket.send_json({"type": "query", "id": "x", "user_query": "missing agent"})
+        error, eos = websocket.receive_json(), websocket.receive_json()
+        websocket.send_json({"type": "query", "id": "y", "agent_id": "metrics_agent"})
+        missing_query = websocket.receive_json()
+
+    assert error["code"] == "INVALID_QUERY" and eos["type"] == "eos"
+    assert missing_query["id"] == "y" and missing_query["code"] == "INVALID_QUERY"
+
+@pytest.mark.asyncio
+async def test_slow_client_does_not_block_cancels_or_errors(monkeypatch):
+    async def endless_stream(agent_id, user_query, llm_settings=None, conversation_history=None):
+        while True:
+            yield {"type": "content", "chunk": "x"}
+
+    class StalledWebSocket:
+        """A client that never reads: every send blocks."""
+        async def send_json(self, frame):
+            await asyncio.Event().wait()
+
+    monkeypatch.setattr(llm_mcp, "process_query_stream", endless_stream)
+    monkeypatch.setattr(mcp_ws, "admission_controller", AdmissionController())
+    monkeypatch.setattr(mcp_ws, "MCP_WS_SEND_QUEUE_SIZE", 4)
+    session = mcp_ws.MCPWebSocketSession(StalledWebSocket())
+    sender = asyncio.create_task(session.sender_loop())
+
+    session.handle_frame({"type": "query", "id": "q1", "agent_id": "metrics_agent", "user_query": "go"})
+    task = session.queries["q1"]
+    for _ in range(10):
+        await asyncio.sleep(0)  # The stream fills its send slots and waits
+
+    session.handle_frame({"type": "bogus", "id": "q2"})  # Errors are queued without waiting
+    session.handle_frame({"type": "cancel", "id": "q1"})
+    await asyncio.gather(task, return_exceptions=True)
+
+    assert task.cancelled()
+    queued = []
+    while not session.outbound.empty():
+        queued.append(session.outbound.get_nowait()[0])
+    assert [frame["type"] for frame in queued[-3:]] == ["error", "eos", "eos"]
+    assert queued[-1] == {"id": "q1", "type": "eos", "message": "Query q1 cancelled."}
+    sender.cancel()
+    await asyncio.gather(sender, return_exceptions=True)
+
+def drain(session):
+    frames = []
+    while not session.outbound.empty():
+        frames.append(session.outbound.get_nowait()[0])
+    return frames
+
+@pytest.mark.asyncio
+async def test_rejected_query_frees_its_id(monkeypatch):
+    controller = AdmissionController(max_concurrent=1, max_queue=0, max_queue_per_agent=0)
+    held = await controller.acquire("metrics_agent")  # Every further query is rejected
+    monkeypatch.setattr(mcp_ws, "admission_controller", controller)
+    session = mcp_ws.MCPWebSocketSession(websocket=None)
+
+    for _ in range(2):  # The id can be reused after a rejection
+        session.handle_frame({"type": "query", "id": "q1", "agent_id": "metrics_agent", "user_query": "go"})
+        await session.queries["q1"]
+        assert "q1" not in session.queries
+        error, eos = drain(session)
+        assert error["code"] == "ADMISSION_REJECTED" and eos["type"] == "eos"
+    held.release()
+
+@pytest.mark.asyncio
+async def test_cancel_while_queued_for_admission(monkeypatch):
+    controller = AdmissionController(max_concurrent=1)
+    held = await controller.acquire("metrics_agent")  # The query waits in the admission queue
+    monkeypatch.setattr(mcp_ws, "admission_controller", controller)
+    session = mcp_ws.MCPWebSocketSession(websocket=None)
+
+    session.handle_frame({"type": "query", "id": "q1", "agent_id": "metrics_agent", "user_query": "go"})
+    task = session.queries["q1"]
+    await asyncio.sleep(0)
+    assert controller.stats()["waiting"] == 1
+    session.handle_frame({"type": "cancel", "id": "q1"})
+    await asyncio.gather(task, return_exceptions=True)
+
+    assert task.cancelled() and "q1" not in session.queries
+    assert drain(session) == [{"id": "q1", "type": "eos", "message": "Query q1 cancelled."}]
+    held.release()
+    assert controller.stats()["in_flight"] == 0 and controller.stats()["waiting"] == 0